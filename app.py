@@ -1,3 +1,6 @@
+import time
+_import_started = time.perf_counter()  # reporte de boot (utils/boot.py)
+
 import logging
 from flask import Flask, render_template, redirect, url_for, flash, request, session
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
@@ -21,6 +24,14 @@ def create_app():
     # Initialize extensions
     db.init_app(app)
 
+    # Lecturas de vistas @read_only a la réplica (si READ_REPLICA_URL está configurada)
+    from utils.db_routing import init_db_routing
+    init_db_routing(app, db)
+
+    # Instrumentación por request (queries, tiempo en BD, N+1, Server-Timing)
+    from monitoring import init_monitoring
+    init_monitoring(app)
+
     # Initialize Flask-Migrate
     migrate = Migrate(app, db)
 
@@ -36,13 +47,27 @@ def create_app():
     login_manager.login_message = 'Por favor inicie sesión para acceder a esta página.'
     login_manager.login_message_category = 'info'
 
+    # Cache de aplicación: datos maestros, umbrales y usuarios (ver cache/)
+    from cache import init_cache
+    init_cache(app)
+
+    # Snapshots de usuario en el cache de aplicación (ver services/user_cache.py)
+    from services.user_cache import UserCache
+    UserCache.configure(ttl=app.config['USER_CACHE_TTL'])
+
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        # Un usuario desactivado pierde la sesión en su siguiente request
+        user = UserCache.load(int(user_id))
+        return user if user is not None and user.is_active else None
 
     # Initialize IAP Authentication
     init_iap_auth(app)
 
+    # /_ah/warmup y warmup de arranque (utils/warmup.py)
+    from utils.warmup import init_warmup
+    init_warmup(app)
+
     # Register blueprints
     from routes.auth import auth_bp
     from routes.dashboard import dashboard_bp
@@ -76,7 +101,9 @@ def create_app():
             'auth.logout',
             'auth.demo_login',
             'auth.unauthorized',
-            'static'
+            'static',
+            'metrics',  # Autoriza por token o superusuario (monitoring/metrics.py)
+            'warmup'  # Corre una sola vez por proceso (utils/warmup.py)
         ]
 
         # Permitir acceso a endpoints públicos
@@ -111,6 +138,11 @@ def create_app():
                 message=f"Acceso denegado. Solo autenticación SSO permitida en {environment.upper()}."
             ), 403
 
+    # Profiler bajo demanda (?__profile=1): después del middleware de auth, que ya
+    # dejó autenticado al usuario, porque solo se activa para superusuarios
+    from monitoring import init_profiler
+    init_profiler(app)
+
     @app.context_processor
     def inject_version():
         return dict(app_version=os.environ.get("APP_VERSION", "local"))
@@ -203,6 +235,11 @@ def create_app():
 app = create_app()
 register_commands(app)
 
+# STARTUP_MODE=fast (startup.sh): migraciones y superusers en este proceso
+if app.config['BOOT_STEPS_IN_PROCESS']:
+    from utils.boot import run_boot_steps
+    run_boot_steps(app, db, import_seconds=time.perf_counter() - _import_started)
+
 if __name__ == '__main__':
     # Fix for Issue #76: Debug Mode Habilitado en Entry Point
     debug_mode = Config.FLASK_DEBUG
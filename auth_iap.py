@@ -1,19 +1,164 @@
 from flask import request, current_app, flash
 from flask_login import login_user
 from models import User, db, LoginAudit, Superuser, ROLE_ADMIN 
+from collections import OrderedDict
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
+from monitoring.metrics import record_cache
+import hashlib
+import logging
+import threading
+import time
 import jwt
 import requests
 import os
 
+logger = logging.getLogger(__name__)
+
+GOOGLE_IAP_CERTS_URL = "https://www.gstatic.com/iap/verify/public_key"
+
+
+class IAPKeyStore:
+    """
+    Claves públicas de IAP con TTL, refresco en segundo plano y re-fetch ante un kid desconocido.
+
+    Las claves se guardan ya parseadas (objetos de cryptography), así que validar
+    un JWT no vuelve a procesar el PEM. Si Google no responde se siguen sirviendo
+    las últimas claves conocidas.
+    """
+
+    def __init__(self, url=GOOGLE_IAP_CERTS_URL, ttl=3600, timeout=5, refresh_ahead=0.8,
+                 kid_miss_interval=60):
+        self.url = url
+        self.ttl = ttl
+        self.timeout = timeout
+        self.refresh_ahead = refresh_ahead
+        self.kid_miss_interval = kid_miss_interval
+        self._keys = {}
+        self._fetched_at = 0.0
+        self._failed_at = None       # último refresco (TTL o anticipado) fallido
+        self._last_kid_miss = None   # último re-fetch por kid desconocido
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _fetch(self):
+        """Descarga y parsea el set de claves. Devuelve True si se actualizó."""
+        try:
+            response = requests.get(self.url, timeout=self.timeout)
+            response.raise_for_status()
+            keys = {kid: load_pem_public_key(pem.encode()) for kid, pem in response.json().items()}
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error(f"Failed to fetch Google IAP public keys: {e}")
+            return False
+
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+        return True
+
+    def _refresh(self):
+        """Refresco por TTL o anticipado; un fallo abre la espera de kid_miss_interval."""
+        self._failed_at = None if self._fetch() else time.monotonic()
+
+    def _refresh_in_background(self):
+        with self._lock:
+            try:
+                self._refresh()
+            finally:
+                self._refreshing = False
+
+    def _can_refetch(self, last_attempt):
+        return last_attempt is None or time.monotonic() - last_attempt >= self.kid_miss_interval
+
+    def get_keys(self):
+        """Devuelve {kid: public_key}; solo bloquea si no hay claves o expiraron."""
+        age = time.monotonic() - self._fetched_at
+
+        if not self._keys or age >= self.ttl:
+            if self._can_refetch(self._failed_at):
+                with self._lock:
+                    # Otro hilo pudo haberlas descargado mientras esperábamos el lock.
+                    # Tras un fallo se reintenta recién pasado kid_miss_interval (mientras, claves viejas).
+                    expired = not self._keys or time.monotonic() - self._fetched_at >= self.ttl
+                    if expired and self._can_refetch(self._failed_at):
+                        self._refresh()
+        elif age >= self.ttl * self.refresh_ahead and not self._refreshing and self._can_refetch(self._failed_at):
+            # Sin esperar: si el lock está tomado otro hilo ya está descargando
+            if self._lock.acquire(blocking=False):
+                try:
+                    start = not self._refreshing
+                    self._refreshing = True
+                finally:
+                    self._lock.release()
+                if start:
+                    threading.Thread(target=self._refresh_in_background, daemon=True).start()
+
+        return self._keys
+
+    def get_key(self, kid):
+        """Busca la clave de un kid; ante un kid desconocido re-descarga (con límite de frecuencia)."""
+        key = self.get_keys().get(kid)
+        if key is None and self._can_refetch(self._last_kid_miss):
+            with self._lock:
+                key = self._keys.get(kid)
+                if key is None and self._can_refetch(self._last_kid_miss):
+                    self._last_kid_miss = time.monotonic()
+                    self._fetch()
+                    key = self._keys.get(kid)
+        return key
+
+
+class VerifiedTokenCache:
+    """LRU acotado de JWT ya verificados, indexado por SHA-256 del token y válido hasta su `exp`."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            claims, exp = entry
+            if exp <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return claims
+
+    def put(self, token, claims):
+        exp = claims.get('exp')
+        if not exp:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (claims, exp)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
 class IAPAuthenticator:
     """Handles Google Cloud IAP authentication and JWT validation."""
 
-    def __init__(self, gcp_project_number=None, backend_service_id=None):
+    def __init__(self, gcp_project_number=None, backend_service_id=None, key_store=None):
         self.gcp_project_number = gcp_project_number
         self.backend_service_id = backend_service_id
         self.expected_audience = f"/projects/{self.gcp_project_number}/global/backendServices/{self.backend_service_id}" if gcp_project_number and backend_service_id else None
-        self.google_certs_url = "https://www.gstatic.com/iap/verify/public_key"
-        self.certs = {}
+        self.key_store = key_store or IAPKeyStore()
+        self.verified_tokens = VerifiedTokenCache()
 
     def is_iap_request(self):
         """Check if the request seems to come from IAP."""
@@ -24,41 +169,33 @@ class IAPAuthenticator:
         return request.headers.get('X-Goog-Authenticated-User-Email', '').replace('accounts.google.com:', '')
 
     def _get_google_public_keys(self):
-        """Fetch and cache Google's public keys for IAP JWT validation."""
-        if not self.certs:
-            try:
-                response = requests.get(self.google_certs_url)
-                response.raise_for_status()
-                self.certs = response.json()
-            except requests.exceptions.RequestException as e:
-                current_app.logger.error(f"Failed to fetch Google IAP public keys: {e}")
-                return None
-        return self.certs
+        """Google's public keys for IAP JWT validation ({kid: public_key})."""
+        return self.key_store.get_keys() or None
 
     def _validate_jwt(self, iap_jwt):
         """Validate the IAP JWT assertion."""
-        try:
-            unverified_claims = jwt.decode(iap_jwt, options={"verify_signature": False})
-            current_app.logger.info(f"IAP JWT unverified claims: {unverified_claims}")
-        except Exception as e:
-            current_app.logger.error(f"Could not decode unverified JWT: {e}")
+        # Un token ya verificado (mismo hash, aún no expirado) no vuelve a verificar firma
+        cached_claims = self.verified_tokens.get(iap_jwt)
+        record_cache('iap_jwt', hit=cached_claims is not None)
+        if cached_claims is not None:
+            return cached_claims, "JWT validado correctamente (cache)."
 
-        public_keys = self._get_google_public_keys()
-        if not public_keys:
+        if not self._get_google_public_keys():
             return None, "No se pudieron obtener las claves públicas de Google."
 
         try:
             kid = jwt.get_unverified_header(iap_jwt).get('kid')
-            if not kid or kid not in public_keys:
+            key = self.key_store.get_key(kid) if kid else None
+            if key is None:
                 return None, "Clave pública (kid) no encontrada en el JWT o en las claves de Google."
 
-            key = public_keys[kid]
             decoded_jwt = jwt.decode(
                 iap_jwt,
                 key,
                 algorithms=['ES256'],
                 audience=self.expected_audience
             )
+            self.verified_tokens.put(iap_jwt, decoded_jwt)
             return decoded_jwt, "JWT validado correctamente."
         except jwt.ExpiredSignatureError:
             return None, "El token JWT ha expirado."
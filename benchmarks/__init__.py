@@ -0,0 +1,7 @@
+"""
+Benchmarks - Medición de los hot paths antes de un deploy
+
+Construye un dataset sintético reproducible (ver dataset.py), mide los casos
+registrados en cases.py y escribe los resultados en JSON, comparados contra
+una línea base guardada. Ver runner.py para el uso por línea de comandos.
+"""
@@ -0,0 +1,162 @@
+"""
+Casos de benchmark: los hot paths de la aplicación.
+
+Cada caso es una función `run(ctx, state)` registrada con @benchmark. Si el caso
+declara `setup`, éste corre antes de cada iteración (fuera del cronómetro) y su
+retorno llega como `state`. El runner ejecuta cada iteración dentro de un app
+context nuevo, como un request real: sesión limpia e identity map vacío.
+"""
+from dataclasses import dataclass
+from itertools import cycle, islice
+
+from models import Ticket, Surgery, TICKET_STATUS_VIGENTE
+from repositories import TicketRepository
+from routes.exports import create_ticket_pdf_final
+from services.fpa_calculator import FPACalculator
+from services.user_cache import UserCache
+
+# name -> Benchmark, en orden de registro
+BENCHMARKS = {}
+
+# Operaciones por iteración de los casos de dominio (independiente del tamaño del dataset)
+DOMAIN_BATCH = 1000
+
+
+@dataclass
+class Benchmark:
+    name: str
+    run: object
+    setup: object = None
+    group: str = 'default'
+
+
+@dataclass
+class BenchContext:
+    """Lo que los casos necesitan: app, cliente autenticado y el dataset."""
+    app: object
+    client: object
+    summary: object
+
+    @property
+    def user_id(self):
+        return self.summary.admin_user_ids[0]
+
+    @property
+    def ticket_id(self):
+        return self.summary.sample_ticket_ids[0]
+
+    def user(self):
+        return UserCache.load(self.user_id)
+
+
+def benchmark(name, setup=None, group='default'):
+    """Registra una función como caso de benchmark."""
+    def decorator(func):
+        BENCHMARKS[name] = Benchmark(name=name, run=func, setup=setup, group=group)
+        return func
+    return decorator
+
+
+def _get(ctx, path):
+    response = ctx.client.get(path)
+    # Las vistas en streaming (utils/streaming.py) renderizan al leer el cuerpo: se mide
+    # hasta el último byte y se cierra el generador (libera el contexto y el cursor)
+    response.get_data()
+    response.close()
+    if response.status_code != 200:
+        raise RuntimeError(f'GET {path} respondió {response.status_code}')
+    return response
+
+
+# --- TicketRepository.build_filtered_query ---
+
+@benchmark('repository.filtered_query[all]', group='repository')
+def filtered_query_all(ctx, state):
+    TicketRepository.build_filtered_query({}, ctx.user()).all()
+
+
+@benchmark('repository.filtered_query[vigente]', group='repository')
+def filtered_query_vigente(ctx, state):
+    TicketRepository.build_filtered_query({'status': TICKET_STATUS_VIGENTE}, ctx.user()).all()
+
+
+@benchmark('repository.filtered_query[search]', group='repository')
+def filtered_query_search(ctx, state):
+    TicketRepository.build_filtered_query({'search': 'Gonz'}, ctx.user()).all()
+
+
+@benchmark('repository.filtered_query[page]', group='repository')
+def filtered_query_page(ctx, state):
+    query = TicketRepository.build_filtered_query({}, ctx.user())
+    TicketRepository.apply_sorting(query, 'fpa', 'asc').paginate(page=1, per_page=20, error_out=False)
+
+
+# --- Endpoints vía test client ---
+
+@benchmark('http.nursing_board', group='http')
+def nursing_board(ctx, state):
+    _get(ctx, '/tickets/nursing')
+
+
+@benchmark('http.ticket_list', group='http')
+def ticket_list(ctx, state):
+    _get(ctx, '/tickets/')
+
+
+@benchmark('http.dashboard', group='http')
+def dashboard(ctx, state):
+    _get(ctx, '/dashboard/')
+
+
+@benchmark('http.export_excel', group='http')
+def export_excel(ctx, state):
+    _get(ctx, '/export/tickets/reports/excel')
+
+
+@benchmark('http.ticket_detail', group='http')
+def ticket_detail(ctx, state):
+    _get(ctx, f'/tickets/{ctx.ticket_id}')
+
+
+# --- Lógica de dominio ---
+
+def _load_sample_ticket(ctx):
+    return TicketRepository.get_with_relations(ctx.ticket_id)
+
+
+@benchmark('pdf.create_ticket_pdf_final', setup=_load_sample_ticket, group='domain')
+def ticket_pdf(ctx, ticket):
+    with ctx.app.test_request_context():
+        create_ticket_pdf_final(ticket)
+
+
+def _load_surgeries(ctx):
+    surgeries = Surgery.query.filter(Surgery.id.in_(ctx.summary.surgery_ids)).all()
+    tickets = Ticket.query.filter_by(clinic_id=ctx.summary.clinic_ids[0])\
+        .order_by(Ticket.created_at.desc()).limit(DOMAIN_BATCH).all()
+    by_id = {s.id: s for s in surgeries}
+    pairs = [(t.pavilion_end_time, by_id[t.surgery_id]) for t in tickets if t.surgery_id in by_id]
+    return list(islice(cycle(pairs), DOMAIN_BATCH))
+
+
+@benchmark(f'fpa.calculate[x{DOMAIN_BATCH}]', setup=_load_surgeries, group='domain')
+def fpa_calculate(ctx, pairs):
+    for surgery_time, surgery in pairs:
+        FPACalculator.calculate(surgery_time, surgery)
+
+
+@benchmark(f'fpa.calculate_many[x{DOMAIN_BATCH}]', setup=_load_surgeries, group='domain')
+def fpa_calculate_many(ctx, pairs):
+    FPACalculator.calculate_many([t for t, _ in pairs], [s.base_stay_hours for _, s in pairs])
+
+
+def _load_active_tickets(ctx):
+    tickets = Ticket.query.filter_by(clinic_id=ctx.summary.clinic_ids[0], status=TICKET_STATUS_VIGENTE)\
+        .order_by(Ticket.current_fpa.desc()).limit(DOMAIN_BATCH).all()
+    return list(islice(cycle(tickets), DOMAIN_BATCH))
+
+
+@benchmark(f'ticket.compute_state[x{DOMAIN_BATCH}]', setup=_load_active_tickets, group='domain')
+def compute_state(ctx, tickets):
+    for ticket in tickets:
+        ticket.compute_state()
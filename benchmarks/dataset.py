@@ -0,0 +1,86 @@
+"""
+Dataset sintético reproducible para los benchmarks.
+
+Usa el mismo generador que `flask gen-load-data` (services/synthetic_data.py)
+con semilla fija: la misma spec produce siempre los mismos datos, de modo que
+dos corridas sobre commits distintos son comparables. Un dataset cargado con
+gen-load-data también sirve con --reuse-dataset.
+"""
+from dataclasses import dataclass
+
+from models import db, User, Surgery, Ticket, FpaModification, ROLE_ADMIN
+from services.synthetic_data import LoadDataSpec, SyntheticDataGenerator, LOAD_USER_PREFIX
+
+
+def benchmark_spec(clinics=3, tickets=100_000, surgeries_per_clinic=24, days=365, seed=None):
+    """LoadDataSpec para benchmarks: sin login_audit (no participa en los casos medidos)."""
+    kwargs = {'seed': seed} if seed is not None else {}
+    return LoadDataSpec(clinics=clinics, tickets=tickets, surgeries_per_clinic=surgeries_per_clinic,
+                        days=days, with_login_audit=False, **kwargs)
+
+
+@dataclass
+class DatasetSummary:
+    """Ids que los benchmarks necesitan para armar sus requests."""
+    spec: LoadDataSpec
+    clinic_ids: list
+    admin_user_ids: list
+    sample_ticket_ids: list
+    surgery_ids: list
+    tickets: int
+    modifications: int
+
+
+def build_dataset(spec=None, batch_size=10_000, now=None):
+    """
+    Genera el dataset en la base de datos del app context actual.
+
+    Returns:
+        DatasetSummary
+    """
+    spec = spec or benchmark_spec()
+    generated = SyntheticDataGenerator(spec, batch_size=batch_size, now=now).generate()
+    return DatasetSummary(
+        spec=spec,
+        clinic_ids=generated.clinic_ids,
+        admin_user_ids=generated.admin_user_ids,
+        sample_ticket_ids=[generated.last_ticket_ids[cid] for cid in generated.clinic_ids],
+        surgery_ids=generated.surgery_ids[generated.clinic_ids[0]],
+        tickets=generated.rows.get('ticket', 0),
+        modifications=generated.rows.get('fpa_modification', 0),
+    )
+
+
+def load_dataset_summary(spec):
+    """
+    Reconstruye el DatasetSummary de un dataset ya cargado (--reuse-dataset).
+
+    Returns:
+        DatasetSummary or None: None si la base no tiene datos generados
+    """
+    admins = db.session.execute(
+        db.select(User.id, User.clinic_id)
+        .where(User.username.like(f'{LOAD_USER_PREFIX}admin_%'), User.role == ROLE_ADMIN)
+        .order_by(User.clinic_id)
+    ).all()
+    if not admins:
+        return None
+    clinic_ids = [clinic_id for _, clinic_id in admins]
+
+    sample_ticket_ids = [ticket_id for (ticket_id,) in db.session.execute(
+        db.select(db.func.max(Ticket.id)).where(Ticket.clinic_id.in_(clinic_ids))
+        .group_by(Ticket.clinic_id).order_by(Ticket.clinic_id)
+    )]
+    return DatasetSummary(
+        spec=spec,
+        clinic_ids=clinic_ids,
+        admin_user_ids=[user_id for user_id, _ in admins],
+        sample_ticket_ids=sample_ticket_ids,
+        surgery_ids=[s_id for (s_id,) in db.session.execute(
+            db.select(Surgery.id).where(Surgery.clinic_id == clinic_ids[0]).order_by(Surgery.id)
+        )],
+        tickets=db.session.scalar(db.select(db.func.count(Ticket.id)).where(Ticket.clinic_id.in_(clinic_ids))),
+        modifications=db.session.scalar(
+            db.select(db.func.count(FpaModification.id)).where(FpaModification.clinic_id.in_(clinic_ids))
+        ),
+    )
@@ -0,0 +1,511 @@
+"""
+Prueba de carga en proceso: un pool de hilos maneja el app WSGI con escenarios
+realistas y reporta throughput, latencias p50/p95/p99 y tasa de error.
+
+Producción corre gunicorn con 1 worker y 8 hilos: todos los requests de un
+worker comparten el intérprete (y el GIL) y el pool de conexiones del engine.
+Manejar el app con N hilos en un solo proceso reproduce exactamente eso, sin
+red ni proxy de por medio, así que el punto de saturación medido aquí es el de
+un worker. Correr varias etapas (--concurrency 1,2,4,8,16) muestra dónde el
+throughput deja de crecer y la latencia se dispara.
+
+Requiere datos generados con `flask gen-load-data` (usuarios load_*) en la base
+configurada, sea SQLite en archivo o un Postgres local:
+
+    DATABASE_URL=sqlite:////tmp/load.sqlite flask gen-load-data --clinics 3 --tickets 100000 --yes
+    DATABASE_URL=sqlite:////tmp/load.sqlite flask load-test --concurrency 1,2,4,8,16 --duration 30
+
+El escenario de clínicos crea y modifica tickets: la base queda con esos datos.
+"""
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timedelta
+
+from benchmarks.runner import _percentile, _git_commit
+
+# Mezcla por defecto: peso relativo de cada escenario
+DEFAULT_MIX = {
+    'nurse_board': 55,
+    'admin_dashboard': 20,
+    'clinician_create_modify': 20,
+    'export_burst': 5,
+}
+
+# Etapas en las que el throughput crece menos que esto se consideran saturadas
+SATURATION_GAIN = 0.10
+
+# RUTs de pacientes creados por la prueba de carga (sobre los de gen-load-data)
+LOAD_TEST_RUT_BASE = 45_000_000
+
+# name -> Scenario, en orden de registro
+SCENARIOS = {}
+
+
+@dataclass
+class Scenario:
+    name: str
+    run: object
+    role: str
+    description: str = ''
+
+
+def scenario(name, role, description=''):
+    """Registra una función `run(user)` como escenario de carga."""
+    def decorator(func):
+        SCENARIOS[name] = Scenario(name=name, run=func, role=role, description=description)
+        return func
+    return decorator
+
+
+@dataclass
+class Sample:
+    scenario: str
+    step: str
+    started: float
+    ms: float
+    status: int
+    ok: bool
+
+
+@dataclass
+class ClinicData:
+    """Usuarios y catálogo de una clínica generada con gen-load-data."""
+    clinic_id: int
+    admin_ids: list
+    clinical_ids: list
+    surgery_ids: list
+    doctor_ids: list
+
+
+@dataclass
+class LoadTestConfig:
+    concurrency: list = field(default_factory=lambda: [1, 2, 4, 8])
+    duration: float = 30.0
+    warmup: float = 3.0
+    think_ms: float = 0.0
+    mix: dict = field(default_factory=lambda: dict(DEFAULT_MIX))
+    burst_every: float = 30.0
+    burst_length: float = 5.0
+    burst_factor: float = 10.0
+    seed: int = 1
+
+
+class LoadTestError(Exception):
+    """La prueba no puede correr (p.ej. no hay datos de carga en la base)."""
+
+
+def parse_mix(value):
+    """
+    Parsea una mezcla 'nurse_board=50,export_burst=5'.
+
+    Raises:
+        ValueError: Escenario desconocido o peso inválido
+    """
+    mix = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Escenario desconocido '{name}'. Disponibles: {', '.join(SCENARIOS)}")
+        try:
+            mix[name] = float(weight) if weight else 1.0
+        except ValueError:
+            raise ValueError(f"Peso inválido para '{name}': {weight}")
+        if mix[name] < 0:
+            raise ValueError(f"Peso inválido para '{name}': {weight}")
+    if not any(mix.values()):
+        raise ValueError('La mezcla no tiene escenarios con peso positivo')
+    return mix
+
+
+def load_clinics():
+    """
+    Clínicas con usuarios de gen-load-data en la base del app context actual.
+
+    Raises:
+        LoadTestError: Si la base no tiene usuarios load_*
+    """
+    from models import db, User, Surgery, Doctor, ROLE_ADMIN, ROLE_CLINICAL
+    from services.synthetic_data import LOAD_USER_PREFIX
+
+    users = db.session.execute(
+        db.select(User.id, User.clinic_id, User.role)
+        .where(User.username.like(f'{LOAD_USER_PREFIX}%'), User.is_active.is_(True),
+               User.role.in_((ROLE_ADMIN, ROLE_CLINICAL)))
+        .order_by(User.clinic_id, User.id)
+    ).all()
+
+    clinics = {}
+    for user_id, clinic_id, role in users:
+        clinic = clinics.setdefault(clinic_id, ClinicData(clinic_id, [], [], [], []))
+        (clinic.admin_ids if role == ROLE_ADMIN else clinic.clinical_ids).append(user_id)
+
+    for clinic in clinics.values():
+        clinic.surgery_ids = list(db.session.scalars(
+            db.select(Surgery.id).where(Surgery.clinic_id == clinic.clinic_id, Surgery.is_active.is_(True))
+        ))
+        clinic.doctor_ids = list(db.session.scalars(
+            db.select(Doctor.id).where(Doctor.clinic_id == clinic.clinic_id, Doctor.is_active.is_(True))
+        ))
+
+    usable = [c for c in clinics.values() if c.admin_ids and c.clinical_ids and c.surgery_ids]
+    if not usable:
+        raise LoadTestError('No hay usuarios de carga en la base: ejecute primero `flask gen-load-data`')
+    return usable
+
+
+class VirtualUser:
+    """
+    Un usuario simulado: test client propio con sesión iniciada.
+
+    Cada request se cronometra y queda como Sample en `samples`; `ok` exige el
+    status esperado y, en los POST, que la respuesta no haya dejado un flash de
+    error (las rutas redirigen igual en éxito y en error).
+    """
+
+    def __init__(self, app, clinic, user_id, rng, scenario_name, origin):
+        self.app = app
+        self.clinic = clinic
+        self.user_id = user_id
+        self.rng = rng
+        self.scenario_name = scenario_name
+        self.origin = origin
+        self.samples = []
+        self.client = app.test_client()
+        with self.client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+
+    def request(self, step, method, path, expect=200, data=None):
+        start = time.perf_counter()
+        try:
+            response = self.client.open(path, method=method, data=data)
+            # El tiempo incluye el cuerpo completo: las vistas en streaming renderizan al leerlo
+            response.get_data()
+            response.close()
+            status = response.status_code
+            ok = status == expect
+        except Exception:
+            # Una excepción no capturada en el app es un 500 para el usuario
+            response, status, ok = None, 500, False
+        elapsed = (time.perf_counter() - start) * 1000
+        if ok and method == 'POST':
+            ok = not self._pop_error_flashes()
+        self.samples.append(Sample(self.scenario_name, step, start - self.origin, elapsed, status, ok))
+        return response if ok else None
+
+    def _pop_error_flashes(self):
+        with self.client.session_transaction() as session:
+            flashes = session.pop('_flashes', [])
+        return [message for category, message in flashes if category == 'error']
+
+
+# --- Escenarios ---
+
+@scenario('nurse_board', role='clinical', description='Enfermería refrescando el tablero')
+def nurse_board(user):
+    user.request('nursing_board', 'GET', '/tickets/nursing')
+
+
+@scenario('admin_dashboard', role='admin', description='Administrador en el dashboard')
+def admin_dashboard(user):
+    user.request('dashboard', 'GET', '/dashboard/')
+
+
+@scenario('clinician_create_modify', role='clinical',
+          description='Clínico crea un ticket y luego modifica su FPA')
+def clinician_create_modify(user):
+    from services.synthetic_data import rut_with_check_digit
+
+    if user.request('create_form', 'GET', '/tickets/create') is None:
+        return
+
+    rng = user.rng
+    surgery_time = datetime.now().replace(second=0, microsecond=0) - timedelta(hours=rng.randint(1, 20))
+    form = {
+        'rut': rut_with_check_digit(LOAD_TEST_RUT_BASE + rng.randrange(1_000_000)),
+        'primer_nombre': 'Carga',
+        'segundo_nombre': '',
+        'apellido_paterno': 'Prueba',
+        'apellido_materno': '',
+        'age': str(rng.randint(18, 90)),
+        'sex': rng.choice(('F', 'M')),
+        'episode_id': f'LT-{rng.randrange(10**8)}',
+        'surgery_id': str(rng.choice(user.clinic.surgery_ids)),
+        'doctor_id': str(rng.choice(user.clinic.doctor_ids)) if user.clinic.doctor_ids else '',
+        'pavilion_end_time': surgery_time.strftime('%Y-%m-%dT%H:%M'),
+        'room': str(rng.randint(100, 450)),
+    }
+    response = user.request('create_submit', 'POST', '/tickets/create', expect=302, data=form)
+    location = response.headers.get('Location', '') if response is not None else ''
+    if '/tickets/TH-' not in location:
+        if response is not None:
+            # Redirigió de vuelta al formulario: el ticket no se creó
+            user.samples[-1].ok = False
+        return
+
+    ticket_id = location.rsplit('/', 1)[-1]
+    user.request('modify_fpa', 'POST', f'/tickets/{ticket_id}/update_fpa', expect=302, data={
+        'new_fpa_date': (surgery_time + timedelta(days=rng.randint(2, 5))).strftime('%Y-%m-%d'),
+        'discharge_end_hour': str(rng.choice((10, 12, 14, 16, 18))),
+        'reason': 'Evolución clínica',
+        'justification': 'Prueba de carga',
+    })
+
+
+@scenario('export_burst', role='admin', description='Exportaciones Excel, concentradas en ráfagas')
+def export_burst(user):
+    user.request('export_excel', 'GET', '/export/tickets/reports/excel')
+
+
+# --- Ejecución ---
+
+class _PoolMonitor:
+    """Conexiones del pool en uso (actual y pico) mientras corre una etapa."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.checked_out = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def _on_checkout(self, *args):
+        with self._lock:
+            self.checked_out += 1
+            self.peak = max(self.peak, self.checked_out)
+
+    def _on_checkin(self, *args):
+        with self._lock:
+            self.checked_out -= 1
+
+    def __enter__(self):
+        from sqlalchemy import event
+        event.listen(self.engine, 'checkout', self._on_checkout)
+        event.listen(self.engine, 'checkin', self._on_checkin)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        event.remove(self.engine, 'checkout', self._on_checkout)
+        event.remove(self.engine, 'checkin', self._on_checkin)
+        return False
+
+
+def _in_burst(elapsed, config):
+    return config.burst_every > 0 and (elapsed % config.burst_every) < config.burst_length
+
+
+def _choose(rng, config, bursting):
+    names = list(config.mix)
+    weights = [config.mix[name] * (config.burst_factor if bursting and name == 'export_burst' else 1)
+               for name in names]
+    return rng.choices(names, weights=weights)[0]
+
+
+def _worker(app, clinics, config, worker_index, origin, deadline, results):
+    rng = random.Random(config.seed * 1000 + worker_index)
+    clinic = clinics[worker_index % len(clinics)]
+    users = {}
+    samples = []
+
+    while time.perf_counter() < deadline:
+        elapsed = time.perf_counter() - origin
+        name = _choose(rng, config, _in_burst(elapsed, config))
+        definition = SCENARIOS[name]
+        user = users.get(name)
+        if user is None:
+            pool = clinic.admin_ids if definition.role == 'admin' else clinic.clinical_ids
+            user = users[name] = VirtualUser(app, clinic, rng.choice(pool), rng, name, origin)
+        definition.run(user)
+        if config.think_ms:
+            time.sleep(rng.expovariate(1000 / config.think_ms))
+
+    for user in users.values():
+        samples.extend(user.samples)
+    results[worker_index] = samples
+
+
+def summarize(samples, duration):
+    """
+    Agrega samples por escenario y por paso.
+
+    Args:
+        samples (list[Sample]): Requests medidos (ya sin el warmup)
+        duration (float): Segundos medidos
+
+    Returns:
+        dict: scenario -> {requests, errors, error_rate, rps, p50_ms, p95_ms,
+            p99_ms, max_ms, steps: {step -> mismas métricas}}
+    """
+    def stats(group):
+        latencies = [s.ms for s in group]
+        errors = sum(1 for s in group if not s.ok)
+        return {
+            'requests': len(group),
+            'errors': errors,
+            'error_rate': round(errors / len(group), 4),
+            'rps': round(len(group) / duration, 2) if duration else 0.0,
+            'p50_ms': round(_percentile(latencies, 50), 1),
+            'p95_ms': round(_percentile(latencies, 95), 1),
+            'p99_ms': round(_percentile(latencies, 99), 1),
+            'max_ms': round(max(latencies), 1),
+        }
+
+    by_scenario = {}
+    for sample in samples:
+        by_scenario.setdefault(sample.scenario, {}).setdefault(sample.step, []).append(sample)
+
+    summary = {}
+    for name, steps in by_scenario.items():
+        summary[name] = stats([s for group in steps.values() for s in group])
+        summary[name]['steps'] = {step: stats(group) for step, group in steps.items()}
+    return summary
+
+
+def run_stage(app, clinics, config, concurrency):
+    """
+    Corre `concurrency` hilos en lazo cerrado durante warmup + duration.
+
+    Returns:
+        dict: concurrency, totales, por escenario y uso del pool de conexiones
+    """
+    from models import db
+
+    with app.app_context():
+        engine = db.engine
+
+    results = {}
+    with _PoolMonitor(engine) as pool:
+        origin = time.perf_counter()
+        deadline = origin + config.warmup + config.duration
+        threads = [
+            threading.Thread(target=_worker, name=f'load-test-{i}', daemon=True,
+                             args=(app, clinics, config, i, origin, deadline, results))
+            for i in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    measured = [s for samples in results.values() for s in samples if s.started >= config.warmup]
+    scenarios = summarize(measured, config.duration)
+    errors = sum(1 for s in measured if not s.ok)
+    latencies = [s.ms for s in measured]
+    return {
+        'concurrency': concurrency,
+        'requests': len(measured),
+        'rps': round(len(measured) / config.duration, 2) if config.duration else 0.0,
+        'errors': errors,
+        'error_rate': round(errors / len(measured), 4) if measured else 0.0,
+        'p50_ms': round(_percentile(latencies, 50), 1) if latencies else None,
+        'p95_ms': round(_percentile(latencies, 95), 1) if latencies else None,
+        'p99_ms': round(_percentile(latencies, 99), 1) if latencies else None,
+        'pool_peak_checked_out': pool.peak,
+        'scenarios': scenarios,
+    }
+
+
+def find_saturation(stages, gain=SATURATION_GAIN):
+    """
+    Primera concurrencia cuyo throughput no mejora en más de `gain` respecto
+    de la etapa anterior (la etapa anterior es el punto útil máximo).
+
+    Returns:
+        int or None: Concurrencia de saturación, None si siguió escalando
+    """
+    for previous, current in zip(stages, stages[1:]):
+        if previous['rps'] and current['rps'] < previous['rps'] * (1 + gain):
+            return current['concurrency']
+    return None
+
+
+def _pool_config(engine):
+    pool = engine.pool
+    info = {'class': type(pool).__name__}
+    for attr in ('size', 'timeout'):
+        value = getattr(pool, attr, None)
+        if callable(value):
+            info[attr] = value()
+    info['max_overflow'] = getattr(pool, '_max_overflow', None)
+    return info
+
+
+def run_load_test(app, config, progress=None):
+    """
+    Corre todas las etapas de concurrencia y arma el reporte.
+
+    Raises:
+        LoadTestError: Si no hay datos de carga en la base
+
+    Returns:
+        dict: meta, stages y saturation_concurrency
+    """
+    from models import db
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        clinics = load_clinics()
+        mix = {name: weight for name, weight in config.mix.items() if weight > 0}
+        config.mix = mix
+        meta = {
+            'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'git_commit': _git_commit(),
+            'database': db.engine.dialect.name,
+            'pool': _pool_config(db.engine),
+            'clinics': len(clinics),
+            'config': asdict(config),
+        }
+
+    stages = []
+    for concurrency in config.concurrency:
+        if progress:
+            progress(f'{concurrency} hilos durante {config.warmup + config.duration:.0f}s ...')
+        stage = run_stage(app, clinics, config, concurrency)
+        stages.append(stage)
+        if progress:
+            progress(f'  {stage["rps"]:.1f} req/s, p95 {stage["p95_ms"]} ms, '
+                     f'errores {stage["error_rate"]:.1%}, pico de conexiones {stage["pool_peak_checked_out"]}')
+
+    return {'meta': meta, 'stages': stages, 'saturation_concurrency': find_saturation(stages)}
+
+
+def format_report(report):
+    """Tabla de texto por etapa y escenario."""
+    lines = []
+    header = (f"{'escenario / paso':<34} {'req':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'p99 ms':>8} {'error':>7}")
+    for stage in report['stages']:
+        lines.append('')
+        lines.append(f"== {stage['concurrency']} hilos: {stage['rps']:.1f} req/s, "
+                     f"p95 {stage['p95_ms']} ms, pico de conexiones {stage['pool_peak_checked_out']}")
+        lines.append(header)
+        for name, result in stage['scenarios'].items():
+            lines.append(_format_row(name, result))
+            if len(result['steps']) > 1:
+                for step, step_result in result['steps'].items():
+                    lines.append(_format_row(f'  {step}', step_result))
+
+    saturation = report['saturation_concurrency']
+    lines.append('')
+    if saturation is None:
+        lines.append('El throughput siguió creciendo en todas las etapas: pruebe más concurrencia.')
+    else:
+        lines.append(f'Saturación: con {saturation} hilos el throughput crece menos de '
+                     f'{SATURATION_GAIN:.0%} respecto de la etapa anterior.')
+    return '\n'.join(lines)
+
+
+def _format_row(label, result):
+    return (f"{label:<34} {result['requests']:>7} {result['rps']:>8.1f} {result['p50_ms']:>8.1f} "
+            f"{result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['error_rate']:>7.1%}")
+
+
+def write_report(report, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
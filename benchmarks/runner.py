@@ -0,0 +1,310 @@
+"""
+Runner de benchmarks: construye el dataset, mide cada caso y compara contra
+una línea base guardada.
+
+Uso:
+    python -m benchmarks --tickets 100000 --clinics 3
+    python -m benchmarks --tickets 20000 --only http. --save-baseline
+    python -m benchmarks --baseline benchmarks/results/baseline.json --fail-on-regression
+
+Sin --database-url usa un SQLite temporal. Con --database-url apunta a una base
+dedicada (p.ej. un Postgres local); nunca se escribe en una base con datos que
+no sean del benchmark.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+DEFAULT_OUTPUT = os.path.join(RESULTS_DIR, 'latest.json')
+DEFAULT_BASELINE = os.path.join(RESULTS_DIR, 'baseline.json')
+
+# Diferencias menores a esto no cuentan como regresión (ruido del reloj)
+MIN_DELTA_MS = 1.0
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    group: str
+    iterations: int
+    min_ms: float
+    median_ms: float
+    mean_ms: float
+    p95_ms: float
+    max_ms: float
+    stdev_ms: float
+    queries: int
+
+
+class _QueryCounter:
+    """Cuenta sentencias ejecutadas en un engine mientras está activo."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        from sqlalchemy import event
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+        return False
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_case(case, ctx, iterations=5, warmup=1):
+    """
+    Ejecuta un caso `warmup + iterations` veces y resume los tiempos medidos.
+
+    Cada iteración corre en un app context propio (sesión e identity map
+    limpios, como un request). El setup del caso queda fuera del cronómetro.
+
+    Returns:
+        BenchmarkResult: Tiempos en ms y queries de la última iteración
+    """
+    from models import db
+
+    samples, queries = [], 0
+    for i in range(warmup + iterations):
+        with ctx.app.app_context():
+            state = case.setup(ctx) if case.setup else None
+            with _QueryCounter(db.engine) as counter:
+                start = time.perf_counter()
+                case.run(ctx, state)
+                elapsed = (time.perf_counter() - start) * 1000
+        if i >= warmup:
+            samples.append(elapsed)
+            queries = counter.count
+
+    return BenchmarkResult(
+        name=case.name,
+        group=case.group,
+        iterations=iterations,
+        min_ms=round(min(samples), 3),
+        median_ms=round(statistics.median(samples), 3),
+        mean_ms=round(statistics.fmean(samples), 3),
+        p95_ms=round(_percentile(samples, 95), 3),
+        max_ms=round(max(samples), 3),
+        stdev_ms=round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+        queries=queries,
+    )
+
+
+def select_cases(benchmarks, patterns=None):
+    """Casos cuyo nombre empieza con (o calza el glob de) alguno de los patrones."""
+    if not patterns:
+        return list(benchmarks.values())
+    return [
+        case for name, case in benchmarks.items()
+        if any(name.startswith(p) or fnmatch.fnmatch(name, p) for p in patterns)
+    ]
+
+
+def compare_to_baseline(results, baseline, tolerance=0.20, min_delta_ms=MIN_DELTA_MS):
+    """
+    Compara medianas contra la línea base.
+
+    Args:
+        results (dict): name -> dict de resultado (sección 'results' del JSON)
+        baseline (dict): Igual que results, de una corrida anterior
+        tolerance (float): Fracción de aumento tolerada (0.20 = +20%)
+        min_delta_ms (float): Aumento absoluto mínimo para considerar regresión
+
+    Returns:
+        list[dict]: name, baseline_ms, current_ms, ratio, status
+            (status: 'regression', 'improvement', 'ok' o 'new')
+    """
+    comparison = []
+    for name, result in results.items():
+        current = result['median_ms']
+        previous = baseline.get(name, {}).get('median_ms')
+        if previous is None:
+            comparison.append({'name': name, 'baseline_ms': None, 'current_ms': current,
+                               'ratio': None, 'status': 'new'})
+            continue
+
+        ratio = current / previous if previous else float('inf')
+        delta = current - previous
+        if ratio > 1 + tolerance and delta > min_delta_ms:
+            status = 'regression'
+        elif ratio < 1 - tolerance and -delta > min_delta_ms:
+            status = 'improvement'
+        else:
+            status = 'ok'
+        comparison.append({'name': name, 'baseline_ms': previous, 'current_ms': current,
+                           'ratio': round(ratio, 3), 'status': status})
+    return comparison
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_table(results, comparison):
+    by_name = {c['name']: c for c in comparison}
+    print(f"\n{'benchmark':<38} {'median ms':>10} {'p95 ms':>10} {'queries':>8} {'baseline':>10} {'Δ':>8}")
+    for name, result in results.items():
+        cmp = by_name.get(name, {})
+        baseline = f"{cmp['baseline_ms']:.1f}" if cmp.get('baseline_ms') is not None else '-'
+        delta = f"{(cmp['ratio'] - 1) * 100:+.0f}%" if cmp.get('ratio') is not None else ''
+        flag = '  REGRESIÓN' if cmp.get('status') == 'regression' else ''
+        print(f"{name:<38} {result['median_ms']:>10.1f} {result['p95_ms']:>10.1f} "
+              f"{result['queries']:>8} {baseline:>10} {delta:>8}{flag}")
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--tickets', type=int, default=100_000)
+    parser.add_argument('--clinics', type=int, default=3)
+    parser.add_argument('--surgeries', type=int, default=24, help='Cirugías por clínica')
+    parser.add_argument('--days', type=int, default=365, help='Días hacia atrás que cubren los tickets')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--database-url', default=None, help='Base dedicada (default: SQLite temporal)')
+    parser.add_argument('--reuse-dataset', action='store_true',
+                        help='Usar el dataset ya cargado en --database-url en vez de regenerarlo')
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--only', nargs='*', default=None, help='Prefijos o globs de casos a correr')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='Guardar esta corrida como línea base')
+    parser.add_argument('--tolerance', type=float, default=0.20)
+    parser.add_argument('--fail-on-regression', action='store_true')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+
+    # Config lee el entorno al importarse: definirlo antes de importar la app
+    tmpdir = None
+    if args.database_url is None:
+        tmpdir = tempfile.mkdtemp(prefix='ticket-home-bench-')
+        args.database_url = f"sqlite:///{os.path.join(tmpdir, 'bench.sqlite')}"
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('SECRET_KEY', 'benchmark-secret-key')
+    os.environ['ENABLE_IAP'] = 'false'
+    os.environ['ENABLE_DEMO_LOGIN'] = 'true'
+    os.environ['METRICS_ENABLED'] = 'false'
+    os.environ['MEMORY_TRACKING_ENABLED'] = 'false'
+    os.environ['QUERY_LOG_ENABLED'] = 'false'
+
+    try:
+        return _run(args)
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def _run(args):
+    from app import create_app
+    from models import db
+    from benchmarks.cases import BENCHMARKS, BenchContext
+    from benchmarks.dataset import benchmark_spec, build_dataset, load_dataset_summary
+
+    app = create_app()
+    app.config.update(WTF_CSRF_ENABLED=False, SERVER_NAME='localhost.localdomain')
+
+    spec = benchmark_spec(clinics=args.clinics, tickets=args.tickets, surgeries_per_clinic=args.surgeries,
+                          days=args.days, seed=args.seed)
+
+    with app.app_context():
+        db.create_all()
+        build_seconds = None
+        summary = load_dataset_summary(spec) if args.reuse_dataset else None
+        if summary is None:
+            if db.session.execute(db.text('SELECT 1 FROM ticket LIMIT 1')).first():
+                print('La base de datos ya tiene tickets: use una base dedicada o --reuse-dataset', file=sys.stderr)
+                return 2
+            print(f'Generando dataset: {spec.clinics} clínicas × {spec.surgeries_per_clinic} cirugías '
+                  f'× {spec.tickets} tickets ...', flush=True)
+            start = time.perf_counter()
+            summary = build_dataset(spec)
+            build_seconds = round(time.perf_counter() - start, 2)
+            print(f'  listo en {build_seconds}s ({summary.modifications} modificaciones)')
+        dialect = db.engine.dialect.name
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(summary.admin_user_ids[0])
+        session['_fresh'] = True
+    ctx = BenchContext(app=app, client=client, summary=summary)
+
+    results = {}
+    for case in select_cases(BENCHMARKS, args.only):
+        print(f'  {case.name} ...', end=' ', flush=True)
+        result = run_case(case, ctx, iterations=args.iterations, warmup=args.warmup)
+        results[case.name] = asdict(result)
+        print(f'{result.median_ms:.1f} ms')
+
+    payload = {
+        'meta': {
+            'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': dialect,
+            'dataset': spec.as_dict(),
+            'dataset_build_seconds': build_seconds,
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+        },
+        'results': results,
+    }
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline_payload = json.load(f)
+        baseline = baseline_payload.get('results', {})
+        if baseline_payload.get('meta', {}).get('dataset') != spec.as_dict():
+            print('Aviso: la línea base se midió con otro dataset; la comparación no es directa.')
+    comparison = compare_to_baseline(results, baseline, tolerance=args.tolerance)
+    payload['comparison'] = {'baseline': args.baseline if baseline else None,
+                             'tolerance': args.tolerance, 'items': comparison}
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump({'meta': payload['meta'], 'results': results}, f, indent=2, ensure_ascii=False)
+
+    _print_table(results, comparison)
+    print(f'\nResultados: {args.output}')
+
+    regressions = [c['name'] for c in comparison if c['status'] == 'regression']
+    if regressions:
+        print(f"Regresiones (> +{args.tolerance:.0%}): {', '.join(regressions)}")
+        if args.fail_on_regression:
+            return 1
+    return 0
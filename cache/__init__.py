@@ -0,0 +1,115 @@
+"""
+Cache - Cache de aplicación con invalidación por versión
+
+`app_cache` es el cache del proceso; create_app() elige su backend y su bus
+de invalidación con init_cache(app). Las lecturas se cachean con @cached y las
+escrituras del ORM invalidan los namespaces afectados al commit
+(cache/invalidation.py); el bus lleva esas invalidaciones a los demás
+workers e instancias (cache/bus.py).
+"""
+import logging
+
+from flask import current_app
+
+from .backends import CacheBackend, MemoryBackend, RedisBackend, NullBackend
+from .bus import InvalidationBus, PostgresBus, FileBus
+from .core import Cache, clinic_namespace, clinic_namespaces
+
+logger = logging.getLogger(__name__)
+
+app_cache = Cache()
+
+from .invalidation import invalidate_on_commit  # noqa: E402  (registra los listeners del ORM; usa app_cache)
+
+
+def cached(name, namespace=None, ttl=None, key=None):
+    """@app_cache.cached: ver Cache.cached."""
+    return app_cache.cached(name, namespace=namespace, ttl=ttl, key=key)
+
+
+def init_cache(app):
+    """
+    Configura el backend y el bus de invalidación de app_cache.
+
+    Config:
+        CACHE_BACKEND (str): memory | redis | none (default memory)
+        CACHE_URL (str): URL de Redis para CACHE_BACKEND=redis
+        CACHE_DEFAULT_TTL (int): Segundos de vida por defecto (default 300)
+        CACHE_MAX_ENTRIES (int): Capacidad del backend memory (default 10000)
+        CACHE_KEY_PREFIX (str): Prefijo de claves en Redis (default ticket-home)
+        CACHE_BUS (str): none | postgres | file: bus de invalidación entre procesos (default none)
+        CACHE_BUS_CHANNEL (str): Canal de LISTEN/NOTIFY con CACHE_BUS=postgres
+        CACHE_BUS_FILE (str): Archivo compartido con CACHE_BUS=file
+    """
+    app.config.setdefault('CACHE_BACKEND', 'memory')
+    app.config.setdefault('CACHE_URL', None)
+    app.config.setdefault('CACHE_DEFAULT_TTL', 300)
+    app.config.setdefault('CACHE_MAX_ENTRIES', 10_000)
+    app.config.setdefault('CACHE_KEY_PREFIX', 'ticket-home')
+    app.config.setdefault('CACHE_BUS', 'none')
+    app.config.setdefault('CACHE_BUS_CHANNEL', 'cache_invalidation')
+    app.config.setdefault('CACHE_BUS_FILE', None)
+
+    kind = app.config['CACHE_BACKEND'].lower()
+    if kind == 'memory':
+        backend = MemoryBackend(maxsize=app.config['CACHE_MAX_ENTRIES'])
+    elif kind == 'redis':
+        if not app.config['CACHE_URL']:
+            raise ValueError('CACHE_BACKEND=redis requiere CACHE_URL')
+        backend = RedisBackend.from_url(app.config['CACHE_URL'], prefix=app.config['CACHE_KEY_PREFIX'])
+    elif kind == 'none':
+        # Sin almacenamiento, pero el single-flight sigue agrupando cargas concurrentes
+        backend = NullBackend()
+    else:
+        raise ValueError(f'CACHE_BACKEND desconocido: {kind} (memory, redis o none)')
+
+    bus = _create_bus(app)
+    app_cache.configure(backend=backend, default_ttl=app.config['CACHE_DEFAULT_TTL'])
+    app_cache.attach_bus(bus)
+    app.extensions['cache'] = app_cache
+    logger.info(f'Cache de aplicación: {kind}, bus: {app.config["CACHE_BUS"]}')
+
+    if app_cache.bus is not None:
+        @app.before_request
+        def start_cache_bus():
+            # El oyente nace en el worker, no en el master de gunicorn --preload
+            bus = current_app.extensions['cache'].bus
+            if bus is not None:
+                bus.ensure_started()
+
+
+def _create_bus(app):
+    kind = app.config['CACHE_BUS'].lower()
+    if kind == 'none':
+        return None
+    if kind == 'file':
+        if not app.config['CACHE_BUS_FILE']:
+            raise ValueError('CACHE_BUS=file requiere CACHE_BUS_FILE')
+        return FileBus(app.config['CACHE_BUS_FILE'])
+    if kind == 'postgres':
+        from models import db
+
+        with app.app_context():
+            engine = db.engine
+        if engine.dialect.name != 'postgresql':
+            raise ValueError(f'CACHE_BUS=postgres requiere una base Postgres (es {engine.dialect.name})')
+        return PostgresBus(engine, channel=app.config['CACHE_BUS_CHANNEL'])
+    raise ValueError(f'CACHE_BUS desconocido: {kind} (none, postgres o file)')
+
+
+__all__ = [
+    'app_cache',
+    'init_cache',
+    'cached',
+    'Cache',
+    'clinic_namespace',
+    'clinic_namespaces',
+    'invalidate_on_commit',
+    'CacheBackend',
+    'MemoryBackend',
+    'RedisBackend',
+    'NullBackend',
+    'InvalidationBus',
+    'PostgresBus',
+    'FileBus',
+]
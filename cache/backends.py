@@ -0,0 +1,187 @@
+"""
+Backends del cache de aplicación
+
+Todos cumplen CacheBackend. `get` devuelve None si la clave no existe, así que
+el cache (cache/core.py) envuelve los valores para poder guardar None. Los
+contadores (versiones de namespace) van aparte: en Redis son enteros de INCR,
+no valores serializados.
+
+- MemoryBackend: TTL + LRU en el proceso; guarda los objetos tal cual, sin
+  serializar (los valores cacheados no deben mutarse).
+- RedisBackend: compartido entre instancias; serializa con pickle. Acepta
+  cualquier cliente con la API de redis-py que usa (get, set, delete, incr,
+  scan_iter): el paquete `redis` en producción, cache.testing.LocalRedis en
+  tests y desarrollo local.
+- NullBackend: no guarda nada (CACHE_BACKEND=none).
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Protocol
+
+
+class CacheBackend(Protocol):
+
+    # True si todas las instancias ven las mismas entradas (no hace falta el bus, cache/bus.py)
+    shared: bool
+
+    def get(self, key): ...
+
+    def set(self, key, value, ttl=None): ...
+
+    def delete(self, key): ...
+
+    def get_counter(self, key):
+        """Valor de un contador, o None si no existe."""
+
+    def add_counter(self, key, value):
+        """Crea el contador con `value` solo si no existe."""
+
+    def incr(self, key):
+        """Incrementa un contador (lo crea en 1) y devuelve el nuevo valor."""
+
+    def clear(self): ...
+
+
+class MemoryBackend:
+    """
+    TTL + LRU en memoria del proceso, thread-safe.
+
+    Los contadores no entran al LRU: si se desalojara la versión de un
+    namespace, las entradas viejas podrían volver a ser válidas.
+    """
+
+    shared = False
+
+    def __init__(self, maxsize=10_000, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= now:
+            del self._entries[key]
+            return None
+        return entry
+
+    def _store(self, key, value, ttl):
+        self._entries[key] = (value, self.clock() + ttl if ttl else None)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key, self.clock())
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_counter(self, key):
+        return self._counters.get(key)
+
+    def add_counter(self, key, value):
+        with self._lock:
+            self._counters.setdefault(key, value)
+
+    def incr(self, key):
+        with self._lock:
+            value = self._counters[key] = self._counters.get(key, 0) + 1
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Backend en red con la API de redis-py; las claves llevan `prefix` para poder limpiar solo las propias."""
+
+    shared = True
+
+    def __init__(self, client, prefix='ticket-home'):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, prefix='ticket-home', timeout=0.5):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError('CACHE_BACKEND=redis requiere el paquete `redis` (pip install redis)') from e
+        client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        return cls(client, prefix=prefix)
+
+    def _key(self, key):
+        return f'{self.prefix}:{key}'
+
+    def get(self, key):
+        raw = self.client.get(self._key(key))
+        return None if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self._key(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ex=ttl or None)
+
+    def delete(self, key):
+        self.client.delete(self._key(key))
+
+    def get_counter(self, key):
+        raw = self.client.get(self._key(key))
+        return None if raw is None else int(raw)
+
+    def add_counter(self, key, value):
+        self.client.set(self._key(key), int(value), nx=True)
+
+    def incr(self, key):
+        return int(self.client.incr(self._key(key)))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=f'{self.prefix}:*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+class NullBackend:
+    """No guarda nada: cada lectura es un miss."""
+
+    shared = False
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def get_counter(self, key):
+        return None
+
+    def add_counter(self, key, value):
+        pass
+
+    def incr(self, key):
+        return 1
+
+    def clear(self):
+        pass
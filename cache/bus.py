@@ -0,0 +1,223 @@
+"""
+Bus de invalidación entre procesos
+
+Con CACHE_BACKEND=memory cada worker e instancia tiene sus propias entradas y
+versiones: un `bump` hecho en una instancia no llega a las otras, que siguen
+sirviendo datos viejos hasta que expira el TTL. El bus difunde cada `bump` y
+`delete` de app_cache y cada proceso los aplica a su propio backend.
+
+- PostgresBus: LISTEN/NOTIFY sobre la base de la app (producción).
+- FileBus: mensajes JSON por línea en un archivo compartido; sirve para
+  varios workers en una máquina y para tests.
+
+Cada proceso escucha desde un hilo propio que se inicia con su primer request,
+no en create_app: con gunicorn --preload el hilo debe nacer en el worker (el
+master publica las invalidaciones del arranque pero no escucha). Los mensajes
+de un proceso llevan su `origin` y él mismo los ignora.
+
+Si el oyente pierde la conexión, al reconectar vacía el cache local: no sabe
+qué mensajes se perdió mientras estuvo caído.
+"""
+import json
+import logging
+import os
+import select
+import socket
+import threading
+import uuid
+
+from monitoring.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+BUS_MESSAGES = registry.counter(
+    'cache_bus_messages_total', 'Mensajes del bus de invalidación por dirección (sent/received/failed).',
+    ('direction',))
+
+
+class InvalidationBus:
+    """
+    Base de los buses: origen por proceso, arranque perezoso del oyente y
+    despacho de mensajes. Las subclases implementan `_send` y `_listen`.
+    """
+
+    reconnect_delay = 1.0
+
+    def __init__(self):
+        self.handler = None
+        self._pid = None
+        self._origin_pid = None
+        self._origin = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def origin(self):
+        """Identificador de este proceso (cambia tras un fork)."""
+        if self._origin_pid != os.getpid():
+            self._origin_pid = os.getpid()
+            self._origin = f'{socket.gethostname()}:{self._origin_pid}:{uuid.uuid4().hex[:8]}'
+        return self._origin
+
+    def subscribe(self, handler):
+        """handler(message) se llama desde el hilo oyente con cada mensaje de otro proceso."""
+        self.handler = handler
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopped.clear()
+            self._prepare()
+            threading.Thread(target=self._run, name='cache-bus', daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def publish(self, message):
+        """Envía un mensaje a los demás procesos; un fallo se registra y no se propaga."""
+        message = dict(message, origin=self.origin)
+        try:
+            self._send(json.dumps(message, separators=(',', ':')))
+            BUS_MESSAGES.inc(direction='sent')
+        except Exception as e:
+            BUS_MESSAGES.inc(direction='failed')
+            logger.warning(f'Bus de cache: no se pudo publicar {message}: {e}')
+
+    def _dispatch(self, payload):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.warning(f'Bus de cache: mensaje inválido {payload!r}')
+            return
+        if message.get('origin') == self.origin or self.handler is None:
+            return
+        BUS_MESSAGES.inc(direction='received')
+        try:
+            self.handler(message)
+        except Exception as e:
+            logger.error(f'Bus de cache: error al aplicar {message}: {e}')
+
+    def _run(self):
+        first = True
+        while not self._stopped.is_set():
+            try:
+                self._listen(reconnected=not first)
+            except Exception as e:
+                logger.warning(f'Bus de cache: oyente desconectado ({e}), reintentando')
+            first = False
+            self._stopped.wait(self.reconnect_delay)
+
+    def _prepare(self):
+        """Estado a tomar antes de lanzar el hilo (p. ej. posición en el archivo)."""
+
+    def _send(self, payload):
+        raise NotImplementedError
+
+    def _listen(self, reconnected):
+        """Bloquea entregando mensajes a _dispatch hasta stop() o un error."""
+        raise NotImplementedError
+
+    def _resynced(self):
+        """Tras una reconexión: se pudieron perder mensajes, así que se pide vaciar el cache local."""
+        if self.handler is not None:
+            self.handler({'op': 'clear'})
+
+
+class PostgresBus(InvalidationBus):
+    """
+    LISTEN/NOTIFY de Postgres. Publica con una conexión del pool de la app y
+    escucha con una conexión propia, fuera del pool, en modo autocommit.
+
+    Args:
+        engine: Engine de SQLAlchemy (postgresql+psycopg2)
+        channel (str): Canal de NOTIFY
+        poll_seconds (float): Cada cuánto revisa stop() mientras espera
+    """
+
+    def __init__(self, engine, channel='cache_invalidation', poll_seconds=5.0):
+        super().__init__()
+        self.engine = engine
+        self.channel = channel
+        self.poll_seconds = poll_seconds
+
+    def _send(self, payload):
+        from sqlalchemy import text
+
+        with self.engine.begin() as connection:
+            connection.execute(text('SELECT pg_notify(:channel, :payload)'),
+                               {'channel': self.channel, 'payload': payload})
+
+    def _listen(self, reconnected):
+        raw = self.engine.raw_connection()
+        raw.detach()  # conexión dedicada: no vuelve al pool
+        dbapi_connection = raw.dbapi_connection
+        try:
+            dbapi_connection.autocommit = True
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.channel}"')
+            if reconnected:
+                self._resynced()
+            while not self._stopped.is_set():
+                if select.select([dbapi_connection], [], [], self.poll_seconds) == ([], [], []):
+                    continue
+                dbapi_connection.poll()
+                while dbapi_connection.notifies:
+                    self._dispatch(dbapi_connection.notifies.pop(0).payload)
+        finally:
+            raw.close()
+
+
+class FileBus(InvalidationBus):
+    """
+    Mensajes como líneas JSON agregadas a un archivo; cada oyente lee desde la
+    posición que tenía al iniciarse. Las escrituras con O_APPEND de una línea
+    corta son atómicas en un sistema de archivos local.
+
+    Args:
+        path (str): Archivo compartido por los procesos
+        poll_seconds (float): Intervalo de lectura
+    """
+
+    def __init__(self, path, poll_seconds=0.2):
+        super().__init__()
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self._offset = 0
+        self._poll_lock = threading.Lock()
+
+    def _prepare(self):
+        self._offset = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def _send(self, payload):
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, payload.encode() + b'\n')
+        finally:
+            os.close(fd)
+
+    def _listen(self, reconnected):
+        if reconnected:
+            self._resynced()
+        while not self._stopped.is_set():
+            self.poll()
+            self._stopped.wait(self.poll_seconds)
+
+    def poll(self):
+        """Lee y despacha las líneas nuevas; devuelve cuántas leyó."""
+        if not os.path.exists(self.path):
+            return 0
+        with self._poll_lock:
+            with open(self.path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read()
+            # Una línea sin '\n' todavía se está escribiendo
+            complete = data[:data.rfind(b'\n') + 1]
+            self._offset += len(complete)
+        lines = complete.splitlines()
+        for line in lines:
+            self._dispatch(line.decode())
+        return len(lines)
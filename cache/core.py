@@ -0,0 +1,312 @@
+"""
+Cache - Lecturas cacheadas con invalidación por versión de namespace
+
+Cada entrada vive en un namespace (por ejemplo `clinic:3`) cuya versión es un
+contador del backend, y la versión forma parte de la clave:
+
+    master_data:clinic:3@1729345678000123:(3,)
+
+Invalidar un namespace es incrementar su contador (`bump`): las entradas
+anteriores dejan de ser alcanzables y expiran solas por TTL/LRU, sin recorrer
+claves. Un contador que no existe (base nueva, Redis reiniciado) se siembra con
+la hora en microsegundos, así nunca se reutiliza una versión anterior.
+
+La versión se resuelve antes de cargar: si una escritura hace `bump` mientras
+se carga, el valor queda guardado bajo la versión vieja y el siguiente lector
+recarga. Un valor cargado antes de un commit nunca tapa al commit.
+
+`get_or_load` hace single-flight por proceso: si varios threads piden la misma
+clave vacía, uno carga y los demás esperan su resultado (o su excepción).
+
+Un backend caído no rompe la request: el error se registra y la lectura se
+trata como miss.
+
+Con un bus (cache/bus.py) cada `bump` y `delete` se difunde a los demás
+procesos, que lo aplican a su backend si no es compartido.
+"""
+import functools
+import inspect
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from monitoring.metrics import record_cache, registry
+
+from .backends import MemoryBackend
+
+logger = logging.getLogger(__name__)
+
+CACHE_LOADS = registry.counter(
+    'cache_loads_total', 'Cargas de cache por resultado (loaded/coalesced/error).', ('cache', 'result'))
+
+STAT_FIELDS = ('hits', 'misses', 'loads', 'load_errors', 'coalesced', 'sets', 'deletes', 'bumps', 'errors')
+
+
+class _Flight:
+    """Carga en curso de una clave: los seguidores esperan `done`."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class Cache:
+    """
+    Cache de aplicación sobre un CacheBackend.
+
+    Args:
+        backend: CacheBackend (default MemoryBackend)
+        default_ttl (int): Segundos de vida de las entradas sin ttl propio (0 = sin expiración)
+        enabled (bool): False hace que cada lectura vaya directo al loader
+    """
+
+    def __init__(self, backend=None, default_ttl=300, enabled=True):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.default_ttl = default_ttl
+        self.enabled = enabled
+        self.bus = None
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._stats = defaultdict(Counter)
+        self._stats_lock = threading.Lock()
+
+    def configure(self, backend=None, default_ttl=None, enabled=None):
+        """Cambia backend, TTL por defecto o activación; con backend nuevo no hay entradas previas."""
+        if backend is not None:
+            self.backend = backend
+        if default_ttl is not None:
+            self.default_ttl = default_ttl
+        if enabled is not None:
+            self.enabled = enabled
+
+    def attach_bus(self, bus):
+        """Difunde las invalidaciones por `bus` y aplica las de otros procesos (None lo desconecta)."""
+        if self.bus is not None:
+            self.bus.stop()
+        self.bus = bus
+        if bus is not None:
+            bus.subscribe(self.apply)
+
+    def _publish(self, message):
+        if self.bus is not None:
+            self.bus.publish(message)
+
+    def apply(self, message):
+        """
+        Aplica una invalidación recibida de otro proceso.
+
+        Con un backend compartido (Redis) ya está aplicada: el otro proceso
+        escribió en el mismo backend.
+        """
+        if self.backend.shared:
+            return
+        op = message.get('op')
+        if op == 'bump':
+            self.bump(message['namespace'], publish=False)
+        elif op == 'delete':
+            self.delete(message['name'], message['key'], namespace=message.get('namespace'), publish=False)
+        elif op == 'clear':
+            self.clear()
+        else:
+            logger.warning(f'Cache: mensaje de invalidación desconocido {message}')
+
+    # --- Estadísticas ---
+
+    def _count(self, name, field, amount=1):
+        with self._stats_lock:
+            self._stats[name][field] += amount
+
+    def stats(self, name=None):
+        """
+        Contadores por cache (hits, misses, loads, coalesced, ...).
+
+        Args:
+            name (str, optional): Un cache en particular (default todos)
+
+        Returns:
+            dict: {name: {campo: n}} o {campo: n} si se pide uno
+        """
+        with self._stats_lock:
+            snapshot = {cache: {field: counts[field] for field in STAT_FIELDS}
+                        for cache, counts in self._stats.items()}
+        if name is not None:
+            return snapshot.get(name, dict.fromkeys(STAT_FIELDS, 0))
+        return snapshot
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats.clear()
+
+    # --- Backend ---
+
+    def _call(self, name, operation, *args, default=None):
+        try:
+            return getattr(self.backend, operation)(*args)
+        except Exception as e:
+            self._count(name, 'errors')
+            logger.warning(f'Cache {name}: {operation} falló en {type(self.backend).__name__}: {e}')
+            return default
+
+    def namespace_version(self, namespace):
+        """Versión vigente de un namespace (la siembra si no existe)."""
+        key = f'ns:{namespace}'
+        version = self._call(namespace, 'get_counter', key)
+        if version is None:
+            self._call(namespace, 'add_counter', key, time.time_ns() // 1000)
+            version = self._call(namespace, 'get_counter', key)
+        return version or 0
+
+    def bump(self, namespace, publish=True):
+        """Invalida todas las entradas de un namespace (y en los demás procesos si hay bus)."""
+        self.namespace_version(namespace)
+        self._count(namespace, 'bumps')
+        version = self._call(namespace, 'incr', f'ns:{namespace}')
+        if publish:
+            self._publish({'op': 'bump', 'namespace': namespace})
+        return version
+
+    def key_for(self, name, key, namespace=None):
+        if namespace is None:
+            return f'{name}:{key}'
+        return f'{name}:{namespace}@{self.namespace_version(namespace)}:{key}'
+
+    def _lookup(self, name, full_key):
+        """(True, valor) o (False, None); los valores van en una tupla para poder cachear None."""
+        entry = self._call(name, 'get', full_key)
+        return (True, entry[0]) if entry is not None else (False, None)
+
+    def _store(self, name, full_key, value, ttl):
+        self._count(name, 'sets')
+        self._call(name, 'set', full_key, (value,), self.default_ttl if ttl is None else ttl)
+
+    # --- API ---
+
+    def get(self, name, key, namespace=None, default=None):
+        if not self.enabled:
+            return default
+        found, value = self._lookup(name, self.key_for(name, key, namespace))
+        self._count(name, 'hits' if found else 'misses')
+        record_cache(name, hit=found)
+        return value if found else default
+
+    def set(self, name, key, value, namespace=None, ttl=None):
+        if self.enabled:
+            self._store(name, self.key_for(name, key, namespace), value, ttl)
+
+    def delete(self, name, key, namespace=None, publish=True):
+        self._count(name, 'deletes')
+        self._call(name, 'delete', self.key_for(name, key, namespace))
+        if publish:
+            self._publish({'op': 'delete', 'name': name, 'key': str(key), 'namespace': namespace})
+
+    def get_or_load(self, name, key, loader, namespace=None, ttl=None):
+        """
+        Devuelve el valor cacheado o lo carga con `loader()` y lo guarda.
+
+        Args:
+            name (str): Nombre del cache (prefijo de la clave y etiqueta de métricas)
+            key: Clave dentro del cache (se usa su str)
+            loader (callable): Carga el valor en un miss
+            namespace (str, optional): Namespace versionado que invalida la entrada
+            ttl (int, optional): Segundos de vida (default default_ttl)
+
+        Returns:
+            El valor cacheado o el que devolvió loader
+        """
+        if not self.enabled:
+            return loader()
+
+        full_key = self.key_for(name, key, namespace)
+        found, value = self._lookup(name, full_key)
+        self._count(name, 'hits' if found else 'misses')
+        record_cache(name, hit=found)
+        if found:
+            return value
+
+        with self._inflight_lock:
+            flight = self._inflight.get(full_key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[full_key] = _Flight()
+
+        if not leader:
+            self._count(name, 'coalesced')
+            CACHE_LOADS.inc(cache=name, result='coalesced')
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            # Otro líder pudo terminar entre nuestro miss y el registro del vuelo
+            found, value = self._lookup(name, full_key)
+            if not found:
+                self._count(name, 'loads')
+                value = loader()
+                CACHE_LOADS.inc(cache=name, result='loaded')
+                self._store(name, full_key, value, ttl)
+            flight.value = value
+            return value
+        except Exception as e:
+            self._count(name, 'load_errors')
+            CACHE_LOADS.inc(cache=name, result='error')
+            flight.error = e
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(full_key, None)
+            flight.done.set()
+
+    def clear(self):
+        """Borra todas las entradas y versiones del backend local (no se difunde)."""
+        self._call('cache', 'clear')
+
+    def cached(self, name, namespace=None, ttl=None, key=None):
+        """
+        Decorador para lecturas que devuelven datos planos (dicts, listas,
+        tuplas), nunca objetos ORM: quedarían ligados a la sesión que los cargó.
+
+        Args:
+            name (str): Nombre del cache
+            namespace (str | callable, optional): Namespace fijo, o función que
+                recibe los argumentos de la llamada por nombre y lo devuelve
+            ttl (int, optional): Segundos de vida
+            key (callable, optional): Función de los argumentos por nombre que
+                devuelve la clave (default repr de los argumentos)
+
+        La función original queda en `wrapper.uncached`.
+        """
+        def decorator(func):
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                arguments = bound.arguments
+                cache_key = key(**arguments) if key else repr(tuple(arguments.values()))
+                ns = namespace(**arguments) if callable(namespace) else namespace
+                return self.get_or_load(name, cache_key, lambda: func(*args, **kwargs), namespace=ns, ttl=ttl)
+
+            wrapper.uncached = func
+            return wrapper
+        return decorator
+
+
+def clinic_namespace(clinic_id, prefix='clinic'):
+    """
+    Namespace de los datos de una clínica; None son los de todas (vista de superusuario).
+
+    `prefix` separa familias de datos que se invalidan por escrituras distintas:
+    'clinic' para los catálogos, 'tickets' para lo que se calcula de los tickets.
+    """
+    return f'{prefix}:all' if clinic_id is None else f'{prefix}:{clinic_id}'
+
+
+def clinic_namespaces(clinic_id, prefix='clinic'):
+    """Namespaces que invalida una escritura en una clínica: el suyo y el de todas."""
+    if clinic_id is None:
+        return {clinic_namespace(None, prefix)}
+    return {clinic_namespace(clinic_id, prefix), clinic_namespace(None, prefix)}
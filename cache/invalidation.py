@@ -0,0 +1,94 @@
+"""
+Invalidación del cache por escrituras del ORM
+
+Al hacer flush se anotan en `session.info` los namespaces que tocan los
+objetos nuevos, modificados o borrados; al commit se les hace `bump`, y un
+rollback los descarta. Así el cache solo se invalida por cambios que quedaron
+en la base, y ningún lector ve la versión nueva antes de que el commit sea
+visible.
+
+Cada modelo cacheado declara sus namespaces con @invalidates. Las escrituras
+que no pasan por el ORM (UPDATE masivos) anotan los suyos con
+invalidate_on_commit().
+"""
+from sqlalchemy import event, inspect
+
+from models import Clinic, Doctor, Specialty, StandardizedReason, Superuser, Surgery, Ticket, UrgencyThreshold, User
+from utils.db_routing import RoutingSession
+
+from .core import clinic_namespaces
+
+PENDING_KEY = 'cache_pending_bumps'
+
+INVALIDATION_RULES = {}
+
+
+def invalidates(*models):
+    """Registra func(obj) -> namespaces que invalida una escritura de esos modelos."""
+    def decorator(func):
+        for model in models:
+            INVALIDATION_RULES[model] = func
+        return func
+    return decorator
+
+
+def invalidate_on_commit(session, namespaces):
+    """Invalida `namespaces` cuando `session` haga commit (se descartan con rollback)."""
+    session.info.setdefault(PENDING_KEY, set()).update(namespaces)
+
+
+def _values(obj, attribute):
+    """Valor actual y anterior (si cambió en este flush) de un atributo."""
+    history = inspect(obj).attrs[attribute].history
+    return {*history.added, *history.unchanged, *history.deleted} or {getattr(obj, attribute)}
+
+
+@invalidates(Specialty, Surgery, Doctor, StandardizedReason)
+def _clinic_catalog(obj):
+    # Un cambio de clínica invalida la de origen y la de destino
+    return set().union(*(clinic_namespaces(clinic_id) for clinic_id in _values(obj, 'clinic_id')))
+
+
+@invalidates(Clinic)
+def _clinic(obj):
+    return clinic_namespaces(obj.id)
+
+
+@invalidates(UrgencyThreshold)
+def _thresholds(obj):
+    # Las clínicas sin umbral propio usan el global: un solo namespace para todos
+    return {'thresholds'}
+
+
+@invalidates(User, Superuser)
+def _users(obj):
+    # Snapshots de Flask-Login (services/user_cache.py); un Superuser cambia is_superuser
+    # de las cuentas con ese email, así que se invalidan todos
+    return {'users'}
+
+
+@invalidates(Ticket)
+def _tickets(obj):
+    # Agregados de tickets (pronóstico de altas); no toca los catálogos de la clínica
+    return set().union(*(clinic_namespaces(clinic_id, 'tickets') for clinic_id in _values(obj, 'clinic_id')))
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _collect(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        rule = INVALIDATION_RULES.get(type(obj))
+        if rule is not None:
+            invalidate_on_commit(session, rule(obj))
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _bump(session):
+    from . import app_cache
+
+    for namespace in session.info.pop(PENDING_KEY, ()):
+        app_cache.bump(namespace)
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _discard(session):
+    session.info.pop(PENDING_KEY, None)
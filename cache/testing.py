@@ -0,0 +1,77 @@
+"""
+LocalRedis - Reemplazo en memoria de un cliente redis-py
+
+Implementa solo los comandos que usa RedisBackend (get, set con ex/nx, delete,
+incr, scan_iter, flushdb) con la misma semántica: guarda bytes, expira por
+tiempo y falla en INCR sobre valores que no son enteros. Permite probar el
+backend en red (serialización, prefijos, contadores compartidos) sin un
+servidor Redis; dos RedisBackend sobre el mismo LocalRedis se comportan como
+dos instancias de la app contra el mismo Redis.
+"""
+import fnmatch
+import threading
+import time
+
+
+class LocalRedis:
+    """Subconjunto thread-safe de la API de redis.Redis."""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._data = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _encode(value):
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    @staticmethod
+    def _name(name):
+        # redis-py acepta claves str o bytes (scan_iter devuelve bytes)
+        return name.decode() if isinstance(name, bytes) else name
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= self.clock():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, name):
+        with self._lock:
+            entry = self._live(self._name(name))
+            return None if entry is None else entry[0]
+
+    def set(self, name, value, ex=None, nx=False):
+        name = self._name(name)
+        with self._lock:
+            if nx and self._live(name) is not None:
+                return None
+            self._data[name] = (self._encode(value), self.clock() + ex if ex else None)
+            return True
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(1 for name in names if self._data.pop(self._name(name), None) is not None)
+
+    def incr(self, name, amount=1):
+        name = self._name(name)
+        with self._lock:
+            entry = self._live(name)
+            try:
+                value = int(entry[0]) + amount if entry else amount
+            except ValueError:
+                raise ValueError('value is not an integer or out of range') from None
+            self._data[name] = (self._encode(value), entry[1] if entry else None)
+            return value
+
+    def scan_iter(self, match=None):
+        with self._lock:
+            keys = [key for key in list(self._data) if self._live(key) is not None]
+        return iter(key.encode() for key in keys if match is None or fnmatch.fnmatchcase(key, match))
+
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
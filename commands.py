@@ -314,6 +314,9 @@ def _sync_superusers():
             print(f"  - Removed superuser: {email}")
 
     db.session.commit()
+
+    from services.user_cache import UserCache
+    UserCache.invalidate()
     print("Superuser sync complete.")
 
 def _create_minimal_seed():
@@ -512,6 +515,302 @@ def sync_superusers_command():
     """Syncs superuser emails from environment variable to the database."""
     _sync_superusers()
 
+@click.command('backfill-audit-events')
+@click.option('--batch-size', default=1000, show_default=True, help='Filas procesadas por transacción')
+@with_appcontext
+def backfill_audit_events_command(batch_size):
+    """Completa event_type/payload de las filas antiguas de action_audit a partir del texto."""
+    from services.audit_service import AuditService
+    updated = AuditService.backfill_event_types(batch_size=batch_size)
+    click.echo(f'✓ {updated} registros de auditoría actualizados')
+
+@click.command('gen-load-data')
+@click.option('--clinics', default=20, show_default=True, help='Clínicas a crear')
+@click.option('--tickets', default=500_000, show_default=True, help='Tickets totales (repartidos entre clínicas)')
+@click.option('--days', default=730, show_default=True, help='Días hacia atrás que cubren los tickets')
+@click.option('--surgeries', default=24, show_default=True, help='Cirugías por clínica')
+@click.option('--doctors', default=40, show_default=True, help='Médicos por clínica')
+@click.option('--annulled-ratio', default=0.04, show_default=True, help='Fracción de tickets anulados')
+@click.option('--no-login-audit', is_flag=True, help='No generar login_audit')
+@click.option('--seed', default=20261019, show_default=True, help='Semilla (mismo valor = mismos datos)')
+@click.option('--batch-size', default=10_000, show_default=True, help='Filas por lote de COPY/INSERT')
+@click.option('--yes', is_flag=True, help='No pedir confirmación')
+@with_appcontext
+def gen_load_data_command(clinics, tickets, days, surgeries, doctors, annulled_ratio, no_login_audit,
+                          seed, batch_size, yes):
+    """Genera datos sintéticos a escala de producción para pruebas de carga (COPY en PostgreSQL)."""
+    from services.synthetic_data import SyntheticDataGenerator, LoadDataSpec, LOAD_USER_PASSWORD
+
+    if current_app.config.get('ENVIRONMENT') == 'production':
+        click.echo('✗ gen-load-data no se ejecuta en producción.')
+        raise SystemExit(1)
+
+    spec = LoadDataSpec(clinics=clinics, tickets=tickets, days=days, surgeries_per_clinic=surgeries,
+                        doctors_per_clinic=doctors, annulled_ratio=annulled_ratio,
+                        with_login_audit=not no_login_audit, seed=seed)
+    dialect = db.engine.dialect.name
+    if not yes:
+        click.confirm(f'Se insertarán {clinics} clínicas y {tickets} tickets en {dialect} '
+                      f'({db.engine.url.render_as_string(hide_password=True)}). ¿Continuar?', abort=True)
+
+    generator = SyntheticDataGenerator(spec, batch_size=batch_size, progress=lambda m: click.echo(f'  {m}'))
+    summary = generator.generate()
+
+    click.echo(f'✓ Datos generados en {summary.seconds}s ({"COPY" if dialect == "postgresql" else "INSERT"})')
+    for table, count in summary.rows.items():
+        click.echo(f'  - {table}: {count}')
+    click.echo(f'  Usuarios: load_admin_<prefijo>, load_clinical_<prefijo>_N (password: {LOAD_USER_PASSWORD})')
+
+@click.command('load-test')
+@click.option('--concurrency', default='1,2,4,8', show_default=True,
+              help='Hilos por etapa, separados por coma (una etapa por valor)')
+@click.option('--duration', default=30.0, show_default=True, help='Segundos medidos por etapa')
+@click.option('--warmup', default=3.0, show_default=True, help='Segundos por etapa que no se miden')
+@click.option('--think-ms', default=0.0, show_default=True, help='Pausa media entre iteraciones de un usuario')
+@click.option('--mix', default=None,
+              help='Pesos por escenario, p.ej. nurse_board=55,admin_dashboard=20,'
+                   'clinician_create_modify=20,export_burst=5')
+@click.option('--burst-every', default=30.0, show_default=True, help='Período de las ráfagas de exports (0 = sin ráfagas)')
+@click.option('--burst-length', default=5.0, show_default=True, help='Duración de cada ráfaga en segundos')
+@click.option('--seed', default=1, show_default=True)
+@click.option('--output', default=None, help='Guardar el reporte en JSON')
+@click.option('--yes', is_flag=True, help='No pedir confirmación')
+@with_appcontext
+def load_test_command(concurrency, duration, warmup, think_ms, mix, burst_every, burst_length, seed, output, yes):
+    """Prueba de carga en proceso sobre los datos de gen-load-data (throughput y p50/p95/p99)."""
+    try:
+        from benchmarks import load_test
+    except ImportError:
+        # benchmarks/ no se copia a la imagen de producción
+        click.echo('✗ load-test requiere el directorio benchmarks/ (no está en la imagen de producción).')
+        raise SystemExit(1)
+
+    if current_app.config.get('ENVIRONMENT') == 'production':
+        click.echo('✗ load-test no se ejecuta en producción.')
+        raise SystemExit(1)
+
+    try:
+        levels = [int(level) for level in concurrency.split(',') if level.strip()]
+        weights = load_test.parse_mix(mix) if mix else dict(load_test.DEFAULT_MIX)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    if not levels or min(levels) < 1:
+        raise click.BadParameter('--concurrency debe tener valores >= 1')
+
+    config = load_test.LoadTestConfig(concurrency=levels, duration=duration, warmup=warmup, think_ms=think_ms,
+                                      mix=weights, burst_every=burst_every, burst_length=burst_length, seed=seed)
+    if not yes and weights.get('clinician_create_modify'):
+        click.confirm(f'El escenario de clínicos crea tickets en '
+                      f'{db.engine.url.render_as_string(hide_password=True)}. ¿Continuar?', abort=True)
+
+    try:
+        report = load_test.run_load_test(current_app._get_current_object(), config,
+                                         progress=lambda m: click.echo(f'  {m}'))
+    except load_test.LoadTestError as e:
+        click.echo(f'✗ {e}')
+        raise SystemExit(1)
+
+    click.echo(load_test.format_report(report))
+    if output:
+        load_test.write_report(report, output)
+        click.echo(f'\nReporte: {output}')
+
+@click.command('query-report')
+@click.option('--dir', 'directory', default=None, help='Directorio de los volcados (default QUERY_LOG_DIR)')
+@click.option('--top', default=20, show_default=True, help='Fingerprints a mostrar')
+@click.option('--sort', type=click.Choice(['total_ms', 'mean_ms', 'max_ms', 'count', 'rows']),
+              default='total_ms', show_default=True)
+@click.option('--explain/--no-explain', default=True, show_default=True, help='Mostrar el plan de cada SELECT')
+@click.option('--analyze', is_flag=True,
+              help='EXPLAIN ANALYZE en PostgreSQL (ejecuta la query; requiere QUERY_LOG_CAPTURE_PARAMETERS)')
+@with_appcontext
+def query_report_command(directory, top, sort, explain, analyze):
+    """Peores queries por fingerprint según los volcados del query log."""
+    from monitoring.query_log import load_dumps, top_fingerprints, explain as explain_plan
+
+    directory = directory or current_app.config.get('QUERY_LOG_DIR')
+    stats = load_dumps(directory)
+    if not stats:
+        click.echo(f'Sin volcados en {directory} (QUERY_LOG_ENABLED, QUERY_LOG_DUMP_INTERVAL).')
+        return
+
+    total_ms = sum(entry.total_ms for entry in stats.values())
+    click.echo(f'{len(stats)} fingerprints, {sum(e.count for e in stats.values())} ejecuciones, '
+               f'{total_ms:.0f} ms en total ({directory})\n')
+    click.echo(f'{"#":>3} {"count":>8} {"total ms":>10} {"%":>5} {"mean ms":>9} {"max ms":>9} {"rows":>7}  endpoints')
+
+    for rank, (fingerprint, entry) in enumerate(top_fingerprints(stats, sort, top), 1):
+        mean_rows = f'{entry.rows / entry.rows_measured:.1f}' if entry.rows_measured else '-'
+        share = entry.total_ms / total_ms * 100 if total_ms else 0
+        endpoints = ', '.join(f'{name} ({count})' for name, count in entry.endpoints.most_common(3))
+        click.echo(f'{rank:>3} {entry.count:>8} {entry.total_ms:>10.1f} {share:>5.1f} {entry.mean_ms:>9.2f} '
+                   f'{entry.max_ms:>9.2f} {mean_rows:>7}  {endpoints}')
+        click.echo(f'{"":>7}{fingerprint}')
+        if not explain:
+            continue
+        try:
+            plan = explain_plan(db.session.connection(), entry, analyze=analyze)
+        except Exception as e:
+            # Tabla migrada, parámetros no serializables, etc.: seguir con el resto
+            db.session.rollback()
+            click.echo(f'{"":>7}EXPLAIN falló: {str(e).splitlines()[0]}\n')
+            continue
+        if plan and analyze and entry.parameters is None:
+            click.echo(f'{"":>7}(sin parámetros capturados: EXPLAIN con valores de relleno, sin ANALYZE)')
+        for line in plan or ():
+            click.echo(f'{"":>7}  {line}')
+        click.echo('')
+    db.session.rollback()
+
+@click.command('index-advisor')
+@click.option('--clinic-id', type=int, default=None, help='Clínica cuyos datos parametrizan las consultas')
+@click.option('--query', 'queries', multiple=True, help='Consulta canónica a revisar (repetible; default todas)')
+@click.option('--plans', is_flag=True, help='Mostrar el plan de todas las consultas, no solo las marcadas')
+@click.option('--strict', is_flag=True, help='Salir con código 1 si faltan índices o hay scans secuenciales')
+@with_appcontext
+def index_advisor_command(clinic_id, queries, plans, strict):
+    """EXPLAIN de las consultas canónicas: índices faltantes y scans secuenciales."""
+    import db_indexes
+
+    unknown = [name for name in queries if name not in db_indexes.CANONICAL_QUERIES]
+    if unknown:
+        raise click.BadParameter(f"{', '.join(unknown)} (disponibles: {', '.join(db_indexes.CANONICAL_QUERIES)})",
+                                 param_hint='--query')
+
+    connection = db.session.connection()
+    missing = db_indexes.missing_indexes(connection)
+    results = db_indexes.run_advisor(connection, clinic_id=clinic_id, queries=list(queries) or None)
+    db.session.rollback()
+
+    click.echo(db_indexes.format_report(results, missing, show_plans=plans))
+    if strict and (missing or any(result.flagged_scans or result.error for result in results)):
+        raise SystemExit(1)
+
+@click.command('import-report')
+@click.option('--module', default='app', show_default=True, help='Módulo a importar')
+@click.option('--top', default=15, show_default=True, help='Paquetes a mostrar')
+@click.option('--strict', is_flag=True, help='Salir con código 1 si las librerías de export se cargan al importar')
+def import_report_command(module, top, strict):
+    """Tiempo de import de la app por paquete (python -X importtime en un proceso nuevo)."""
+    from utils.boot import import_time_report, LAZY_MODULES
+
+    report = import_time_report(module)
+    click.echo(f'Import de {module}: {report.total_us / 1000:.0f} ms\n')
+    click.echo(f'{"paquete":<24} {"self ms":>9} {"módulos":>8}')
+    for package, self_us, count in report.top(top):
+        click.echo(f'{package:<24} {self_us / 1000:>9.1f} {count:>8}')
+    click.echo('')
+    if report.eager_lazy:
+        click.echo(f"✗ Se importan al arrancar: {', '.join(report.eager_lazy)} (deben importarse en la primera llamada)")
+        if strict:
+            raise SystemExit(1)
+    else:
+        click.echo(f"✓ {', '.join(LAZY_MODULES)} no se importan al arrancar")
+
+@click.command('recalc-fpa')
+@click.option('--surgery', 'surgery_id', type=int, required=True, help='Cirugía cuyos parámetros cambiaron')
+@click.option('--dry-run', is_flag=True, help='Solo mostrar las diferencias, sin escribir')
+@click.option('--user', 'username', default=None, help='Usuario o email registrado en la auditoría (obligatorio sin --dry-run)')
+@click.option('--show', default=20, show_default=True, help='Diferencias a listar')
+@click.option('--batch-size', default=1000, show_default=True, help='Tickets leídos y escritos por lote')
+@with_appcontext
+def recalc_fpa_command(surgery_id, dry_run, username, show, batch_size):
+    """Recalcula la FPA del sistema de los tickets vigentes de una cirugía."""
+    from services.fpa_recalc import FpaRecalcService
+
+    surgery = db.session.get(Surgery, surgery_id)
+    if surgery is None:
+        raise click.BadParameter(f'no existe la cirugía {surgery_id}', param_hint='--surgery')
+    user = None
+    if not dry_run:
+        if not username:
+            raise click.UsageError('--user es obligatorio para aplicar el recálculo (queda en la auditoría)')
+        user = User.query.filter((User.username == username) | (User.email == username)).first()
+        if user is None:
+            raise click.BadParameter(f'no existe el usuario {username}', param_hint='--user')
+
+    result = FpaRecalcService.recalculate(surgery, user=user, dry_run=dry_run, batch_size=batch_size)
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+
+    click.echo(f'Cirugía {surgery.name} ({surgery.base_stay_hours}h base): {result.scanned} tickets vigentes, '
+               f'{len(result.changes)} con diferencias ({len(result.current_fpa_changes)} cambian la FPA vigente) '
+               f'en {result.seconds:.2f}s')
+    if result.changes:
+        click.echo(f'\n{"ticket":<20} {"FPA sistema":<33} {"FPA vigente":<33} noches')
+    for change in result.changes[:show]:
+        old_system = change.old_system_fpa.strftime('%Y-%m-%d %H:%M') if change.old_system_fpa else '-'
+        current = (f'{change.old_current_fpa:%Y-%m-%d %H:%M} -> {change.new_current_fpa:%Y-%m-%d %H:%M}'
+                   if change.follows_system else 'sin cambio (decisión médica)')
+        click.echo(f'{change.ticket_id:<20} {old_system} -> {change.new_system_fpa:%Y-%m-%d %H:%M} '
+                   f'{current:<33} {change.old_overnight_stays} -> {change.new_overnight_stays}')
+    if len(result.changes) > show:
+        click.echo(f'... y {len(result.changes) - show} más')
+    if dry_run:
+        click.echo('\nSimulación (--dry-run): no se escribió nada')
+    elif result.applied:
+        click.echo(f'\n✓ {len(result.changes)} tickets actualizados (una entrada de auditoría)')
+
+@click.command('fpa-whatif')
+@click.option('--surgery', 'surgery_id', type=int, required=True, help='Cirugía a simular')
+@click.option('--base-hours', type=int, required=True, help='Horas base de estadía simuladas')
+@click.option('--days', default=365, show_default=True, help='Días hacia atrás de pabellón incluidos (0 = toda la historia)')
+@click.option('--clinic-id', type=int, default=None, help='Solo los tickets de una clínica')
+@with_appcontext
+def fpa_whatif_command(surgery_id, base_hours, days, clinic_id):
+    """Días-cama de los tickets de una cirugía si su estadía base fuera otra (no escribe nada)."""
+    from services.fpa_simulation import FpaSimulationService
+
+    surgery = db.session.get(Surgery, surgery_id)
+    if surgery is None:
+        raise click.BadParameter(f'no existe la cirugía {surgery_id}', param_hint='--surgery')
+    if base_hours < 0:
+        raise click.BadParameter('debe ser >= 0', param_hint='--base-hours')
+    start, end = FpaSimulationService.period(days) if days else (None, None)
+
+    report = FpaSimulationService.bed_nights_whatif(surgery, base_hours, start=start, end=end, clinic_id=clinic_id)
+
+    period = f'desde {start:%Y-%m-%d}' if start else 'toda la historia'
+    click.echo(f'Cirugía {surgery.name}: {report.tickets} tickets ({period}) en {report.seconds * 1000:.0f} ms\n')
+    click.echo(f'{"escenario":<28} {"días-cama":>10}')
+    click.echo(f'{"registrado (FPA vigente)":<28} {report.recorded_bed_nights:>10}')
+    click.echo(f'{f"sistema con {report.current_base_hours}h base":<28} {report.current_bed_nights:>10}')
+    click.echo(f'{f"sistema con {report.whatif_base_hours}h base":<28} {report.whatif_bed_nights:>10}')
+    click.echo(f'\nDiferencia: {report.delta:+d} días-cama')
+
+@click.command('occupancy-report')
+@click.option('--clinic-id', type=int, default=None, help='Clínica (default todas)')
+@click.option('--from', 'start', type=click.DateTime(), default=None, help='Inicio del rango (default: inicio del mes pasado)')
+@click.option('--to', 'end', type=click.DateTime(), default=None, help='Fin del rango, excluido (default: inicio de este mes)')
+@click.option('--at', 'at', type=click.DateTime(['%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M']), default=None,
+              help='Pacientes en la clínica en un instante, en vez del rango')
+@with_appcontext
+def occupancy_report_command(clinic_id, start, end, at):
+    """Ocupación de camas por ubicación: pacientes, ingresos, altas y peak en un rango."""
+    from services.occupancy import OccupancyService
+
+    if at:
+        result = OccupancyService.at(clinic_id, at)
+        click.echo(f'Pacientes el {at:%Y-%m-%d %H:%M}: {result["total"]}')
+        for location, count in result['by_location'].items():
+            click.echo(f'  {location:<30} {count:>6}')
+        return
+
+    this_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    end = end or this_month
+    start = start or (end - timedelta(days=1)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if end <= start:
+        raise click.BadParameter('debe ser posterior a --from', param_hint='--to')
+
+    report = OccupancyService.report(clinic_id, start, end)
+    click.echo(f'Ocupación {start:%Y-%m-%d %H:%M} -> {end:%Y-%m-%d %H:%M}\n')
+    click.echo(f'{"ubicación":<30} {"al inicio":>9} {"pacientes":>9} {"ingresos":>9} {"altas":>7} {"peak":>6}  peak a las')
+    for row in [*report['locations'], report['total']]:
+        click.echo(f'{row["location"]:<30} {row["at_start"]:>9} {row["patients"]:>9} {row["admitted"]:>9} '
+                   f'{row["discharged"]:>7} {row["peak"]:>6}  {row["peak_at"][:16].replace("T", " ")}')
+
 @click.command('export-local-db')
 @click.option('--output', default='local_db_export.sql', help='Output SQL filename')
 @click.option('--upload-to-gcs', is_flag=True, help='Upload to Google Cloud Storage after export')
@@ -786,6 +1085,15 @@ def register_commands(app):
     app.cli.add_command(run_upgrade_command)
     app.cli.add_command(verify_superuser_command)
     app.cli.add_command(sync_superusers_command)
+    app.cli.add_command(backfill_audit_events_command)
+    app.cli.add_command(gen_load_data_command)
+    app.cli.add_command(load_test_command)
+    app.cli.add_command(query_report_command)
+    app.cli.add_command(index_advisor_command)
+    app.cli.add_command(import_report_command)
+    app.cli.add_command(recalc_fpa_command)
+    app.cli.add_command(fpa_whatif_command)
+    app.cli.add_command(occupancy_report_command)
     app.cli.add_command(export_local_db_command)
     app.cli.add_command(init_db_qa_minimal_command)
     app.cli.add_command(reset_db_qa_minimal_command)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 basedir = os.path.abspath(os.path.dirname(__file__))
@@ -55,6 +56,13 @@ class Config:
     SQLALCHEMY_DATABASE_URI = DATABASE_URL
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = os.environ.get('ENABLE_SQL_LOGGING', 'False').lower() == 'true'
+
+    # Réplica de lectura para vistas @read_only (utils/db_routing.py); sin URL todo va a la primaria
+    READ_REPLICA_URL = os.environ.get('READ_REPLICA_URL')
+    SQLALCHEMY_BINDS = {'replica': READ_REPLICA_URL} if READ_REPLICA_URL else {}
+    READ_REPLICA_MAX_LAG_SECONDS = float(os.environ.get('READ_REPLICA_MAX_LAG_SECONDS', 10))
+    READ_REPLICA_CHECK_SECONDS = float(os.environ.get('READ_REPLICA_CHECK_SECONDS', 5))
+    READ_YOUR_WRITES_SECONDS = float(os.environ.get('READ_YOUR_WRITES_SECONDS', 15))
     
     # URLs y configuraciones generales
     BASE_URL = os.environ.get('BASE_URL', 'http://localhost:5000')
@@ -64,6 +72,67 @@ class Config:
     # Logging
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
     
+    # Cache de aplicación (cache/): memory (por proceso), redis (compartido, CACHE_URL) o none
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+    CACHE_URL = os.environ.get('CACHE_URL')
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 300))
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+    CACHE_KEY_PREFIX = os.environ.get('CACHE_KEY_PREFIX', 'ticket-home')
+    # Invalidaciones entre workers/instancias con CACHE_BACKEND=memory: none, postgres (LISTEN/NOTIFY) o file
+    CACHE_BUS = os.environ.get('CACHE_BUS', 'none')
+    CACHE_BUS_CHANNEL = os.environ.get('CACHE_BUS_CHANNEL', 'cache_invalidation')
+    CACHE_BUS_FILE = os.environ.get('CACHE_BUS_FILE')
+
+    # Cache de usuarios del user_loader (segundos; 0 desactiva)
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+
+    # Instrumentación SQL por request (monitoring/sql.py)
+    SQL_INSTRUMENTATION_ENABLED = os.environ.get('SQL_INSTRUMENTATION_ENABLED', 'True').lower() == 'true'
+    SQL_QUERY_BUDGET = int(os.environ.get('SQL_QUERY_BUDGET', 30))
+    SQL_TIME_BUDGET_MS = float(os.environ.get('SQL_TIME_BUDGET_MS', 500))
+    SQL_N_PLUS_ONE_THRESHOLD = int(os.environ.get('SQL_N_PLUS_ONE_THRESHOLD', 5))
+    SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', 'True').lower() == 'true'
+
+    # Endpoint /metrics (formato Prometheus)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # Profiler bajo demanda para superusuarios (?__profile=1, monitoring/profiler.py).
+    # Nunca en producción: init_profiler lo ignora ahí aunque se active por variable de entorno
+    PROFILER_ENABLED = (
+        environment != 'production' and os.environ.get('PROFILER_ENABLED', 'True').lower() == 'true'
+    )
+    PROFILER_RATE_LIMIT = int(os.environ.get('PROFILER_RATE_LIMIT', 6))
+    PROFILER_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILER_SAMPLE_INTERVAL_MS', 5))
+
+    # Pico de memoria por request en endpoints pesados (monitoring/memory.py)
+    MEMORY_TRACKING_ENABLED = os.environ.get('MEMORY_TRACKING_ENABLED', 'True').lower() == 'true'
+    MEMORY_TRACKED_ENDPOINTS = [e.strip() for e in os.environ.get(
+        'MEMORY_TRACKED_ENDPOINTS',
+        'exports.export_excel,admin.export_full_database_action,tickets.nursing_board'
+    ).split(',') if e.strip()]
+    # tracemalloc encarece cada asignación: se traza una fracción de los requests
+    MEMORY_TRACE_SAMPLE_RATE = float(os.environ.get('MEMORY_TRACE_SAMPLE_RATE', 0.1))
+    MEMORY_TOP_ALLOCATIONS = int(os.environ.get('MEMORY_TOP_ALLOCATIONS', 10))
+    MEMORY_WARN_MB = float(os.environ.get('MEMORY_WARN_MB', 256))
+
+    # Agregado de queries por fingerprint y `flask query-report` (monitoring/query_log.py)
+    # Solo en desarrollo por defecto; en QA/producción se activa explícitamente (idealmente con muestreo)
+    QUERY_LOG_ENABLED = os.environ.get('QUERY_LOG_ENABLED', str(environment == 'local')).lower() == 'true'
+    QUERY_LOG_SAMPLE_RATE = float(os.environ.get('QUERY_LOG_SAMPLE_RATE', 1.0))
+    QUERY_LOG_SLOW_MS = float(os.environ.get('QUERY_LOG_SLOW_MS', 200))
+    QUERY_LOG_DIR = os.environ.get('QUERY_LOG_DIR', os.path.join(tempfile.gettempdir(), 'ticket-home-query-log'))
+    QUERY_LOG_DUMP_INTERVAL = float(os.environ.get('QUERY_LOG_DUMP_INTERVAL', 60))
+    # Valores de los parámetros en los volcados: pueden ser datos de pacientes, solo para depurar en local
+    QUERY_LOG_CAPTURE_PARAMETERS = os.environ.get('QUERY_LOG_CAPTURE_PARAMETERS', 'False').lower() == 'true'
+
+    # Migraciones y sync de superusers al crear la app, sin procesos `flask` previos
+    # (utils/boot.py; startup.sh lo activa con STARTUP_MODE=fast)
+    BOOT_STEPS_IN_PROCESS = os.environ.get('BOOT_STEPS_IN_PROCESS', 'False').lower() == 'true'
+    # Warmup de templates, mappers, pool y datos maestros en el boot y en /_ah/warmup (utils/warmup.py)
+    WARMUP_ON_BOOT = os.environ.get('WARMUP_ON_BOOT', 'True').lower() == 'true'
+    WARMUP_POOL_CONNECTIONS = int(os.environ.get('WARMUP_POOL_CONNECTIONS', 0))
+
     # Features flags
     SKIP_AUTH_FOR_TESTING = os.environ.get('SKIP_AUTH_FOR_TESTING', 'False').lower() == 'true'
     
@@ -1,102 +1,285 @@
 """
-Script para crear índices de base de datos para optimizar performance.
+Index advisor - EXPLAIN de las consultas canónicas contra la base real
 
-Ejecutar con: flask db migrate -m "Agregar índices de performance"
+Los índices de performance que este archivo definía se aplican ahora con la
+migración 202610191200 (CREATE INDEX CONCURRENTLY en PostgreSQL). Lo que queda
+aquí es el chequeo de que efectivamente se usan:
+
+- compara los índices declarados en models.py con los que existen en la base
+  (una base donde la migración no corrió aparece con índices faltantes);
+- ejecuta EXPLAIN sobre las consultas de los repositorios y rutas calientes
+  (tablero de enfermería, listado, dashboard, auditoría) y reporta scans
+  secuenciales y ordenamientos que no sirve un índice.
+
+Ejecutar con: flask index-advisor
+
+Con pocas filas PostgreSQL prefiere un Seq Scan aunque exista el índice:
+conviene correrlo sobre datos de volumen realista (`flask gen-load-data`).
 """
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from types import SimpleNamespace
 
-from alembic import op
-import sqlalchemy as sa
+from sqlalchemy import func, inspect, select
 
+from models import db, Ticket, Patient, FpaModification, ActionAudit, LoginAudit, User
+from monitoring.query_log import explain_statement
+from repositories import TicketRepository
 
-def create_performance_indexes():
-    """Crea índices en columnas frecuentemente consultadas."""
+# Tablas maestras chicas: un scan completo es lo esperado, no un hallazgo
+SMALL_TABLES = frozenset({
+    'clinic', 'specialty', 'surgery', 'doctor', 'superuser', 'standardized_reason', 'urgency_threshold',
+})
 
-    # Index en tickets para búsquedas por clínica + estado
-    op.create_index(
-        'idx_tickets_clinic_status',
-        'ticket',
-        ['clinic_id', 'status']
-    )
+_SQLITE_SCAN_RE = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+_SQLITE_SORT_RE = re.compile(r'USE TEMP B-TREE FOR (?:ORDER BY|RIGHT PART OF ORDER BY)')
+_PG_SCAN_RE = re.compile(r'Seq Scan on (\w+)')
+_PG_SORT_RE = re.compile(r'^\s*(?:->\s*)?(?:Incremental )?Sort\b')
 
-    # Index en tickets para ordenamiento por FPA
-    op.create_index(
-        'idx_tickets_current_fpa',
-        'ticket',
-        ['current_fpa']
-    )
+CANONICAL_QUERIES = {}
 
-    # Index en tickets para búsqueda por fecha de creación
-    op.create_index(
-        'idx_tickets_created_at',
-        'ticket',
-        ['created_at']
-    )
 
-    # Index en patients para búsqueda por RUT
-    op.create_index(
-        'idx_patients_rut',
-        'patient',
-        ['rut']
-    )
+@dataclass
+class CanonicalQuery:
+    name: str
+    description: str
+    build: object
 
-    # Index en patients para búsqueda por nombre
-    op.create_index(
-        'idx_patients_names',
-        'patient',
-        ['primer_nombre', 'apellido_paterno']
-    )
 
-    # Index en action_audit para consultas por usuario + fecha
-    op.create_index(
-        'idx_action_audit_user_date',
-        'action_audit',
-        ['user_id', sa.text('timestamp DESC')]
+def canonical(name, description):
+    """Registra una consulta canónica: build(sample) -> Query o Select."""
+    def decorator(build):
+        CANONICAL_QUERIES[name] = CanonicalQuery(name, description, build)
+        return build
+    return decorator
+
+
+@dataclass
+class AdvisorResult:
+    name: str
+    description: str
+    sql: str = ''
+    plan: list = field(default_factory=list)
+    seq_scans: list = field(default_factory=list)
+    sorts: bool = False
+    error: str = None
+
+    @property
+    def flagged_scans(self):
+        return [table for table in self.seq_scans if table not in SMALL_TABLES]
+
+
+# --- Consultas canónicas ---
+
+def _clinic_user(sample):
+    return SimpleNamespace(is_superuser=False, clinic_id=sample.clinic_id)
+
+
+@canonical('nursing_board', 'Tablero de enfermería de una clínica (vigentes por FPA)')
+def _nursing_board(sample):
+    query = TicketRepository.build_filtered_query({'status': 'Vigente'}, _clinic_user(sample))
+    return query.order_by(Ticket.current_fpa.asc())
+
+
+@canonical('nursing_board_superuser', 'Tablero de enfermería de superusuario (todas las clínicas)')
+def _nursing_board_superuser(sample):
+    query = TicketRepository.build_filtered_query({'status': 'Vigente'}, SimpleNamespace(is_superuser=True))
+    return query.order_by(Ticket.current_fpa.asc())
+
+
+@canonical('ticket_list', 'Listado de tickets, primera página por fecha de creación')
+def _ticket_list(sample):
+    query = TicketRepository.build_filtered_query({}, _clinic_user(sample))
+    return TicketRepository.apply_sorting(query, 'created_at', 'desc').limit(50)
+
+
+@canonical('ticket_list_date_range', 'Listado de tickets filtrado por rango de creación')
+def _ticket_list_date_range(sample):
+    filters = {'date_from': (sample.now - timedelta(days=30)).strftime('%Y-%m-%d')}
+    query = TicketRepository.build_filtered_query(filters, _clinic_user(sample))
+    return TicketRepository.apply_sorting(query, 'created_at', 'desc').limit(50)
+
+
+@canonical('ticket_detail', 'Ticket por ID dentro de su clínica')
+def _ticket_detail(sample):
+    return Ticket.query.filter_by(id=sample.ticket_id, clinic_id=sample.clinic_id).limit(1)
+
+
+@canonical('ticket_modifications', 'Historial de modificaciones de FPA de un ticket')
+def _ticket_modifications(sample):
+    return FpaModification.query.filter_by(ticket_id=sample.ticket_id).order_by(FpaModification.modified_at)
+
+
+@canonical('tickets_by_creator', 'Tickets creados por un usuario')
+def _tickets_by_creator(sample):
+    return Ticket.query.filter_by(created_by=sample.username).order_by(Ticket.created_at.desc())
+
+
+@canonical('dashboard_monthly_count', 'KPI del dashboard: tickets creados en el mes')
+def _dashboard_monthly_count(sample):
+    start_of_month = sample.now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return select(func.count()).select_from(Ticket).where(
+        Ticket.clinic_id == sample.clinic_id, Ticket.created_at >= start_of_month)
+
+
+@canonical('dashboard_near_deadline', 'KPI del dashboard: vigentes que vencen en 24 h')
+def _dashboard_near_deadline(sample):
+    return select(func.count()).select_from(Ticket).where(
+        Ticket.clinic_id == sample.clinic_id,
+        Ticket.status == 'Vigente',
+        Ticket.current_fpa <= sample.now + timedelta(hours=24),
+        Ticket.current_fpa > sample.now,
     )
 
-    # Index en login_audit para consultas por usuario
-    op.create_index(
-        'idx_login_audit_user',
-        'login_audit',
-        ['user_id']
+
+@canonical('patient_by_rut', 'Paciente por RUT en una clínica (creación de ticket)')
+def _patient_by_rut(sample):
+    return Patient.query.filter_by(rut=sample.rut, clinic_id=sample.clinic_id).limit(1)
+
+
+@canonical('action_audit_page', 'Auditoría de acciones de una clínica, primera página')
+def _action_audit_page(sample):
+    return ActionAudit.query.filter(ActionAudit.clinic_id == sample.clinic_id)\
+        .order_by(ActionAudit.timestamp.desc(), ActionAudit.id.desc()).limit(51)
+
+
+@canonical('login_logs_user', 'Logins de un usuario en los últimos 30 días')
+def _login_logs_user(sample):
+    return LoginAudit.query.filter(
+        LoginAudit.timestamp >= sample.now - timedelta(days=30),
+        LoginAudit.user_id == sample.user_id,
+    ).order_by(LoginAudit.timestamp.desc())
+
+
+@canonical('surgery_ticket_history', 'Tickets de una cirugía en el último año (what-if y recálculo de FPA)')
+def _surgery_ticket_history(sample):
+    return select(Ticket.pavilion_end_time).where(
+        Ticket.surgery_id == sample.surgery_id,
+        Ticket.status != 'Anulado',
+        Ticket.pavilion_end_time >= sample.now - timedelta(days=365),
     )
 
-    # Index en tickets para búsqueda por ID (frecuente en búsquedas)
-    op.create_index(
-        'idx_tickets_id_pattern',
-        'ticket',
-        [sa.text('id varchar_pattern_ops')]
+
+@canonical('discharge_forecast', 'Pronóstico de altas por bloque horario de una clínica (tablero)')
+def _discharge_forecast(sample):
+    from services.discharge_forecast import DischargeForecastService
+    start = sample.now.replace(minute=0, second=0, microsecond=0)
+    return DischargeForecastService.forecast_query(sample.clinic_id, start, 72)
+
+
+# --- Análisis ---
+
+def sample_values(clinic_id=None):
+    """Valores reales de la base para parametrizar las consultas (o placeholders)."""
+    ticket = Ticket.query.filter_by(clinic_id=clinic_id).first() if clinic_id else Ticket.query.first()
+    user = User.query.filter_by(clinic_id=clinic_id).first() if clinic_id else User.query.first()
+    patient = Patient.query.filter_by(clinic_id=clinic_id).first() if clinic_id else Patient.query.first()
+    return SimpleNamespace(
+        now=datetime.utcnow(),
+        clinic_id=clinic_id or (ticket.clinic_id if ticket else 1),
+        ticket_id=ticket.id if ticket else 'TH-XXXX-2026-00001',
+        username=ticket.created_by if ticket else (user.username if user else 'usuario'),
+        user_id=user.id if user else 1,
+        surgery_id=ticket.surgery_id if ticket else 1,
+        rut=patient.rut if patient else '11111111-1',
     )
 
-    print("✅ Índices de performance creados exitosamente")
 
+def compile_query(query, dialect):
+    """(sql, parámetros) de una Query ORM o un Select, en el formato del driver."""
+    statement = getattr(query, 'statement', query)
+    compiled = statement.compile(dialect=dialect)
+    params = compiled.construct_params()
+    if compiled.positional:
+        return str(compiled), tuple(params[name] for name in compiled.positiontup)
+    return str(compiled), params
+
+
+def _base_table(name):
+    # Alias de joinedload: patient_1 -> patient
+    return re.sub(r'_\d+$', '', name)
+
+
+def analyze_plan(plan, dialect_name):
+    """(tablas con scan secuencial, hay ordenamiento sin índice) de un plan."""
+    scans, sorts = [], False
+    for line in plan:
+        if dialect_name == 'sqlite':
+            match = _SQLITE_SCAN_RE.match(line.strip())
+            sorts = sorts or bool(_SQLITE_SORT_RE.search(line))
+        else:
+            match = _PG_SCAN_RE.search(line)
+            sorts = sorts or bool(_PG_SORT_RE.match(line))
+        if match and _base_table(match.group(1)) not in scans:
+            scans.append(_base_table(match.group(1)))
+    return scans, sorts
+
+
+def missing_indexes(connection):
+    """Índices declarados en models.py que no existen en la base: [(tabla, índice)]."""
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {index['name'] for index in inspector.get_indexes(table.name)}
+        missing.extend((table.name, index.name) for index in sorted(table.indexes, key=lambda i: i.name)
+                       if index.name not in present)
+    return missing
 
-def drop_performance_indexes():
-    """Elimina los índices creados (para rollback)."""
 
-    op.drop_index('idx_tickets_clinic_status', 'ticket')
-    op.drop_index('idx_tickets_current_fpa', 'ticket')
-    op.drop_index('idx_tickets_created_at', 'ticket')
-    op.drop_index('idx_patients_rut', 'patient')
-    op.drop_index('idx_patients_names', 'patient')
-    op.drop_index('idx_action_audit_user_date', 'action_audit')
-    op.drop_index('idx_login_audit_user', 'login_audit')
-    op.drop_index('idx_tickets_id_pattern', 'ticket')
+def run_advisor(connection, clinic_id=None, queries=None):
+    """
+    EXPLAIN de las consultas canónicas.
 
-    print("✅ Índices de performance eliminados")
+    Args:
+        connection: Conexión SQLAlchemy (db.session.connection())
+        clinic_id (int, optional): Clínica cuyos datos se usan como parámetros
+        queries (list, optional): Nombres de CANONICAL_QUERIES (default todas)
 
+    Returns:
+        list[AdvisorResult]
+    """
+    sample = sample_values(clinic_id)
+    dialect = connection.dialect
+    results = []
+    for name in queries or CANONICAL_QUERIES:
+        canonical_query = CANONICAL_QUERIES[name]
+        result = AdvisorResult(name, canonical_query.description)
+        try:
+            result.sql, params = compile_query(canonical_query.build(sample), dialect)
+            result.plan = explain_statement(connection, result.sql, params)
+        except Exception as e:
+            result.error = str(e).splitlines()[0]
+            results.append(result)
+            continue
+        result.seq_scans, result.sorts = analyze_plan(result.plan, dialect.name)
+        results.append(result)
+    return results
 
-# Para ejecutar manualmente:
-if __name__ == '__main__':
-    print("""
-    Este script debe ejecutarse como migración de Alembic.
 
-    Pasos:
-    1. flask db migrate -m "Agregar índices de performance"
-    2. flask db upgrade
+def format_report(results, missing, show_plans=False):
+    lines = []
+    if missing:
+        lines.append('Índices declarados en models.py que faltan en la base (¿migración pendiente?):')
+        lines.extend(f'  ✗ {table}.{name}' for table, name in missing)
+    else:
+        lines.append('✓ Todos los índices de models.py existen en la base.')
+    lines.append('')
 
-    Los índices mejorarán significativamente el performance de:
-    - Nursing board (filtros por clínica y estado)
-    - Búsqueda de pacientes por RUT y nombre
-    - Ordenamiento por FPA
-    - Auditoría de acciones y logins
-    """)
+    for result in results:
+        if result.error:
+            status = f'✗ EXPLAIN falló: {result.error}'
+        elif result.flagged_scans:
+            status = f"⚠ scan secuencial en {', '.join(result.flagged_scans)}"
+        else:
+            status = '✓ usa índices'
+        if not result.error and result.sorts:
+            status += ' (ordena sin índice)'
+        lines.append(f'{result.name:<26} {status}')
+        lines.append(f'{"":<26} {result.description}')
+        if show_plans or result.flagged_scans:
+            lines.extend(f'{"":<28}{line}' for line in result.plan)
+    return '\n'.join(lines)
@@ -11,7 +11,10 @@ config = context.config
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
-fileConfig(config.config_file_name)
+# utils/boot.py corre las migraciones dentro de gunicorn: ahí no se reconfigura
+# el logging del proceso (fileConfig deshabilitaría los loggers de la app)
+if config.attributes.get('configure_logger', True):
+    fileConfig(config.config_file_name)
 logger = logging.getLogger('alembic.env')
 
 
@@ -0,0 +1,39 @@
+"""Add composite (..., timestamp, id) indexes for keyset-paginated audit views
+
+Revision ID: 202610191000
+Revises: 268afe8e7a1f
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '202610191000'
+down_revision = '268afe8e7a1f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Action audit: un índice por cada filtro del explorador, todos terminando
+    # en (timestamp, id) para que la paginación keyset sea un range scan.
+    op.create_index('ix_action_audit_ts_id', 'action_audit', ['timestamp', 'id'])
+    op.create_index('ix_action_audit_clinic_ts_id', 'action_audit', ['clinic_id', 'timestamp', 'id'])
+    op.create_index('ix_action_audit_user_ts_id', 'action_audit', ['user_id', 'timestamp', 'id'])
+    op.create_index('ix_action_audit_target_ts_id', 'action_audit',
+                    ['target_type', 'target_id', 'timestamp', 'id'])
+
+    # Login audit
+    op.create_index('ix_login_audit_ts_id', 'login_audit', ['timestamp', 'id'])
+    op.create_index('ix_login_audit_clinic_ts_id', 'login_audit', ['clinic_id', 'timestamp', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_login_audit_clinic_ts_id', table_name='login_audit')
+    op.drop_index('ix_login_audit_ts_id', table_name='login_audit')
+    op.drop_index('ix_action_audit_target_ts_id', table_name='action_audit')
+    op.drop_index('ix_action_audit_user_ts_id', table_name='action_audit')
+    op.drop_index('ix_action_audit_clinic_ts_id', table_name='action_audit')
+    op.drop_index('ix_action_audit_ts_id', table_name='action_audit')
@@ -0,0 +1,42 @@
+"""Add structured event_type and payload columns to action_audit
+
+Revision ID: 202610191100
+Revises: 202610191000
+Create Date: 2026-10-19 11:00:00.000000
+
+Las filas existentes quedan con event_type NULL; se completan con
+`flask backfill-audit-events`, que procesa en lotes para no bloquear la tabla.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '202610191100'
+down_revision = '202610191000'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('action_audit', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('event_type', sa.String(length=50), nullable=True))
+        batch_op.add_column(sa.Column(
+            'payload',
+            sa.JSON().with_variant(postgresql.JSONB(), 'postgresql'),
+            nullable=True,
+        ))
+
+    op.create_index('ix_action_audit_event_ts_id', 'action_audit', ['event_type', 'timestamp', 'id'])
+    op.create_index('ix_action_audit_user_event_ts', 'action_audit', ['user_id', 'event_type', 'timestamp'])
+
+
+def downgrade():
+    op.drop_index('ix_action_audit_user_event_ts', table_name='action_audit')
+    op.drop_index('ix_action_audit_event_ts_id', table_name='action_audit')
+
+    with op.batch_alter_table('action_audit', schema=None) as batch_op:
+        batch_op.drop_column('payload')
+        batch_op.drop_column('event_type')
@@ -0,0 +1,78 @@
+"""Add hot-path ticket, fpa_modification and login_audit indexes (CONCURRENTLY)
+
+Revision ID: 202610191200
+Revises: 202610191100
+Create Date: 2026-10-19 12:00:00.000000
+
+Reemplaza a db_indexes.py, que nunca se aplicó como migración. Los índices que
+proponía y que ya existen (patient.rut, action_audit por usuario) o que no
+sirven a las búsquedas reales (varchar_pattern_ops con ILIKE '%...%') se omiten.
+
+En PostgreSQL se crean con CREATE INDEX CONCURRENTLY para no bloquear
+escrituras en ticket durante el deploy; eso no puede correr dentro de una
+transacción, así que va en un autocommit_block. Si un intento anterior se
+interrumpió, el índice queda INVALID: se elimina y se vuelve a crear.
+
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '202610191200'
+down_revision = '202610191100'
+branch_labels = None
+depends_on = None
+
+
+VIGENTE = sa.text("status = 'Vigente'")
+
+# (nombre, tabla, columnas, where)
+INDEXES = [
+    # Tablero de enfermería y listado por clínica: filtro + orden por FPA
+    ('ix_ticket_clinic_status_fpa', 'ticket', ['clinic_id', 'status', 'current_fpa'], None),
+    # Superusuario sin clínica: solo tickets vigentes, ordenados por FPA
+    ('ix_ticket_vigente_fpa', 'ticket', ['current_fpa'], VIGENTE),
+    # Dashboard y filtros por rango de fecha de creación
+    ('ix_ticket_clinic_created_at', 'ticket', ['clinic_id', 'created_at'], None),
+    ('ix_ticket_created_at', 'ticket', ['created_at'], None),
+    ('ix_ticket_created_by', 'ticket', ['created_by'], None),
+    # Historial de modificaciones de un ticket (exports, detalle)
+    ('ix_fpa_modification_ticket_modified', 'fpa_modification', ['ticket_id', 'modified_at'], None),
+    # Logins de un usuario en los últimos N días
+    ('ix_login_audit_user_ts', 'login_audit', ['user_id', 'timestamp'], None),
+]
+
+
+def _drop_invalid_index(name):
+    invalid = op.get_bind().execute(sa.text(
+        "SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+        "WHERE c.relname = :name AND NOT i.indisvalid"
+    ), {'name': name}).first()
+    if invalid:
+        op.execute(sa.text(f'DROP INDEX CONCURRENTLY IF EXISTS {name}'))
+
+
+def upgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        for name, table, columns, where in INDEXES:
+            op.create_index(name, table, columns, sqlite_where=where)
+        return
+
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            if not context.is_offline_mode():
+                _drop_invalid_index(name)
+            op.create_index(name, table, columns, postgresql_where=where,
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table)
+        return
+
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,52 @@
+"""Add ticket (surgery_id, pavilion_end_time) index (CONCURRENTLY)
+
+Revision ID: 202610191300
+Revises: 202610191200
+Create Date: 2026-10-19 13:00:00.000000
+
+Los tickets de una cirugía se leían con un scan completo de ticket: el
+recálculo masivo de FPA (`flask recalc-fpa`) y el reporte what-if de
+días-cama (`flask fpa-whatif`) filtran por cirugía y rango de pabellón.
+
+Igual que 202610191200: CREATE INDEX CONCURRENTLY en un autocommit_block en
+PostgreSQL, eliminando antes un índice INVALID de un intento interrumpido.
+
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '202610191300'
+down_revision = '202610191200'
+branch_labels = None
+depends_on = None
+
+
+NAME = 'ix_ticket_surgery_pavilion'
+COLUMNS = ['surgery_id', 'pavilion_end_time']
+
+
+def upgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        op.create_index(NAME, 'ticket', COLUMNS)
+        return
+
+    with op.get_context().autocommit_block():
+        if not context.is_offline_mode():
+            invalid = op.get_bind().execute(sa.text(
+                "SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+                "WHERE c.relname = :name AND NOT i.indisvalid"
+            ), {'name': NAME}).first()
+            if invalid:
+                op.execute(sa.text(f'DROP INDEX CONCURRENTLY IF EXISTS {NAME}'))
+        op.create_index(NAME, 'ticket', COLUMNS, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        op.drop_index(NAME, table_name='ticket')
+        return
+
+    with op.get_context().autocommit_block():
+        op.drop_index(NAME, table_name='ticket', postgresql_concurrently=True, if_exists=True)
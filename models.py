@@ -1,5 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
+from utils.db_routing import RoutingSession, primary_bind
 from flask_login import UserMixin
+from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
 import json
@@ -20,9 +22,34 @@ REASON_CATEGORY_INITIAL = 'initial'  # Discrepancia inicial al crear ticket
 REASON_CATEGORY_MODIFICATION = 'modification'
 REASON_CATEGORY_ANNULMENT = 'annulment'
 
+# Audit target types (ActionAudit.target_type)
+AUDIT_TARGET_TYPES = ('Ticket', 'User', 'UrgencyThreshold', 'Surgery')
+
+# Audit event types (ActionAudit.event_type)
+AUDIT_EVENT_TICKET_CREATED = 'ticket_created'
+AUDIT_EVENT_FPA_MODIFIED = 'fpa_modified'
+AUDIT_EVENT_TICKET_ANNULLED = 'ticket_annulled'
+AUDIT_EVENT_TICKET_RESTORED = 'ticket_restored'
+AUDIT_EVENT_TICKET_EDITED = 'ticket_edited'
+AUDIT_EVENT_PATIENT_EDITED = 'patient_edited'
+AUDIT_EVENT_TICKET_FIELD_UPDATED = 'ticket_field_updated'
+AUDIT_EVENT_USER_ACTIVATED = 'user_activated'
+AUDIT_EVENT_USER_DEACTIVATED = 'user_deactivated'
+AUDIT_EVENT_THRESHOLDS_UPDATED = 'thresholds_updated'
+AUDIT_EVENT_FPA_RECALCULATED = 'fpa_recalculated'
+AUDIT_EVENT_OTHER = 'other'
+
+AUDIT_EVENT_TYPES = (
+    AUDIT_EVENT_TICKET_CREATED, AUDIT_EVENT_FPA_MODIFIED, AUDIT_EVENT_TICKET_ANNULLED,
+    AUDIT_EVENT_TICKET_RESTORED, AUDIT_EVENT_TICKET_EDITED, AUDIT_EVENT_PATIENT_EDITED,
+    AUDIT_EVENT_TICKET_FIELD_UPDATED, AUDIT_EVENT_USER_ACTIVATED, AUDIT_EVENT_USER_DEACTIVATED,
+    AUDIT_EVENT_THRESHOLDS_UPDATED, AUDIT_EVENT_FPA_RECALCULATED, AUDIT_EVENT_OTHER,
+)
+
 # --- End Constants ---
 
-db = SQLAlchemy()
+# RoutingSession: vistas @read_only leen de la réplica si hay una (utils/db_routing.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # Define Superuser first to be available in User model property
 class Superuser(db.Model):
@@ -90,7 +117,11 @@ class User(UserMixin, db.Model):
                 self._is_superuser = False
             else:
                 try:
-                    self._is_superuser = Superuser.query.filter_by(email=self.email).first() is not None
+                    # Permisos: siempre de la primaria, aunque el request lea de la réplica
+                    self._is_superuser = db.session.execute(
+                        db.select(Superuser.id).where(Superuser.email == self.email),
+                        bind_arguments=primary_bind(db)
+                    ).first() is not None
                 except Exception:
                     # The query failed, likely because the table doesn't exist.
                     # This can happen during initial migrations.
@@ -192,6 +223,18 @@ class Patient(db.Model):
         return self.apellido_materno
 
 class Ticket(db.Model):
+    # Índices de las consultas calientes (migración 202610191200, `flask index-advisor`)
+    __table_args__ = (
+        db.Index('ix_ticket_clinic_status_fpa', 'clinic_id', 'status', 'current_fpa'),
+        db.Index('ix_ticket_vigente_fpa', 'current_fpa',
+                 postgresql_where=db.text("status = 'Vigente'"), sqlite_where=db.text("status = 'Vigente'")),
+        db.Index('ix_ticket_clinic_created_at', 'clinic_id', 'created_at'),
+        db.Index('ix_ticket_created_at', 'created_at'),
+        db.Index('ix_ticket_created_by', 'created_by'),
+        # Tickets de una cirugía por fecha de pabellón: recálculo y what-if de FPA (migración 202610191300)
+        db.Index('ix_ticket_surgery_pavilion', 'surgery_id', 'pavilion_end_time'),
+    )
+
     id = db.Column(db.String(20), primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=True)
     surgery_id = db.Column(db.Integer, db.ForeignKey('surgery.id'), nullable=True)
@@ -229,6 +272,10 @@ class Ticket(db.Model):
     
     surgery = db.relationship('Surgery', backref='tickets')
     modifications = db.relationship('FpaModification', backref='ticket', lazy=True, cascade='all, delete-orphan')
+
+    # Conteo de modificaciones calculado en la query (with_expression) por las vistas
+    # en streaming, que no pueden precargar la colección; None si la query no lo pidió
+    modification_count = db.query_expression()
     
 
     
@@ -267,28 +314,87 @@ class Ticket(db.Model):
         self.admission_time = admission_time
         self.is_scheduled = now < admission_time
         self.time_remaining = None if self.is_scheduled else calculate_time_remaining(self.current_fpa)
-
-        if self.is_scheduled:
-            self.urgency_level = 'scheduled'
-        elif self.time_remaining and self.time_remaining['expired']:
-            self.urgency_level = 'expired'
-        elif self.time_remaining:
-            total_hours = self.time_remaining['days'] * 24 + self.time_remaining['hours']
-            if total_hours <= 1:
-                self.urgency_level = 'critical'
-            elif total_hours <= 6:
-                self.urgency_level = 'warning'
-            else:
-                self.urgency_level = 'normal'
-        else:
-            self.urgency_level = 'unknown'
+        self.urgency_level = Ticket.classify_urgency(self.is_scheduled, self.time_remaining)
 
         return self
 
+    @staticmethod
+    def urgency_level_for(pavilion_end_time, current_fpa, now):
+        """
+        Urgency level from raw column values, without loading a Ticket.
+        Same rules as compute_state(); used by aggregations (e.g. /metrics).
+        """
+        from services.fpa_calculator import FPACalculator
+
+        if not current_fpa:
+            return 'unknown'
+        if now < FPACalculator.calculate_admission_time(pavilion_end_time):
+            return Ticket.classify_urgency(True, None)
+
+        remaining = current_fpa - now
+        time_remaining = {
+            'days': remaining.days,
+            'hours': remaining.seconds // 3600,
+            'expired': current_fpa <= now,
+        }
+        return Ticket.classify_urgency(False, time_remaining)
+
+    @staticmethod
+    def urgency_level_expression(now):
+        """
+        SQL CASE with the urgency level of each ticket at `now`.
+        Same rules as urgency_level_for(); lets the nursing board filter, count
+        and order by urgency in the database.
+        """
+        from services.fpa_calculator import FPACalculator
+
+        lead = timedelta(minutes=FPACalculator.ADMISSION_LEAD_MINUTES)
+        early_hour, early_minute = FPACalculator.EARLY_SURGERY_TIME
+        admission_hour, admission_minute = FPACalculator.EARLY_ADMISSION_TIME
+        early_lead = timedelta(hours=early_hour - admission_hour, minutes=early_minute - admission_minute)
+
+        # Cirugía de las 08:00 (cualquier segundo de ese minuto): ingreso = pabellón - 1h30. Solo
+        # importa si el pabellón cae en (now + 1h30, now + 2h], que toca a lo más dos fechas
+        early_minutes = {datetime(day.year, day.month, day.day, early_hour, early_minute)
+                         for day in ((now + early_lead).date(), (now + lead).date())}
+        pavilion = Ticket.pavilion_end_time
+        is_scheduled = db.or_(
+            pavilion > now + lead,
+            db.and_(pavilion > now + early_lead,
+                    db.or_(*(db.and_(pavilion >= start, pavilion < start + timedelta(minutes=1))
+                             for start in sorted(early_minutes)))),
+        )
+        # classify_urgency: horas restantes truncadas <= 1 es crítico, <= 6 advertencia
+        return db.case(
+            (Ticket.current_fpa.is_(None), 'unknown'),
+            (is_scheduled, 'scheduled'),
+            (Ticket.current_fpa <= now, 'expired'),
+            (Ticket.current_fpa < now + timedelta(hours=2), 'critical'),
+            (Ticket.current_fpa < now + timedelta(hours=7), 'warning'),
+            else_='normal',
+        )
+
+    @staticmethod
+    def classify_urgency(is_scheduled, time_remaining):
+        if is_scheduled:
+            return 'scheduled'
+        if time_remaining and time_remaining['expired']:
+            return 'expired'
+        if time_remaining:
+            total_hours = time_remaining['days'] * 24 + time_remaining['hours']
+            if total_hours <= 1:
+                return 'critical'
+            if total_hours <= 6:
+                return 'warning'
+            return 'normal'
+        return 'unknown'
+
     def can_be_modified(self):
         return self.status == 'Vigente'
     
     def get_modification_count(self):
+        if self.modification_count is not None:
+            return self.modification_count
         return len(self.modifications)
     
     @property
@@ -337,6 +443,10 @@ class Ticket(db.Model):
 
 
 class FpaModification(db.Model):
+    __table_args__ = (
+        db.Index('ix_fpa_modification_ticket_modified', 'ticket_id', 'modified_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     ticket_id = db.Column(db.String(20), db.ForeignKey('ticket.id'), nullable=False)
     clinic_id = db.Column(db.Integer, db.ForeignKey('clinic.id'), nullable=False)
@@ -352,6 +462,13 @@ class FpaModification(db.Model):
 
 
 class LoginAudit(db.Model):
+    # Índices para paginación keyset (timestamp, id) del visor de auditoría
+    __table_args__ = (
+        db.Index('ix_login_audit_ts_id', 'timestamp', 'id'),
+        db.Index('ix_login_audit_clinic_ts_id', 'clinic_id', 'timestamp', 'id'),
+        db.Index('ix_login_audit_user_ts', 'user_id', 'timestamp'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     username = db.Column(db.String(80), nullable=False)
@@ -363,6 +480,17 @@ class LoginAudit(db.Model):
 
 
 class ActionAudit(db.Model):
+    # Índices compuestos alineados con los filtros del explorador de auditoría.
+    # Todos terminan en (timestamp, id) para soportar paginación keyset.
+    __table_args__ = (
+        db.Index('ix_action_audit_ts_id', 'timestamp', 'id'),
+        db.Index('ix_action_audit_clinic_ts_id', 'clinic_id', 'timestamp', 'id'),
+        db.Index('ix_action_audit_user_ts_id', 'user_id', 'timestamp', 'id'),
+        db.Index('ix_action_audit_target_ts_id', 'target_type', 'target_id', 'timestamp', 'id'),
+        db.Index('ix_action_audit_event_ts_id', 'event_type', 'timestamp', 'id'),
+        db.Index('ix_action_audit_user_event_ts', 'user_id', 'event_type', 'timestamp'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     username = db.Column(db.String(80), nullable=False)
@@ -372,6 +500,11 @@ class ActionAudit(db.Model):
     target_id = db.Column(db.String(80), nullable=True)
     target_type = db.Column(db.String(80), nullable=True)
 
+    # Evento estructurado: tipo indexado + payload JSON (JSONB en PostgreSQL).
+    # `action` se mantiene como texto legible para la UI.
+    event_type = db.Column(db.String(50), nullable=True)
+    payload = db.Column(db.JSON().with_variant(JSONB(), 'postgresql'), nullable=True)
+
     user = db.relationship('User', backref='action_audits')
 
 
@@ -0,0 +1,41 @@
+"""
+Monitoring - Instrumentación de requests
+
+Agrupa los hooks de observabilidad de la aplicación. Se inicializa una vez
+desde create_app() con init_monitoring(app).
+"""
+from .sql import init_sql_instrumentation, get_request_sql_stats, fingerprint_statement, RequestQueryStats
+from .metrics import init_metrics, registry, record_cache
+from .profiler import init_profiler
+from .memory import init_memory_tracking, trace_memory, MemoryTrace
+from .query_log import init_query_log
+
+
+def init_monitoring(app):
+    """
+    Registra la instrumentación de requests en la app.
+
+    El profiler bajo demanda (init_profiler) se registra aparte, después del
+    middleware de autenticación.
+    """
+    init_metrics(app)
+    init_sql_instrumentation(app)
+    init_memory_tracking(app)
+    init_query_log(app)
+
+
+__all__ = [
+    'init_monitoring',
+    'init_sql_instrumentation',
+    'get_request_sql_stats',
+    'fingerprint_statement',
+    'RequestQueryStats',
+    'init_metrics',
+    'registry',
+    'record_cache',
+    'init_profiler',
+    'init_memory_tracking',
+    'trace_memory',
+    'MemoryTrace',
+    'init_query_log',
+]
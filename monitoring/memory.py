@@ -0,0 +1,281 @@
+"""
+Memory - Pico de memoria por request en endpoints seleccionados
+
+Cloud Run mata la instancia que excede su límite de memoria, y los endpoints que
+materializan resultados completos (exports, tablero de enfermería) son los
+candidatos. Para los endpoints de MEMORY_TRACKED_ENDPOINTS:
+
+- mide con tracemalloc el pico de memoria Python del request y toma snapshots
+  cerca de ese pico para loguear los sitios que más asignaron;
+- registra el RSS del proceso durante el request (lo que ve Cloud Run).
+
+tracemalloc es global al proceso y encarece cada asignación, así que solo un
+request a la vez se traza (el resto mide solo RSS) y MEMORY_TRACE_SAMPLE_RATE
+permite trazar una fracción de los requests.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from flask import g, request
+
+from .metrics import registry
+
+logger = logging.getLogger('monitoring.memory')
+
+MB = 1024 * 1024
+
+DEFAULT_TRACKED_ENDPOINTS = (
+    'exports.export_excel',
+    'admin.export_full_database_action',
+    'tickets.nursing_board',
+)
+MEMORY_BUCKETS = tuple(mb * MB for mb in (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2000))
+
+# Nuevo snapshot solo si la memoria trazada creció esto respecto del anterior:
+# pocos snapshots (crecimiento geométrico) y el último queda cerca del pico
+SNAPSHOT_GROWTH = 1.25
+MIN_SNAPSHOT_BYTES = 1 * MB
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Un solo trazado a la vez: tracemalloc.start/stop afecta a todo el proceso
+_trace_lock = threading.Lock()
+
+
+def current_rss():
+    """RSS actual del proceso en bytes (Linux), o None si no se puede leer."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _PeakByEndpoint:
+    """Máximo observado por endpoint (para un gauge calculado en el scrape)."""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, value):
+        with self._lock:
+            if value > self._values.get(endpoint, 0):
+                self._values[endpoint] = value
+
+    def values(self):
+        with self._lock:
+            return {(endpoint,): value for endpoint, value in self._values.items()}
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+rss_peaks = _PeakByEndpoint()
+
+REQUEST_MEMORY_PEAK = registry.histogram(
+    'request_memory_peak_bytes', 'Pico de memoria Python (tracemalloc) por request trazado.',
+    ('endpoint',), buckets=MEMORY_BUCKETS)
+REQUEST_RSS_PEAK = registry.gauge(
+    'request_rss_peak_bytes', 'RSS máximo del proceso observado durante requests del endpoint.',
+    ('endpoint',), callback=rss_peaks.values)
+PROCESS_RSS = registry.gauge(
+    'process_resident_memory_bytes', 'RSS actual del proceso.',
+    callback=lambda: {(): rss} if (rss := current_rss()) is not None else {})
+MEMORY_TRACE_SKIPPED = registry.counter(
+    'request_memory_trace_skipped_total', 'Requests seleccionados que no se trazaron porque otro request ya usaba tracemalloc.',
+    ('endpoint',))
+
+
+def _site(frame):
+    filename = frame.filename
+    if filename.startswith(_APP_ROOT + os.sep):
+        filename = os.path.relpath(filename, _APP_ROOT)
+    else:
+        # Librerías: paquete/módulo basta (p.ej. openpyxl/worksheet/worksheet.py)
+        filename = os.path.join(*filename.split(os.sep)[-3:])
+    return f'{filename}:{frame.lineno}'
+
+
+class MemoryTrace:
+    """
+    tracemalloc y RSS durante un bloque de código.
+
+    Un hilo vigía revisa la memoria trazada cada `interval` segundos y toma un
+    snapshot cada vez que crece SNAPSHOT_GROWTH veces, de modo que los sitios
+    de asignación reportados son los de (casi) el pico y no los que sobreviven
+    al final del bloque.
+
+    Usar a través de trace_memory() o con _trace_lock tomado.
+    """
+
+    def __init__(self, interval=0.05, top=10):
+        self.interval = interval
+        self.top = top
+        self.peak_bytes = 0
+        self.rss_start = None
+        self.rss_peak = None
+        self._snapshot = None
+        self._snapshot_size = 0
+        self._baseline = 0
+        self._owns_tracing = False
+        self._stop = threading.Event()
+        self._watcher = None
+
+    def _observe_rss(self):
+        rss = current_rss()
+        if rss is not None and (self.rss_peak is None or rss > self.rss_peak):
+            self.rss_peak = rss
+
+    def _maybe_snapshot(self):
+        current, _ = tracemalloc.get_traced_memory()
+        current -= self._baseline
+        if current >= max(MIN_SNAPSHOT_BYTES, self._snapshot_size * SNAPSHOT_GROWTH):
+            self._snapshot = tracemalloc.take_snapshot()
+            self._snapshot_size = current
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            self._observe_rss()
+            self._maybe_snapshot()
+
+    def start(self):
+        self.rss_start = current_rss()
+        self.rss_peak = self.rss_start
+        if tracemalloc.is_tracing():
+            # Alguien más ya traza (p.ej. python -X tracemalloc): no apagarlo al final
+            self._baseline = tracemalloc.get_traced_memory()[0]
+        else:
+            tracemalloc.start()
+            self._owns_tracing = True
+        tracemalloc.reset_peak()
+        self._watcher = threading.Thread(target=self._watch, name='memory-trace', daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+        self._observe_rss()
+        self._maybe_snapshot()
+        if self._snapshot is None:
+            self._snapshot = tracemalloc.take_snapshot()
+        self.peak_bytes = max(0, tracemalloc.get_traced_memory()[1] - self._baseline)
+        if self._owns_tracing:
+            tracemalloc.stop()
+
+    def top_allocations(self):
+        """Sitios con más memoria asignada en el snapshot más cercano al pico."""
+        if self._snapshot is None:
+            return []
+        snapshot = self._snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, __file__),
+        ))
+        return [
+            {'site': _site(stat.traceback[0]), 'size_kb': round(stat.size / 1024, 1), 'count': stat.count}
+            for stat in snapshot.statistics('lineno')[:self.top]
+        ]
+
+    def format_top(self):
+        return '\n'.join(f"  {a['size_kb']:>10.1f} KiB  {a['count']:>7}  {a['site']}" for a in self.top_allocations())
+
+
+@contextmanager
+def trace_memory(interval=0.05, top=10):
+    """
+    Traza la memoria de un bloque (espera si otro trazado está en curso).
+
+    Example:
+        >>> with trace_memory() as trace:
+        ...     build_report()
+        >>> trace.peak_bytes, trace.top_allocations()
+    """
+    with _trace_lock:
+        trace = MemoryTrace(interval=interval, top=top)
+        trace.start()
+        try:
+            yield trace
+        finally:
+            trace.stop()
+
+
+def init_memory_tracking(app):
+    """
+    Registra la medición de memoria por request en los endpoints seleccionados.
+
+    Config:
+        MEMORY_TRACKING_ENABLED (bool): Activa la medición (default True)
+        MEMORY_TRACKED_ENDPOINTS (list): Endpoints medidos
+        MEMORY_TRACE_SAMPLE_RATE (float): Fracción de requests trazados con tracemalloc
+            (el resto mide solo RSS; default 0.1)
+        MEMORY_TOP_ALLOCATIONS (int): Sitios de asignación a loguear (default 10)
+        MEMORY_WARN_MB (float): Pico desde el cual se loguea como WARNING (default 256)
+    """
+    app.config.setdefault('MEMORY_TRACKING_ENABLED', True)
+    app.config.setdefault('MEMORY_TRACKED_ENDPOINTS', list(DEFAULT_TRACKED_ENDPOINTS))
+    app.config.setdefault('MEMORY_TRACE_SAMPLE_RATE', 0.1)
+    app.config.setdefault('MEMORY_TOP_ALLOCATIONS', 10)
+    app.config.setdefault('MEMORY_WARN_MB', 256)
+
+    if not app.config['MEMORY_TRACKING_ENABLED']:
+        return
+
+    @app.before_request
+    def start_memory_trace():
+        if request.endpoint not in app.config['MEMORY_TRACKED_ENDPOINTS']:
+            return
+        g._memory_endpoint = request.endpoint
+        if random.random() >= app.config['MEMORY_TRACE_SAMPLE_RATE']:
+            return
+        if not _trace_lock.acquire(blocking=False):
+            MEMORY_TRACE_SKIPPED.inc(endpoint=request.endpoint)
+            return
+        trace = MemoryTrace(top=app.config['MEMORY_TOP_ALLOCATIONS'])
+        try:
+            trace.start()
+        except Exception:
+            _trace_lock.release()
+            raise
+        g._memory_trace = trace
+
+    @app.teardown_request
+    def finish_memory_trace(exc):
+        endpoint = g.pop('_memory_endpoint', None)
+        if endpoint is None:
+            return
+        trace = g.pop('_memory_trace', None)
+        if trace is None:
+            rss = current_rss()
+            if rss is not None:
+                rss_peaks.observe(endpoint, rss)
+            return
+
+        try:
+            trace.stop()
+        finally:
+            _trace_lock.release()
+
+        REQUEST_MEMORY_PEAK.observe(trace.peak_bytes, endpoint=endpoint)
+        if trace.rss_peak is not None:
+            rss_peaks.observe(endpoint, trace.rss_peak)
+
+        record = {
+            'event': 'request_memory',
+            'method': request.method,
+            'path': request.path,
+            'endpoint': endpoint,
+            'peak_mb': round(trace.peak_bytes / MB, 2),
+            'rss_start_mb': round(trace.rss_start / MB, 1) if trace.rss_start is not None else None,
+            'rss_peak_mb': round(trace.rss_peak / MB, 1) if trace.rss_peak is not None else None,
+            'top_allocations': trace.top_allocations(),
+        }
+        level = logging.WARNING if trace.peak_bytes > app.config['MEMORY_WARN_MB'] * MB else logging.INFO
+        logger.log(level, json.dumps(record, ensure_ascii=False))
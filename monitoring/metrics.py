@@ -0,0 +1,427 @@
+"""
+Metrics - Registro de métricas en proceso con exposición en formato Prometheus
+
+Las escrituras no toman locks: cada hilo escribe en su propio "shard"
+(threading.local) y el scrape suma los shards de todos los hilos. Con gunicorn
+en 1 worker x 8 hilos esto evita contención en el camino caliente; el único
+lock se toma al registrar el shard de un hilo nuevo, al sumar el de un hilo
+que termina y al hacer scrape.
+
+Métricas que dependen del estado de la BD (tickets por clínica y urgencia) se
+calculan al momento del scrape mediante callbacks.
+"""
+import hmac
+import math
+import threading
+import time
+import weakref
+from collections import defaultdict
+from functools import wraps
+from flask import Response, abort, g, request
+from flask_login import current_user
+from sqlalchemy import event
+
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _merge_sums(target, source):
+    for key, value in source.items():
+        target[key] += value
+
+
+def _merge_rows(target, source):
+    for key, row in list(source.items()):
+        acc = target.setdefault(key, [0] * len(row))
+        for i, value in enumerate(row):
+            acc[i] += value
+
+
+class _ShardOwner:
+    """Vive en el threading.local del hilo; se libera cuando el hilo termina."""
+    __slots__ = ('__weakref__',)
+
+
+class _ThreadShards:
+    """
+    Un objeto por hilo, creado con `factory`; `all()` devuelve los de todos los hilos.
+
+    Cuando un hilo termina su shard se suma (con `merge`) a un shard global de
+    hilos terminados, así la lista no crece con cada hilo que pasa por el proceso.
+    """
+
+    def __init__(self, factory, merge):
+        self._factory = factory
+        self._merge = merge
+        self._local = threading.local()
+        self._shards = []
+        self._retired = factory()
+        self._lock = threading.Lock()
+
+    def get(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._factory()
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            self._local.owner = owner = _ShardOwner()
+            weakref.finalize(owner, self._retire, shard)
+        return shard
+
+    def _retire(self, shard):
+        with self._lock:
+            self._shards.remove(shard)
+            self._merge(self._retired, shard)
+
+    def all(self):
+        with self._lock:
+            return self._shards + [self._retired]
+
+    def reset(self):
+        with self._lock:
+            for shard in self._shards:
+                shard.clear()
+            self._retired.clear()
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _label_key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for suffix, labelvalues, extra, value in self.samples():
+            lines.append(f'{self.name}{suffix}{_format_labels(self.labelnames, labelvalues, extra)} {_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    """Contador monótono."""
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._shards = _ThreadShards(lambda: defaultdict(float), _merge_sums)
+
+    def inc(self, amount=1, **labels):
+        self._shards.get()[self._label_key(labels)] += amount
+
+    def values(self):
+        totals = defaultdict(float)
+        for shard in self._shards.all():
+            for key, value in list(shard.items()):
+                totals[key] += value
+        return dict(totals)
+
+    def value(self, **labels):
+        return self.values().get(self._label_key(labels), 0.0)
+
+    def samples(self):
+        return [('', key, None, value) for key, value in sorted(self.values().items())]
+
+    def reset(self):
+        self._shards.reset()
+
+
+class Gauge(_Metric):
+    """
+    Gauge con inc/dec por hilo (sumados en el scrape) o calculado por un callback.
+
+    `callback` devuelve {tuple(labelvalues): value} y reemplaza a inc/dec.
+    """
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self._shards = _ThreadShards(lambda: defaultdict(float), _merge_sums)
+
+    def inc(self, amount=1, **labels):
+        self._shards.get()[self._label_key(labels)] += amount
+
+    def dec(self, amount=1, **labels):
+        self._shards.get()[self._label_key(labels)] -= amount
+
+    def values(self):
+        if self.callback is not None:
+            return self.callback()
+        totals = defaultdict(float)
+        for shard in self._shards.all():
+            for key, value in list(shard.items()):
+                totals[key] += value
+        return dict(totals)
+
+    def value(self, **labels):
+        return self.values().get(self._label_key(labels), 0.0)
+
+    def track(self, **labels):
+        """Decorador: incrementa mientras la función se está ejecutando."""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                self.inc(**labels)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.dec(**labels)
+            return wrapper
+        return decorator
+
+    def samples(self):
+        return [('', key, None, value) for key, value in sorted(self.values().items())]
+
+    def reset(self):
+        self._shards.reset()
+
+
+class Histogram(_Metric):
+    """Histograma con buckets acumulativos (le) en el formato de Prometheus."""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Por hilo: {labelvalues: [conteo por bucket..., suma]}
+        self._shards = _ThreadShards(dict, _merge_rows)
+
+    def observe(self, value, **labels):
+        shard = self._shards.get()
+        key = self._label_key(labels)
+        row = shard.get(key)
+        if row is None:
+            row = shard[key] = [0] * len(self.buckets) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                row[i] += 1
+                break
+        row[-1] += value
+
+    def snapshot(self):
+        """{labelvalues: (conteos acumulados por bucket, suma, total)}"""
+        merged = {}
+        for shard in self._shards.all():
+            _merge_rows(merged, shard)
+        result = {}
+        for key, row in merged.items():
+            cumulative, running = [], 0
+            for count in row[:-1]:
+                running += count
+                cumulative.append(running)
+            result[key] = (cumulative, row[-1], running)
+        return result
+
+    def samples(self):
+        samples = []
+        for key, (cumulative, total_sum, count) in sorted(self.snapshot().items()):
+            for bound, value in zip(self.buckets, cumulative):
+                samples.append(('_bucket', key, ('le', _format_value(bound)), value))
+            samples.append(('_sum', key, None, total_sum))
+            samples.append(('_count', key, None, count))
+        return samples
+
+    def reset(self):
+        self._shards.reset()
+
+
+class MetricsRegistry:
+    """Conjunto de métricas expuestas por /metrics."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def expose(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+REQUEST_LATENCY = registry.histogram(
+    'http_request_duration_seconds', 'Latencia de requests por endpoint.', ('endpoint', 'method'))
+REQUESTS_TOTAL = registry.counter(
+    'http_requests_total', 'Requests atendidos por endpoint y código de estado.', ('endpoint', 'method', 'status'))
+REQUESTS_IN_FLIGHT = registry.gauge(
+    'http_requests_in_flight', 'Requests en curso.')
+DB_POOL_CHECKOUT_WAIT = registry.histogram(
+    'db_pool_checkout_wait_seconds', 'Espera para obtener una conexión del pool.',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0))
+CACHE_REQUESTS = registry.counter(
+    'cache_requests_total', 'Lecturas de cache por resultado (hit/miss).', ('cache', 'result'))
+EXPORTS_IN_PROGRESS = registry.gauge(
+    'exports_in_progress', 'Exportaciones (Excel/PDF) generándose en este momento.', ('kind',))
+
+
+def record_cache(cache, hit):
+    """Cuenta un hit o miss de un cache en proceso."""
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def _ticket_counts():
+    """Tickets vigentes por clínica y nivel de urgencia, calculados al momento del scrape."""
+    from models import db, Ticket, Clinic, TICKET_STATUS_VIGENTE
+    from utils.datetime_utils import utcnow
+
+    # Subconsulta: el CASE lleva parámetros y Postgres no lo reconocería repetido en el GROUP BY
+    levels = (
+        db.select(Ticket.clinic_id, Ticket.urgency_level_expression(utcnow()).label('urgency'))
+        .where(Ticket.status == TICKET_STATUS_VIGENTE)
+        .subquery()
+    )
+    rows = db.session.execute(
+        db.select(Clinic.name, levels.c.urgency, db.func.count())
+        .select_from(levels)
+        .join(Clinic, Clinic.id == levels.c.clinic_id)
+        .group_by(levels.c.clinic_id, Clinic.name, levels.c.urgency)
+    ).all()
+
+    counts = defaultdict(int)
+    for clinic_name, urgency, count in rows:
+        counts[(clinic_name, urgency)] += count
+    return dict(counts)
+
+
+TICKETS_ACTIVE = registry.gauge(
+    'tickets_active', 'Tickets vigentes por clínica y nivel de urgencia.', ('clinic', 'urgency'),
+    callback=_ticket_counts)
+
+
+def _instrument_pool_checkout(engine):
+    """
+    Mide la espera de checkout envolviendo Pool._do_get (SQLAlchemy no tiene un
+    evento "antes del checkout"). Se vuelve a aplicar si el pool se recrea.
+    """
+    pool = engine.pool
+    if getattr(pool, '_checkout_timed', False):
+        return
+    original = pool._do_get
+
+    def timed_do_get():
+        start = time.perf_counter()
+        try:
+            return original()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+    pool._do_get = timed_do_get
+    pool._checkout_timed = True
+
+
+def _reinstrument_on_dispose(engine):
+    # Engine.dispose() reemplaza el pool por uno nuevo antes de emitir el evento
+    _instrument_pool_checkout(engine)
+
+
+def _metrics_authorized(app):
+    token = app.config.get('METRICS_TOKEN')
+    if token:
+        header = request.headers.get('Authorization', '')
+        return hmac.compare_digest(header, f'Bearer {token}')
+    # Sin token configurado solo un superusuario con sesión puede ver las métricas
+    return current_user.is_authenticated and current_user.is_superuser
+
+
+def init_metrics(app):
+    """
+    Registra los hooks de métricas HTTP y el endpoint /metrics.
+
+    Config:
+        METRICS_ENABLED (bool): Activa métricas y endpoint (default True)
+        METRICS_TOKEN (str): Bearer token para el scraper; si no está, exige superusuario
+    """
+    app.config.setdefault('METRICS_ENABLED', True)
+    app.config.setdefault('METRICS_TOKEN', None)
+
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    from models import db
+    with app.app_context():
+        _instrument_pool_checkout(db.engine)
+        if not event.contains(db.engine, 'engine_disposed', _reinstrument_on_dispose):
+            event.listen(db.engine, 'engine_disposed', _reinstrument_on_dispose)
+
+    @app.before_request
+    def start_request_metrics():
+        g._metrics_start = time.perf_counter()
+        g._metrics_status = 500
+        REQUESTS_IN_FLIGHT.inc()
+
+    @app.after_request
+    def capture_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(exc):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return
+        REQUESTS_IN_FLIGHT.dec()
+        # Endpoints sin match (404) se agrupan para acotar la cardinalidad
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint, method=request.method)
+        REQUESTS_TOTAL.inc(endpoint=endpoint, method=request.method, status=g.pop('_metrics_status', 500))
+
+    def metrics():
+        if not _metrics_authorized(app):
+            abort(403)
+        return Response(registry.expose(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
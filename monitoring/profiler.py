@@ -0,0 +1,337 @@
+"""
+Profiler bajo demanda - Perfil de un request real, solo para superusuarios
+
+Un superusuario agrega `?__profile=1` (o el header `X-Profile: 1`) a cualquier
+URL y en vez de la página recibe el perfil de ese request, medido con los datos
+reales de su clínica:
+
+    ?__profile=1 | cprofile   cProfile; reporte HTML (default) o `pstats`
+                              (archivo para snakeviz / pstats)
+    ?__profile=sample         Muestreo del stack cada PROFILER_SAMPLE_INTERVAL_MS;
+                              reporte HTML o `collapsed` (listo para flamegraph.pl
+                              o speedscope)
+
+El formato se elige con `__profile_format` (o `X-Profile-Format`). Ambos
+reportes incluyen las queries del request con su tiempo.
+
+Solo corre un perfil a la vez por proceso y hay un límite de perfiles por minuto
+(PROFILER_RATE_LIMIT). Con PROFILER_ENABLED=False, o con ENVIRONMENT=production,
+los hooks ni se registran.
+"""
+import cProfile
+import logging
+import marshal
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from flask import g, request, abort, current_app, render_template, Response
+from flask_login import current_user
+
+from .sql import get_request_sql_stats, fingerprint_statement
+
+logger = logging.getLogger('monitoring.profiler')
+
+PROFILE_PARAM = '__profile'
+FORMAT_PARAM = '__profile_format'
+PROFILE_HEADER = 'X-Profile'
+FORMAT_HEADER = 'X-Profile-Format'
+
+# modo -> formatos válidos (el primero es el default)
+MODES = {
+    'cprofile': ('html', 'pstats'),
+    'sample': ('html', 'collapsed'),
+}
+MODE_ALIASES = {'1': 'cprofile', 'true': 'cprofile', 'cprofile': 'cprofile', 'sample': 'sample'}
+
+# Filas de las tablas del reporte HTML
+REPORT_ROWS = 60
+
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class RateLimiter:
+    """Ventana deslizante: como máximo `limit` eventos cada `window` segundos."""
+
+    def __init__(self, window=60.0):
+        self.window = window
+        self._events = deque()
+        self._lock = threading.Lock()
+
+    def allow(self, limit):
+        now = time.monotonic()
+        with self._lock:
+            while self._events and now - self._events[0] >= self.window:
+                self._events.popleft()
+            if len(self._events) >= limit:
+                return False
+            self._events.append(now)
+            return True
+
+    def reset(self):
+        with self._lock:
+            self._events.clear()
+
+
+def frame_label(code):
+    """Nombre de un frame para stacks colapsados: `func (archivo:línea)` sin ';'."""
+    filename = code.co_filename
+    if filename.startswith(_APP_ROOT + os.sep):
+        filename = os.path.relpath(filename, _APP_ROOT)
+    else:
+        filename = os.path.join(*filename.split(os.sep)[-2:]) if os.sep in filename else filename
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f'{name} ({filename}:{code.co_firstlineno})'.replace(';', ',')
+
+
+class CProfileCollector:
+    """cProfile sobre el hilo del request."""
+
+    mode = 'cprofile'
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self._stats = None
+
+    def start(self):
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+
+    def stats(self):
+        """pstats: (archivo, línea, función) -> (cc, ncalls, tottime, cumtime, callers)."""
+        if self._stats is None:
+            self.profiler.create_stats()
+            self._stats = self.profiler.stats
+        return self._stats
+
+    def top(self, key, limit=REPORT_ROWS):
+        rows = []
+        for (filename, line, func), (_, ncalls, tottime, cumtime, _) in self.stats().items():
+            if filename.startswith(_APP_ROOT + os.sep):
+                filename = os.path.relpath(filename, _APP_ROOT)
+            rows.append({'function': f'{func} ({filename}:{line})', 'ncalls': ncalls,
+                         'tottime_ms': tottime * 1000, 'cumtime_ms': cumtime * 1000})
+        rows.sort(key=lambda row: row[key], reverse=True)
+        return rows[:limit]
+
+
+class SamplingCollector:
+    """
+    Muestrea el stack del hilo del request desde un hilo aparte.
+
+    No instrumenta cada llamada como cProfile, así que distorsiona poco los
+    tiempos; el costo es la resolución (un sample cada `interval` segundos).
+    """
+
+    mode = 'sample'
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._target = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self):
+        """Formato "stack colapsado": `raíz;...;hoja <samples>` por línea."""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class ProfileSession:
+    """Un request perfilado: collector, formato y el lock del proceso."""
+
+    def __init__(self, collector, fmt, lock):
+        self.collector = collector
+        self.format = fmt
+        self._lock = lock
+        self._stopped = False
+        self.started_at = time.perf_counter()
+        self.elapsed_ms = None
+
+    def start(self):
+        self.collector.start()
+
+    def stop(self):
+        if self._stopped:
+            return
+        self._stopped = True
+        try:
+            self.collector.stop()
+        finally:
+            self.elapsed_ms = (time.perf_counter() - self.started_at) * 1000
+            self._lock.release()
+
+
+def _requested_profile():
+    """(modo, formato) pedidos en el request, o None si no se pidió perfil."""
+    raw = request.args.get(PROFILE_PARAM) or request.headers.get(PROFILE_HEADER)
+    if not raw:
+        return None
+    mode = MODE_ALIASES.get(raw.strip().lower())
+    if mode is None:
+        abort(400, description=f"Modo de perfil inválido '{raw}' (use 1, cprofile o sample)")
+    fmt = (request.args.get(FORMAT_PARAM) or request.headers.get(FORMAT_HEADER) or MODES[mode][0]).lower()
+    if fmt not in MODES[mode]:
+        abort(400, description=f"Formato '{fmt}' no disponible para {mode} ({', '.join(MODES[mode])})")
+    return mode, fmt
+
+
+def _sql_summary(stats):
+    """Queries agrupadas por fingerprint, de mayor a menor tiempo total."""
+    if stats is None or stats.statements is None:
+        return None
+    groups = {}
+    for statement, duration in stats.statements:
+        fp = fingerprint_statement(statement)
+        group = groups.setdefault(fp, {'fingerprint': fp, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        group['count'] += 1
+        group['total_ms'] += duration * 1000
+        group['max_ms'] = max(group['max_ms'], duration * 1000)
+    return {
+        'count': len(stats.statements),
+        'total_ms': sum(duration for _, duration in stats.statements) * 1000,
+        'groups': sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True),
+    }
+
+
+def _filename(ext):
+    endpoint = (request.endpoint or 'unmatched').replace('.', '_')
+    return f'profile-{endpoint}-{time.strftime("%Y%m%d-%H%M%S")}.{ext}'
+
+
+def _build_report(session, response):
+    collector = session.collector
+    if session.format == 'pstats':
+        return Response(marshal.dumps(collector.stats()), mimetype='application/octet-stream',
+                        headers={'Content-Disposition': f'attachment; filename="{_filename("prof")}"'})
+    if session.format == 'collapsed':
+        return Response(collector.collapsed(), mimetype='text/plain',
+                        headers={'Content-Disposition': f'attachment; filename="{_filename("folded")}"'})
+
+    context = {
+        'mode': collector.mode,
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'elapsed_ms': session.elapsed_ms,
+        'sql': _sql_summary(get_request_sql_stats()),
+    }
+    if collector.mode == 'cprofile':
+        context['by_cumulative'] = collector.top('cumtime_ms')
+        context['by_own_time'] = collector.top('tottime_ms')
+    else:
+        context['interval_ms'] = collector.interval * 1000
+        context['samples'] = collector.samples
+        context['top_stacks'] = collector.stacks.most_common(REPORT_ROWS)
+        context['collapsed'] = collector.collapsed()
+    return Response(render_template('monitoring/profile_report.html', **context), mimetype='text/html')
+
+
+def init_profiler(app):
+    """
+    Registra el profiler bajo demanda.
+
+    Debe llamarse después del middleware de autenticación: el perfil solo se
+    activa si el usuario ya quedó autenticado como superusuario.
+
+    Config:
+        PROFILER_ENABLED (bool): Registra los hooks (default True); False lo apaga por completo.
+            En producción (ENVIRONMENT='production') se ignora: el profiler queda apagado
+        PROFILER_RATE_LIMIT (int): Perfiles por minuto en el proceso (default 6)
+        PROFILER_SAMPLE_INTERVAL_MS (float): Intervalo del modo sample (default 5)
+    """
+    app.config.setdefault('PROFILER_ENABLED', True)
+    app.config.setdefault('PROFILER_RATE_LIMIT', 6)
+    app.config.setdefault('PROFILER_SAMPLE_INTERVAL_MS', 5.0)
+
+    if not app.config['PROFILER_ENABLED']:
+        return
+    if app.config.get('ENVIRONMENT') == 'production':
+        logger.warning('PROFILER_ENABLED ignorado en producción: profiler deshabilitado')
+        return
+
+    limiter = RateLimiter()
+    # cProfile y sys.setprofile son globales al proceso: un perfil a la vez
+    busy = threading.Lock()
+    app.extensions['profiler'] = limiter
+
+    @app.before_request
+    def start_profile():
+        if PROFILE_PARAM not in request.args and PROFILE_HEADER not in request.headers:
+            return None
+        if not (current_user.is_authenticated and current_user.is_superuser):
+            # Sin permiso el parámetro se ignora: el request sigue normal
+            return None
+        requested = _requested_profile()
+        if requested is None:
+            return None
+
+        if not busy.acquire(blocking=False):
+            abort(429, description='Hay otro perfil en curso en este proceso.')
+        if not limiter.allow(current_app.config['PROFILER_RATE_LIMIT']):
+            busy.release()
+            abort(429, description='Límite de perfiles por minuto alcanzado.')
+
+        mode, fmt = requested
+        if mode == 'cprofile':
+            collector = CProfileCollector()
+        else:
+            collector = SamplingCollector(current_app.config['PROFILER_SAMPLE_INTERVAL_MS'] / 1000)
+        stats = get_request_sql_stats()
+        if stats is not None:
+            stats.statements = []
+
+        logger.info('Perfil %s de %s %s por %s', mode, request.method, request.path, current_user.email)
+        g._profile = ProfileSession(collector, fmt, busy)
+        g._profile.start()
+        return None
+
+    @app.after_request
+    def finish_profile(response):
+        session = g.pop('_profile', None)
+        if session is None:
+            return response
+        try:
+            if response.is_streamed and not response.direct_passthrough:
+                # Consumir el stream dentro del perfil: ahí se renderiza la plantilla
+                response.get_data()
+        finally:
+            session.stop()
+        report = _build_report(session, response)
+        report.headers['X-Profile-Mode'] = session.collector.mode
+        report.headers['X-Profile-Original-Status'] = str(response.status_code)
+        return report
+
+    @app.teardown_request
+    def abandon_profile(exc):
+        # Excepción sin after_request: liberar el lock igual
+        session = g.pop('_profile', None)
+        if session is not None:
+            session.stop()
+
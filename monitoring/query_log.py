@@ -0,0 +1,378 @@
+"""
+Query log - Agregado de queries por fingerprint y volcado periódico a disco
+
+SQLALCHEMY_ECHO es todo o nada. Aquí cada sentencia ejecutada (o una muestra,
+QUERY_LOG_SAMPLE_RATE) se normaliza a su fingerprint y se acumulan por
+fingerprint: ejecuciones, tiempo total y máximo, filas devueltas y los
+endpoints que la ejecutan. De la ejecución más lenta se guardan la sentencia y
+los tipos de sus parámetros, para poder pedir su EXPLAIN después con valores
+de relleno.
+
+El agregado vive en memoria y un hilo lo vuelca cada QUERY_LOG_DUMP_INTERVAL
+segundos a QUERY_LOG_DIR/query-log-<pid>.json (un archivo por proceso). Las
+ejecuciones sobre QUERY_LOG_SLOW_MS se loguean además como WARNING.
+
+`flask query-report` lee esos archivos, los combina y muestra los peores
+fingerprints con su plan de ejecución.
+
+Los valores de los parámetros (RUT, nombres, edades de pacientes) no se
+guardan salvo con QUERY_LOG_CAPTURE_PARAMETERS, pensado solo para depurar en
+local: sin ellos el reporte hace EXPLAIN pero no EXPLAIN ANALYZE.
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from flask import has_request_context, request
+
+from .sql import add_statement_observer, fingerprint_statement
+
+logger = logging.getLogger('monitoring.query_log')
+
+DEFAULT_DIR = os.path.join(tempfile.gettempdir(), 'ticket-home-query-log')
+
+# Fingerprints distintos que se agregan por separado; el resto va a OTHER_FINGERPRINT
+DEFAULT_MAX_FINGERPRINTS = 2000
+OTHER_FINGERPRINT = '<otros fingerprints>'
+
+# Endpoints que se conservan por fingerprint
+MAX_ENDPOINTS = 5
+
+SORT_KEYS = ('total_ms', 'mean_ms', 'max_ms', 'count', 'rows')
+
+# Valores de relleno por tipo para el EXPLAIN de parámetros no capturados
+PLACEHOLDER_VALUES = {
+    'int': 0, 'float': 0.0, 'Decimal': Decimal(0), 'bool': False, 'str': '', 'bytes': b'',
+    'datetime': datetime(2000, 1, 1), 'date': date(2000, 1, 1), 'time': dt_time(0),
+}
+
+
+def _jsonable(value):
+    """Parámetros del driver (tuplas, dicts, fechas, Decimal) como JSON."""
+    return json.loads(json.dumps(value, default=str))
+
+
+def parameter_types(parameters):
+    """Parámetros del driver reducidos al nombre del tipo de cada valor (sin datos)."""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    return [type(value).__name__ for value in parameters or ()]
+
+
+def placeholder_parameters(types):
+    """Valores de relleno con la forma de `parameter_types()`, para EXPLAIN sin ANALYZE."""
+    if isinstance(types, dict):
+        return {key: PLACEHOLDER_VALUES.get(name) for key, name in types.items()}
+    return [PLACEHOLDER_VALUES.get(name) for name in types]
+
+
+class FingerprintStats:
+    """Acumulado de un fingerprint."""
+
+    __slots__ = ('count', 'total_ms', 'max_ms', 'rows', 'rows_measured', 'slow',
+                 'statement', 'parameters', 'parameter_types', 'endpoints')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.rows_measured = 0
+        self.slow = 0
+        self.statement = None
+        self.parameters = None
+        self.parameter_types = None
+        self.endpoints = Counter()
+
+    @property
+    def mean_ms(self):
+        return self.total_ms / self.count if self.count else 0.0
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': round(self.total_ms, 3),
+            'mean_ms': round(self.mean_ms, 3),
+            'max_ms': round(self.max_ms, 3),
+            'rows': self.rows,
+            'rows_measured': self.rows_measured,
+            'slow': self.slow,
+            'statement': self.statement,
+            'parameters': self.parameters,
+            'parameter_types': self.parameter_types,
+            'endpoints': dict(self.endpoints.most_common(MAX_ENDPOINTS)),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        for key in ('count', 'total_ms', 'max_ms', 'rows', 'rows_measured', 'slow', 'statement', 'parameters',
+                    'parameter_types'):
+            setattr(stats, key, data.get(key, getattr(stats, key)))
+        stats.endpoints = Counter(data.get('endpoints') or {})
+        return stats
+
+    def merge(self, other):
+        if other.max_ms > self.max_ms:
+            self.max_ms = other.max_ms
+            self.statement, self.parameters = other.statement, other.parameters
+            self.parameter_types = other.parameter_types
+        self.count += other.count
+        self.total_ms += other.total_ms
+        self.rows += other.rows
+        self.rows_measured += other.rows_measured
+        self.slow += other.slow
+        self.endpoints.update(other.endpoints)
+
+
+class QueryLog:
+    """Agregado en memoria, por fingerprint, de las sentencias ejecutadas."""
+
+    def __init__(self, max_fingerprints=DEFAULT_MAX_FINGERPRINTS, slow_ms=None, sample_rate=1.0,
+                 capture_parameters=False):
+        self.max_fingerprints = max_fingerprints
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.capture_parameters = capture_parameters
+        self.started_at = time.time()
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, statement, parameters, duration_ms, rowcount=-1, endpoint=None, executemany=False):
+        fingerprint = fingerprint_statement(statement)
+        slow = self.slow_ms is not None and duration_ms >= self.slow_ms
+        with self._lock:
+            stats = self._stats.get(fingerprint)
+            if stats is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    fingerprint = OTHER_FINGERPRINT
+                    stats = self._stats.get(fingerprint)
+                if stats is None:
+                    stats = self._stats[fingerprint] = FingerprintStats()
+            stats.count += 1
+            stats.total_ms += duration_ms
+            if rowcount is not None and rowcount >= 0:
+                stats.rows += rowcount
+                stats.rows_measured += 1
+            if slow:
+                stats.slow += 1
+            stats.endpoints[endpoint or '-'] += 1
+            if duration_ms > stats.max_ms or stats.statement is None:
+                # Solo al superar el máximo: serializar los parámetros no es gratis
+                stats.max_ms = max(stats.max_ms, duration_ms)
+                stats.statement = statement
+                if executemany:
+                    stats.parameters = stats.parameter_types = None
+                elif self.capture_parameters:
+                    stats.parameters, stats.parameter_types = _jsonable(parameters), None
+                else:
+                    stats.parameters, stats.parameter_types = None, parameter_types(parameters)
+        if slow:
+            logger.warning(json.dumps({
+                'event': 'slow_query', 'fingerprint': fingerprint[:300], 'ms': round(duration_ms, 2),
+                'rows': rowcount, 'endpoint': endpoint,
+            }, ensure_ascii=False))
+
+    def snapshot(self):
+        """{fingerprint: dict} del agregado actual."""
+        with self._lock:
+            items = list(self._stats.items())
+        return {fingerprint: stats.to_dict() for fingerprint, stats in items}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.started_at = time.time()
+
+    def dump(self, path):
+        """Escribe el agregado en `path` de forma atómica (tmp + rename)."""
+        payload = {
+            'pid': os.getpid(),
+            'started_at': self.started_at,
+            'dumped_at': time.time(),
+            'fingerprints': self.snapshot(),
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+query_log = QueryLog()
+
+
+class _Dumper:
+    """
+    Hilo que vuelca query_log a disco cada `interval` segundos.
+
+    Se inicia con la primera sentencia registrada y no en create_app: si
+    gunicorn hace fork después de crear la app, el hilo debe nacer en el worker.
+    """
+
+    def __init__(self):
+        self.directory = DEFAULT_DIR
+        self.interval = 60.0
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f'query-log-{os.getpid()}.json')
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            if self.interval > 0:
+                threading.Thread(target=self._run, name='query-log-dump', daemon=True).start()
+            atexit.register(self.dump)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.dump()
+
+    def dump(self):
+        try:
+            query_log.dump(self.path)
+        except OSError as e:
+            logger.error(f'No se pudo volcar el query log a {self.path}: {e}')
+
+
+dumper = _Dumper()
+
+
+def _observe(statement, parameters, duration, cursor, executemany):
+    if query_log.sample_rate < 1.0 and random.random() >= query_log.sample_rate:
+        return
+    dumper.ensure_started()
+    endpoint = request.endpoint if has_request_context() else None
+    query_log.record(statement, parameters, duration * 1000, rowcount=getattr(cursor, 'rowcount', -1),
+                     endpoint=endpoint, executemany=executemany)
+
+
+def init_query_log(app):
+    """
+    Registra el agregado de queries por fingerprint.
+
+    Config:
+        QUERY_LOG_ENABLED (bool): Activa el agregado (default False; Config lo activa solo en local)
+        QUERY_LOG_SAMPLE_RATE (float): Fracción de sentencias registradas (default 1.0)
+        QUERY_LOG_SLOW_MS (float): Ejecuciones desde este tiempo se loguean como WARNING
+        QUERY_LOG_DIR (str): Directorio de los volcados
+        QUERY_LOG_DUMP_INTERVAL (float): Segundos entre volcados (0 = solo al salir)
+        QUERY_LOG_MAX_FINGERPRINTS (int): Fingerprints distintos a conservar
+        QUERY_LOG_CAPTURE_PARAMETERS (bool): Guarda los valores de los parámetros (default False:
+            solo sus tipos; los valores pueden ser datos de pacientes)
+    """
+    app.config.setdefault('QUERY_LOG_ENABLED', False)
+    app.config.setdefault('QUERY_LOG_SAMPLE_RATE', 1.0)
+    app.config.setdefault('QUERY_LOG_SLOW_MS', 200.0)
+    app.config.setdefault('QUERY_LOG_DIR', DEFAULT_DIR)
+    app.config.setdefault('QUERY_LOG_DUMP_INTERVAL', 60.0)
+    app.config.setdefault('QUERY_LOG_MAX_FINGERPRINTS', DEFAULT_MAX_FINGERPRINTS)
+    app.config.setdefault('QUERY_LOG_CAPTURE_PARAMETERS', False)
+
+    # El directorio se necesita también para `flask query-report`
+    dumper.directory = app.config['QUERY_LOG_DIR']
+    if not app.config['QUERY_LOG_ENABLED']:
+        return
+
+    query_log.slow_ms = app.config['QUERY_LOG_SLOW_MS']
+    query_log.max_fingerprints = app.config['QUERY_LOG_MAX_FINGERPRINTS']
+    query_log.sample_rate = app.config['QUERY_LOG_SAMPLE_RATE']
+    query_log.capture_parameters = app.config['QUERY_LOG_CAPTURE_PARAMETERS']
+    dumper.interval = app.config['QUERY_LOG_DUMP_INTERVAL']
+    add_statement_observer(_observe)
+
+
+# --- Reporte ---
+
+def load_dumps(directory=None):
+    """
+    Combina los volcados de todos los procesos de `directory`.
+
+    Returns:
+        dict: fingerprint -> FingerprintStats
+    """
+    merged = {}
+    for path in sorted(glob.glob(os.path.join(directory or dumper.directory, 'query-log-*.json'))):
+        try:
+            with open(path) as f:
+                payload = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f'Volcado ilegible {path}: {e}')
+            continue
+        for fingerprint, data in payload.get('fingerprints', {}).items():
+            stats = FingerprintStats.from_dict(data)
+            if fingerprint in merged:
+                merged[fingerprint].merge(stats)
+            else:
+                merged[fingerprint] = stats
+    return merged
+
+
+def top_fingerprints(stats, sort='total_ms', limit=20):
+    """Los `limit` peores fingerprints según `sort` (uno de SORT_KEYS)."""
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Orden inválido '{sort}' ({', '.join(SORT_KEYS)})")
+    return sorted(stats.items(), key=lambda item: getattr(item[1], sort), reverse=True)[:limit]
+
+
+def explain_statement(connection, statement, parameters=None, analyze=False):
+    """
+    Plan de ejecución de una sentencia SQL ya compilada para `connection`.
+
+    En SQLite se usa EXPLAIN QUERY PLAN; en PostgreSQL, EXPLAIN o, con
+    `analyze`, EXPLAIN (ANALYZE, BUFFERS), que ejecuta la sentencia.
+
+    Returns:
+        list[str]: Líneas del plan
+    """
+    if isinstance(parameters, list):
+        parameters = tuple(parameters)
+
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN'
+    elif dialect == 'postgresql':
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS)' if analyze else 'EXPLAIN'
+    else:
+        prefix = 'EXPLAIN'
+
+    rows = connection.exec_driver_sql(f'{prefix} {statement}', parameters or ()).all()
+    if dialect == 'sqlite':
+        # (id, parent, notused, detail)
+        return [row[-1] for row in rows]
+    return [str(row[0]) for row in rows]
+
+
+def explain(connection, stats, analyze=False):
+    """
+    Plan de ejecución de la ejecución más lenta de un fingerprint.
+
+    Solo SELECT: EXPLAIN ANALYZE ejecuta la sentencia y en un INSERT/UPDATE la
+    aplicaría. Sin los valores capturados se usan valores de relleno y nunca
+    se pide ANALYZE: los tiempos con esos valores no dicen nada.
+
+    Returns:
+        list[str] or None: Líneas del plan, None si no aplica
+    """
+    statement = stats.statement
+    if not statement or not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    if stats.parameters is None and stats.parameter_types is not None:
+        return explain_statement(connection, statement, placeholder_parameters(stats.parameter_types))
+    return explain_statement(connection, statement, stats.parameters, analyze=analyze)
@@ -0,0 +1,224 @@
+"""
+SQL instrumentation - Queries por request, tiempo en BD y detección de N+1
+
+Escucha before/after_cursor_execute de SQLAlchemy y acumula, para el request
+en curso, cantidad de queries, tiempo total en BD y cuántas veces se repite
+cada "fingerprint" de sentencia. Una misma sentencia repetida muchas veces en
+un request (típicamente un lazy load dentro de un loop) se reporta como N+1.
+
+La respuesta lleva un header Server-Timing y, al cerrarse el request
+(teardown_request, que en las vistas en streaming corre tras el último trozo),
+se escribe una línea de log estructurada (JSON) con el total, como INFO; los
+requests que superan el presupuesto o tienen N+1 se loguean como WARNING.
+"""
+import json
+import logging
+import re
+import time
+from collections import Counter
+from functools import lru_cache
+from flask import g, request, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('monitoring.sql')
+
+_listeners_registered = False
+
+# Funciones (statement, parameters, duración, cursor, executemany) llamadas tras cada
+# sentencia, dentro o fuera de un request (p.ej. monitoring/query_log.py)
+_statement_observers = []
+
+# Sentencias más largas no se cachean (listas IN expandidas: casi nunca se repiten)
+_FINGERPRINT_CACHE_MAX_LEN = 4096
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAM_LIST_RE = re.compile(r'\(\s*(?:\?|%\(\w+\)s|:\w+|__\[POSTCOMPILE_\w+\])(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))*\s*\)')
+_PYFORMAT_RE = re.compile(r'%\(\w+\)s')
+
+
+def fingerprint_statement(statement):
+    """
+    Normaliza una sentencia SQL para agrupar ejecuciones equivalentes.
+
+    Reemplaza literales y parámetros por '?' y colapsa listas IN (...) y espacios,
+    de modo que `WHERE id = 1` y `WHERE id = 2` den el mismo fingerprint.
+    """
+    if len(statement) <= _FINGERPRINT_CACHE_MAX_LEN:
+        return _cached_fingerprint(statement)
+    return _fingerprint(statement)
+
+
+@lru_cache(maxsize=1024)
+def _cached_fingerprint(statement):
+    # Las sentencias compiladas se repiten casi siempre iguales: evita los regex
+    return _fingerprint(statement)
+
+
+def _fingerprint(statement):
+    fingerprint = _STRING_RE.sub('?', statement)
+    fingerprint = _PYFORMAT_RE.sub('?', fingerprint)
+    fingerprint = _NUMBER_RE.sub('?', fingerprint)
+    fingerprint = _PARAM_LIST_RE.sub('(?)', fingerprint)
+    return _WHITESPACE_RE.sub(' ', fingerprint).strip()
+
+
+class RequestQueryStats:
+    """Acumulador de queries de un request."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.fingerprints = Counter()
+        self.started_at = time.perf_counter()
+        # Lista de (sentencia, segundos) solo si alguien la pide (monitoring/profiler.py)
+        self.statements = None
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.total_time += duration
+        self.fingerprints[fingerprint_statement(statement)] += 1
+        if self.statements is not None:
+            self.statements.append((statement, duration))
+
+    def repeated(self, threshold):
+        """Fingerprints ejecutados al menos `threshold` veces (candidatos a N+1)."""
+        return [(fp, n) for fp, n in self.fingerprints.most_common() if n >= threshold]
+
+    @property
+    def db_ms(self):
+        return self.total_time * 1000
+
+    @property
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started_at) * 1000
+
+
+def get_request_sql_stats():
+    """RequestQueryStats del request actual, o None fuera de un request instrumentado."""
+    if not has_app_context():
+        return None
+    return g.get('_sql_stats')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_start_time', []).append((context, time.perf_counter()))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get('_query_start_time')
+    if not start_times:
+        return
+    duration = time.perf_counter() - start_times.pop()[1]
+
+    stats = get_request_sql_stats()
+    if stats is not None:
+        stats.record(statement, duration)
+    for observer in _statement_observers:
+        observer(statement, parameters, duration, cursor, executemany)
+
+
+def _handle_error(exception_context):
+    # Una sentencia que falla no llega a after_cursor_execute: se descarta su inicio
+    # (solo si es la de este contexto; un error en post_exec ya pasó por after)
+    connection = exception_context.connection
+    if connection is None:
+        return
+    start_times = connection.info.get('_query_start_time')
+    if start_times and start_times[-1][0] is exception_context.execution_context:
+        start_times.pop()
+
+
+def add_statement_observer(observer):
+    """Registra una función llamada tras cada sentencia ejecutada (idempotente)."""
+    _register_engine_listeners()
+    if observer not in _statement_observers:
+        _statement_observers.append(observer)
+
+
+def _register_engine_listeners():
+    """Los listeners van a nivel de clase Engine: cubren todos los engines (primario y réplicas)."""
+    global _listeners_registered
+    if _listeners_registered:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+    _listeners_registered = True
+
+
+def init_sql_instrumentation(app):
+    """
+    Registra la instrumentación SQL por request.
+
+    Config:
+        SQL_INSTRUMENTATION_ENABLED (bool): Activa la instrumentación (default True)
+        SQL_QUERY_BUDGET (int): Máximo de queries por request antes de marcarlo
+        SQL_TIME_BUDGET_MS (float): Máximo de ms en BD por request antes de marcarlo
+        SQL_N_PLUS_ONE_THRESHOLD (int): Repeticiones de un fingerprint para reportar N+1
+        SERVER_TIMING_ENABLED (bool): Agrega el header Server-Timing
+    """
+    app.config.setdefault('SQL_INSTRUMENTATION_ENABLED', True)
+    app.config.setdefault('SQL_QUERY_BUDGET', 30)
+    app.config.setdefault('SQL_TIME_BUDGET_MS', 500)
+    app.config.setdefault('SQL_N_PLUS_ONE_THRESHOLD', 5)
+    app.config.setdefault('SERVER_TIMING_ENABLED', True)
+
+    if not app.config['SQL_INSTRUMENTATION_ENABLED']:
+        return
+
+    _register_engine_listeners()
+
+    @app.before_request
+    def start_sql_stats():
+        # Siempre se reemplaza: en tests el app context (y g) se reutiliza entre requests
+        g._sql_stats = RequestQueryStats()
+
+    @app.after_request
+    def add_server_timing(response):
+        stats = g.get('_sql_stats')
+        if stats is None:
+            return response
+        g._sql_status = response.status_code
+
+        if app.config['SERVER_TIMING_ENABLED']:
+            # Los headers salen antes del cuerpo: en una respuesta en streaming solo se
+            # conocen las queries previas al render; el total va al log de teardown
+            desc = f'{stats.count} queries before body' if response.is_streamed else f'{stats.count} queries'
+            response.headers.add(
+                'Server-Timing',
+                f'db;dur={stats.db_ms:.1f};desc="{desc}", app;dur={stats.elapsed_ms:.1f}'
+            )
+        return response
+
+    @app.teardown_request
+    def report_sql_stats(exc):
+        # teardown_request corre al cerrar el request: con stream_with_context, tras el último trozo
+        stats = g.pop('_sql_stats', None)
+        if stats is None:
+            return
+        status = g.pop('_sql_status', 500)
+
+        threshold = app.config['SQL_N_PLUS_ONE_THRESHOLD']
+        n_plus_one = stats.repeated(threshold)
+        over_budget = (
+            stats.count > app.config['SQL_QUERY_BUDGET']
+            or stats.db_ms > app.config['SQL_TIME_BUDGET_MS']
+        )
+
+        record = {
+            'event': 'request_sql',
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': status,
+            'queries': stats.count,
+            'db_ms': round(stats.db_ms, 2),
+            'duration_ms': round(stats.elapsed_ms, 2),
+            'over_budget': over_budget,
+            'n_plus_one': [{'fingerprint': fp[:200], 'count': n} for fp, n in n_plus_one],
+        }
+        level = logging.WARNING if (over_budget or n_plus_one) else logging.INFO
+        logger.log(level, json.dumps(record, ensure_ascii=False))
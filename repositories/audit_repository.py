@@ -2,35 +2,142 @@
 Audit Repository - Data access layer for Audit Logs
 """
 from models import db, ActionAudit, LoginAudit
+from sqlalchemy import tuple_
 from datetime import datetime, timedelta
 
 
 class AuditRepository:
     """Repository for Audit database operations."""
 
+    CURSOR_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
     @staticmethod
-    def get_action_logs(user_id=None, clinic_id=None, limit=100, offset=0):
+    def encode_cursor(log):
         """
-        Get action audit logs with optional filtering.
+        Encode the keyset position of an audit row as an opaque string.
 
         Args:
-            user_id (int, optional): Filter by user
-            clinic_id (int, optional): Filter by clinic
-            limit (int): Maximum number of records
-            offset (int): Offset for pagination
+            log: ActionAudit or LoginAudit instance (last row of a page)
 
         Returns:
-            list: List of ActionAudit records
+            str: Cursor in the form "<timestamp>_<id>"
         """
-        query = ActionAudit.query.order_by(ActionAudit.timestamp.desc())
+        return f"{log.timestamp.strftime(AuditRepository.CURSOR_FORMAT)}_{log.id}"
 
-        if user_id:
-            query = query.filter_by(user_id=user_id)
+    @staticmethod
+    def decode_cursor(cursor):
+        """
+        Decode a cursor produced by encode_cursor().
 
-        if clinic_id:
-            query = query.filter_by(clinic_id=clinic_id)
+        Args:
+            cursor (str): Cursor string
+
+        Returns:
+            tuple: (timestamp, id) or None if the cursor is missing/invalid
+        """
+        if not cursor:
+            return None
+        try:
+            timestamp_str, id_str = cursor.rsplit('_', 1)
+            return datetime.strptime(timestamp_str, AuditRepository.CURSOR_FORMAT), int(id_str)
+        except (ValueError, TypeError):
+            return None
+
+    @staticmethod
+    def _paginate_keyset(query, model, cursor=None, limit=50):
+        """
+        Apply keyset pagination on (timestamp, id) in descending order.
+
+        Unlike OFFSET pagination, the cost of fetching a page does not grow
+        with the page number: the database seeks directly to the cursor
+        position using the composite (..., timestamp, id) indexes.
+
+        Args:
+            query: Filtered SQLAlchemy query over `model`
+            model: ActionAudit or LoginAudit
+            cursor (str, optional): Cursor of the last row of the previous page
+            limit (int): Page size
+
+        Returns:
+            tuple: (list of rows, next_cursor or None)
+        """
+        position = AuditRepository.decode_cursor(cursor)
+        if position:
+            query = query.filter(tuple_(model.timestamp, model.id) < tuple_(*position))
 
-        return query.limit(limit).offset(offset).all()
+        rows = query.order_by(model.timestamp.desc(), model.id.desc()).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = AuditRepository.encode_cursor(rows[-1])
+        return rows, next_cursor
+
+    @staticmethod
+    def _apply_date_range(query, model, date_from=None, date_to=None):
+        """Apply an inclusive YYYY-MM-DD date range on model.timestamp."""
+        if date_from:
+            try:
+                query = query.filter(model.timestamp >= datetime.strptime(date_from, '%Y-%m-%d'))
+            except (ValueError, TypeError):
+                pass
+        if date_to:
+            try:
+                end = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)
+                query = query.filter(model.timestamp < end)
+            except (ValueError, TypeError):
+                pass
+        return query
+
+    @staticmethod
+    def get_action_logs_page(filters, cursor=None, limit=50):
+        """
+        Get a keyset-paginated page of action audit logs.
+
+        Args:
+            filters (dict): Optional keys user_id, clinic_id, event_type,
+                target_type, target_id, date_from, date_to (YYYY-MM-DD)
+            cursor (str, optional): Cursor returned by the previous page
+            limit (int): Page size
+
+        Returns:
+            tuple: (list of ActionAudit, next_cursor or None)
+        """
+        query = ActionAudit.query
+
+        if filters.get('user_id'):
+            query = query.filter(ActionAudit.user_id == filters['user_id'])
+        if filters.get('clinic_id'):
+            query = query.filter(ActionAudit.clinic_id == filters['clinic_id'])
+        if filters.get('event_type'):
+            query = query.filter(ActionAudit.event_type == filters['event_type'])
+        if filters.get('target_type'):
+            query = query.filter(ActionAudit.target_type == filters['target_type'])
+        if filters.get('target_id'):
+            query = query.filter(ActionAudit.target_id == filters['target_id'])
+
+        query = AuditRepository._apply_date_range(
+            query, ActionAudit, filters.get('date_from'), filters.get('date_to')
+        )
+        return AuditRepository._paginate_keyset(query, ActionAudit, cursor, limit)
+
+    @staticmethod
+    def get_login_logs_page(clinic_id=None, cursor=None, limit=20):
+        """
+        Get a keyset-paginated page of login audit logs.
+
+        Args:
+            clinic_id (int, optional): Filter by clinic
+            cursor (str, optional): Cursor returned by the previous page
+            limit (int): Page size
+
+        Returns:
+            tuple: (list of LoginAudit, next_cursor or None)
+        """
+        query = LoginAudit.query
+        if clinic_id:
+            query = query.filter(LoginAudit.clinic_id == clinic_id)
+        return AuditRepository._paginate_keyset(query, LoginAudit, cursor, limit)
 
     @staticmethod
     def get_login_logs(user_id=None, clinic_id=None, days=30):
@@ -1,13 +1,21 @@
 """
 Ticket Repository - Data access layer for Tickets
 """
-from models import db, Ticket, Patient, Surgery, Doctor
-from sqlalchemy.orm import joinedload
-from sqlalchemy import func, or_
+from models import db, Ticket, Patient, Surgery, Doctor, FpaModification, TICKET_STATUS_ANULADO
+from sqlalchemy.orm import joinedload, subqueryload, with_expression
+from sqlalchemy import func, or_, select
 from datetime import datetime, timedelta
 import re
 
 
+# Orden del tablero de enfermería: primero los que requieren atención antes
+BOARD_URGENCY_ORDER = {'normal': 0, 'warning': 1, 'critical': 2, 'scheduled': 3, 'expired': 4, 'unknown': 5}
+BOARD_ACTIVE_LEVELS = ('normal', 'warning', 'critical', 'scheduled')
+
+# Filas por fetch del cursor del servidor en las vistas en streaming
+STREAM_FETCH_SIZE = 200
+
+
 class TicketRepository:
     """Repository for Ticket database operations."""
 
@@ -52,22 +60,33 @@ class TicketRepository:
         return query.first()
 
     @staticmethod
-    def build_filtered_query(filters, current_user):
+    def build_filtered_query(filters, current_user, streamed=False):
         """
         Build a filtered query based on search criteria.
 
         Args:
             filters (dict): Filter parameters
             current_user: Current logged-in user
+            streamed (bool): For views that iterate the rows with yield_per: the
+                modification count comes from a correlated subquery
+                (Ticket.modification_count) instead of loading the collection
 
         Returns:
             Query: SQLAlchemy query object
         """
         # Start with base query with eager loading
+        # modifications: subqueryload = una sola query extra sin importar cuántos tickets
+        # (selectinload parte el IN en lotes de 500 y crecería con las filas).
+        # Con yield_per no se puede precargar la colección: se cuenta en la misma query
+        if streamed:
+            modifications = with_expression(Ticket.modification_count, TicketRepository.modification_count())
+        else:
+            modifications = subqueryload(Ticket.modifications)
         query = Ticket.query.options(
             joinedload(Ticket.patient),
             joinedload(Ticket.surgery).joinedload(Surgery.specialty),
-            joinedload(Ticket.attending_doctor)
+            joinedload(Ticket.attending_doctor),
+            modifications
         ).join(Patient, Ticket.patient_id == Patient.id)\
          .join(Surgery, Ticket.surgery_id == Surgery.id)\
          .outerjoin(Doctor, Ticket.doctor_id == Doctor.id)
@@ -145,6 +164,116 @@ class TicketRepository:
 
         return query
 
+    @staticmethod
+    def modification_count():
+        """Correlated subquery counting the FPA modifications of each ticket."""
+        return (
+            select(func.count(FpaModification.id))
+            .where(FpaModification.ticket_id == Ticket.id)
+            .correlate_except(FpaModification)
+            .scalar_subquery()
+        )
+
+    @staticmethod
+    def board_status_condition(status_filter, urgency):
+        """
+        Nursing board UI filter as a SQL condition.
+
+        Args:
+            status_filter (str): 'Vigente', 'Vencido', 'Anulado', 'SinEpisodio' or anything else (all)
+            urgency: Ticket.urgency_level_expression() at the board's `now`
+
+        Returns:
+            SQL boolean expression
+        """
+        not_annulled = Ticket.status != TICKET_STATUS_ANULADO
+        if status_filter == 'Vigente':
+            # Vigentes = normal + warning + critical + scheduled (todos menos expired y anulados)
+            return db.and_(urgency.in_(BOARD_ACTIVE_LEVELS), not_annulled)
+        if status_filter == 'Vencido':
+            return db.and_(urgency == 'expired', not_annulled)
+        if status_filter == 'Anulado':
+            return Ticket.status == TICKET_STATUS_ANULADO
+        if status_filter == 'SinEpisodio':
+            # Sin ID de episodio: programados, vigentes o vencidos (no anulados)
+            return db.and_(TicketRepository._without_episode(), not_annulled, urgency != 'unknown')
+        return db.true()
+
+    @staticmethod
+    def _without_episode():
+        return or_(Patient.episode_id.is_(None), func.trim(Patient.episode_id) == '')
+
+    @staticmethod
+    def board_stats(filters, current_user, status_filter, now):
+        """
+        Nursing board counters in one aggregate query.
+
+        Args:
+            filters (dict): Filter parameters (build_filtered_query)
+            current_user: Current logged-in user
+            status_filter (str): UI filter (board_status_condition)
+            now (datetime): Reference time for the urgency levels
+
+        Returns:
+            dict: total, critical, warning, normal, expired, scheduled, annulled,
+                without_episode and shown (tickets matching the UI filter)
+        """
+        urgency = Ticket.urgency_level_expression(now)
+        flags = TicketRepository.build_filtered_query(filters, current_user, streamed=True)\
+            .with_entities(
+                urgency.label('urgency'),
+                db.case((Ticket.status == TICKET_STATUS_ANULADO, 1), else_=0).label('annulled'),
+                db.case((TicketRepository._without_episode(), 1), else_=0).label('no_episode'),
+                db.case((TicketRepository.board_status_condition(status_filter, urgency), 1), else_=0).label('shown'),
+            ).subquery()
+        rows = db.session.execute(
+            select(flags.c.urgency, flags.c.annulled, flags.c.no_episode, flags.c.shown, func.count())
+            .group_by(flags.c.urgency, flags.c.annulled, flags.c.no_episode, flags.c.shown)
+        ).all()
+
+        stats = dict.fromkeys(('total', 'critical', 'warning', 'normal', 'expired', 'scheduled',
+                               'annulled', 'without_episode', 'shown'), 0)
+        for urgency_level, annulled, no_episode, shown, count in rows:
+            stats['total'] += count
+            if urgency_level in stats:
+                stats[urgency_level] += count
+            stats['annulled'] += count if annulled else 0
+            stats['without_episode'] += count if no_episode and not annulled and urgency_level != 'unknown' else 0
+            stats['shown'] += count if shown else 0
+        return stats
+
+    @staticmethod
+    def board_query(filters, current_user, status_filter, sort_by, sort_dir, now):
+        """
+        Nursing board tickets, filtered and ordered by urgency in SQL, so the
+        cards can be streamed in their final order as rows are fetched.
+
+        Order: urgency (BOARD_URGENCY_ORDER), current FPA, then the chosen
+        sort column (created_at or current_fpa) and the ticket id as tie-breakers.
+
+        Args:
+            filters (dict): Filter parameters (build_filtered_query)
+            current_user: Current logged-in user
+            status_filter (str): UI filter (board_status_condition)
+            sort_by (str): 'created_at' or 'discharge_date'
+            sort_dir (str): 'asc' or 'desc'
+            now (datetime): Reference time for the urgency levels
+
+        Returns:
+            Query: iterated with yield_per(STREAM_FETCH_SIZE)
+        """
+        urgency = Ticket.urgency_level_expression(now)
+        tie_breaker = Ticket.created_at if sort_by == 'created_at' else Ticket.current_fpa
+        return (
+            TicketRepository.build_filtered_query(filters, current_user, streamed=True)
+            .filter(TicketRepository.board_status_condition(status_filter, urgency))
+            .order_by(db.case(BOARD_URGENCY_ORDER, value=urgency),
+                      Ticket.current_fpa.asc(),
+                      tie_breaker.asc() if sort_dir == 'asc' else tie_breaker.desc(),
+                      Ticket.id)
+            .yield_per(STREAM_FETCH_SIZE)
+        )
+
     @staticmethod
     def apply_sorting(query, sort_by='created_at', sort_dir='desc'):
         """
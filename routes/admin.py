@@ -10,14 +10,15 @@ from flask_login import login_required, current_user
 from models import (
     db, User, Surgery, Specialty, StandardizedReason, Doctor,
     Clinic, LoginAudit, Ticket, Patient, REASON_CATEGORY_ANNULMENT,
-    FpaModification, ActionAudit, Superuser, ROLE_SUPERUSER, ROLE_ADMIN, UrgencyThreshold
+    FpaModification, ActionAudit, Superuser, ROLE_SUPERUSER, ROLE_ADMIN, UrgencyThreshold,
+    AUDIT_TARGET_TYPES, AUDIT_EVENT_TYPES, AUDIT_EVENT_PATIENT_EDITED,
+    AUDIT_EVENT_TICKET_EDITED, AUDIT_EVENT_THRESHOLDS_UPDATED
 )
 from datetime import datetime, time
-from utils import admin_required, superuser_required
+from utils import admin_required, superuser_required, read_only
 from utils.datetime_utils import utcnow
-from services import AuditService, UserService
+from services import AuditService, UserService, MasterDataService, FpaRecalcService
 from repositories import TicketRepository, AuditRepository
-import openpyxl
 from io import BytesIO
 
 logger = logging.getLogger(__name__)
@@ -53,24 +54,40 @@ def edit_ticket(ticket_id):
             # --- Patient Data ---
             patient = ticket.patient
             patient_changes = []
-            if patient.rut != request.form['rut']: patient_changes.append(f"RUT de '{patient.rut}' a '{request.form['rut']}'")
+            patient_fields_changed = {}
+            if patient.rut != request.form['rut']:
+                patient_changes.append(f"RUT de '{patient.rut}' a '{request.form['rut']}'")
+                patient_fields_changed['rut'] = [patient.rut, request.form['rut']]
             patient.rut = request.form['rut']
-            if patient.primer_nombre != request.form['primer_nombre']: patient_changes.append(f"Primer Nombre de '{patient.primer_nombre}' a '{request.form['primer_nombre']}'")
+            if patient.primer_nombre != request.form['primer_nombre']:
+                patient_changes.append(f"Primer Nombre de '{patient.primer_nombre}' a '{request.form['primer_nombre']}'")
+                patient_fields_changed['primer_nombre'] = [patient.primer_nombre, request.form['primer_nombre']]
             patient.primer_nombre = request.form['primer_nombre']
-            if patient.segundo_nombre != request.form['segundo_nombre']: patient_changes.append(f"Segundo Nombre de '{patient.segundo_nombre}' a '{request.form['segundo_nombre']}'")
+            if patient.segundo_nombre != request.form['segundo_nombre']:
+                patient_changes.append(f"Segundo Nombre de '{patient.segundo_nombre}' a '{request.form['segundo_nombre']}'")
+                patient_fields_changed['segundo_nombre'] = [patient.segundo_nombre, request.form['segundo_nombre']]
             patient.segundo_nombre = request.form['segundo_nombre']
-            if patient.apellido_paterno != request.form['apellido_paterno']: patient_changes.append(f"Apellido Paterno de '{patient.apellido_paterno}' a '{request.form['apellido_paterno']}'")
+            if patient.apellido_paterno != request.form['apellido_paterno']:
+                patient_changes.append(f"Apellido Paterno de '{patient.apellido_paterno}' a '{request.form['apellido_paterno']}'")
+                patient_fields_changed['apellido_paterno'] = [patient.apellido_paterno, request.form['apellido_paterno']]
             patient.apellido_paterno = request.form['apellido_paterno']
-            if patient.apellido_materno != request.form['apellido_materno']: patient_changes.append(f"Apellido Materno de '{patient.apellido_materno}' a '{request.form['apellido_materno']}'")
+            if patient.apellido_materno != request.form['apellido_materno']:
+                patient_changes.append(f"Apellido Materno de '{patient.apellido_materno}' a '{request.form['apellido_materno']}'")
+                patient_fields_changed['apellido_materno'] = [patient.apellido_materno, request.form['apellido_materno']]
             patient.apellido_materno = request.form['apellido_materno']
-            if patient.age != int(request.form['age']): patient_changes.append(f"Edad de '{patient.age}' a '{request.form['age']}'")
+            if patient.age != int(request.form['age']):
+                patient_changes.append(f"Edad de '{patient.age}' a '{request.form['age']}'")
+                patient_fields_changed['age'] = [patient.age, int(request.form['age'])]
             patient.age = int(request.form['age'])
-            if patient.sex != request.form['sex']: patient_changes.append(f"Sexo de '{patient.sex}' a '{request.form['sex']}'")
+            if patient.sex != request.form['sex']:
+                patient_changes.append(f"Sexo de '{patient.sex}' a '{request.form['sex']}'")
+                patient_fields_changed['sex'] = [patient.sex, request.form['sex']]
             patient.sex = request.form['sex']
             
             new_episode_id = request.form.get('episode_id', '').strip()
             if patient.episode_id != new_episode_id:
                 patient_changes.append(f"ID Episodio de '{patient.episode_id or ''}' a '{new_episode_id}'")
+                patient_fields_changed['episode_id'] = [patient.episode_id, new_episode_id or None]
                 patient.episode_id = new_episode_id if new_episode_id else None
 
 
@@ -80,15 +97,19 @@ def edit_ticket(ticket_id):
                     user=current_user,
                     action=f"Editó paciente: {', '.join(patient_changes)}",
                     target_id=ticket.id,
-                    target_type='Ticket'
+                    target_type='Ticket',
+                    event_type=AUDIT_EVENT_PATIENT_EDITED,
+                    payload={'patient_id': patient.id, 'fields_changed': patient_fields_changed}
                 )
 
             # --- Ticket Data ---
             ticket_changes = []
+            ticket_fields_changed = {}
             new_room = request.form.get('room', '').strip()
             # Fix for Issue #70: Use bed_number instead of room
             if ticket.bed_number != new_room:
                 ticket_changes.append(f"Habitación/Cama de '{ticket.bed_number or ''}' a '{new_room}'")
+                ticket_fields_changed['bed_number'] = [ticket.bed_number, new_room]
                 ticket.bed_number = new_room
 
             # NOTE: Status is NOT modifiable from this form
@@ -107,6 +128,7 @@ def edit_ticket(ticket_id):
                     flash('La cirugía seleccionada no pertenece a la clínica del ticket.', 'error')
                     return redirect(url_for('tickets.detail', ticket_id=ticket.id))
                 ticket_changes.append(f"Cirugía ID de '{ticket.surgery_id}' a '{new_surgery_id}'")
+                ticket_fields_changed['surgery_id'] = [ticket.surgery_id, new_surgery_id]
                 ticket.surgery_id = new_surgery_id
 
             doctor_id = request.form.get('doctor_id')
@@ -121,6 +143,7 @@ def edit_ticket(ticket_id):
                     return redirect(url_for('tickets.detail', ticket_id=ticket.id))
             if ticket.doctor_id != new_doctor_id:
                 ticket_changes.append(f"Doctor ID de '{ticket.doctor_id}' a '{new_doctor_id}'")
+                ticket_fields_changed['doctor_id'] = [ticket.doctor_id, new_doctor_id]
                 ticket.doctor_id = new_doctor_id
 
             if ticket_changes:
@@ -128,7 +151,9 @@ def edit_ticket(ticket_id):
                     user=current_user,
                     action=f"Editó ticket: {', '.join(ticket_changes)}",
                     target_id=ticket.id,
-                    target_type='Ticket'
+                    target_type='Ticket',
+                    event_type=AUDIT_EVENT_TICKET_EDITED,
+                    payload={'fields_changed': ticket_fields_changed}
                 )
 
             db.session.commit()
@@ -575,11 +600,7 @@ def create_surgery():
 @superuser_required
 def toggle_surgery(surgery_id):
     surgery = Surgery.query.get_or_404(surgery_id)
-    if not current_user.is_superuser and surgery.clinic_id != current_user.clinic_id:
-        flash('No tiene permisos para modificar esta cirugía.', 'error')
-        return redirect(url_for('admin.master_data'))
-
-    clinic_filter = surgery.clinic_id if current_user.is_superuser else current_user.clinic_id
+    clinic_filter = surgery.clinic_id
 
     try:
         surgery.is_active = not surgery.is_active
@@ -593,6 +614,36 @@ def toggle_surgery(surgery_id):
 
     return redirect(url_for('admin.master_data', clinic_id=clinic_filter))
 
+@admin_bp.route('/master-data/surgery/<int:surgery_id>/recalc-fpa', methods=['GET', 'POST'])
+@login_required
+@superuser_required
+def recalc_surgery_fpa(surgery_id):
+    """Preview (GET) and apply (POST) the bulk recalculation of a surgery's system FPA."""
+    surgery = Surgery.query.get_or_404(surgery_id)
+    if not current_user.is_superuser and surgery.clinic_id != current_user.clinic_id:
+        flash('No tiene permisos para modificar esta cirugía.', 'error')
+        return redirect(url_for('admin.master_data'))
+
+    clinic_filter = surgery.clinic_id if current_user.is_superuser else current_user.clinic_id
+
+    if request.method == 'GET':
+        result = FpaRecalcService.recalculate(surgery, dry_run=True)
+        db.session.rollback()
+        return render_template('admin/recalc_fpa.html', surgery=surgery, result=result,
+                               preview_limit=200, clinic_filter=clinic_filter)
+
+    try:
+        result = FpaRecalcService.recalculate(surgery, user=current_user)
+        db.session.commit()
+        flash(f'FPA recalculada en {len(result.changes)} de {result.scanned} tickets vigentes '
+              f'de {surgery.name}.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f'Error al recalcular FPA de la cirugía {surgery_id}: {e}', exc_info=True)
+        flash('Error al recalcular FPA. Contacte al administrador.', 'error')
+
+    return redirect(url_for('admin.master_data', clinic_id=clinic_filter))
+
 @admin_bp.route('/master-data/adjustment', methods=['POST'])
 @login_required
 @superuser_required
@@ -732,13 +783,12 @@ def toggle_doctor(doctor_id):
 
 @admin_bp.route('/audit/logins')
 @login_required
+@read_only
 @admin_required
 def login_audit():
-    page = request.args.get('page', 1, type=int)
-    logs_query = LoginAudit.query
-    if not current_user.is_superuser:
-        logs_query = logs_query.filter_by(clinic_id=current_user.clinic_id)
-    logs = logs_query.order_by(LoginAudit.timestamp.desc()).paginate(page=page, per_page=20)
+    cursor = request.args.get('cursor')
+    clinic_id = None if current_user.is_superuser else current_user.clinic_id
+    logs, next_cursor = AuditRepository.get_login_logs_page(clinic_id=clinic_id, cursor=cursor, limit=20)
 
     # Get clinic information for logs (for superusers)
     clinics_dict = {}
@@ -746,7 +796,52 @@ def login_audit():
         all_clinics = Clinic.query.all()
         clinics_dict = {clinic.id: clinic.name for clinic in all_clinics}
 
-    return render_template('admin/audit_log.html', logs=logs, clinics_dict=clinics_dict)
+    return render_template('admin/audit_log.html', logs=logs, next_cursor=next_cursor,
+                           is_first_page=not cursor, clinics_dict=clinics_dict)
+
+
+@admin_bp.route('/audit/actions')
+@login_required
+@read_only
+@admin_required
+def action_audit():
+    """Explorador de auditoría de acciones con filtros y paginación keyset."""
+    filters = {
+        'user_id': request.args.get('user_id', type=int),
+        'clinic_id': request.args.get('clinic_id', type=int) if current_user.is_superuser else current_user.clinic_id,
+        'event_type': request.args.get('event_type', '').strip(),
+        'target_type': request.args.get('target_type', '').strip(),
+        'target_id': request.args.get('target_id', '').strip(),
+        'date_from': request.args.get('date_from', ''),
+        'date_to': request.args.get('date_to', ''),
+    }
+    cursor = request.args.get('cursor')
+    logs, next_cursor = AuditRepository.get_action_logs_page(filters, cursor=cursor, limit=50)
+
+    users_query = User.query
+    if not current_user.is_superuser:
+        users_query = users_query.filter_by(clinic_id=current_user.clinic_id)
+    users = users_query.order_by(User.username).all()
+
+    clinics_dict = {}
+    if current_user.is_superuser:
+        clinics_dict = {clinic.id: clinic.name for clinic in Clinic.query.order_by(Clinic.name).all()}
+
+    # Filtros activos (sin vacíos) para construir los links de paginación
+    active_filters = {k: v for k, v in filters.items() if v}
+    if not current_user.is_superuser:
+        active_filters.pop('clinic_id', None)
+
+    return render_template('admin/action_audit.html',
+                           logs=logs,
+                           next_cursor=next_cursor,
+                           is_first_page=not cursor,
+                           filters=filters,
+                           active_filters=active_filters,
+                           users=users,
+                           clinics_dict=clinics_dict,
+                           target_types=AUDIT_TARGET_TYPES,
+                           event_types=AUDIT_EVENT_TYPES)
 
 
 @admin_bp.route('/exportar')
@@ -759,9 +854,12 @@ def export_page():
 
 @admin_bp.route('/exportar/descargar')
 @login_required
+@read_only
 @superuser_required
 def export_full_database_action():
     """Exports all data from the database to an Excel file, with each table in a separate sheet."""
+    import openpyxl  # import diferido: ver routes/exports.py
+
     try:
         wb = openpyxl.Workbook()
         wb.remove(wb.active)  # Remove default sheet
@@ -889,18 +987,26 @@ def save_color_thresholds():
         threshold.red_threshold_hours = red_hours
         threshold.updated_at = datetime.utcnow()
         threshold.updated_by = current_user.username
+        db.session.flush()
 
-        db.session.commit()
-
-        # Log the action
+        # Log the action (en la misma transacción que el cambio)
         config_type = "global" if clinic_id is None else f"clínica {clinic_id}"
         AuditService.log_action(
             user=current_user,
             action=f"Configuró umbrales de colores ({config_type}): Verde>{green_hours}h, Amarillo>{yellow_hours}h, Rojo<{red_hours}h",
             target_id=str(threshold.id),
-            target_type='UrgencyThreshold'
+            target_type='UrgencyThreshold',
+            event_type=AUDIT_EVENT_THRESHOLDS_UPDATED,
+            payload={
+                'clinic_id': clinic_id,
+                'green': green_hours,
+                'yellow': yellow_hours,
+                'red': red_hours,
+            }
         )
 
+        db.session.commit()
+
         flash('Configuración de umbrales guardada exitosamente.', 'success')
     except Exception as e:
         db.session.rollback()
@@ -915,10 +1021,4 @@ def save_color_thresholds():
 def get_color_thresholds_api():
     """API endpoint to get color thresholds for current user's clinic."""
     clinic_id = current_user.clinic_id if not current_user.is_superuser else request.args.get('clinic_id', type=int)
-    threshold = UrgencyThreshold.get_thresholds_for_clinic(clinic_id)
-
-    return jsonify({
-        'green_threshold_hours': threshold.green_threshold_hours,
-        'yellow_threshold_hours': threshold.yellow_threshold_hours,
-        'red_threshold_hours': threshold.red_threshold_hours
-    })
+    return jsonify(MasterDataService.urgency_thresholds(clinic_id))
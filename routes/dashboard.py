@@ -2,14 +2,17 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from models import Ticket, Surgery, FpaModification, Clinic, Doctor, db, TICKET_STATUS_VIGENTE, TICKET_STATUS_ANULADO
 from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta
 from utils.datetime_utils import utcnow
+from utils.db_routing import read_only
 import json
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
 @dashboard_bp.route('/')
 @login_required
+@read_only
 def index():
     # Only admins and superusers can access the dashboard
     if not (current_user.is_admin() or current_user.is_superuser):
@@ -138,7 +141,8 @@ def index():
     kpis['near_deadline'] = near_deadline
 
     recent_tickets_query = base_query()
-    recent_tickets = recent_tickets_query.order_by(Ticket.created_at.desc()).limit(8).all()
+    recent_tickets = recent_tickets_query.options(joinedload(Ticket.patient))\
+        .order_by(Ticket.created_at.desc()).limit(8).all()
 
     # Get all surgeries for the filter dropdown
     surgeries_query = Surgery.query
@@ -13,15 +13,19 @@ from models import (
     StandardizedReason, Doctor,
     # Issue #54: DischargeTimeSlot eliminado - se usa TimeBlockHelper
     TICKET_STATUS_VIGENTE, REASON_CATEGORY_INITIAL,
-    REASON_CATEGORY_MODIFICATION, REASON_CATEGORY_ANNULMENT
+    REASON_CATEGORY_MODIFICATION, REASON_CATEGORY_ANNULMENT,
+    AUDIT_EVENT_TICKET_FIELD_UPDATED
 )
 from datetime import datetime
-from services import TicketService, FPACalculator, AuditService
+from services import (
+    TicketService, FPACalculator, AuditService, MasterDataService, DischargeForecastService, OccupancyService,
+)
 from repositories import TicketRepository, PatientRepository
 from validators import TicketValidator
 from dto import TicketDTO
-from utils import calculate_time_remaining, utcnow
+from utils import calculate_time_remaining, utcnow, stream_page
 from utils.time_blocks import TimeBlockHelper
+from utils.db_routing import read_only
 
 logger = logging.getLogger(__name__)
 
@@ -96,6 +100,13 @@ def create():
             # We pass this time to the calculator which now handles admission time calculation.
             system_fpa, _ = FPACalculator.calculate(pavilion_end_time, surgery)
 
+            # La previsualización se calcula en el navegador (static/js/fpa_engine.js);
+            # el servidor manda, pero una diferencia delata un motor JS desalineado
+            preview_fpa = request.form.get('preview_fpa')
+            if preview_fpa and preview_fpa != system_fpa.isoformat():
+                logger.warning(f'FPA de previsualización {preview_fpa} distinta de la del sistema '
+                               f'{system_fpa.isoformat()} (cirugía {surgery.id}, hora {pavilion_end_time.isoformat()})')
+
             # Always use the system calculated FPA
             initial_fpa = system_fpa
             current_fpa = system_fpa
@@ -132,45 +143,21 @@ def create():
             return redirect(url_for('tickets.create'))
 
     # GET request - load form data
-    specialties_query = Specialty.query.filter_by(is_active=True)
-    surgeries_query = Surgery.query.filter_by(is_active=True)
-    doctors_query = Doctor.query.filter_by(is_active=True)
-    reasons_query = StandardizedReason.query.filter_by(
-        category=REASON_CATEGORY_INITIAL,
-        is_active=True
-    )
+    form_data = MasterDataService.create_form_data(
+        None if current_user.is_superuser else current_user.clinic_id)
 
-    if not current_user.is_superuser:
-        specialties_query = specialties_query.filter_by(clinic_id=current_user.clinic_id)
-        surgeries_query = surgeries_query.filter_by(clinic_id=current_user.clinic_id)
-        doctors_query = doctors_query.filter_by(clinic_id=current_user.clinic_id)
-        reasons_query = reasons_query.filter_by(clinic_id=current_user.clinic_id)
-
-    specialties = specialties_query.order_by(Specialty.name).all()
-    surgeries = surgeries_query.all()
-    doctors = doctors_query.order_by(Doctor.name).all()
-    initial_reasons = reasons_query.all()
-
-    # Prepare data for JavaScript
-    specialties_data = [{'id': s.id, 'name': s.name, 'clinic_id': s.clinic_id} for s in specialties]
-    surgeries_data = [{'id': s.id, 'name': s.name, 'base_stay_hours': s.base_stay_hours,
-                      'specialty_id': s.specialty_id, 'clinic_id': s.clinic_id} for s in surgeries]
-    doctors_data = [{'id': d.id, 'name': d.name, 'specialty': d.specialty,
-                    'clinic_id': d.clinic_id} for d in doctors]
-    initial_reasons_data = [{'id': r.id, 'reason': r.reason, 'clinic_id': r.clinic_id} for r in initial_reasons]
-
-    return render_template('tickets/create.html',
-                         specialties_data=specialties_data,
-                         surgeries_data=surgeries_data,
-                         doctors_data=doctors_data,
-                         initial_reasons_data=initial_reasons_data,
-                         clinics=clinics)
+    return render_template('tickets/create.html', clinics=clinics, **form_data)
 
 
 @tickets_bp.route('/api/calculate-fpa', methods=['POST'])
 @login_required
 def api_calculate_fpa():
-    """API endpoint to calculate FPA based on surgery and time."""
+    """
+    API endpoint to calculate FPA based on surgery and time.
+
+    The create form computes its preview in the browser (static/js/fpa_engine.js);
+    this endpoint returns the same payload for other clients.
+    """
     data = request.get_json() or {}
     surgery_id = data.get('surgery_id')
     pavilion_end_time_str = data.get('pavilion_end_time')
@@ -212,21 +199,7 @@ def api_calculate_fpa():
 
         pavilion_end_time = datetime.fromisoformat(pavilion_end_time_str)
         # Issue #63: 'pavilion_end_time' here is treated as Surgery Time
-        # We need to get admission time explicitly for the UI
-        admission_time = FPACalculator.calculate_admission_time(pavilion_end_time)
-        system_fpa, _ = FPACalculator.calculate(pavilion_end_time, surgery)
-
-        # Issue #54: Usar TimeBlockHelper en vez de buscar en BD
-        block = TimeBlockHelper.get_block_for_time(system_fpa)
-
-        return jsonify({
-            'fpa_date_iso': system_fpa.date().isoformat(),
-            'fpa_time': system_fpa.strftime('%H:%M'),
-            'fpa_display_str': f"{system_fpa.strftime('%d/%m/%Y')} (Bloque: {block['label']})",
-            'surgery_base_stay_hours': surgery.base_stay_hours,
-            'admission_time_iso': admission_time.isoformat(),
-            'admission_time_display': admission_time.strftime('%d/%m/%Y %H:%M')
-        })
+        return jsonify(FPACalculator.preview(pavilion_end_time, surgery.base_stay_hours))
 
     except Exception as e:
         logger.error(f'Error en cálculo FPA API: {e}', exc_info=True)
@@ -393,31 +366,35 @@ def list():
     sort_by = request.args.get('sort_by', 'created_at')
     sort_dir = request.args.get('sort_dir', 'desc')
 
-    query = TicketRepository.build_filtered_query(filters, current_user)
+    query = TicketRepository.build_filtered_query(filters, current_user, streamed=True)
     query = TicketRepository.apply_sorting(query, sort_by, sort_dir)
 
     total = query.count()
-    tickets = query.offset((page - 1) * per_page).limit(per_page).all()
-
-    # Add time remaining data
-    for ticket in tickets:
-        if ticket.status == 'Vigente' and ticket.current_fpa:
-            ticket.compute_state()
-        else:
-            ticket.time_remaining = None
+    tickets = _list_state(query.offset((page - 1) * per_page).limit(per_page).yield_per(per_page))
 
     surgeries_query = Surgery.query.filter_by(is_active=True)
     if not current_user.is_superuser:
         surgeries_query = surgeries_query.filter_by(clinic_id=current_user.clinic_id)
     surgeries = surgeries_query.all()
 
-    return render_template('tickets/list.html',
-                         tickets=tickets,
-                         surgeries=surgeries,
-                         filters=filters,
-                         page=page,
-                         per_page=per_page,
-                         total=total)
+    return stream_page('tickets/list.html',
+                       tickets=tickets,
+                       has_rows=total > (page - 1) * per_page,
+                       surgeries=surgeries,
+                       filters=filters,
+                       page=page,
+                       per_page=per_page,
+                       total=total)
+
+
+def _list_state(tickets):
+    """Time remaining for vigente tickets, as the rows are fetched."""
+    for ticket in tickets:
+        if ticket.status == 'Vigente' and ticket.current_fpa:
+            ticket.compute_state()
+        else:
+            ticket.time_remaining = None
+        yield ticket
 
 
 @tickets_bp.route('/nursing')
@@ -431,7 +408,7 @@ def nursing_board():
 
     # Filtros para el repositorio (NO incluir status de UI para no interferir con BD)
     filters = {
-        'status': '',  # No filtrar por status de BD, lo hacemos después
+        'status': '',  # No filtrar por status de BD: el filtro de UI va por urgencia (board_query)
         'search': request.args.get('search', ''),
         'room': request.args.get('room', ''),
         'urgency': '',
@@ -445,66 +422,12 @@ def nursing_board():
     sort_by = request.args.get('sort_by', 'discharge_date')
     sort_dir = request.args.get('sort_dir', 'desc')
 
-    query = TicketRepository.build_filtered_query(filters, current_user)
-
-    # Apply sorting based on parameters
-    if sort_by == 'created_at':
-        if sort_dir == 'asc':
-            query = query.order_by(Ticket.created_at.asc())
-        else:
-            query = query.order_by(Ticket.created_at.desc())
-    else:  # Default to discharge_date (current_fpa)
-        if sort_dir == 'asc':
-            query = query.order_by(Ticket.current_fpa.asc())
-        else:
-            query = query.order_by(Ticket.current_fpa.desc())
-
-    tickets = query.all()
-
-    # Calculate urgency levels using centralized method
-    for ticket in tickets:
-        ticket.compute_state()
-
-    # Sort by urgency
-    urgency_priority = {'normal': 0, 'warning': 1, 'critical': 2, 'scheduled': 3, 'expired': 4, 'unknown': 5}
-    tickets.sort(key=lambda t: (urgency_priority.get(t.urgency_level, 99),
-                               t.current_fpa if t.current_fpa else datetime.max))
-
-    # Calculate stats BEFORE filtering (para mostrar totales correctos)
-    all_tickets_stats = {
-        'total': len(tickets),
-        'critical': len([t for t in tickets if t.urgency_level == 'critical']),
-        'warning': len([t for t in tickets if t.urgency_level == 'warning']),
-        'normal': len([t for t in tickets if t.urgency_level == 'normal']),
-        'expired': len([t for t in tickets if t.urgency_level == 'expired']),
-        'scheduled': len([t for t in tickets if t.urgency_level == 'scheduled']),
-        'annulled': len([t for t in tickets if t.status == 'Anulado']),
-        'without_episode': len([t for t in tickets if 
-                                (not t.patient.episode_id or t.patient.episode_id.strip() == '') and 
-                                t.status != 'Anulado' and 
-                                t.urgency_level in ['normal', 'warning', 'critical', 'scheduled', 'expired']])
-    }
-
-    # Filter by UI status type (nuevo sistema simplificado)
-    if ui_status_filter == 'Vigente':
-        # Vigentes = normal + warning + critical + scheduled (todos menos expired y anulados)
-        tickets = [t for t in tickets if t.urgency_level in ['normal', 'warning', 'critical', 'scheduled'] and t.status != 'Anulado']
-    elif ui_status_filter == 'Vencido':
-        # Vencidos = expired (no anulados)
-        tickets = [t for t in tickets if t.urgency_level == 'expired' and t.status != 'Anulado']
-    elif ui_status_filter == 'Anulado':
-        # Anulados por status del ticket
-        tickets = [t for t in tickets if t.status == 'Anulado']
-    elif ui_status_filter == 'SinEpisodio':
-        # Sin ID de episodio: programados, vigentes o vencidos (no anulados)
-        tickets = [t for t in tickets if 
-                   (not t.patient.episode_id or t.patient.episode_id.strip() == '') and 
-                   t.status != 'Anulado' and 
-                   t.urgency_level in ['normal', 'warning', 'critical', 'scheduled', 'expired']]
-    # Si es 'Todos' o vacío, no filtrar
-
-    # Stats para el template
-    stats = all_tickets_stats
+    # Urgencia, filtro de UI, orden y contadores se resuelven en SQL: las tarjetas se
+    # envían en su orden final a medida que llegan las filas (stream_page)
+    now = utcnow()
+    stats = TicketRepository.board_stats(filters, current_user, ui_status_filter, now)
+    tickets = _board_state(
+        TicketRepository.board_query(filters, current_user, ui_status_filter, sort_by, sort_dir, now))
 
     # Issue #88: Get all clinics for the filter dropdown (for superusers only)
     clinics = []
@@ -521,14 +444,52 @@ def nursing_board():
     filters['status'] = ui_status_filter
     filters['surgery_id'] = request.args.get('surgery_id', '')
 
-    return render_template('tickets/nursing_board.html',
-                         tickets=tickets,
-                         filters=filters,
-                         stats=stats,
-                         clinics=clinics,
-                         surgeries=surgeries,
-                         sort_by=sort_by,
-                         sort_dir=sort_dir)
+    return stream_page('tickets/nursing_board.html',
+                       tickets=tickets,
+                       filters=filters,
+                       stats=stats,
+                       clinics=clinics,
+                       surgeries=surgeries,
+                       sort_by=sort_by,
+                       sort_dir=sort_dir)
+
+
+def _board_state(tickets):
+    """Computes each ticket's state as the rows are fetched (during the streamed render)."""
+    for ticket in tickets:
+        yield ticket.compute_state()
+
+
+@tickets_bp.route('/api/discharge-forecast')
+@login_required
+@read_only
+def api_discharge_forecast():
+    """Altas esperadas por bloque de 2 horas y ubicación (mapa de calor del tablero)."""
+    clinic_id = current_user.clinic_id if not current_user.is_superuser else request.args.get('clinic_id', type=int)
+    hours = min(max(request.args.get('hours', 72, type=int), 1), 168)
+    return jsonify(DischargeForecastService.forecast(clinic_id, hours=hours))
+
+
+@tickets_bp.route('/api/occupancy')
+@login_required
+@read_only
+def api_occupancy():
+    """
+    Pacientes en la clínica: ?at=<ISO> (por defecto ahora) o un rango
+    ?start=<ISO>&end=<ISO> con ingresos, altas y peak por ubicación.
+    """
+    clinic_id = current_user.clinic_id if not current_user.is_superuser else request.args.get('clinic_id', type=int)
+    try:
+        at = request.args.get('at')
+        start, end = request.args.get('start'), request.args.get('end')
+        if start or end:
+            start, end = datetime.fromisoformat(start), datetime.fromisoformat(end)
+            if end <= start:
+                return jsonify({'error': 'end debe ser posterior a start'}), 400
+            return jsonify(OccupancyService.report(clinic_id, start, end))
+        return jsonify(OccupancyService.at(clinic_id, datetime.fromisoformat(at) if at else utcnow()))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Fechas en formato ISO: at, o start y end'}), 400
 
 
 @tickets_bp.route('/nursing-list')
@@ -646,7 +607,9 @@ def api_update_bed_location():
             user=current_user,
             action=f"Actualizó {field_label} a: {display_value}",
             target_id=ticket_id,
-            target_type='Ticket'
+            target_type='Ticket',
+            event_type=AUDIT_EVENT_TICKET_FIELD_UPDATED,
+            payload={'field': field, 'value': value or None}
         )
         db.session.commit()
 
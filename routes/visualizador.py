@@ -3,12 +3,14 @@ from flask_login import login_required, current_user
 from models import db, Ticket, Patient, Surgery, Clinic
 from datetime import datetime
 from sqlalchemy import or_
+from utils.db_routing import read_only
 from .utils import _build_tickets_query, calculate_time_remaining, apply_sorting_to_query
 
 visualizador_bp = Blueprint('visualizador', __name__, url_prefix='/visualizador')
 
 @visualizador_bp.route('/dashboard')
 @login_required
+@read_only
 def dashboard():
     if not (current_user.role in ['admin', 'visualizador'] or current_user.is_superuser):
         return "Acceso no autorizado", 403
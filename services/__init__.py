@@ -10,6 +10,12 @@ from .ticket_service import TicketService
 from .audit_service import AuditService
 from .user_service import UserService
 from .patient_service import PatientService
+from .user_cache import UserCache
+from .master_data import MasterDataService
+from .fpa_recalc import FpaRecalcService, FpaRecalcResult, FpaChange
+from .fpa_simulation import FpaSimulationService, BedNightsWhatIf
+from .discharge_forecast import DischargeForecastService
+from .occupancy import OccupancyService, OccupancyIndex
 
 __all__ = [
     'FPACalculator',
@@ -17,4 +23,14 @@ __all__ = [
     'AuditService',
     'UserService',
     'PatientService',
+    'UserCache',
+    'MasterDataService',
+    'FpaRecalcService',
+    'FpaRecalcResult',
+    'FpaChange',
+    'FpaSimulationService',
+    'BedNightsWhatIf',
+    'DischargeForecastService',
+    'OccupancyService',
+    'OccupancyIndex',
 ]
@@ -3,22 +3,114 @@ Audit Service - Business logic for audit logging
 
 This service centralizes all audit logging functionality.
 """
-from models import db, ActionAudit
+import re
+from datetime import datetime
+from sqlalchemy import bindparam, update
+from models import (
+    db, ActionAudit,
+    AUDIT_EVENT_TICKET_CREATED, AUDIT_EVENT_FPA_MODIFIED, AUDIT_EVENT_TICKET_ANNULLED,
+    AUDIT_EVENT_TICKET_RESTORED, AUDIT_EVENT_TICKET_EDITED, AUDIT_EVENT_PATIENT_EDITED,
+    AUDIT_EVENT_TICKET_FIELD_UPDATED, AUDIT_EVENT_USER_ACTIVATED, AUDIT_EVENT_USER_DEACTIVATED,
+    AUDIT_EVENT_THRESHOLDS_UPDATED, AUDIT_EVENT_OTHER,
+)
+
+
+# Formatos de texto libre históricos (antes de event_type/payload).
+# Solo se usan para el backfill de filas antiguas.
+_LEGACY_PATTERNS = (
+    (AUDIT_EVENT_TICKET_CREATED, re.compile(r'^Creó ticket para paciente (?P<patient_name>.+)$', re.S)),
+    (AUDIT_EVENT_FPA_MODIFIED, re.compile(
+        r'^Modificó FPA de (?P<previous_fpa>.+?) a (?P<new_fpa>\d{4}-\d{2}-\d{2}[ T][\d:.]+)\. Razón: (?P<reason>.*)$', re.S)),
+    (AUDIT_EVENT_TICKET_ANNULLED, re.compile(r'^Anuló ticket\. Razón: (?P<reason>.*)$', re.S)),
+    (AUDIT_EVENT_TICKET_RESTORED, re.compile(r'^Restauró ticket anulado$')),
+    (AUDIT_EVENT_PATIENT_EDITED, re.compile(r'^Editó paciente: (?P<changes>.*)$', re.S)),
+    (AUDIT_EVENT_TICKET_EDITED, re.compile(r'^Editó ticket: (?P<changes>.*)$', re.S)),
+    (AUDIT_EVENT_TICKET_FIELD_UPDATED, re.compile(r'^Actualizó (?P<field>cama|ubicación|ID episodio) a: (?P<value>.*)$', re.S)),
+    (AUDIT_EVENT_USER_DEACTIVATED, re.compile(r'^Desactivó usuario (?P<username>.+)$')),
+    (AUDIT_EVENT_USER_ACTIVATED, re.compile(r'^Activó usuario (?P<username>.+)$')),
+    (AUDIT_EVENT_THRESHOLDS_UPDATED, re.compile(
+        r'^Configuró umbrales de colores \((?P<scope>[^)]+)\): '
+        r'Verde>(?P<green>\d+)h, Amarillo>(?P<yellow>\d+)h, Rojo<(?P<red>\d+)h$')),
+)
+
+# "Campo de 'viejo' a 'nuevo'" dentro de los mensajes de edición
+_LEGACY_CHANGE_RE = re.compile(r"(?P<field>[^,']+?) de '(?P<old>[^']*)' a '(?P<new>[^']*)'")
+
+_LEGACY_FIELD_NAMES = {
+    'cama': 'bed_number',
+    'ubicación': 'location',
+    'ID episodio': 'episode_id',
+}
+
+# Textos que routes/tickets.py mostraba en lugar de un valor vacío (el payload en vivo guarda None)
+_LEGACY_EMPTY_VALUES = ('Sin asignar', 'Sin especificar')
+
+# "(global)" o "(clínica N)" en el mensaje de umbrales
+_LEGACY_CLINIC_SCOPE_RE = re.compile(r'^clínica (?P<clinic_id>\d+)$')
+
+# Etiquetas de los mensajes "Editó paciente/ticket" (routes/admin.py) -> claves de fields_changed
+_LEGACY_CHANGE_FIELDS = {
+    'RUT': 'rut',
+    'Primer Nombre': 'primer_nombre',
+    'Segundo Nombre': 'segundo_nombre',
+    'Apellido Paterno': 'apellido_paterno',
+    'Apellido Materno': 'apellido_materno',
+    'Edad': 'age',
+    'Sexo': 'sex',
+    'ID Episodio': 'episode_id',
+    'Habitación/Cama': 'bed_number',
+    'Cirugía ID': 'surgery_id',
+    'Doctor ID': 'doctor_id',
+}
+_LEGACY_INTEGER_FIELDS = ('age', 'surgery_id', 'doctor_id')
+
+
+def _legacy_datetime_to_iso(value):
+    """Convierte el str() de un datetime al formato ISO usado en los payloads."""
+    try:
+        return datetime.fromisoformat(value.strip()).isoformat()
+    except ValueError:
+        return value
+
+
+def _legacy_change_value(field, value):
+    """Valor de un cambio como en el payload en vivo: str(None) -> None, ids y edad como int."""
+    if value == 'None' or (field == 'episode_id' and value == ''):
+        return None
+    if field in _LEGACY_INTEGER_FIELDS:
+        try:
+            return int(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _legacy_changes(changes):
+    """fields_changed de un mensaje de edición, con las claves del payload en vivo."""
+    fields_changed = {}
+    for m in _LEGACY_CHANGE_RE.finditer(changes):
+        label = m.group('field').strip()
+        field = _LEGACY_CHANGE_FIELDS.get(label, label)
+        fields_changed[field] = [_legacy_change_value(field, m.group('old')),
+                                 _legacy_change_value(field, m.group('new'))]
+    return fields_changed
 
 
 class AuditService:
     """Service for logging user actions and maintaining audit trail."""
 
     @staticmethod
-    def log_action(user, action, target_id=None, target_type=None):
+    def log_action(user, action, target_id=None, target_type=None, event_type=None, payload=None):
         """
         Logs an action performed by a user.
 
         Args:
             user: User model instance (must be authenticated)
-            action (str): Description of the action performed
+            action (str): Human-readable description of the action performed
             target_id (str, optional): ID of the target entity
             target_type (str, optional): Type of the target entity (e.g., 'Ticket', 'User')
+            event_type (str, optional): One of AUDIT_EVENT_TYPES (defaults to 'other')
+            payload (dict, optional): Structured, JSON-serializable event data
 
         Returns:
             ActionAudit: The created audit log entry
@@ -32,7 +124,100 @@ class AuditService:
             clinic_id=user.clinic_id,
             action=action,
             target_id=str(target_id) if target_id else None,
-            target_type=target_type
+            target_type=target_type,
+            event_type=event_type or AUDIT_EVENT_OTHER,
+            payload=payload
         )
         db.session.add(log_entry)
         return log_entry
+
+    @staticmethod
+    def parse_legacy_action(action):
+        """
+        Derives (event_type, payload) from a legacy free-text action.
+
+        Args:
+            action (str): Text stored in ActionAudit.action
+
+        The payload has the same keys the live writer stores for that
+        event_type; values the text never carried are None.
+
+        Returns:
+            tuple: (event_type, payload); unknown texts map to ('other', None)
+        """
+        for event_type, pattern in _LEGACY_PATTERNS:
+            match = pattern.match(action or '')
+            if not match:
+                continue
+            data = match.groupdict()
+
+            if event_type == AUDIT_EVENT_TICKET_CREATED:
+                # El texto solo traía el nombre del paciente
+                data = {'patient_id': None, 'surgery_id': None, 'initial_fpa': None, 'overnight_stays': None}
+            elif event_type == AUDIT_EVENT_FPA_MODIFIED:
+                data['previous_fpa'] = _legacy_datetime_to_iso(data['previous_fpa'])
+                data['new_fpa'] = _legacy_datetime_to_iso(data['new_fpa'])
+                data['justification'] = None
+            elif event_type in (AUDIT_EVENT_PATIENT_EDITED, AUDIT_EVENT_TICKET_EDITED):
+                data = {'fields_changed': _legacy_changes(data['changes'])}
+            elif event_type == AUDIT_EVENT_TICKET_FIELD_UPDATED:
+                data['field'] = _LEGACY_FIELD_NAMES[data['field']]
+                if data['value'] in _LEGACY_EMPTY_VALUES:
+                    data['value'] = None
+            elif event_type == AUDIT_EVENT_THRESHOLDS_UPDATED:
+                scope = data.pop('scope')
+                clinic_match = _LEGACY_CLINIC_SCOPE_RE.match(scope)
+                data = {
+                    'clinic_id': int(clinic_match.group('clinic_id')) if clinic_match else None,
+                    **{key: int(data[key]) for key in ('green', 'yellow', 'red')},
+                }
+
+            return event_type, (data or None)
+
+        return AUDIT_EVENT_OTHER, None
+
+    @staticmethod
+    def backfill_event_types(batch_size=1000):
+        """
+        Fills event_type/payload for rows written before structured events existed.
+
+        Walks the table by primary key in batches and commits after each one,
+        so it can be interrupted and resumed safely.
+
+        Args:
+            batch_size (int): Rows parsed and updated per transaction
+
+        Returns:
+            int: Number of rows updated
+        """
+        table = ActionAudit.__table__
+        stmt = (
+            update(table)
+            .where(table.c.id == bindparam('row_id'))
+            .values(event_type=bindparam('new_event_type'), payload=bindparam('new_payload'))
+        )
+
+        updated = 0
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                db.select(table.c.id, table.c.action)
+                .where(table.c.event_type.is_(None), table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+
+            params = []
+            for row_id, action in rows:
+                event_type, payload = AuditService.parse_legacy_action(action)
+                params.append({'row_id': row_id, 'new_event_type': event_type, 'new_payload': payload})
+
+            db.session.connection().execute(stmt, params)
+            db.session.commit()
+
+            updated += len(rows)
+            last_id = rows[-1][0]
+
+        return updated
@@ -0,0 +1,114 @@
+"""
+Discharge Forecast Service - Expected discharges per 2-hour block
+
+Counts the vigente tickets whose current FPA falls in each TimeBlockHelper
+block over the next hours, per location, for the nursing board heatmap.
+
+The bucketing runs in SQL: a ticket belongs to the block that ends at its FPA
+rounded to the nearest hour (TimeBlockHelper.get_block_for_time), which is
+`(epoch_seconds(current_fpa) + 1800) // 3600` as an hour number. One GROUP BY
+returns at most (hours + 1) x locations rows, whatever the number of tickets.
+Results are cached per clinic for a short TTL and invalidated on commit by
+ticket writes (cache/invalidation.py); they are read from the primary, whose
+commits drive that invalidation.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, func, select
+
+from cache import cached, clinic_namespace
+from models import db, Ticket, TICKET_STATUS_VIGENTE
+from utils.datetime_utils import utcnow
+from utils.db_routing import primary_bind
+from utils.sql_time import epoch_seconds
+from utils.time_blocks import TimeBlockHelper
+
+FORECAST_HOURS = 72
+FORECAST_TTL = 60
+
+# Ubicación de los tickets sin ubicación asignada
+NO_LOCATION = 'Sin ubicación'
+
+# Bucket de las altas vencidas (FPA antes del primer bloque)
+_OVERDUE = -1
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class DischargeForecastService:
+    """Discharge forecast by time block and location."""
+
+    @staticmethod
+    def forecast(clinic_id=None, hours=FORECAST_HOURS, now=None):
+        """
+        Expected discharges per 2-hour block from the current hour on.
+
+        The first block ends at the current hour; the window moves (and the
+        cache key changes) once per hour.
+
+        Args:
+            clinic_id (int, optional): Clinic to forecast (None = all clinics, for superusers)
+            hours (int): Number of blocks (one per block end hour)
+            now (datetime, optional): Reference time (default utcnow)
+
+        Returns:
+            dict: start, hours, blocks (end hours), labels, locations,
+                counts ([location][block]), overdue (per location), totals (per block), total
+        """
+        start = (now or utcnow()).replace(minute=0, second=0, microsecond=0)
+        return DischargeForecastService._matrix(clinic_id, start, hours)
+
+    @staticmethod
+    def forecast_query(clinic_id, start, hours):
+        """
+        (block, location, tickets) rows: block is the index of the block from
+        `start` (an exact hour), or -1 for overdue FPAs.
+        """
+        # FPA en [start - 30min, start + hours - 30min) redondea a las horas start .. start + hours - 1
+        lower = start - timedelta(minutes=30)
+        upper = lower + timedelta(hours=hours)
+        first_hour = int((start - _EPOCH).total_seconds()) // 3600
+        block = case((Ticket.current_fpa < lower, _OVERDUE),
+                     else_=(epoch_seconds(Ticket.current_fpa) + 1800) // 3600 - first_hour)
+
+        query = (
+            select(block.label('block'), Ticket.location, func.count().label('tickets'))
+            .where(Ticket.status == TICKET_STATUS_VIGENTE, Ticket.current_fpa < upper)
+            .group_by(block, Ticket.location)
+        )
+        if clinic_id is not None:
+            query = query.where(Ticket.clinic_id == clinic_id)
+        return query
+
+    @staticmethod
+    @cached('discharge_forecast', namespace=lambda clinic_id, start, hours: clinic_namespace(clinic_id, 'tickets'),
+            ttl=FORECAST_TTL)
+    def _matrix(clinic_id, start, hours):
+        rows = db.session.execute(DischargeForecastService.forecast_query(clinic_id, start, hours),
+                                  bind_arguments=primary_bind(db)).all()
+
+        locations = sorted({row.location or NO_LOCATION for row in rows}, key=lambda name: (name == NO_LOCATION, name))
+        index = {name: i for i, name in enumerate(locations)}
+        counts = [[0] * hours for _ in locations]
+        overdue = [0] * len(locations)
+        for row in rows:
+            i = index[row.location or NO_LOCATION]
+            if row.block == _OVERDUE:
+                overdue[i] += row.tickets
+            else:
+                counts[i][row.block] += row.tickets
+
+        block_hours = [(start + timedelta(hours=h)).hour for h in range(hours)]
+        totals = [sum(column) for column in zip(*counts)] if counts else [0] * hours
+        return {
+            'clinic_id': clinic_id,
+            'start': start.isoformat(),
+            'hours': hours,
+            'blocks': block_hours,
+            'labels': [TimeBlockHelper.get_block_label(hour) for hour in block_hours],
+            'locations': locations,
+            'counts': counts,
+            'overdue': overdue,
+            'totals': totals,
+            'total': sum(totals),
+        }
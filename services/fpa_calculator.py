@@ -7,10 +7,17 @@ should be discharged based on surgery type, pavilion end time, and other factors
 from datetime import timedelta
 from typing import Tuple
 
+from utils.time_blocks import TimeBlockHelper
+
 
 class FPACalculator:
     """Service for calculating FPA and overnight stays for patients."""
 
+    # Reglas de ingreso; rules() las exporta al motor del navegador (static/js/fpa_engine.js)
+    ADMISSION_LEAD_MINUTES = 120
+    EARLY_SURGERY_TIME = (8, 0)
+    EARLY_ADMISSION_TIME = (6, 30)
+
     @staticmethod
     def calculate_admission_time(surgery_time):
         """
@@ -19,11 +26,12 @@ class FPACalculator:
         Excepción: Si cirugía es a las 08:00, ingreso es a las 06:30.
         """
         # Excepción: Cirugía a las 08:00 AM (con tolerancia de +/- 5 min si es necesario, pero seremos estrictos por ahora)
-        if surgery_time.hour == 8 and surgery_time.minute == 0:
-            return surgery_time.replace(hour=6, minute=30)
+        if (surgery_time.hour, surgery_time.minute) == FPACalculator.EARLY_SURGERY_TIME:
+            hour, minute = FPACalculator.EARLY_ADMISSION_TIME
+            return surgery_time.replace(hour=hour, minute=minute)
         
         # Regla General: 2 horas antes
-        return surgery_time - timedelta(hours=2)
+        return surgery_time - timedelta(minutes=FPACalculator.ADMISSION_LEAD_MINUTES)
 
     @staticmethod
     def calculate(surgery_time, surgery) -> Tuple[object, int]:
@@ -79,3 +87,100 @@ class FPACalculator:
         overnight_stays = max(0, days_diff)
 
         return fpa, overnight_stays
+
+    @staticmethod
+    def rules():
+        """
+        FPA rule parameters for the browser preview engine (static/js/fpa_engine.js).
+
+        Shipped with the master data of the ticket form, so the preview is
+        computed client-side; tests/data/fpa_golden_vectors.json keeps both
+        implementations identical.
+
+        Returns:
+            dict: admission lead, 08:00 exception and time block parameters
+        """
+        return {
+            'admission_lead_minutes': FPACalculator.ADMISSION_LEAD_MINUTES,
+            'early_surgery_time': list(FPACalculator.EARLY_SURGERY_TIME),
+            'early_admission_time': list(FPACalculator.EARLY_ADMISSION_TIME),
+            'block_hours': TimeBlockHelper.BLOCK_HOURS,
+            'block_round_up_minute': TimeBlockHelper.ROUND_UP_MINUTE,
+        }
+
+    @staticmethod
+    def preview(surgery_time, base_stay_hours):
+        """
+        FPA preview shown by the ticket form (same fields as FpaEngine.preview in JS).
+
+        Args:
+            surgery_time (datetime): Scheduled time for the surgery
+            base_stay_hours (int): Base stay hours of the surgery
+
+        Returns:
+            dict: fpa_iso, fpa_date_iso, fpa_time, fpa_display_str, surgery_base_stay_hours,
+                overnight_stays, block_value, admission_time_iso, admission_time_display
+        """
+        from models import Surgery
+
+        admission_time = FPACalculator.calculate_admission_time(surgery_time)
+        fpa, overnight_stays = FPACalculator.calculate(surgery_time, Surgery(base_stay_hours=base_stay_hours))
+        block = TimeBlockHelper.get_block_for_time(fpa)
+        return {
+            'fpa_iso': fpa.isoformat(),
+            'fpa_date_iso': fpa.date().isoformat(),
+            'fpa_time': fpa.strftime('%H:%M'),
+            'fpa_display_str': f"{fpa.strftime('%d/%m/%Y')} (Bloque: {block['label']})",
+            'surgery_base_stay_hours': base_stay_hours,
+            'overnight_stays': overnight_stays,
+            'block_value': block['value'],
+            'admission_time_iso': admission_time.isoformat(),
+            'admission_time_display': admission_time.strftime('%d/%m/%Y %H:%M'),
+        }
+
+    @staticmethod
+    def calculate_many(surgery_times, base_stay_hours):
+        """
+        Vectorized calculate() over NumPy datetime64 arrays.
+
+        Applies the same rules as calculate() (admission time, round up to the
+        next full hour, overnight stays as calendar-day difference) to whole
+        arrays at once, for bulk recalculation and what-if simulations over the
+        ticket history. NumPy is imported on the first call, not at app boot.
+
+        Args:
+            surgery_times (array-like): Pavilion end times (datetimes or datetime64)
+            base_stay_hours (int or array-like): Base stay hours, one value or one per time
+
+        Returns:
+            tuple: (fpa datetime64[us] array, overnight_stays int64 array)
+        """
+        import numpy as np
+
+        if isinstance(surgery_times, np.ndarray):
+            times = surgery_times.astype('datetime64[us]')
+        else:
+            # fromiter evita la lista intermedia de objetos de np.asarray (~30% más rápido)
+            times = np.fromiter(surgery_times, dtype='datetime64[us]')
+        hours = np.asarray(base_stay_hours, dtype='int64')
+        one_hour = np.timedelta64(1, 'h')
+
+        # 1. Ingreso: -2h, salvo cirugía a las 08:00 (cualquier segundo) -> 06:30
+        early_surgery = 60 * FPACalculator.EARLY_SURGERY_TIME[0] + FPACalculator.EARLY_SURGERY_TIME[1]
+        early_lead = early_surgery - 60 * FPACalculator.EARLY_ADMISSION_TIME[0] - FPACalculator.EARLY_ADMISSION_TIME[1]
+        time_of_day = times - times.astype('datetime64[D]')
+        at_eight = ((time_of_day >= np.timedelta64(early_surgery, 'm'))
+                    & (time_of_day < np.timedelta64(early_surgery + 1, 'm')))
+        admission = times - np.where(at_eight, np.timedelta64(early_lead, 'm'),
+                                     np.timedelta64(FPACalculator.ADMISSION_LEAD_MINUTES, 'm'))
+
+        # 2. FPA base
+        fpa = admission + hours * one_hour
+
+        # 3. Redondeo hacia arriba si hay minutos o segundos (los microsegundos solo se truncan)
+        floored = fpa.astype('datetime64[h]').astype('datetime64[us]')
+        fpa = floored + np.where(fpa - floored >= np.timedelta64(1, 's'), one_hour, np.timedelta64(0, 'h'))
+
+        # 4. Noches: diferencia de días calendario entre ingreso y FPA
+        days = (fpa.astype('datetime64[D]') - admission.astype('datetime64[D]')).astype('int64')
+        return fpa, np.maximum(days, 0)
@@ -0,0 +1,231 @@
+"""
+FPA Recalculation Service - Bulk recalculation after a surgery change
+
+Tickets store the system FPA computed when they were created. When a
+surgery's `base_stay_hours` changes, its vigente tickets keep the stale value.
+This service recomputes them set-wise: tickets are read as plain column
+values in keyset batches, recalculated with FPACalculator.calculate_many and
+written with one UPDATE ... RETURNING per batch and kind of change, with a
+single audit entry for the run.
+
+What is updated per ticket:
+    - system_calculated_fpa and surgery_base_hours_snapshot, always.
+    - current_fpa and overnight_stays only for tickets that still follow the
+      system FPA (current_fpa == system_calculated_fpa and no FpaModification).
+      A medical decision is never overwritten.
+
+The UPDATE of a ticket that follows the system FPA is guarded by its
+current_fpa, so a concurrent FPA modification wins over the recalculation;
+only the rows returned by the UPDATEs are counted and audited.
+The Core UPDATEs bypass the ORM cache invalidation, so the affected clinics'
+ticket namespaces are invalidated explicitly on commit.
+"""
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import case, exists, select, update
+
+from cache import clinic_namespaces, invalidate_on_commit
+from models import (
+    db, Ticket, FpaModification, TICKET_STATUS_VIGENTE, AUDIT_EVENT_FPA_RECALCULATED,
+)
+from .audit_service import AuditService
+from .fpa_calculator import FPACalculator
+
+
+@dataclass
+class FpaChange:
+    """Recalculated values of one ticket."""
+    ticket_id: str
+    old_system_fpa: Optional[datetime]
+    new_system_fpa: datetime
+    old_current_fpa: datetime
+    new_current_fpa: datetime
+    old_overnight_stays: int
+    new_overnight_stays: int
+    follows_system: bool
+
+    def to_row(self):
+        """Compact JSON row for the audit payload."""
+        return [self.ticket_id,
+                self.old_system_fpa.isoformat() if self.old_system_fpa else None,
+                self.new_system_fpa.isoformat(),
+                self.old_current_fpa.isoformat(),
+                self.new_current_fpa.isoformat(),
+                self.old_overnight_stays,
+                self.new_overnight_stays]
+
+
+@dataclass
+class FpaRecalcResult:
+    """Outcome of a recalculation (or its preview when applied is False)."""
+    surgery_id: int
+    surgery_name: str
+    base_stay_hours: int
+    scanned: int = 0
+    changes: List[FpaChange] = field(default_factory=list)
+    applied: bool = False
+    seconds: float = 0.0
+
+    @property
+    def current_fpa_changes(self):
+        """Changes that also move the ticket's current FPA."""
+        return [change for change in self.changes if change.follows_system]
+
+    def to_payload(self):
+        return {
+            'surgery_id': self.surgery_id,
+            'base_stay_hours': self.base_stay_hours,
+            'scanned': self.scanned,
+            'updated': len(self.changes),
+            'current_fpa_updated': len(self.current_fpa_changes),
+            'columns': ['ticket_id', 'old_system_fpa', 'new_system_fpa', 'old_current_fpa',
+                        'new_current_fpa', 'old_overnight_stays', 'new_overnight_stays'],
+            'changes': [change.to_row() for change in self.changes],
+        }
+
+
+class FpaRecalcService:
+    """Set-based recalculation of the system FPA of a surgery's vigente tickets."""
+
+    BATCH_SIZE = 1000
+
+    @staticmethod
+    def _batches(surgery_id, clinic_id=None, batch_size=None):
+        """Yield lists of ticket rows (keyset pagination by ticket id)."""
+        batch_size = batch_size or FpaRecalcService.BATCH_SIZE
+        modified = exists().where(FpaModification.ticket_id == Ticket.id)
+        query = (
+            select(Ticket.id, Ticket.clinic_id, Ticket.pavilion_end_time, Ticket.system_calculated_fpa,
+                   Ticket.current_fpa, Ticket.overnight_stays, modified.label('modified'))
+            .where(Ticket.surgery_id == surgery_id, Ticket.status == TICKET_STATUS_VIGENTE)
+            .order_by(Ticket.id)
+            .limit(batch_size)
+        )
+        if clinic_id is not None:
+            query = query.where(Ticket.clinic_id == clinic_id)
+
+        last_id = None
+        while True:
+            page = query if last_id is None else query.where(Ticket.id > last_id)
+            rows = db.session.execute(page).all()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1].id
+
+    @staticmethod
+    def _diff(rows, base_stay_hours):
+        """FpaChange for every row whose recalculated values differ."""
+        fpas, nights = FPACalculator.calculate_many([row.pavilion_end_time for row in rows], base_stay_hours)
+        changes = []
+        for row, fpa, overnight_stays in zip(rows, fpas.tolist(), nights.tolist()):
+            follows_system = (not row.modified and row.system_calculated_fpa is not None
+                              and row.current_fpa == row.system_calculated_fpa)
+            new_current = fpa if follows_system else row.current_fpa
+            new_overnight = overnight_stays if follows_system else row.overnight_stays
+            if (fpa, new_current, new_overnight) == (row.system_calculated_fpa, row.current_fpa, row.overnight_stays):
+                continue
+            changes.append(FpaChange(row.id, row.system_calculated_fpa, fpa, row.current_fpa, new_current,
+                                     row.overnight_stays, new_overnight, follows_system))
+        return changes
+
+    @staticmethod
+    def _write(changes, base_stay_hours):
+        """
+        Write one batch of changes with one UPDATE ... RETURNING per kind of change.
+
+        Per-ticket values go in CASE expressions keyed by id, so each kind is a
+        single statement whose RETURNING tells which guarded rows were written.
+
+        Returns:
+            set: Ids of the tickets actually updated
+        """
+        table = Ticket.__table__
+        vigente = table.c.status == TICKET_STATUS_VIGENTE
+
+        def by_id(changes, attr):
+            return case({c.ticket_id: getattr(c, attr) for c in changes}, value=table.c.id)
+
+        system_changes = [c for c in changes if not c.follows_system]
+        following_changes = [c for c in changes if c.follows_system]
+        connection = db.session.connection()
+        written = set()
+        if system_changes:
+            system_only = (
+                update(table)
+                .where(table.c.id.in_([c.ticket_id for c in system_changes]), vigente)
+                .values(system_calculated_fpa=by_id(system_changes, 'new_system_fpa'),
+                        surgery_base_hours_snapshot=base_stay_hours)
+                .returning(table.c.id)
+            )
+            written.update(connection.execute(system_only).scalars())
+        if following_changes:
+            new_fpa = by_id(following_changes, 'new_system_fpa')
+            following = (
+                update(table)
+                .where(table.c.id.in_([c.ticket_id for c in following_changes]), vigente,
+                       table.c.current_fpa == by_id(following_changes, 'old_current_fpa'))
+                .values(system_calculated_fpa=new_fpa,
+                        current_fpa=new_fpa,
+                        overnight_stays=by_id(following_changes, 'new_overnight_stays'),
+                        surgery_base_hours_snapshot=base_stay_hours)
+                .returning(table.c.id)
+            )
+            written.update(connection.execute(following).scalars())
+        return written
+
+    @staticmethod
+    def recalculate(surgery, user=None, dry_run=False, clinic_id=None, batch_size=None):
+        """
+        Recompute the system FPA of a surgery's vigente tickets.
+
+        The caller commits (or rolls back) the session, as with the other
+        ticket services.
+
+        Args:
+            surgery (Surgery): Surgery whose parameters changed
+            user: User performing the recalculation (audit entry); required unless dry_run
+            dry_run (bool): Only compute the differences, write nothing
+            clinic_id (int, optional): Restrict to one clinic's tickets
+            batch_size (int, optional): Tickets read and written per batch
+
+        Returns:
+            FpaRecalcResult
+        """
+        if not dry_run and user is None:
+            raise ValueError('A user is required to apply a recalculation (audit entry)')
+
+        started = time.perf_counter()
+        result = FpaRecalcResult(surgery.id, surgery.name, surgery.base_stay_hours)
+        clinic_ids = set()
+        for rows in FpaRecalcService._batches(surgery.id, clinic_id=clinic_id, batch_size=batch_size):
+            result.scanned += len(rows)
+            changes = FpaRecalcService._diff(rows, surgery.base_stay_hours)
+            if changes and not dry_run:
+                # Rows whose guard failed (changed meanwhile) are left out of the count and the audit
+                written = FpaRecalcService._write(changes, surgery.base_stay_hours)
+                changes = [change for change in changes if change.ticket_id in written]
+                clinic_ids.update(row.clinic_id for row in rows if row.id in written)
+            result.changes.extend(changes)
+
+        if result.changes and not dry_run:
+            AuditService.log_action(
+                user=user,
+                action=(f'Recalculó FPA del sistema de {len(result.changes)} tickets de la cirugía '
+                        f'{surgery.name} ({surgery.base_stay_hours}h base)'),
+                target_id=str(surgery.id),
+                target_type='Surgery',
+                event_type=AUDIT_EVENT_FPA_RECALCULATED,
+                payload=result.to_payload(),
+            )
+            result.applied = True
+            invalidate_on_commit(db.session, set().union(
+                *(clinic_namespaces(clinic_id, 'tickets') for clinic_id in clinic_ids)))
+            # Tickets already loaded in the session do not see the Core UPDATEs
+            db.session.expire_all()
+
+        result.seconds = time.perf_counter() - started
+        return result
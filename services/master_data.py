@@ -0,0 +1,78 @@
+"""
+Master Data Service - Per-clinic catalogs used by the ticket forms
+
+Specialties, surgeries, doctors, standardized reasons and urgency thresholds
+change rarely and are read on every ticket form. The reads are cached in the
+application cache (cache/) and invalidated on commit by writes to those models
+(cache/invalidation.py); the warmup (utils/warmup.py) pre-loads them for every
+active clinic.
+"""
+from cache import cached, clinic_namespace
+from models import Specialty, Surgery, Doctor, StandardizedReason, UrgencyThreshold, REASON_CATEGORY_INITIAL
+from .fpa_calculator import FPACalculator
+
+
+class MasterDataService:
+    """Read access to per-clinic master data."""
+
+    @staticmethod
+    @cached('master_data', namespace=lambda clinic_id: clinic_namespace(clinic_id))
+    def create_form_data(clinic_id=None):
+        """
+        Active catalogs for the ticket creation form, serialized for JavaScript.
+
+        Args:
+            clinic_id (int, optional): Clinic to filter by (None = all clinics, for superusers)
+
+        Returns:
+            dict: specialties_data, surgeries_data, doctors_data, initial_reasons_data,
+                fpa_rules (parameters of the browser FPA preview)
+        """
+        specialties_query = Specialty.query.filter_by(is_active=True)
+        surgeries_query = Surgery.query.filter_by(is_active=True)
+        doctors_query = Doctor.query.filter_by(is_active=True)
+        reasons_query = StandardizedReason.query.filter_by(
+            category=REASON_CATEGORY_INITIAL,
+            is_active=True
+        )
+
+        if clinic_id is not None:
+            specialties_query = specialties_query.filter_by(clinic_id=clinic_id)
+            surgeries_query = surgeries_query.filter_by(clinic_id=clinic_id)
+            doctors_query = doctors_query.filter_by(clinic_id=clinic_id)
+            reasons_query = reasons_query.filter_by(clinic_id=clinic_id)
+
+        specialties = specialties_query.order_by(Specialty.name).all()
+        surgeries = surgeries_query.all()
+        doctors = doctors_query.order_by(Doctor.name).all()
+        initial_reasons = reasons_query.all()
+
+        return {
+            'specialties_data': [{'id': s.id, 'name': s.name, 'clinic_id': s.clinic_id} for s in specialties],
+            'surgeries_data': [{'id': s.id, 'name': s.name, 'base_stay_hours': s.base_stay_hours,
+                                'specialty_id': s.specialty_id, 'clinic_id': s.clinic_id} for s in surgeries],
+            'doctors_data': [{'id': d.id, 'name': d.name, 'specialty': d.specialty,
+                              'clinic_id': d.clinic_id} for d in doctors],
+            'initial_reasons_data': [{'id': r.id, 'reason': r.reason, 'clinic_id': r.clinic_id}
+                                     for r in initial_reasons],
+            'fpa_rules': FPACalculator.rules(),
+        }
+
+    @staticmethod
+    @cached('thresholds', namespace='thresholds')
+    def urgency_thresholds(clinic_id=None):
+        """
+        Urgency color thresholds for a clinic (its own, else the global ones, else defaults).
+
+        Args:
+            clinic_id (int, optional): Clinic to look up (None = global)
+
+        Returns:
+            dict: green_threshold_hours, yellow_threshold_hours, red_threshold_hours
+        """
+        threshold = UrgencyThreshold.get_thresholds_for_clinic(clinic_id)
+        return {
+            'green_threshold_hours': threshold.green_threshold_hours,
+            'yellow_threshold_hours': threshold.yellow_threshold_hours,
+            'red_threshold_hours': threshold.red_threshold_hours,
+        }
@@ -0,0 +1,306 @@
+"""
+Occupancy Service - Patients in house over time
+
+Each non-annulled ticket is a half-open interval [admission, current_fpa):
+admission is FPACalculator.calculate_admission_time(pavilion_end_time), the
+same admission time the nursing board shows. An OccupancyIndex keeps the
+interval endpoints of a clinic sorted per location, so
+
+    in house at T           = #starts <= T - #ends <= T           (two bisects)
+    in house during [a, b)  = #starts < b  - #ends <= a           (two bisects)
+    peak in [a, b)          = sweep of the endpoints inside [a, b) from the count at a
+
+Indexes are built lazily per clinic and kept in process. Ticket writes are
+applied incrementally on commit (ORM events). Each index remembers the version
+of its 'tickets:<clinic>' cache namespace: a commit that bumps it by exactly
+one applies its own changes; any other jump (another process, bulk Core
+UPDATEs, a cache flush) drops the index and the next query rebuilds it.
+Indexes are always built from the primary, whose version they carry.
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from dataclasses import dataclass
+
+from sqlalchemy import event, inspect, select
+
+from cache import app_cache, clinic_namespace
+from models import db, Ticket, TICKET_STATUS_ANULADO
+from utils.db_routing import RoutingSession, primary_bind
+from .discharge_forecast import NO_LOCATION
+from .fpa_calculator import FPACalculator
+
+PENDING_KEY = 'occupancy_pending'
+
+# Segundos tras los cuales un índice se reconstruye aunque su versión no cambie
+# (sin backend de cache las versiones no detectan escrituras de otros procesos)
+MAX_AGE_SECONDS = 600
+
+
+@dataclass
+class Peak:
+    """Highest occupancy in a range and the first time it was reached."""
+    count: int
+    at: object
+
+
+class OccupancyIndex:
+    """
+    Sorted interval endpoints of one clinic's tickets, per location.
+
+    The key None holds every location together, so totals and the overall
+    peak are queries on one pair of lists instead of a merge.
+    """
+
+    def __init__(self, version=None):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.intervals = {}
+        self._starts = defaultdict(list)
+        self._ends = defaultdict(list)
+
+    def __len__(self):
+        return len(self.intervals)
+
+    @property
+    def locations(self):
+        return sorted((name for name in self._starts if name is not None and self._starts[name]),
+                      key=lambda name: (name == NO_LOCATION, name))
+
+    @classmethod
+    def from_intervals(cls, intervals, version=None):
+        """Index (ticket_id, location, start, end) tuples, sorting once instead of inserting each."""
+        index = cls(version)
+        for ticket_id, location, start, end in intervals:
+            if start is None or end is None or end <= start:
+                continue
+            location = location or NO_LOCATION
+            index.intervals[ticket_id] = (location, start, end)
+            for key in (location, None):
+                index._starts[key].append(start)
+                index._ends[key].append(end)
+        for endpoints in (*index._starts.values(), *index._ends.values()):
+            endpoints.sort()
+        return index
+
+    def add(self, ticket_id, location, start, end):
+        """Add (or replace) a ticket's interval; empty intervals are not stored."""
+        self.remove(ticket_id)
+        if start is None or end is None or end <= start:
+            return
+        location = location or NO_LOCATION
+        self.intervals[ticket_id] = (location, start, end)
+        for key in (location, None):
+            insort(self._starts[key], start)
+            insort(self._ends[key], end)
+
+    def remove(self, ticket_id):
+        interval = self.intervals.pop(ticket_id, None)
+        if interval is None:
+            return
+        location, start, end = interval
+        for key in (location, None):
+            starts, ends = self._starts[key], self._ends[key]
+            del starts[bisect_left(starts, start)]
+            del ends[bisect_left(ends, end)]
+
+    def at(self, when, location=None):
+        """Patients in house at `when`."""
+        return bisect_right(self._starts[location], when) - bisect_right(self._ends[location], when)
+
+    def during(self, start, end, location=None):
+        """Patients in house at some point of [start, end)."""
+        return bisect_left(self._starts[location], end) - bisect_right(self._ends[location], start)
+
+    def admitted(self, start, end, location=None):
+        """Admissions (interval starts) in [start, end)."""
+        starts = self._starts[location]
+        return bisect_left(starts, end) - bisect_left(starts, start)
+
+    def discharged(self, start, end, location=None):
+        """Discharges (interval ends) in [start, end)."""
+        ends = self._ends[location]
+        return bisect_left(ends, end) - bisect_left(ends, start)
+
+    def peak(self, start, end, location=None):
+        """Highest occupancy in [start, end) and the first instant it happens."""
+        starts, ends = self._starts[location], self._ends[location]
+        best = Peak(self.at(start, location), start)
+        current = best.count
+        i, i_end = bisect_right(starts, start), bisect_left(starts, end)
+        j, j_end = bisect_right(ends, start), bisect_left(ends, end)
+        while i < i_end:
+            # Intervalos semiabiertos: a la misma hora, la salida libera la cama antes del ingreso
+            if j < j_end and ends[j] <= starts[i]:
+                current -= 1
+                j += 1
+                continue
+            current += 1
+            if current > best.count:
+                best = Peak(current, starts[i])
+            i += 1
+        return best
+
+
+class OccupancyService:
+    """Point, range and peak occupancy queries over per-clinic interval indexes."""
+
+    _indexes = {}
+    _lock = threading.RLock()
+
+    @staticmethod
+    def _namespace(clinic_id):
+        return clinic_namespace(clinic_id, 'tickets')
+
+    @staticmethod
+    def build(clinic_id=None):
+        """Build the index of a clinic (None = all clinics) from the database."""
+        version = app_cache.namespace_version(OccupancyService._namespace(clinic_id))
+        query = select(Ticket.id, Ticket.location, Ticket.pavilion_end_time, Ticket.current_fpa)\
+            .where(Ticket.status != TICKET_STATUS_ANULADO)
+        if clinic_id is not None:
+            query = query.where(Ticket.clinic_id == clinic_id)
+
+        admission_time = FPACalculator.calculate_admission_time
+        return OccupancyIndex.from_intervals(
+            ((row.id, row.location, admission_time(row.pavilion_end_time), row.current_fpa)
+             for row in db.session.execute(query, bind_arguments=primary_bind(db))),
+            version=version,
+        )
+
+    @staticmethod
+    def index_for(clinic_id=None):
+        """The clinic's index, rebuilt if another writer or its age made it stale."""
+        with OccupancyService._lock:
+            index = OccupancyService._indexes.get(clinic_id)
+            version = app_cache.namespace_version(OccupancyService._namespace(clinic_id))
+            if (index is None or index.version != version
+                    or time.monotonic() - index.built_at > MAX_AGE_SECONDS):
+                index = OccupancyService._indexes[clinic_id] = OccupancyService.build(clinic_id)
+            return index
+
+    @staticmethod
+    def reset():
+        """Drop every index (they are rebuilt on the next query)."""
+        with OccupancyService._lock:
+            OccupancyService._indexes.clear()
+
+    @staticmethod
+    def at(clinic_id, when):
+        """
+        Patients in house at a point in time.
+
+        Args:
+            clinic_id (int, optional): Clinic (None = all clinics)
+            when (datetime): Point in time
+
+        Returns:
+            dict: at, total, by_location
+        """
+        with OccupancyService._lock:
+            index = OccupancyService.index_for(clinic_id)
+            return {
+                'at': when.isoformat(),
+                'total': index.at(when),
+                'by_location': {name: index.at(when, name) for name in index.locations},
+            }
+
+    @staticmethod
+    def report(clinic_id, start, end):
+        """
+        Occupancy over a range, per location: in house at the start, patients,
+        admissions and discharges in the range, and the peak with its time.
+
+        Args:
+            clinic_id (int, optional): Clinic (None = all clinics)
+            start (datetime): Range start (included)
+            end (datetime): Range end (excluded)
+
+        Returns:
+            dict: start, end, total and locations (list of per-location rows)
+        """
+        def row(index, location):
+            peak = index.peak(start, end, location)
+            return {
+                'location': location,
+                'at_start': index.at(start, location),
+                'patients': index.during(start, end, location),
+                'admitted': index.admitted(start, end, location),
+                'discharged': index.discharged(start, end, location),
+                'peak': peak.count,
+                'peak_at': peak.at.isoformat(),
+            }
+
+        with OccupancyService._lock:
+            index = OccupancyService.index_for(clinic_id)
+            total = row(index, None)
+            total['location'] = 'Total'
+            return {
+                'start': start.isoformat(),
+                'end': end.isoformat(),
+                'total': total,
+                'locations': [row(index, name) for name in index.locations],
+            }
+
+    # --- Actualización incremental ---
+
+    @staticmethod
+    def _apply(session):
+        pending = session.info.pop(PENDING_KEY, None)
+        if not pending:
+            return
+        with OccupancyService._lock:
+            by_clinic = defaultdict(list)
+            for ticket_id, (clinic_ids, state) in pending.items():
+                for clinic_id in (*clinic_ids, None):
+                    by_clinic[clinic_id].append((ticket_id, state))
+
+            for clinic_id, changes in by_clinic.items():
+                index = OccupancyService._indexes.get(clinic_id)
+                if index is None:
+                    continue
+                version = app_cache.namespace_version(OccupancyService._namespace(clinic_id))
+                if version != index.version + 1:
+                    # Hubo otra escritura entre medio: reconstruir en la próxima consulta
+                    del OccupancyService._indexes[clinic_id]
+                    continue
+                for ticket_id, state in changes:
+                    if state is None or (clinic_id is not None and state[0] != clinic_id):
+                        index.remove(ticket_id)
+                    else:
+                        index.add(ticket_id, *state[1:])
+                index.version = version
+
+
+def _ticket_state(ticket):
+    """(clinic_id, location, admission, end) of a ticket, or None if it does not occupy a bed."""
+    if ticket.status == TICKET_STATUS_ANULADO or ticket.pavilion_end_time is None:
+        return None
+    return (ticket.clinic_id, ticket.location,
+            FPACalculator.calculate_admission_time(ticket.pavilion_end_time), ticket.current_fpa)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _collect(session, flush_context):
+    pending = None
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if not isinstance(obj, Ticket):
+            continue
+        if pending is None:
+            pending = session.info.setdefault(PENDING_KEY, {})
+        history = inspect(obj).attrs.clinic_id.history
+        clinic_ids = {*history.added, *history.unchanged, *history.deleted} or {obj.clinic_id}
+        previous = pending.get(obj.id, (set(), None))[0]
+        state = None if obj in session.deleted else _ticket_state(obj)
+        pending[obj.id] = (previous | clinic_ids, state)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _commit(session):
+    OccupancyService._apply(session)
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _discard(session):
+    session.info.pop(PENDING_KEY, None)
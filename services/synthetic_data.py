@@ -0,0 +1,543 @@
+"""
+Synthetic Data - Generador de datos de carga a escala de producción
+
+`seed_db` crea datos demo objeto por objeto vía ORM: sirve para una demo, no
+para pruebas de capacidad. Este generador produce clínicas, usuarios,
+cirugías, médicos, pacientes, tickets, modificaciones de FPA, anulaciones y
+auditoría con distribuciones realistas, y los carga en lote:
+
+- PostgreSQL: COPY ... FROM STDIN (formato text)
+- Otros (SQLite): insert() compilado una vez + executemany por lote
+
+(Un insert().values() multi-fila se recompila en cada lote: con 20+ columnas
+la compilación de SQLAlchemy domina el tiempo total, ~5x más lento.)
+
+Los ids se asignan en Python a partir del max(id) actual (un solo escritor: es
+una herramienta para staging/local, no para correr contra producción); en
+PostgreSQL las secuencias se ajustan al terminar. Con la misma semilla y el
+mismo `now` el contenido generado es idéntico.
+"""
+import io
+import json
+import random
+import time
+from dataclasses import dataclass, field, asdict
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+
+from faker import Faker
+from sqlalchemy import insert, func, select, text
+from werkzeug.security import generate_password_hash
+
+from models import (
+    db, Clinic, User, Specialty, Surgery, Doctor, StandardizedReason, Patient, Ticket,
+    FpaModification, LoginAudit, ActionAudit,
+    ROLE_ADMIN, ROLE_CLINICAL, ROLE_VISUALIZADOR, TICKET_STATUS_VIGENTE, TICKET_STATUS_ANULADO,
+    REASON_CATEGORY_INITIAL, REASON_CATEGORY_MODIFICATION, REASON_CATEGORY_ANNULMENT,
+    AUDIT_EVENT_TICKET_CREATED, AUDIT_EVENT_FPA_MODIFIED, AUDIT_EVENT_TICKET_ANNULLED,
+)
+from services.fpa_calculator import FPACalculator
+from utils.string_utils import generate_prefix
+
+LOAD_USER_PREFIX = 'load_'
+LOAD_USER_PASSWORD = 'password123'
+
+# Ciudades para nombrar clínicas: generate_prefix() toma las 4 primeras letras,
+# que deben ser únicas (son parte del id de ticket TH-PREF-AAAA-NNNNN)
+CLINIC_CITIES = (
+    'Arica', 'Calama', 'Antofagasta', 'Copiapó', 'Ovalle', 'Quillota', 'Los Andes', 'San Felipe',
+    'Melipilla', 'Curicó', 'Talca', 'Linares', 'Chillán', 'Concepción', 'Los Ángeles', 'Angol',
+    'Villarrica', 'Valdivia', 'Osorno', 'Puerto Montt', 'Castro', 'Coyhaique', 'Puerto Natales',
+    'Tocopilla', 'Huasco', 'Buin', 'Talagante', 'Nacimiento', 'Lebu', 'Ancud',
+)
+
+# (nombre, especialidad, horas base, ambulatoria)
+SURGERY_CATALOG = (
+    ('Apendicectomía Laparoscópica', 'Cirugía General', 24, False),
+    ('Colecistectomía Laparoscópica', 'Cirugía General', 24, False),
+    ('Hernioplastía Inguinal', 'Cirugía General', 8, True),
+    ('Gastrectomía en Manga', 'Cirugía General', 72, False),
+    ('Tiroidectomía Total', 'Cirugía de Cabeza y Cuello', 48, False),
+    ('Histerectomía Laparoscópica', 'Ginecología', 48, False),
+    ('Histerectomía Abdominal', 'Ginecología', 72, False),
+    ('Cesárea', 'Obstetricia', 72, False),
+    ('Artroscopia de Rodilla', 'Traumatología', 8, True),
+    ('Prótesis Total de Cadera', 'Traumatología', 96, False),
+    ('Prótesis Total de Rodilla', 'Traumatología', 96, False),
+    ('Osteosíntesis de Tobillo', 'Traumatología', 48, False),
+    ('Reparación de Manguito Rotador', 'Traumatología', 24, False),
+    ('Resección Transuretral de Próstata', 'Urología', 48, False),
+    ('Nefrolitotomía Percutánea', 'Urología', 72, False),
+    ('Ureteroscopía', 'Urología', 24, False),
+    ('Amigdalectomía', 'Otorrinolaringología', 24, False),
+    ('Septoplastía', 'Otorrinolaringología', 8, True),
+    ('Adenoidectomía', 'Otorrinolaringología', 8, True),
+    ('Safenectomía', 'Cirugía Vascular', 24, False),
+    ('Microdiscectomía Lumbar', 'Neurocirugía', 48, False),
+    ('Artrodesis Lumbar', 'Neurocirugía', 96, False),
+    ('Mastectomía Parcial', 'Cirugía General', 24, False),
+    ('Hemorroidectomía', 'Coloproctología', 24, False),
+)
+
+MODIFICATION_REASONS = (
+    'Paciente requiere observación adicional',
+    'Complicación post-operatoria',
+    'Espera de resultados de exámenes',
+    'Dolor no controlado',
+    'Alta anticipada por buena evolución',
+    'Espera de cupo en domicilio',
+)
+ANNULMENT_REASONS = ('Ticket creado por error', 'Cirugía suspendida', 'Paciente trasladado')
+INITIAL_REASONS = ('Criterio médico inicial', 'Protocolo estándar de la cirugía')
+
+# Cantidad de modificaciones por ticket: 0..5 (la mayoría sin cambios)
+MODIFICATION_WEIGHTS = (55, 25, 12, 5, 2, 1)
+# Cambio de FPA en horas por modificación (más extensiones que adelantos)
+FPA_SHIFT_HOURS = (-4, -2, 2, 4, 6, 12, 24, 48)
+FPA_SHIFT_WEIGHTS = (4, 6, 20, 20, 10, 18, 17, 5)
+# Hora de término de pabellón (08..20) con peak en la mañana
+SURGERY_HOUR_WEIGHTS = (10, 12, 12, 11, 9, 8, 9, 9, 8, 6, 4, 2, 1)
+WEEKEND_ACCEPT = 0.35
+READMISSION_RATIO = 0.08
+DOCTOR_ASSIGNED_RATIO = 0.92
+LOGIN_PROBABILITY = 0.7
+# RUTs sintéticos sobre 30.000.000: fuera del rango de personas reales
+SYNTHETIC_RUT_BASE = 30_000_000
+
+
+@dataclass(frozen=True)
+class LoadDataSpec:
+    """Tamaño y forma del dataset de carga."""
+    clinics: int = 20
+    tickets: int = 500_000
+    days: int = 730
+    surgeries_per_clinic: int = 24
+    doctors_per_clinic: int = 40
+    clinical_users_per_clinic: int = 3
+    annulled_ratio: float = 0.04
+    with_login_audit: bool = True
+    seed: int = 20261019
+
+    def as_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class LoadDataSummary:
+    """Resultado de una generación: ids útiles y filas insertadas por tabla."""
+    spec: LoadDataSpec
+    clinic_ids: list = field(default_factory=list)
+    admin_user_ids: list = field(default_factory=list)
+    surgery_ids: dict = field(default_factory=dict)
+    last_ticket_ids: dict = field(default_factory=dict)
+    rows: dict = field(default_factory=dict)
+    seconds: float = 0.0
+
+
+def rut_with_check_digit(number):
+    """RUT chileno `12345678-K` con dígito verificador (módulo 11)."""
+    total, factor = 0, 2
+    for digit in reversed(str(number)):
+        total += int(digit) * factor
+        factor = 2 if factor == 7 else factor + 1
+    check = 11 - total % 11
+    check_digit = {10: 'K', 11: '0'}.get(check, str(check))
+    return f'{number}-{check_digit}'
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False)
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class BulkLoader:
+    """
+    Escribe filas por tabla en lotes: COPY en PostgreSQL, executemany en el resto.
+
+    Las filas son tuplas en el orden de `columns`. Los ids se reservan con
+    `next_ids()` a partir del max(id) de cada tabla.
+    """
+
+    def __init__(self, session, batch_size=10_000):
+        self.session = session
+        self.batch_size = batch_size
+        self.use_copy = session.get_bind().dialect.name == 'postgresql'
+        self.rows = {}
+        self._next_id = {}
+
+    def next_ids(self, model, count):
+        """Reserva `count` ids consecutivos para `model` y retorna el primero."""
+        table = model.__table__
+        if table.name not in self._next_id:
+            current = self.session.scalar(select(func.max(table.c.id))) or 0
+            self._next_id[table.name] = current + 1
+        start = self._next_id[table.name]
+        self._next_id[table.name] = start + count
+        return start
+
+    def write(self, model, columns, rows):
+        """Inserta `rows` (tuplas) en la tabla de `model`."""
+        table = model.__table__
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            if self.use_copy:
+                self._copy(table, columns, batch)
+            else:
+                self._insert_many(table, columns, batch)
+        self.rows[table.name] = self.rows.get(table.name, 0) + len(rows)
+
+    def _insert_many(self, table, columns, rows):
+        self.session.execute(insert(table), [dict(zip(columns, row)) for row in rows])
+
+    def _copy(self, table, columns, rows):
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(_copy_value(v) for v in row))
+            buffer.write('\n')
+        buffer.seek(0)
+        column_list = ', '.join(f'"{c}"' for c in columns)
+        raw = self.session.connection().connection
+        with raw.cursor() as cursor:
+            cursor.copy_expert(f'COPY "{table.name}" ({column_list}) FROM STDIN', buffer)
+
+    def finish(self):
+        """Ajusta las secuencias de PostgreSQL a los ids insertados explícitamente."""
+        if not self.use_copy:
+            return
+        for table_name in self._next_id:
+            self.session.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('\"{table_name}\"', 'id'), "
+                f"(SELECT COALESCE(MAX(id), 1) FROM \"{table_name}\"))"
+            ))
+
+
+class SyntheticDataGenerator:
+    """
+    Genera y carga el dataset de `LoadDataSpec` en la base de datos actual.
+
+    Uso:
+        summary = SyntheticDataGenerator(LoadDataSpec(clinics=20, tickets=500_000)).generate()
+    """
+
+    def __init__(self, spec=None, batch_size=10_000, now=None, progress=None):
+        self.spec = spec or LoadDataSpec()
+        self.batch_size = batch_size
+        self.now = now or datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        self.progress = progress or (lambda message: None)
+        self.rng = random.Random(self.spec.seed)
+        self.fake = Faker('es_CL')
+        self.fake.seed_instance(self.spec.seed)
+
+    def generate(self):
+        """
+        Inserta todo el dataset y hace commit por clínica.
+
+        Returns:
+            LoadDataSummary: Ids de clínicas/admins, último ticket por clínica y filas por tabla
+        """
+        started = time.perf_counter()
+        loader = BulkLoader(db.session, batch_size=self.batch_size)
+        summary = LoadDataSummary(spec=self.spec)
+
+        # Pools de nombres: faker por fila es lo más lento de la generación
+        self.first_names = [self.fake.first_name() for _ in range(400)]
+        self.last_names = [self.fake.last_name() for _ in range(400)]
+        self.password_hash = generate_password_hash(LOAD_USER_PASSWORD)
+
+        clinics = self._create_clinics(loader)
+        per_clinic = self._split(self.spec.tickets, len(clinics))
+
+        for index, ((clinic_id, name, prefix), count) in enumerate(zip(clinics, per_clinic)):
+            self.progress(f'{name}: {count} tickets')
+            users = self._create_users(loader, clinic_id, prefix)
+            surgeries = self._create_catalog(loader, clinic_id)
+            doctors = self._create_doctors(loader, clinic_id)
+            last_ticket_id = self._create_tickets(
+                loader, clinic_id, prefix, count, users, surgeries, doctors,
+                rut_base=SYNTHETIC_RUT_BASE + index * 2_000_000,
+            )
+            if self.spec.with_login_audit:
+                self._create_logins(loader, clinic_id, users)
+            db.session.commit()
+
+            summary.clinic_ids.append(clinic_id)
+            summary.admin_user_ids.append(users[0][0])
+            summary.surgery_ids[clinic_id] = [s.id for s in surgeries]
+            summary.last_ticket_ids[clinic_id] = last_ticket_id
+
+        loader.finish()
+        db.session.commit()
+        summary.rows = dict(loader.rows)
+        summary.seconds = round(time.perf_counter() - started, 2)
+        return summary
+
+    # --- Catálogos ---
+
+    @staticmethod
+    def _split(total, parts):
+        return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+    def _clinic_names(self, count):
+        taken = {generate_prefix(name) for (name,) in db.session.execute(select(Clinic.name))}
+        names = []
+        for city in CLINIC_CITIES:
+            name = f'Clínica RedSalud {city}'
+            prefix = generate_prefix(name)
+            if prefix not in taken:
+                taken.add(prefix)
+                names.append((name, prefix))
+            if len(names) == count:
+                return names
+
+        # Más clínicas que ciudades: prefijos sintéticos 'qaaa', 'qaab', ...
+        n = 0
+        while len(names) < count:
+            suffix = ''.join(chr(ord('a') + (n // 26 ** k) % 26) for k in (2, 1, 0))
+            name = f'Clínica RedSalud Q{suffix}'
+            prefix = generate_prefix(name)
+            if prefix not in taken:
+                taken.add(prefix)
+                names.append((name, prefix))
+            n += 1
+        return names
+
+    def _create_clinics(self, loader):
+        names = self._clinic_names(self.spec.clinics)
+        first_id = loader.next_ids(Clinic, len(names))
+        rows = [(first_id + i, name, True) for i, (name, _) in enumerate(names)]
+        loader.write(Clinic, ('id', 'name', 'is_active'), rows)
+        return [(first_id + i, name, prefix) for i, (name, prefix) in enumerate(names)]
+
+    def _create_users(self, loader, clinic_id, prefix):
+        """Retorna [(id, username)]: admin primero, luego clínicos y visualizador."""
+        roles = [(ROLE_ADMIN, f'{LOAD_USER_PREFIX}admin_{prefix}')]
+        roles += [(ROLE_CLINICAL, f'{LOAD_USER_PREFIX}clinical_{prefix}_{n + 1}')
+                  for n in range(self.spec.clinical_users_per_clinic)]
+        roles.append((ROLE_VISUALIZADOR, f'{LOAD_USER_PREFIX}visualizador_{prefix}'))
+
+        first_id = loader.next_ids(User, len(roles))
+        rows = [(
+            first_id + i, username, f'{username}@tickethome.com', self.password_hash,
+            role, True, self.now - timedelta(days=self.spec.days), clinic_id,
+        ) for i, (role, username) in enumerate(roles)]
+        loader.write(User, ('id', 'username', 'email', 'password', 'role', 'is_active', 'created_at',
+                            'clinic_id'), rows)
+
+        reasons = [(r, REASON_CATEGORY_INITIAL) for r in INITIAL_REASONS]
+        reasons += [(r, REASON_CATEGORY_MODIFICATION) for r in MODIFICATION_REASONS]
+        reasons += [(r, REASON_CATEGORY_ANNULMENT) for r in ANNULMENT_REASONS]
+        first_reason = loader.next_ids(StandardizedReason, len(reasons))
+        loader.write(StandardizedReason, ('id', 'reason', 'category', 'is_active', 'clinic_id'), [
+            (first_reason + i, reason, category, True, clinic_id) for i, (reason, category) in enumerate(reasons)
+        ])
+        return [(first_id + i, username) for i, (_, username) in enumerate(roles)]
+
+    def _create_catalog(self, loader, clinic_id):
+        """Especialidades + cirugías. Retorna instancias Surgery transitorias (no van a la sesión)."""
+        catalog = [SURGERY_CATALOG[i % len(SURGERY_CATALOG)] for i in range(self.spec.surgeries_per_clinic)]
+        specialties = sorted({entry[1] for entry in catalog})
+        first_specialty = loader.next_ids(Specialty, len(specialties))
+        specialty_ids = {name: first_specialty + i for i, name in enumerate(specialties)}
+        loader.write(Specialty, ('id', 'name', 'is_active', 'clinic_id'), [
+            (specialty_ids[name], name, True, clinic_id) for name in specialties
+        ])
+
+        first_surgery = loader.next_ids(Surgery, len(catalog))
+        surgeries, rows = [], []
+        for i, (name, specialty, hours, ambulatory) in enumerate(catalog):
+            if i >= len(SURGERY_CATALOG):
+                name = f'{name} ({i // len(SURGERY_CATALOG) + 1})'
+            cutoff = 14 if ambulatory else None
+            surgeries.append(Surgery(id=first_surgery + i, name=name, base_stay_hours=hours,
+                                     is_ambulatory=ambulatory, ambulatory_cutoff_hour=cutoff))
+            rows.append((first_surgery + i, name, hours, specialty_ids[specialty], True, True,
+                         ambulatory, cutoff, clinic_id))
+        loader.write(Surgery, ('id', 'name', 'base_stay_hours', 'specialty_id', 'is_active',
+                               'applies_ticket_home', 'is_ambulatory', 'ambulatory_cutoff_hour',
+                               'clinic_id'), rows)
+        return surgeries
+
+    def _create_doctors(self, loader, clinic_id):
+        rng = self.rng
+        count = self.spec.doctors_per_clinic
+        first_id = loader.next_ids(Doctor, count)
+        specialties = sorted({entry[1] for entry in SURGERY_CATALOG})
+        loader.write(Doctor, ('id', 'name', 'specialty', 'rut', 'is_active', 'created_at', 'clinic_id'), [(
+            first_id + i,
+            f'Dr. {rng.choice(self.first_names)} {rng.choice(self.last_names)}',
+            rng.choice(specialties),
+            rut_with_check_digit(rng.randint(5_000_000, 20_000_000)),
+            True,
+            self.now - timedelta(days=self.spec.days),
+            clinic_id,
+        ) for i in range(count)])
+        return list(range(first_id, first_id + count))
+
+    # --- Tickets ---
+
+    def _surgery_times(self, count):
+        """Términos de pabellón repartidos en `days` días, menos en fin de semana, ordenados."""
+        rng = self.rng
+        start = self.now - timedelta(days=self.spec.days)
+        hours = list(range(8, 8 + len(SURGERY_HOUR_WEIGHTS)))
+        cumulative_hours = list(accumulate(SURGERY_HOUR_WEIGHTS))
+        times = []
+        while len(times) < count:
+            day = start + timedelta(days=rng.randrange(self.spec.days + 1))
+            if day.weekday() >= 5 and rng.random() > WEEKEND_ACCEPT:
+                continue
+            hour = rng.choices(hours, cum_weights=cumulative_hours)[0]
+            times.append(day.replace(hour=hour, minute=rng.choice((0, 15, 30, 45))))
+        times.sort()
+        return times
+
+    def _create_tickets(self, loader, clinic_id, prefix, count, users, surgeries, doctors, rut_base):
+        rng = self.rng
+        if count == 0:
+            return None
+
+        # Popularidad tipo Zipf: pocas cirugías concentran la mayoría de los tickets
+        surgery_weights = list(accumulate(1 / (rank + 1) for rank in range(len(surgeries))))
+        modification_counts = list(range(len(MODIFICATION_WEIGHTS)))
+        cumulative_mods = list(accumulate(MODIFICATION_WEIGHTS))
+        cumulative_shift = list(accumulate(FPA_SHIFT_WEIGHTS))
+        clinical_users = users[1:-1] or users[:1]
+
+        patient_columns = ('id', 'rut', 'primer_nombre', 'segundo_nombre', 'apellido_paterno',
+                           'apellido_materno', 'age', 'sex', 'episode_id', 'clinic_id')
+        ticket_columns = ('id', 'patient_id', 'surgery_id', 'doctor_id', 'clinic_id', 'pavilion_end_time',
+                          'medical_discharge_date', 'system_calculated_fpa', 'initial_fpa', 'current_fpa',
+                          'overnight_stays', 'bed_number', 'location', 'status', 'created_at', 'created_by',
+                          'annulled_at', 'annulled_reason', 'annulled_by', 'initial_reason',
+                          'surgery_name_snapshot', 'surgery_base_hours_snapshot')
+        modification_columns = ('id', 'ticket_id', 'clinic_id', 'previous_fpa', 'new_fpa', 'reason',
+                                'justification', 'modified_at', 'modified_by')
+        audit_columns = ('id', 'user_id', 'username', 'clinic_id', 'timestamp', 'action', 'target_id',
+                         'target_type', 'event_type', 'payload')
+
+        counters = {}
+        patient_ids, patient_names = [], {}
+        last_ticket_id = None
+        surgery_times = self._surgery_times(count)
+
+        for start in range(0, count, self.batch_size):
+            times = surgery_times[start:start + self.batch_size]
+            patients, tickets, modifications, audits = [], [], [], []
+
+            # Reingresos: algunos tickets reutilizan un paciente previo de la clínica
+            new_patients = [i for i in range(len(times))
+                            if not patient_ids or rng.random() >= READMISSION_RATIO]
+            next_patient = loader.next_ids(Patient, len(new_patients))
+            new_patient_set = set(new_patients)
+
+            for i, surgery_time in enumerate(times):
+                if i in new_patient_set:
+                    patient_id = next_patient
+                    next_patient += 1
+                    sex = rng.choice(('M', 'F'))
+                    patients.append((
+                        patient_id, rut_with_check_digit(rut_base + len(patient_ids)),
+                        rng.choice(self.first_names), None,
+                        rng.choice(self.last_names), rng.choice(self.last_names),
+                        min(99, max(1, int(rng.gauss(52, 18)))), sex,
+                        f'EP-{prefix.upper()}-{len(patient_ids) + 1:07d}', clinic_id,
+                    ))
+                    patient_ids.append(patient_id)
+                    patient_names[patient_id] = f'{patients[-1][2]} {patients[-1][4]}'
+                else:
+                    patient_id = rng.choice(patient_ids)
+
+                surgery = rng.choices(surgeries, cum_weights=surgery_weights)[0]
+                fpa, overnight_stays = FPACalculator.calculate(surgery_time, surgery)
+                creator_id, creator = rng.choice(clinical_users)
+                created_at = surgery_time + timedelta(minutes=rng.randint(10, 180))
+
+                year = created_at.year
+                counters[year] = counters.get(year, 0) + 1
+                ticket_id = f'TH-{prefix.upper()}-{year}-{counters[year]:05d}'
+
+                audits.append((creator_id, creator, clinic_id, created_at,
+                               f'Creó ticket para paciente {patient_names[patient_id]}', ticket_id, 'Ticket',
+                               AUDIT_EVENT_TICKET_CREATED, {
+                                   'patient_id': patient_id,
+                                   'surgery_id': surgery.id,
+                                   'initial_fpa': fpa.isoformat(),
+                                   'overnight_stays': overnight_stays,
+                               }))
+
+                current_fpa = fpa
+                modified_at = created_at
+                for _ in range(rng.choices(modification_counts, cum_weights=cumulative_mods)[0]):
+                    shift = rng.choices(FPA_SHIFT_HOURS, cum_weights=cumulative_shift)[0]
+                    new_fpa = max(created_at, current_fpa + timedelta(hours=shift))
+                    modified_at = modified_at + timedelta(hours=rng.randint(1, 20))
+                    reason = rng.choice(MODIFICATION_REASONS)
+                    modifier_id, modifier = rng.choice(clinical_users)
+                    modifications.append((None, ticket_id, clinic_id, current_fpa, new_fpa, reason,
+                                          None, modified_at, modifier))
+                    audits.append((modifier_id, modifier, clinic_id, modified_at,
+                                   f'Modificó FPA de {current_fpa} a {new_fpa}. Razón: {reason}',
+                                   ticket_id, 'Ticket', AUDIT_EVENT_FPA_MODIFIED, {
+                                       'previous_fpa': current_fpa.isoformat(),
+                                       'new_fpa': new_fpa.isoformat(),
+                                       'reason': reason,
+                                       'justification': None,
+                                   }))
+                    current_fpa = new_fpa
+
+                annulled = rng.random() < self.spec.annulled_ratio
+                annulled_at = annulled_reason = annulled_by = None
+                if annulled:
+                    annulled_at = modified_at + timedelta(hours=rng.randint(1, 48))
+                    annulled_reason = rng.choice(ANNULMENT_REASONS)
+                    annulled_by = creator
+                    audits.append((creator_id, creator, clinic_id, annulled_at,
+                                   f'Anuló ticket. Razón: {annulled_reason}', ticket_id, 'Ticket',
+                                   AUDIT_EVENT_TICKET_ANNULLED, {'reason': annulled_reason}))
+
+                tickets.append((
+                    ticket_id, patient_id, surgery.id,
+                    rng.choice(doctors) if rng.random() < DOCTOR_ASSIGNED_RATIO else None,
+                    clinic_id, surgery_time, fpa.date(), fpa, fpa, current_fpa, overnight_stays,
+                    str(rng.randint(100, 699)), rng.choice(('Piso 3', 'Piso 4', 'Piso 5', 'UPC', None)),
+                    TICKET_STATUS_ANULADO if annulled else TICKET_STATUS_VIGENTE,
+                    created_at, creator, annulled_at, annulled_reason, annulled_by,
+                    rng.choice(INITIAL_REASONS), surgery.name, surgery.base_stay_hours,
+                ))
+                last_ticket_id = ticket_id
+
+            first_mod = loader.next_ids(FpaModification, len(modifications))
+            modifications = [(first_mod + i,) + row[1:] for i, row in enumerate(modifications)]
+            first_audit = loader.next_ids(ActionAudit, len(audits))
+            audits = [(first_audit + i,) + row for i, row in enumerate(audits)]
+
+            loader.write(Patient, patient_columns, patients)
+            loader.write(Ticket, ticket_columns, tickets)
+            loader.write(FpaModification, modification_columns, modifications)
+            loader.write(ActionAudit, audit_columns, audits)
+
+        return last_ticket_id
+
+    def _create_logins(self, loader, clinic_id, users):
+        rng = self.rng
+        rows = []
+        start = self.now - timedelta(days=self.spec.days)
+        for day in range(self.spec.days):
+            for user_id, username in users:
+                if rng.random() < LOGIN_PROBABILITY:
+                    timestamp = start + timedelta(days=day, hours=rng.randint(7, 20), minutes=rng.randint(0, 59))
+                    rows.append((user_id, username, clinic_id, timestamp,
+                                 f'10.{clinic_id % 256}.{rng.randint(0, 255)}.{rng.randint(1, 254)}'))
+        rows.sort(key=lambda row: row[3])
+        first_id = loader.next_ids(LoginAudit, len(rows))
+        loader.write(LoginAudit, ('id', 'user_id', 'username', 'clinic_id', 'timestamp', 'ip_address'),
+                     [(first_id + i,) + row for i, row in enumerate(rows)])
@@ -5,7 +5,11 @@ This service handles all ticket-related business logic including creation,
 modification, and cancellation.
 """
 from datetime import datetime
-from models import db, Ticket, FpaModification
+from models import (
+    db, Ticket, FpaModification,
+    AUDIT_EVENT_TICKET_CREATED, AUDIT_EVENT_FPA_MODIFIED,
+    AUDIT_EVENT_TICKET_ANNULLED, AUDIT_EVENT_TICKET_RESTORED,
+)
 from .fpa_calculator import FPACalculator
 from .audit_service import AuditService
 from utils.string_utils import generate_prefix
@@ -113,7 +117,14 @@ class TicketService:
             user=user,
             action=f"Creó ticket para paciente {ticket_data['patient'].full_name}",
             target_id=ticket_id,
-            target_type='Ticket'
+            target_type='Ticket',
+            event_type=AUDIT_EVENT_TICKET_CREATED,
+            payload={
+                'patient_id': ticket_data['patient'].id,
+                'surgery_id': ticket_data['surgery'].id,
+                'initial_fpa': initial_fpa.isoformat(),
+                'overnight_stays': overnight_stays,
+            }
         )
 
         return ticket
@@ -160,7 +171,14 @@ class TicketService:
             user=user,
             action=f"Modificó FPA de {previous_fpa} a {new_fpa}. Razón: {reason}",
             target_id=ticket.id,
-            target_type='Ticket'
+            target_type='Ticket',
+            event_type=AUDIT_EVENT_FPA_MODIFIED,
+            payload={
+                'previous_fpa': previous_fpa.isoformat() if previous_fpa else None,
+                'new_fpa': new_fpa.isoformat(),
+                'reason': reason,
+                'justification': justification,
+            }
         )
 
         return modification
@@ -188,7 +206,9 @@ class TicketService:
             user=user,
             action=f"Anuló ticket. Razón: {reason}",
             target_id=ticket.id,
-            target_type='Ticket'
+            target_type='Ticket',
+            event_type=AUDIT_EVENT_TICKET_ANNULLED,
+            payload={'reason': reason}
         )
 
         return ticket
@@ -215,7 +235,8 @@ class TicketService:
             user=user,
             action="Restauró ticket anulado",
             target_id=ticket.id,
-            target_type='Ticket'
+            target_type='Ticket',
+            event_type=AUDIT_EVENT_TICKET_RESTORED
         )
 
         return ticket
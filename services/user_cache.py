@@ -0,0 +1,123 @@
+"""
+User Cache - Cached user snapshots for Flask-Login
+
+`load_user` runs on every request. Without a cache that costs one query for the
+user, another for `is_superuser` (Superuser table) and a third for the lazy
+`clinic` relationship. The snapshot keeps only what requests read from
+`current_user`, detached from any session, and is picklable so it can live in
+a networked cache backend.
+"""
+from collections import namedtuple
+from flask_login import UserMixin
+from sqlalchemy import select
+from cache import app_cache
+from models import db, Clinic, User
+from monitoring.metrics import record_cache
+from utils.db_routing import primary_bind
+
+
+CachedClinic = namedtuple('CachedClinic', ['id', 'name'])
+
+
+class CachedUser(UserMixin):
+    """Read-only snapshot of a User, safe to share between requests and threads."""
+
+    def __init__(self, user):
+        self.id = user.id
+        self.username = user.username
+        self.email = user.email
+        self.role = user.role
+        self.clinic_id = user.clinic_id
+        self._active = bool(user.is_active)
+        self._is_superuser = user.is_superuser
+        self.clinic = CachedClinic(user.clinic.id, user.clinic.name) if user.clinic else None
+
+    @property
+    def is_active(self):
+        return self._active
+
+    @property
+    def is_superuser(self):
+        return self._is_superuser
+
+    def is_admin(self):
+        # Misma regla que User.is_admin()
+        if not self.role:
+            return self.is_superuser
+        return self.role.lower() in ['admin', 'superuser', 'superusuario'] or self.is_superuser
+
+    def __repr__(self):
+        return f'<CachedUser {self.username}>'
+
+
+class UserCache:
+    """
+    CachedUser snapshots keyed by user id, stored in the application cache
+    (cache/) so they are shared between instances when it runs on Redis.
+    """
+
+    name = 'user'
+    namespace = 'users'
+    ttl = 60
+
+    @staticmethod
+    def configure(ttl=None):
+        """
+        Adjust the TTL (seconds). A TTL of 0 disables caching.
+
+        Args:
+            ttl (int, optional): Seconds a snapshot stays valid
+        """
+        if ttl is not None:
+            UserCache.ttl = ttl
+        UserCache.invalidate()
+
+    @staticmethod
+    def load(user_id):
+        """
+        Get the snapshot for a user id, querying the database on a miss.
+
+        Args:
+            user_id (int): User primary key
+
+        Returns:
+            CachedUser or None: None if the user does not exist
+        """
+        if UserCache.ttl > 0:
+            snapshot = app_cache.get(UserCache.name, user_id, namespace=UserCache.namespace)
+            if snapshot is not None:
+                return snapshot
+        else:
+            record_cache(UserCache.name, hit=False)
+
+        # De la primaria aunque la vista sea @read_only: el snapshot se cachea con la versión
+        # del namespace 'users' de la primaria y una réplica atrasada dejaría activo a un
+        # usuario recién desactivado
+        user = db.session.execute(
+            select(User).where(User.id == user_id).execution_options(populate_existing=True),
+            bind_arguments=primary_bind(db)
+        ).scalar_one_or_none()
+        if user is None:
+            # Not cached: the id may be created later
+            return None
+        if user.clinic_id is not None:
+            # En el identity map: user.clinic se resuelve sin otra query (a la réplica)
+            db.session.get(Clinic, user.clinic_id, bind_arguments=primary_bind(db))
+        snapshot = CachedUser(user)
+
+        if UserCache.ttl > 0:
+            app_cache.set(UserCache.name, user_id, snapshot, namespace=UserCache.namespace, ttl=UserCache.ttl)
+        return snapshot
+
+    @staticmethod
+    def invalidate(user_id=None):
+        """
+        Drop one user's snapshot, or every snapshot when user_id is None.
+
+        Args:
+            user_id (int, optional): User to invalidate
+        """
+        if user_id is None:
+            app_cache.bump(UserCache.namespace)
+        else:
+            app_cache.delete(UserCache.name, user_id, namespace=UserCache.namespace)
@@ -1,7 +1,7 @@
 """
 User Service - Business logic for user management
 """
-from models import db, User, Superuser
+from models import db, User, Superuser, AUDIT_EVENT_USER_ACTIVATED, AUDIT_EVENT_USER_DEACTIVATED
 from .audit_service import AuditService
 
 
@@ -63,12 +63,15 @@ class UserService:
         Returns:
             User: Updated user instance
         """
+        # El snapshot de UserCache se invalida al commit (cache/invalidation.py)
         user.is_active = False
         AuditService.log_action(
             user=admin_user,
             action=f"Desactivó usuario {user.username}",
             target_id=user.id,
-            target_type='User'
+            target_type='User',
+            event_type=AUDIT_EVENT_USER_DEACTIVATED,
+            payload={'username': user.username}
         )
         return user
 
@@ -84,11 +87,14 @@ class UserService:
         Returns:
             User: Updated user instance
         """
+        # El snapshot de UserCache se invalida al commit (cache/invalidation.py)
         user.is_active = True
         AuditService.log_action(
             user=admin_user,
             action=f"Activó usuario {user.username}",
             target_id=user.id,
-            target_type='User'
+            target_type='User',
+            event_type=AUDIT_EVENT_USER_ACTIVATED,
+            payload={'username': user.username}
         )
         return user
@@ -8,6 +8,11 @@ echo "=========================================="
 # Configurar puerto
 PORT=${PORT:-8080}
 
+# fast: migraciones y superusers dentro de gunicorn (utils/boot.py), sin procesos flask previos
+# legacy: flask db upgrade + flask sync-superusers antes de gunicorn
+STARTUP_MODE=${STARTUP_MODE:-fast}
+GUNICORN_EXTRA_ARGS=""
+
 # Verificar DATABASE_URL
 if [ -z "$DATABASE_URL" ]; then
     echo "ADVERTENCIA: DATABASE_URL no configurada"
@@ -39,7 +44,7 @@ if [ -n "$DATABASE_URL" ]; then
             flask reset-db 2>&1 || echo "Advertencia: Error en reset-db"
         fi
         echo "Reset de base de datos completado"
-    else
+    elif [ "$STARTUP_MODE" = "legacy" ]; then
         echo ""
         echo "Aplicando migraciones de base de datos..."
         flask db upgrade 2>&1 || { echo "ERROR: Las migraciones de base de datos fallaron. Abortando."; exit 1; }
@@ -49,6 +54,13 @@ if [ -n "$DATABASE_URL" ]; then
         echo "Sincronizando superusers..."
         flask sync-superusers 2>&1 || echo "Advertencia: No se pudieron sincronizar superusers"
         echo "Superusers sincronizados"
+    else
+        echo ""
+        echo "STARTUP_MODE=fast: migraciones (solo si hay pendientes) y superusers al cargar la app"
+        export BOOT_STEPS_IN_PROCESS=true
+        # La app se carga en el master, antes de forkear: el timeout de gunicorn
+        # no mata al worker mientras corre una migración larga
+        GUNICORN_EXTRA_ARGS="--preload"
     fi
 fi
 
@@ -66,4 +78,5 @@ exec gunicorn \
     --log-level info \
     --access-logfile - \
     --error-logfile - \
+    $GUNICORN_EXTRA_ARGS \
     app:app
@@ -0,0 +1,150 @@
+/**
+ * FPA Engine - Cálculo de la FPA en el navegador para la previsualización del
+ * formulario de creación de tickets.
+ *
+ * Replica FPACalculator (services/fpa_calculator.py) y TimeBlockHelper
+ * (utils/time_blocks.py) con los parámetros que exporta FPACalculator.rules()
+ * en los datos maestros del formulario. tests/data/fpa_golden_vectors.json
+ * mantiene ambas implementaciones idénticas; el servidor recalcula la FPA al
+ * crear el ticket.
+ *
+ * Las fechas son "ingenuas" como en Python (sin zona horaria): se representan
+ * con Date cuyos campos UTC son la hora de pared, así los cambios de horario
+ * de verano del navegador no alteran la aritmética.
+ */
+(function (root, factory) {
+    if (typeof module === 'object' && module.exports) {
+        module.exports = factory();
+    } else {
+        root.FpaEngine = factory();
+    }
+}(typeof self !== 'undefined' ? self : this, function () {
+    'use strict';
+
+    const MINUTE = 60 * 1000;
+    const HOUR = 60 * MINUTE;
+    const DAY = 24 * HOUR;
+    const ISO_PATTERN = /^(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2})(?::(\d{2})(?:\.(\d{1,6}))?)?$/;
+
+    function pad(value, width) {
+        return String(value).padStart(width || 2, '0');
+    }
+
+    /** "YYYY-MM-DDTHH:MM[:SS[.ffffff]]" (valor de un input datetime-local) -> Date. */
+    function parse(value) {
+        const match = ISO_PATTERN.exec(String(value).trim());
+        if (!match) {
+            return null;
+        }
+        const [, year, month, day, hour, minute, second, fraction] = match;
+        const millis = fraction ? Math.floor(Number(fraction.padEnd(6, '0')) / 1000) : 0;
+        return new Date(Date.UTC(Number(year), Number(month) - 1, Number(day),
+            Number(hour), Number(minute), Number(second || 0), millis));
+    }
+
+    /** Igual que datetime.isoformat() de Python. */
+    function isoformat(date) {
+        const text = `${isoDate(date)}T${pad(date.getUTCHours())}:${pad(date.getUTCMinutes())}:${pad(date.getUTCSeconds())}`;
+        const millis = date.getUTCMilliseconds();
+        return millis ? `${text}.${pad(millis, 3)}000` : text;
+    }
+
+    function isoDate(date) {
+        return `${pad(date.getUTCFullYear(), 4)}-${pad(date.getUTCMonth() + 1)}-${pad(date.getUTCDate())}`;
+    }
+
+    /** strftime('%d/%m/%Y') */
+    function displayDate(date) {
+        return `${pad(date.getUTCDate())}/${pad(date.getUTCMonth() + 1)}/${pad(date.getUTCFullYear(), 4)}`;
+    }
+
+    /** strftime('%H:%M') */
+    function displayTime(date) {
+        return `${pad(date.getUTCHours())}:${pad(date.getUTCMinutes())}`;
+    }
+
+    /** FPACalculator.calculate_admission_time */
+    function admissionTime(rules, surgeryTime) {
+        const [earlyHour, earlyMinute] = rules.early_surgery_time;
+        if (surgeryTime.getUTCHours() === earlyHour && surgeryTime.getUTCMinutes() === earlyMinute) {
+            // Como replace(hour, minute): se conservan segundos y fracción
+            const admission = new Date(surgeryTime.getTime());
+            admission.setUTCHours(rules.early_admission_time[0], rules.early_admission_time[1]);
+            return admission;
+        }
+        return new Date(surgeryTime.getTime() - rules.admission_lead_minutes * MINUTE);
+    }
+
+    /** FPACalculator.calculate: {admission, fpa, overnightStays} */
+    function calculate(rules, surgeryTime, baseStayHours) {
+        const admission = admissionTime(rules, surgeryTime);
+        const base = new Date(admission.getTime() + baseStayHours * HOUR);
+
+        // Redondeo hacia arriba si hay minutos o segundos (la fracción solo se trunca)
+        let fpa = new Date(Math.floor(base.getTime() / HOUR) * HOUR);
+        if (base.getUTCMinutes() > 0 || base.getUTCSeconds() > 0) {
+            fpa = new Date(fpa.getTime() + HOUR);
+        }
+
+        // Noches: diferencia de días calendario entre ingreso y FPA
+        const days = Math.floor(fpa.getTime() / DAY) - Math.floor(admission.getTime() / DAY);
+        return { admission: admission, fpa: fpa, overnightStays: Math.max(0, days) };
+    }
+
+    /** TimeBlockHelper.get_block_label */
+    function blockLabel(rules, endHour) {
+        const startHour = ((endHour - rules.block_hours) % 24 + 24) % 24;
+        return `${pad(startHour)}:00 - ${pad(endHour)}:00`;
+    }
+
+    /** TimeBlockHelper.get_block_for_time */
+    function blockForTime(rules, date) {
+        let hour = date.getUTCHours();
+        if (date.getUTCMinutes() >= rules.block_round_up_minute) {
+            hour += 1;
+        }
+        if (hour >= 24) {
+            hour = 0;
+        }
+        return {
+            value: hour,
+            label: blockLabel(rules, hour),
+            start_hour: ((hour - rules.block_hours) % 24 + 24) % 24,
+            end_hour: hour,
+        };
+    }
+
+    /**
+     * FPACalculator.preview: los mismos campos que /tickets/api/calculate-fpa.
+     * Devuelve null si la hora de cirugía no es válida.
+     */
+    function preview(rules, surgeryTimeValue, baseStayHours) {
+        const surgeryTime = parse(surgeryTimeValue);
+        if (!surgeryTime) {
+            return null;
+        }
+        const result = calculate(rules, surgeryTime, baseStayHours);
+        const block = blockForTime(rules, result.fpa);
+        return {
+            fpa_iso: isoformat(result.fpa),
+            fpa_date_iso: isoDate(result.fpa),
+            fpa_time: displayTime(result.fpa),
+            fpa_display_str: `${displayDate(result.fpa)} (Bloque: ${block.label})`,
+            surgery_base_stay_hours: baseStayHours,
+            overnight_stays: result.overnightStays,
+            block_value: block.value,
+            admission_time_iso: isoformat(result.admission),
+            admission_time_display: `${displayDate(result.admission)} ${displayTime(result.admission)}`,
+        };
+    }
+
+    return {
+        parse: parse,
+        isoformat: isoformat,
+        admissionTime: admissionTime,
+        calculate: calculate,
+        blockLabel: blockLabel,
+        blockForTime: blockForTime,
+        preview: preview,
+    };
+}));
@@ -4,6 +4,8 @@ Proporciona app, cliente, base de datos, usuarios, clínicas y datos de prueba.
 """
 import pytest
 import os
+import tempfile
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash
 
@@ -14,8 +16,13 @@ os.environ['SECRET_KEY'] = 'test-secret-key'
 os.environ['ENABLE_IAP'] = 'false'
 os.environ['ENABLE_DEMO_LOGIN'] = 'true'
 os.environ['SKIP_AUTH_FOR_TESTING'] = 'true'
+# Volcados del query log fuera del directorio compartido de /tmp
+os.environ['QUERY_LOG_DIR'] = tempfile.mkdtemp(prefix='query-log-test-')
+# Sin volcado periódico: el hilo asignaría memoria en medio de los tests de tracemalloc
+os.environ['QUERY_LOG_DUMP_INTERVAL'] = '0'
 
 from app import create_app
+from services.fpa_calculator import FPACalculator
 from models import (
     db, User, Clinic, Specialty, Surgery, Doctor,
     StandardizedReason, Patient, Ticket,
@@ -26,6 +33,71 @@ from models import (
 )
 
 
+# Resultados de tests/test_query_budgets.py: (endpoint, tickets, queries, presupuesto)
+QUERY_BUDGET_REPORT = []
+
+
+class QueryCounter:
+    """Sentencias SQL ejecutadas dentro de un bloque `with query_counter() as counter`."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _before_cursor_execute(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def __enter__(self):
+        from sqlalchemy import event
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        event.remove(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return False
+
+
+@pytest.fixture
+def query_counter(db_session):
+    """Fábrica de QueryCounter sobre el engine de la BD de test."""
+    return lambda: QueryCounter(db_session.engine)
+
+
+@pytest.fixture
+def memory_ceiling():
+    """
+    `with memory_ceiling(mb): ...` falla si el pico de memoria Python del bloque
+    (tracemalloc) supera `mb` megabytes; el mensaje lista los sitios que más asignaron.
+    """
+    from monitoring.memory import trace_memory, MB
+
+    @contextmanager
+    def check(mb):
+        with trace_memory() as trace:
+            yield trace
+        assert trace.peak_bytes <= mb * MB, (
+            f'Pico de memoria {trace.peak_bytes / MB:.1f} MB > techo {mb:.1f} MB\n{trace.format_top()}'
+        )
+    return check
+
+
+def pytest_terminal_summary(terminalreporter):
+    """Tabla de queries por endpoint registrada por los tests de presupuesto."""
+    if not QUERY_BUDGET_REPORT:
+        return
+    terminalreporter.section('Query budgets por endpoint')
+    terminalreporter.write_line(f"{'endpoint':<28}{'tickets':>9}{'queries':>9}{'budget':>8}")
+    for endpoint, tickets, queries, budget in sorted(QUERY_BUDGET_REPORT):
+        flag = '' if queries <= budget else '  <-- excede'
+        terminalreporter.write_line(f'{endpoint:<28}{tickets:>9}{queries:>9}{budget:>8}{flag}')
+
+
 @pytest.fixture(scope='session')
 def app():
     """
@@ -57,11 +129,18 @@ def db_session(app):
     Crea todas las tablas al inicio y las borra al final.
     Scope: function - nueva BD para cada test (aislamiento).
     """
+    from cache import app_cache
+    from services.occupancy import OccupancyService
+    # Los ids se reutilizan entre tests: un usuario o catálogo cacheado sería de otro test
+    app_cache.clear()
+    OccupancyService.reset()
     with app.app_context():
         db.create_all()
         yield db
         db.session.remove()
         db.drop_all()
+    app_cache.clear()
+    OccupancyService.reset()
 
 
 @pytest.fixture
@@ -307,6 +386,20 @@ def sample_ticket(db_session, sample_clinic, sample_patient, sample_surgery_norm
     return ticket
 
 
+def make_ticket(number, surgery, clinic, patient, pavilion_end, status=TICKET_STATUS_VIGENTE, current_fpa=None):
+    """Ticket creado con la FPA del sistema vigente al momento de crearlo."""
+    fpa, overnight = FPACalculator.calculate(pavilion_end, surgery)
+    ticket = Ticket(
+        id=f'TH-TEST-2025-{number:03d}', patient_id=patient.id, surgery_id=surgery.id, clinic_id=clinic.id,
+        pavilion_end_time=pavilion_end, medical_discharge_date=fpa.date(),
+        system_calculated_fpa=fpa, initial_fpa=current_fpa or fpa, current_fpa=current_fpa or fpa,
+        overnight_stays=overnight, status=status, created_by='test',
+        surgery_name_snapshot=surgery.name, surgery_base_hours_snapshot=surgery.base_stay_hours,
+    )
+    db.session.add(ticket)
+    return ticket
+
+
 @pytest.fixture
 def authenticated_client(client, sample_user_admin, app):
     """
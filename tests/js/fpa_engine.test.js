@@ -0,0 +1,35 @@
+/**
+ * static/js/fpa_engine.js contra tests/data/fpa_golden_vectors.json (los mismos
+ * vectores que verifica tests/test_fpa_engine.py con FPACalculator).
+ *
+ *     node --test tests/js/fpa_engine.test.js
+ */
+'use strict';
+
+const assert = require('node:assert/strict');
+const fs = require('node:fs');
+const path = require('node:path');
+const { test } = require('node:test');
+
+const FpaEngine = require('../../static/js/fpa_engine.js');
+
+const vectors = JSON.parse(fs.readFileSync(path.join(__dirname, '..', 'data', 'fpa_golden_vectors.json'), 'utf8'));
+const rules = vectors.rules;
+
+test('preview coincide con FPACalculator.preview', () => {
+    for (const vector of vectors.previews) {
+        assert.deepEqual(FpaEngine.preview(rules, vector.surgery_time, vector.base_stay_hours), vector.expected,
+            `${vector.surgery_time} + ${vector.base_stay_hours}h`);
+    }
+});
+
+test('blockForTime coincide con TimeBlockHelper.get_block_for_time', () => {
+    for (const vector of vectors.blocks) {
+        assert.deepEqual(FpaEngine.blockForTime(rules, FpaEngine.parse(vector.time)), vector.expected, vector.time);
+    }
+});
+
+test('la hora de cirugía inválida no produce previsualización', () => {
+    assert.equal(FpaEngine.preview(rules, '', 24), null);
+    assert.equal(FpaEngine.preview(rules, '15/01/2025 10:00', 24), null);
+});
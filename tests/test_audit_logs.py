@@ -99,6 +99,28 @@ def superuser(db_session):
     return user
 
 
+def _assert_backfill_matches_live(event_type):
+    """
+    El parser del backfill, aplicado al texto de los eventos escritos en vivo,
+    da el mismo event_type y las mismas claves de payload; los valores que el
+    texto no trae quedan en None y el resto coincide.
+    """
+    from services import AuditService
+
+    events = ActionAudit.query.filter_by(event_type=event_type).all()
+    assert events
+    for event in events:
+        parsed_type, parsed = AuditService.parse_legacy_action(event.action)
+        assert parsed_type == event.event_type
+        if event.payload is None:
+            assert parsed is None
+            continue
+        assert set(parsed) == set(event.payload)
+        for key, value in parsed.items():
+            assert value is None or value == event.payload[key], key
+    return len(events)
+
+
 @pytest.mark.auth
 class TestLoginAuditMultiTenancy:
     """Tests de multi-tenancy en LoginAudit."""
@@ -486,3 +508,283 @@ class TestAuditLogEdgeCases:
             assert len(clinic_logs) == 1
             assert clinic_logs[0].clinic_id == clinic.id
             assert clinic_logs[0].username == user.username
+
+
+@pytest.mark.auth
+class TestAuditKeysetPagination:
+    """Tests de la paginación keyset (timestamp, id) del explorador de auditoría."""
+
+    def _create_actions(self, db_session, user, count, target_id='TH-PROV-001'):
+        base = datetime(2026, 3, 1, 12, 0)
+        logs = []
+        for i in range(count):
+            log = ActionAudit(
+                user_id=user.id,
+                username=user.username,
+                clinic_id=user.clinic_id,
+                # Timestamps repetidos de a pares para forzar el desempate por id
+                timestamp=base.replace(minute=i // 2),
+                action=f'accion {i}',
+                target_id=target_id,
+                target_type='Ticket'
+            )
+            db_session.session.add(log)
+            logs.append(log)
+        db_session.session.commit()
+        return logs
+
+    def test_pages_cover_all_rows_without_duplicates(self, db_session, admin_providencia):
+        """Recorrer todas las páginas devuelve cada registro exactamente una vez."""
+        from repositories import AuditRepository
+
+        self._create_actions(db_session, admin_providencia, 13)
+
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = AuditRepository.get_action_logs_page({}, cursor=cursor, limit=5)
+            seen.extend(log.id for log in page)
+            if not cursor:
+                break
+
+        assert len(seen) == 13
+        assert len(set(seen)) == 13
+
+    def test_pages_are_ordered_by_timestamp_then_id_desc(self, db_session, admin_providencia):
+        """El orden es (timestamp DESC, id DESC), estable entre páginas."""
+        from repositories import AuditRepository
+
+        self._create_actions(db_session, admin_providencia, 6)
+
+        first, cursor = AuditRepository.get_action_logs_page({}, limit=3)
+        second, next_cursor = AuditRepository.get_action_logs_page({}, cursor=cursor, limit=3)
+        keys = [(log.timestamp, log.id) for log in first + second]
+
+        assert keys == sorted(keys, reverse=True)
+        assert next_cursor is None
+
+    def test_filters_by_target_and_clinic(self, db_session, admin_providencia, admin_vitacura):
+        """Los filtros de objeto y clínica se aplican antes de paginar."""
+        from repositories import AuditRepository
+
+        self._create_actions(db_session, admin_providencia, 4, target_id='TH-PROV-001')
+        self._create_actions(db_session, admin_providencia, 2, target_id='TH-PROV-002')
+        self._create_actions(db_session, admin_vitacura, 3, target_id='TH-PROV-001')
+
+        page, _ = AuditRepository.get_action_logs_page({
+            'target_type': 'Ticket',
+            'target_id': 'TH-PROV-001',
+            'clinic_id': admin_providencia.clinic_id,
+        }, limit=50)
+
+        assert len(page) == 4
+        assert all(log.clinic_id == admin_providencia.clinic_id for log in page)
+
+    def test_invalid_cursor_returns_first_page(self, db_session, admin_providencia):
+        """Un cursor inválido no rompe la consulta: se devuelve la primera página."""
+        from repositories import AuditRepository
+
+        self._create_actions(db_session, admin_providencia, 3)
+        page, _ = AuditRepository.get_action_logs_page({}, cursor='basura', limit=10)
+        assert len(page) == 3
+
+    def test_admin_explorer_only_shows_own_clinic(self, app, client, db_session,
+                                                  admin_providencia, admin_vitacura):
+        """Un admin no puede ver acciones de otra clínica aunque pase clinic_id."""
+        from flask_login import login_user
+
+        self._create_actions(db_session, admin_providencia, 1, target_id='TH-PROV-777')
+        self._create_actions(db_session, admin_vitacura, 1, target_id='TH-VITA-888')
+
+        with client:
+            with app.test_request_context():
+                login_user(admin_providencia)
+            response = client.get(f'/admin/audit/actions?clinic_id={admin_vitacura.clinic_id}')
+
+        assert response.status_code == 200
+        content = response.data.decode('utf-8')
+        assert 'TH-PROV-777' in content
+        assert 'TH-VITA-888' not in content
+
+
+class TestStructuredAuditEvents:
+    """Tests de eventos de auditoría estructurados (event_type + payload)."""
+
+    def test_log_action_stores_event_type_and_payload(self, db_session, admin_providencia):
+        """log_action persiste event_type/payload; sin event_type queda 'other'."""
+        from services import AuditService
+        from models import AUDIT_EVENT_FPA_MODIFIED, AUDIT_EVENT_OTHER
+
+        structured = AuditService.log_action(
+            admin_providencia, 'Modificó FPA', target_id='TH-1', target_type='Ticket',
+            event_type=AUDIT_EVENT_FPA_MODIFIED,
+            payload={'previous_fpa': '2026-03-01T10:00:00', 'new_fpa': '2026-03-02T10:00:00'}
+        )
+        plain = AuditService.log_action(admin_providencia, 'Algo libre')
+        db_session.session.commit()
+
+        stored = db_session.session.get(ActionAudit, structured.id)
+        assert stored.event_type == AUDIT_EVENT_FPA_MODIFIED
+        assert stored.payload['new_fpa'] == '2026-03-02T10:00:00'
+        assert db_session.session.get(ActionAudit, plain.id).event_type == AUDIT_EVENT_OTHER
+
+    @pytest.mark.parametrize('action,event_type,payload', [
+        ('Creó ticket para paciente Juan Pérez', 'ticket_created',
+         {'patient_id': None, 'surgery_id': None, 'initial_fpa': None, 'overnight_stays': None}),
+        ('Modificó FPA de 2026-03-01 10:00:00 a 2026-03-02 12:30:00. Razón: Complicación',
+         'fpa_modified',
+         {'previous_fpa': '2026-03-01T10:00:00', 'new_fpa': '2026-03-02T12:30:00',
+          'reason': 'Complicación', 'justification': None}),
+        ("Editó paciente: RUT de '1-9' a '2-7', Edad de '40' a '41'",
+         'patient_edited',
+         {'fields_changed': {'rut': ['1-9', '2-7'], 'age': [40, 41]}}),
+        ("Editó ticket: Habitación/Cama de '101' a '205', Cirugía ID de '3' a '4', Doctor ID de 'None' a '7'",
+         'ticket_edited',
+         {'fields_changed': {'bed_number': ['101', '205'], 'surgery_id': [3, 4], 'doctor_id': [None, 7]}}),
+        ('Actualizó cama a: 305', 'ticket_field_updated', {'field': 'bed_number', 'value': '305'}),
+        ('Actualizó ubicación a: Sin especificar', 'ticket_field_updated', {'field': 'location', 'value': None}),
+        ('Configuró umbrales de colores (global): Verde>8h, Amarillo>4h, Rojo<2h',
+         'thresholds_updated', {'clinic_id': None, 'green': 8, 'yellow': 4, 'red': 2}),
+        ('Configuró umbrales de colores (clínica 3): Verde>10h, Amarillo>5h, Rojo<1h',
+         'thresholds_updated', {'clinic_id': 3, 'green': 10, 'yellow': 5, 'red': 1}),
+        ('Restauró ticket anulado', 'ticket_restored', None),
+        ('Texto desconocido', 'other', None),
+    ])
+    def test_parse_legacy_action(self, action, event_type, payload):
+        """El parser de texto histórico extrae el tipo de evento y sus datos."""
+        from services import AuditService
+
+        assert AuditService.parse_legacy_action(action) == (event_type, payload)
+
+    def test_legacy_edit_messages_parse_to_the_live_payload(self, authenticated_client, db_session, sample_ticket,
+                                                            sample_surgery_ambulatory):
+        """El texto de una edición real en admin se parsea a los mismos fields_changed del payload."""
+        from datetime import timedelta
+        from services import AuditService
+        from utils import utcnow
+
+        sample_ticket.current_fpa = utcnow() + timedelta(days=2)
+        db_session.session.commit()
+
+        response = authenticated_client.post(f'/admin/ticket/{sample_ticket.id}/edit', data={
+            'rut': '22222222-2', 'primer_nombre': 'Pedro', 'segundo_nombre': '', 'apellido_paterno': 'Soto',
+            'apellido_materno': 'Rojas', 'age': '61', 'sex': 'F', 'episode_id': '',
+            'room': '205', 'surgery_id': str(sample_surgery_ambulatory.id), 'doctor_id': '',
+        })
+        assert response.status_code == 302
+
+        events = ActionAudit.query.filter(ActionAudit.event_type.in_(['patient_edited', 'ticket_edited'])).all()
+        assert {event.event_type for event in events} == {'patient_edited', 'ticket_edited'}
+        for event in events:
+            event_type, payload = AuditService.parse_legacy_action(event.action)
+            assert event_type == event.event_type
+            assert payload['fields_changed'] == event.payload['fields_changed']
+            assert len(payload['fields_changed']) >= 3
+
+    def test_created_backfill_matches_live(self, db_session, sample_clinic, sample_patient,
+                                           sample_surgery_normal, sample_user_admin):
+        from datetime import timedelta
+        from services import TicketService
+
+        pavilion_end = datetime(2026, 2, 11, 10, 0)
+        TicketService.create_ticket({
+            'patient': sample_patient, 'surgery': sample_surgery_normal, 'clinic': sample_clinic,
+            'pavilion_end_time': pavilion_end, 'initial_fpa': pavilion_end + timedelta(hours=24),
+        }, sample_user_admin)
+        db_session.session.commit()
+
+        _assert_backfill_matches_live('ticket_created')
+
+    def test_fpa_modified_backfill_matches_live(self, db_session, sample_ticket, sample_user_admin):
+        from datetime import timedelta
+        from services import TicketService
+
+        TicketService.modify_fpa(sample_ticket, sample_ticket.current_fpa + timedelta(hours=5, minutes=30),
+                                 'Complicación', 'Fiebre postoperatoria', sample_user_admin)
+        db_session.session.commit()
+
+        _assert_backfill_matches_live('fpa_modified')
+
+    def test_annulled_and_restored_backfill_matches_live(self, db_session, sample_ticket, sample_user_admin):
+        from services import TicketService
+
+        TicketService.annul_ticket(sample_ticket, 'Ingreso duplicado', sample_user_admin)
+        TicketService.restore_ticket(sample_ticket, sample_user_admin)
+        db_session.session.commit()
+
+        _assert_backfill_matches_live('ticket_annulled')
+        _assert_backfill_matches_live('ticket_restored')
+
+    def test_field_updated_backfill_matches_live(self, authenticated_client, db_session, sample_ticket):
+        from datetime import timedelta
+        from utils import utcnow
+
+        sample_ticket.current_fpa = utcnow() + timedelta(days=2)
+        db_session.session.commit()
+
+        for field, value in (('bed_number', '305'), ('location', ''), ('episode_id', '')):
+            response = authenticated_client.post('/tickets/api/update-bed-location', json={
+                'ticket_id': sample_ticket.id, 'field': field, 'value': value,
+            })
+            assert response.status_code == 200
+
+        assert _assert_backfill_matches_live('ticket_field_updated') == 3
+
+    def test_user_status_backfill_matches_live(self, db_session, sample_user_admin, sample_user_clinical):
+        from services import UserService
+
+        UserService.deactivate_user(sample_user_clinical, sample_user_admin)
+        UserService.activate_user(sample_user_clinical, sample_user_admin)
+        db_session.session.commit()
+
+        _assert_backfill_matches_live('user_deactivated')
+        _assert_backfill_matches_live('user_activated')
+
+    def test_thresholds_backfill_matches_live(self, authenticated_client, db_session, sample_clinic):
+        response = authenticated_client.post('/admin/configuracion/umbrales-colores/guardar', data={
+            'clinic_id': str(sample_clinic.id),
+            'green_threshold_hours': '10', 'yellow_threshold_hours': '5', 'red_threshold_hours': '1',
+        })
+        assert response.status_code == 302
+
+        _assert_backfill_matches_live('thresholds_updated')
+
+    def test_backfill_only_touches_untyped_rows(self, db_session, admin_providencia):
+        """El backfill por lotes completa filas antiguas y respeta las ya tipadas."""
+        from services import AuditService
+
+        for i in range(5):
+            db_session.session.add(ActionAudit(
+                user_id=admin_providencia.id, username=admin_providencia.username,
+                clinic_id=admin_providencia.clinic_id,
+                action=f'Anuló ticket. Razón: motivo {i}', target_type='Ticket'
+            ))
+        typed = ActionAudit(
+            user_id=admin_providencia.id, username=admin_providencia.username,
+            clinic_id=admin_providencia.clinic_id, action='Anuló ticket. Razón: x',
+            event_type='other'
+        )
+        db_session.session.add(typed)
+        db_session.session.commit()
+
+        assert AuditService.backfill_event_types(batch_size=2) == 5
+        assert AuditService.backfill_event_types(batch_size=2) == 0
+
+        db_session.session.expire_all()
+        annulled = ActionAudit.query.filter_by(event_type='ticket_annulled').all()
+        assert len(annulled) == 5
+        assert {log.payload['reason'] for log in annulled} == {f'motivo {i}' for i in range(5)}
+        assert db_session.session.get(ActionAudit, typed.id).event_type == 'other'
+
+    def test_filter_by_event_type(self, db_session, admin_providencia):
+        """El explorador filtra por event_type sin depender del texto."""
+        from repositories import AuditRepository
+        from services import AuditService
+
+        AuditService.log_action(admin_providencia, 'a', event_type='fpa_modified')
+        AuditService.log_action(admin_providencia, 'b', event_type='ticket_annulled')
+        AuditService.log_action(admin_providencia, 'c', event_type='fpa_modified')
+        db_session.session.commit()
+
+        page, _ = AuditRepository.get_action_logs_page({'event_type': 'fpa_modified'})
+        assert sorted(log.action for log in page) == ['a', 'c']
@@ -0,0 +1,94 @@
+"""
+Tests del suite de benchmarks (benchmarks/): dataset reproducible, runner y
+comparación contra línea base.
+"""
+from models import Ticket
+from benchmarks.cases import BENCHMARKS, BenchContext
+from benchmarks.dataset import benchmark_spec, build_dataset, load_dataset_summary
+from benchmarks.runner import compare_to_baseline, run_case, select_cases
+
+SMALL_SPEC = benchmark_spec(clinics=2, tickets=41, surgeries_per_clinic=4, days=30)
+
+
+class TestDataset:
+
+    def test_build_dataset_summary(self, db_session):
+        summary = build_dataset(SMALL_SPEC)
+
+        assert len(summary.clinic_ids) == 2
+        assert len(summary.admin_user_ids) == 2
+        assert summary.tickets == Ticket.query.count() == 41
+        assert len(summary.surgery_ids) == 4
+        for clinic_id, ticket_id in zip(summary.clinic_ids, summary.sample_ticket_ids):
+            assert Ticket.query.get(ticket_id).clinic_id == clinic_id
+
+    def test_load_summary_of_existing_dataset(self, db_session):
+        built = build_dataset(SMALL_SPEC)
+        loaded = load_dataset_summary(SMALL_SPEC)
+
+        assert loaded.clinic_ids == built.clinic_ids
+        assert loaded.admin_user_ids == built.admin_user_ids
+        assert loaded.sample_ticket_ids == built.sample_ticket_ids
+        assert loaded.surgery_ids == built.surgery_ids
+        assert loaded.tickets == 41
+
+    def test_load_summary_without_dataset(self, db_session, sample_clinic):
+        assert load_dataset_summary(SMALL_SPEC) is None
+
+
+class TestRunner:
+
+    def test_every_case_runs(self, app, db_session):
+        summary = build_dataset(SMALL_SPEC)
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(summary.admin_user_ids[0])
+            session['_fresh'] = True
+        ctx = BenchContext(app=app, client=client, summary=summary)
+
+        for case in BENCHMARKS.values():
+            result = run_case(case, ctx, iterations=1, warmup=0)
+            assert result.median_ms > 0, case.name
+
+    def test_streamed_pages_are_timed_to_the_last_byte(self, app, db_session, query_counter):
+        summary = build_dataset(SMALL_SPEC)
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(summary.admin_user_ids[0])
+            session['_fresh'] = True
+        ctx = BenchContext(app=app, client=client, summary=summary)
+
+        for name, path in [('http.nursing_board', '/tickets/nursing'), ('http.ticket_list', '/tickets/')]:
+            result = run_case(BENCHMARKS[name], ctx, iterations=1, warmup=1)
+            with query_counter() as counter:
+                response = client.get(path)
+                response.get_data()
+                response.close()
+
+            # Las queries del render en streaming (tarjetas / filas) caen dentro de la medición
+            assert result.queries == counter.count, name
+
+    def test_select_cases_by_prefix_and_glob(self):
+        names = [c.name for c in select_cases(BENCHMARKS, ['http.', '*compute_state*'])]
+        assert 'http.nursing_board' in names
+        assert any(n.startswith('ticket.compute_state') for n in names)
+        assert not any(n.startswith('repository.') for n in names)
+
+
+class TestCompareToBaseline:
+
+    def test_statuses(self):
+        baseline = {'a': {'median_ms': 100.0}, 'b': {'median_ms': 100.0}, 'c': {'median_ms': 100.0}}
+        results = {
+            'a': {'median_ms': 130.0},
+            'b': {'median_ms': 110.0},
+            'c': {'median_ms': 60.0},
+            'd': {'median_ms': 5.0},
+        }
+        status = {c['name']: c['status'] for c in compare_to_baseline(results, baseline, tolerance=0.2)}
+        assert status == {'a': 'regression', 'b': 'ok', 'c': 'improvement', 'd': 'new'}
+
+    def test_small_absolute_delta_is_noise(self):
+        # +100% pero solo 0.5 ms: no es regresión
+        comparison = compare_to_baseline({'x': {'median_ms': 1.0}}, {'x': {'median_ms': 0.5}})
+        assert comparison[0]['status'] == 'ok'
@@ -0,0 +1,161 @@
+"""
+Tests del arranque en proceso (utils/boot.py): migraciones solo si hay
+pendientes, sync de superusuarios e imports diferidos de las librerías de export.
+"""
+import os
+import threading
+
+import pytest
+from alembic import command
+from alembic.script import ScriptDirectory
+
+import db_indexes
+from app import create_app
+from commands import import_report_command
+from config import Config
+from models import db, Superuser
+from services.user_cache import UserCache
+from utils import boot
+
+
+def _head_revisions(app):
+    """(head, revisión anterior) según migrations/, para no fijarlas en el test."""
+    with app.app_context():
+        script = ScriptDirectory.from_config(boot.alembic_config(app))
+        head = script.get_revision(script.get_current_head())
+    return head.revision, head.down_revision
+
+
+@pytest.fixture
+def boot_app(tmp_path, monkeypatch):
+    """App sobre un SQLite en archivo con el esquema actual, estampado en el head."""
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{tmp_path / "boot.db"}')
+    monkeypatch.delenv('SUPERUSER_EMAILS', raising=False)
+    app = create_app()
+    # El warmup de arranque se prueba aparte (registra hooks de fork en el proceso)
+    app.config.update(TESTING=True, WARMUP_ON_BOOT=False)
+    with app.app_context():
+        db.create_all()
+        command.stamp(boot.alembic_config(app), 'head')
+    yield app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+    UserCache.invalidate()
+
+
+def _downgrade_one_revision(app):
+    """Deja la base como antes de la última migración."""
+    with app.app_context():
+        command.downgrade(boot.alembic_config(app), '-1')
+
+
+class TestMigrations:
+
+    def test_current_database_skips_upgrade(self, boot_app, monkeypatch):
+        calls = []
+        monkeypatch.setattr(boot.command, 'upgrade', lambda *args, **kwargs: calls.append(args))
+
+        report = boot.run_boot_steps(boot_app, db)
+
+        head, _ = _head_revisions(boot_app)
+        assert calls == []
+        assert report.step('migraciones').detail == f'al día en {head}'
+
+    def test_pending_migration_is_applied(self, boot_app):
+        head, previous = _head_revisions(boot_app)
+        _downgrade_one_revision(boot_app)
+
+        report = boot.run_boot_steps(boot_app, db)
+
+        assert report.step('migraciones').detail == f'{previous} -> {head}'
+        with boot_app.app_context(), db.engine.connect() as connection:
+            assert boot.migration_revisions(boot_app, connection) == ({head}, {head})
+            assert db_indexes.missing_indexes(connection) == []
+
+    def test_failed_migration_aborts_boot(self, boot_app, monkeypatch):
+        _downgrade_one_revision(boot_app)
+
+        def broken(*args, **kwargs):
+            raise RuntimeError('migración rota')
+        monkeypatch.setattr(boot.command, 'upgrade', broken)
+
+        with pytest.raises(RuntimeError, match='migración rota'):
+            boot.run_boot_steps(boot_app, db)
+
+
+class TestSuperusers:
+
+    def test_superusers_are_synced(self, boot_app, monkeypatch):
+        monkeypatch.setenv('SUPERUSER_EMAILS', 'uno@redsalud.cl; dos@redsalud.cl')
+
+        report = boot.run_boot_steps(boot_app, db, import_seconds=0.5)
+
+        with boot_app.app_context():
+            assert {su.email for su in Superuser.query.all()} == {'uno@redsalud.cl', 'dos@redsalud.cl'}
+        assert [step.name for step in report.steps] == ['import', 'migraciones', 'superusers']
+        assert boot_app.extensions['boot'] is report
+
+    def test_sync_failure_does_not_abort_boot(self, boot_app, monkeypatch):
+        def broken():
+            raise RuntimeError('tabla superuser bloqueada')
+        monkeypatch.setattr(boot, 'sync_superusers', broken)
+
+        report = boot.run_boot_steps(boot_app, db)
+
+        step = report.step('superusers')
+        assert not step.ok
+        assert step.detail == 'tabla superuser bloqueada'
+        assert 'superusers' in report.summary() and 'FALLÓ' in report.summary()
+
+
+class TestWarmupOnBoot:
+
+    def test_warmup_runs_and_pool_reopens_after_fork(self, boot_app, monkeypatch):
+        hooks = {}
+        monkeypatch.setattr(os, 'register_at_fork', lambda **kwargs: hooks.update(kwargs))
+        boot_app.config['WARMUP_ON_BOOT'] = True
+
+        report = boot.run_boot_steps(boot_app, db)
+
+        assert report.step('warmup').ok
+        assert boot_app.extensions['warmup'].report is not None
+        assert set(hooks) == {'before', 'after_in_child'}
+
+        hooks['before']()
+        hooks['after_in_child']()
+        worker = next(t for t in threading.enumerate() if t.name == 'warmup-pool')
+        worker.join(timeout=5)
+        assert not worker.is_alive()
+
+
+class TestImportReport:
+
+    def test_parse_importtime(self):
+        output = '\n'.join([
+            'import time: self [us] | cumulative | imported package',
+            'import time:       120 |        120 |     sqlalchemy.util',
+            'import time:       300 |        420 |   sqlalchemy',
+            'import time:        80 |         80 |   routes.exports',
+            'import time:      1000 |       1500 | app',
+            'UserWarning: una línea que no es de importtime',
+        ])
+
+        report = boot.parse_importtime(output, 'app')
+
+        assert report.total_us == 1500
+        assert report.packages[0] == ('app', 1000, 1)
+        assert ('sqlalchemy', 420, 2) in report.packages
+        assert report.eager_lazy == []
+
+    def test_parse_importtime_flags_eager_export_libraries(self):
+        output = 'import time:       500 |        900 |   openpyxl.workbook\nimport time: 10 | 910 | app'
+
+        assert boot.parse_importtime(output, 'app').eager_lazy == ['openpyxl']
+
+    def test_app_import_does_not_load_export_libraries(self, app):
+        result = app.test_cli_runner().invoke(import_report_command, ['--strict', '--top', '5'])
+
+        assert result.exit_code == 0, result.output
+        assert 'Import de app:' in result.output
+        assert 'openpyxl, reportlab no se importan al arrancar' in result.output
@@ -0,0 +1,333 @@
+"""
+Tests del cache de aplicación (cache/): backends, versiones de namespace,
+single-flight, decorador e invalidación por escrituras del ORM.
+"""
+import threading
+
+import pytest
+from flask import Flask
+
+from cache import app_cache, init_cache, Cache, MemoryBackend, RedisBackend, NullBackend
+from cache.testing import LocalRedis
+from models import db, Clinic, Doctor, Surgery, UrgencyThreshold
+from services import MasterDataService
+from services.user_cache import UserCache, CachedUser
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def redis_cache(monkeypatch):
+    """app_cache sobre un RedisBackend con LocalRedis, como en producción con CACHE_BACKEND=redis."""
+    backend = RedisBackend(LocalRedis())
+    monkeypatch.setattr(app_cache, 'backend', backend)
+    return backend
+
+
+class TestMemoryBackend:
+
+    def test_least_recently_used_entry_is_evicted(self):
+        backend = MemoryBackend(maxsize=2)
+        backend.set('a', 1)
+        backend.set('b', 2)
+        backend.get('a')
+        backend.set('c', 3)
+
+        assert (backend.get('a'), backend.get('b'), backend.get('c')) == (1, None, 3)
+
+    def test_entries_expire(self):
+        clock = FakeClock()
+        backend = MemoryBackend(clock=clock)
+        backend.set('a', 1, ttl=10)
+
+        clock.now += 9
+        assert backend.get('a') == 1
+        clock.now += 1
+        assert backend.get('a') is None
+        assert len(backend) == 0
+
+    def test_counters_are_not_evicted(self):
+        backend = MemoryBackend(maxsize=1)
+        backend.add_counter('ns:x', 5)
+        backend.set('a', 1)
+        backend.set('b', 2)
+
+        assert backend.incr('ns:x') == 6
+        backend.add_counter('ns:x', 100)
+        assert backend.get_counter('ns:x') == 6
+
+
+class TestRedisBackend:
+
+    def test_values_are_serialized(self):
+        client = LocalRedis()
+        backend = RedisBackend(client, prefix='th')
+        backend.set('k', {'ids': [1, 2]}, ttl=30)
+
+        assert backend.get('k') == {'ids': [1, 2]}
+        assert isinstance(client.get('th:k'), bytes)
+
+    def test_instances_share_counters(self):
+        client = LocalRedis()
+        one, other = RedisBackend(client), RedisBackend(client)
+        one.add_counter('ns:clinic:1', 10)
+
+        assert other.incr('ns:clinic:1') == 11
+        assert one.get_counter('ns:clinic:1') == 11
+
+    def test_clear_only_removes_own_prefix(self):
+        client = LocalRedis()
+        client.set('otra-app:k', b'x')
+        backend = RedisBackend(client, prefix='th')
+        backend.set('k', 1)
+        backend.add_counter('ns:a', 1)
+
+        backend.clear()
+
+        assert backend.get('k') is None and backend.get_counter('ns:a') is None
+        assert client.get('otra-app:k') == b'x'
+
+    def test_from_url_requires_redis_package(self, monkeypatch):
+        import builtins
+        real_import = builtins.__import__
+
+        def no_redis(name, *args, **kwargs):
+            if name == 'redis':
+                raise ImportError(name)
+            return real_import(name, *args, **kwargs)
+        monkeypatch.setattr(builtins, '__import__', no_redis)
+
+        with pytest.raises(RuntimeError, match='pip install redis'):
+            RedisBackend.from_url('redis://localhost:6379/0')
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def cache(request):
+    backend = MemoryBackend() if request.param == 'memory' else RedisBackend(LocalRedis())
+    return Cache(backend=backend, default_ttl=60)
+
+
+class TestCache:
+
+    def test_get_or_load_caches_the_value(self, cache):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return None
+
+        assert cache.get_or_load('c', 1, loader) is None
+        assert cache.get_or_load('c', 1, loader) is None
+        assert len(calls) == 1
+        assert cache.stats('c')['hits'] == 1 and cache.stats('c')['misses'] == 1
+
+    def test_bump_invalidates_the_namespace_only(self, cache):
+        cache.set('c', 1, 'viejo', namespace='clinic:1')
+        cache.set('c', 1, 'otra', namespace='clinic:2')
+
+        cache.bump('clinic:1')
+
+        assert cache.get('c', 1, namespace='clinic:1') is None
+        assert cache.get('c', 1, namespace='clinic:2') == 'otra'
+
+    def test_reseeded_namespace_does_not_revive_old_entries(self):
+        backend = MemoryBackend()
+        cache = Cache(backend=backend)
+        cache.set('c', 1, 'viejo', namespace='ns')
+        # Contador perdido (p. ej. Redis reiniciado) pero las entradas siguen
+        backend._counters.clear()
+
+        assert cache.get('c', 1, namespace='ns') is None
+
+    def test_concurrent_misses_load_once(self, cache):
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def loader():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'valor'
+
+        def reader():
+            results.append(cache.get_or_load('c', 'k', loader))
+
+        leader = threading.Thread(target=reader)
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=reader) for _ in range(4)]
+        for thread in followers:
+            thread.start()
+        while cache.stats('c')['coalesced'] < 4:
+            pass
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        assert len(calls) == 1
+        assert results == ['valor'] * 5
+        assert cache.stats('c')['coalesced'] == 4
+
+    def test_loader_error_is_not_cached(self, cache):
+        def broken():
+            raise RuntimeError('base caída')
+
+        with pytest.raises(RuntimeError, match='base caída'):
+            cache.get_or_load('c', 'k', broken)
+
+        assert cache.get_or_load('c', 'k', lambda: 'ok') == 'ok'
+        assert cache.stats('c')['load_errors'] == 1
+
+    def test_backend_failure_is_a_miss(self):
+        class BrokenRedis(LocalRedis):
+            def get(self, name):
+                raise ConnectionError('sin red')
+
+        cache = Cache(backend=RedisBackend(BrokenRedis()))
+
+        assert cache.get_or_load('c', 'k', lambda: 'cargado', namespace='ns') == 'cargado'
+        assert cache.stats('c')['errors'] >= 1
+
+    def test_disabled_cache_always_loads(self):
+        cache = Cache(enabled=False)
+        calls = []
+
+        cache.get_or_load('c', 'k', lambda: calls.append(1))
+        cache.get_or_load('c', 'k', lambda: calls.append(1))
+
+        assert len(calls) == 2
+
+    def test_null_backend_never_hits(self):
+        cache = Cache(backend=NullBackend())
+        cache.set('c', 'k', 1)
+
+        assert cache.get('c', 'k', default='miss') == 'miss'
+
+    def test_decorator_keys_by_arguments(self, cache):
+        calls = []
+
+        @cache.cached('doble', namespace=lambda x, factor: f'ns:{x}')
+        def double(x, factor=2):
+            calls.append((x, factor))
+            return x * factor
+
+        assert double(3) == 6
+        assert double(3, factor=2) == 6
+        assert double(x=3, factor=3) == 9
+        assert calls == [(3, 2), (3, 3)]
+
+        cache.bump('ns:3')
+        double(3)
+        assert len(calls) == 3
+        assert double.uncached(4) == 8
+
+
+class TestInitCache:
+
+    def _app(self, **config):
+        app = Flask(__name__)
+        app.config.update(config)
+        return app
+
+    def test_redis_requires_url(self):
+        with pytest.raises(ValueError, match='CACHE_URL'):
+            init_cache(self._app(CACHE_BACKEND='redis'))
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError, match='memcached'):
+            init_cache(self._app(CACHE_BACKEND='memcached'))
+
+
+class TestInvalidation:
+
+    def test_new_surgery_refreshes_form_data(self, app, db_session, sample_clinic, sample_specialty):
+        assert MasterDataService.create_form_data(sample_clinic.id)['surgeries_data'] == []
+
+        db.session.add(Surgery(name='Nueva', base_stay_hours=24, specialty_id=sample_specialty.id,
+                               clinic_id=sample_clinic.id, is_active=True))
+        db.session.commit()
+
+        for clinic_id in (sample_clinic.id, None):
+            names = [s['name'] for s in MasterDataService.create_form_data(clinic_id)['surgeries_data']]
+            assert names == ['Nueva']
+
+    def test_form_data_is_served_from_cache(self, app, db_session, sample_clinic, sample_surgery_normal):
+        MasterDataService.create_form_data(sample_clinic.id)
+        before = app_cache.stats('master_data')
+
+        MasterDataService.create_form_data(sample_clinic.id)
+
+        assert app_cache.stats('master_data')['hits'] == before['hits'] + 1
+        assert app_cache.stats('master_data')['loads'] == before['loads']
+
+    def test_other_clinics_stay_cached(self, app, db_session, sample_clinic, sample_specialty):
+        other = Clinic(name='Otra clínica', is_active=True)
+        db.session.add(other)
+        db.session.commit()
+        version = app_cache.namespace_version(f'clinic:{other.id}')
+
+        db.session.add(Doctor(name='Dr. Nuevo', specialty='Cirugía', clinic_id=sample_clinic.id, is_active=True))
+        db.session.commit()
+
+        assert app_cache.namespace_version(f'clinic:{other.id}') == version
+
+    def test_moving_a_doctor_invalidates_both_clinics(self, app, db_session, sample_clinic, sample_doctor):
+        other = Clinic(name='Otra clínica', is_active=True)
+        db.session.add(other)
+        db.session.commit()
+        assert MasterDataService.create_form_data(sample_clinic.id)['doctors_data']
+        assert MasterDataService.create_form_data(other.id)['doctors_data'] == []
+
+        sample_doctor.clinic_id = other.id
+        db.session.commit()
+
+        assert MasterDataService.create_form_data(sample_clinic.id)['doctors_data'] == []
+        assert MasterDataService.create_form_data(other.id)['doctors_data']
+
+    def test_rollback_does_not_bump(self, app, db_session, sample_clinic, sample_specialty):
+        version = app_cache.namespace_version(f'clinic:{sample_clinic.id}')
+
+        db.session.add(Surgery(name='Descartada', base_stay_hours=24, specialty_id=sample_specialty.id,
+                               clinic_id=sample_clinic.id, is_active=True))
+        db.session.flush()
+        db.session.rollback()
+
+        assert app_cache.namespace_version(f'clinic:{sample_clinic.id}') == version
+
+    def test_threshold_change_refreshes_every_clinic(self, app, db_session, sample_clinic):
+        assert MasterDataService.urgency_thresholds(sample_clinic.id)['green_threshold_hours'] == 8
+
+        db.session.add(UrgencyThreshold(clinic_id=None, green_threshold_hours=12,
+                                        yellow_threshold_hours=6, red_threshold_hours=3))
+        db.session.commit()
+
+        assert MasterDataService.urgency_thresholds(sample_clinic.id) == {
+            'green_threshold_hours': 12, 'yellow_threshold_hours': 6, 'red_threshold_hours': 3}
+
+
+class TestUserCacheOnRedis:
+
+    def test_snapshot_round_trips(self, db_session, sample_user_admin, sample_clinic, redis_cache):
+        UserCache.load(sample_user_admin.id)
+        snapshot = UserCache.load(sample_user_admin.id)
+
+        assert isinstance(snapshot, CachedUser)
+        assert snapshot.clinic.name == sample_clinic.name
+        assert snapshot.is_admin()
+        assert app_cache.stats('user')['hits'] >= 1
+
+    def test_invalidate_all_bumps_users(self, db_session, sample_user_clinical, redis_cache):
+        assert UserCache.load(sample_user_clinical.id).is_active
+        sample_user_clinical.is_active = False
+        db_session.session.commit()
+
+        UserCache.invalidate()
+
+        assert not UserCache.load(sample_user_clinical.id).is_active
@@ -0,0 +1,186 @@
+"""
+Tests del bus de invalidación entre procesos (cache/bus.py): dos Cache con
+backend en memoria y FileBus sobre el mismo archivo hacen de dos workers.
+"""
+import json
+
+import pytest
+from flask import Flask
+
+from cache import app_cache, init_cache, Cache, FileBus, MemoryBackend, RedisBackend
+from cache.testing import LocalRedis
+from models import db, Surgery
+from services import MasterDataService
+from services.user_cache import UserCache
+
+
+class OtherProcessBus(FileBus):
+    """FileBus con otro origen, como si estuviera en otro proceso."""
+
+    @property
+    def origin(self):
+        return 'otro-worker'
+
+
+def worker(path, backend=None, bus_class=FileBus):
+    bus = bus_class(path)
+    bus._prepare()
+    cache = Cache(backend=backend or MemoryBackend())
+    cache.attach_bus(bus)
+    return cache, bus
+
+
+@pytest.fixture
+def bus_path(tmp_path):
+    return str(tmp_path / 'cache-bus.log')
+
+
+@pytest.fixture
+def shared_bus(bus_path, monkeypatch):
+    """app_cache publicando en un FileBus (publicar no inicia el hilo oyente)."""
+    bus = FileBus(bus_path)
+    monkeypatch.setattr(app_cache, 'bus', bus)
+    return bus
+
+
+class TestFileBus:
+
+    def test_bump_reaches_the_other_worker(self, bus_path):
+        one, _ = worker(bus_path)
+        other, other_bus = worker(bus_path, bus_class=OtherProcessBus)
+        other.set('master_data', 1, 'viejo', namespace='clinic:1')
+
+        one.bump('clinic:1')
+        assert other_bus.poll() == 1
+
+        assert other.get('master_data', 1, namespace='clinic:1') is None
+
+    def test_delete_reaches_the_other_worker(self, bus_path):
+        one, _ = worker(bus_path)
+        other, other_bus = worker(bus_path, bus_class=OtherProcessBus)
+        other.set('user', 7, 'snapshot', namespace='users')
+        other.set('user', 8, 'snapshot', namespace='users')
+
+        one.delete('user', 7, namespace='users')
+        other_bus.poll()
+
+        assert other.get('user', 7, namespace='users') is None
+        assert other.get('user', 8, namespace='users') == 'snapshot'
+
+    def test_own_messages_are_ignored(self, bus_path):
+        cache, bus = worker(bus_path)
+        version = cache.namespace_version('clinic:1')
+
+        cache.bump('clinic:1')
+        bus.poll()
+
+        # Un solo incremento: el propio mensaje no se vuelve a aplicar
+        assert cache.namespace_version('clinic:1') == version + 1
+
+    def test_shared_backend_does_not_reapply(self, bus_path):
+        client = LocalRedis()
+        one, _ = worker(bus_path, backend=RedisBackend(client))
+        other, other_bus = worker(bus_path, backend=RedisBackend(client), bus_class=OtherProcessBus)
+
+        one.bump('clinic:1')
+        version = other.namespace_version('clinic:1')
+        other_bus.poll()
+
+        assert other.namespace_version('clinic:1') == version
+
+    def test_listener_starts_at_current_end(self, bus_path):
+        one, _ = worker(bus_path)
+        one.bump('clinic:1')
+
+        _, late_bus = worker(bus_path, bus_class=OtherProcessBus)
+
+        assert late_bus.poll() == 0
+
+    def test_partial_line_waits_for_the_rest(self, bus_path):
+        other, other_bus = worker(bus_path, bus_class=OtherProcessBus)
+        message = json.dumps({'op': 'bump', 'namespace': 'clinic:1', 'origin': 'x'})
+        with open(bus_path, 'a') as f:
+            f.write(message[:10])
+
+        assert other_bus.poll() == 0
+        with open(bus_path, 'a') as f:
+            f.write(message[10:] + '\n')
+        assert other_bus.poll() == 1
+
+    def test_reconnect_clears_local_cache(self, bus_path):
+        cache, bus = worker(bus_path)
+        cache.set('master_data', 1, 'quizás viejo', namespace='clinic:1')
+
+        bus._resynced()
+
+        assert cache.get('master_data', 1, namespace='clinic:1') is None
+
+    def test_publish_failure_does_not_raise(self, tmp_path):
+        cache, _ = worker(str(tmp_path / 'no-existe' / 'bus.log'))
+
+        cache.bump('clinic:1')
+
+        assert cache.get('c', 1, namespace='clinic:1') is None
+
+    def test_listener_thread_delivers_messages(self, bus_path):
+        one, _ = worker(bus_path)
+        other, other_bus = worker(bus_path, bus_class=OtherProcessBus)
+        other_bus.poll_seconds = 0.01
+        other.set('c', 1, 'viejo', namespace='ns')
+        received = []
+        other_bus.subscribe(lambda message: (other.apply(message), received.append(message)))
+        other_bus.ensure_started()
+        try:
+            one.bump('ns')
+            for _ in range(500):
+                if received:
+                    break
+                other_bus._stopped.wait(0.01)
+        finally:
+            other_bus.stop()
+
+        assert received and other.get('c', 1, namespace='ns') is None
+
+
+class TestWritePathsPublish:
+
+    def _messages(self, path):
+        with open(path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_catalog_commit_publishes_clinic_bumps(self, app, db_session, sample_clinic, sample_specialty,
+                                                   shared_bus):
+        MasterDataService.create_form_data(sample_clinic.id)
+
+        db.session.add(Surgery(name='Nueva', base_stay_hours=24, specialty_id=sample_specialty.id,
+                               clinic_id=sample_clinic.id, is_active=True))
+        db.session.commit()
+
+        namespaces = {m['namespace'] for m in self._messages(shared_bus.path) if m['op'] == 'bump'}
+        assert {f'clinic:{sample_clinic.id}', 'clinic:all'} <= namespaces
+
+    def test_user_invalidation_publishes_delete(self, app, db_session, sample_user_clinical, shared_bus):
+        UserCache.invalidate(sample_user_clinical.id)
+
+        assert self._messages(shared_bus.path)[-1] == {
+            'op': 'delete', 'name': 'user', 'key': str(sample_user_clinical.id), 'namespace': 'users',
+            'origin': shared_bus.origin}
+
+
+class TestInitBus:
+
+    def _app(self, **config):
+        app = Flask(__name__)
+        app.config.update(config)
+        return app
+
+    def test_file_bus_requires_path(self):
+        with pytest.raises(ValueError, match='CACHE_BUS_FILE'):
+            init_cache(self._app(CACHE_BUS='file'))
+
+    def test_postgres_bus_requires_postgres(self):
+        app = self._app(CACHE_BUS='postgres', SQLALCHEMY_DATABASE_URI='sqlite://')
+        db.init_app(app)
+
+        with pytest.raises(ValueError, match='sqlite'):
+            init_cache(app)
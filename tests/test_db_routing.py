@@ -0,0 +1,210 @@
+"""
+Tests del enrutamiento de lecturas a la réplica (utils/db_routing.py), con dos
+archivos SQLite: primaria y "réplica" con datos distintos para saber de dónde
+se leyó.
+"""
+from datetime import timedelta
+
+import pytest
+from flask import g
+from sqlalchemy import select, text
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from cache import app_cache
+from config import Config
+from models import db, Clinic, User, Patient, Specialty, Surgery, ROLE_ADMIN
+from services import OccupancyService
+from services.user_cache import UserCache
+from tests.conftest import make_ticket
+from utils import utcnow
+from utils.db_routing import read_only, READ_ROUTING, READ_TARGET_HEADER, REPLICA_BIND_KEY
+
+
+@pytest.fixture
+def routed_app(tmp_path, monkeypatch):
+    replica_url = f'sqlite:///{tmp_path / "replica.db"}'
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{tmp_path / "primary.db"}')
+    monkeypatch.setattr(Config, 'READ_REPLICA_URL', replica_url)
+    monkeypatch.setattr(Config, 'SQLALCHEMY_BINDS', {REPLICA_BIND_KEY: replica_url})
+    app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+
+    @app.route('/_routing/clinics')
+    @read_only
+    def read_clinics():
+        return ','.join(clinic.name for clinic in Clinic.query.order_by(Clinic.id))
+
+    @app.route('/_routing/clinics/primary')
+    def read_clinics_primary():
+        return ','.join(clinic.name for clinic in Clinic.query.order_by(Clinic.id))
+
+    @app.route('/_routing/clinics', methods=['POST'])
+    def create_clinic():
+        db.session.add(Clinic(name='Nueva', is_active=True))
+        db.session.commit()
+        return 'ok'
+
+    UserCache.invalidate()
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(db.engines[REPLICA_BIND_KEY])
+        for engine, name in ((db.engines[None], 'Primaria'), (db.engines[REPLICA_BIND_KEY], 'Réplica')):
+            with engine.begin() as connection:
+                connection.execute(Clinic.__table__.insert(), {'id': 1, 'name': name, 'is_active': True})
+                connection.execute(User.__table__.insert(), {
+                    'id': 1, 'username': 'admin_routing', 'email': 'admin@routing.test',
+                    'password': generate_password_hash('x', method='pbkdf2:sha256:1'),
+                    'role': ROLE_ADMIN, 'clinic_id': 1, 'is_active': True,
+                })
+    yield app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+    # init_app registra un MetaData por bind en el `db` compartido: sin quitarlo,
+    # create_all() de la app de tests (sin réplica) falla
+    db.metadatas.pop(REPLICA_BIND_KEY, None)
+    UserCache.invalidate()
+
+
+@pytest.fixture
+def routed_client(routed_app):
+    client = routed_app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+        session['_fresh'] = True
+    return client
+
+
+def _health(app):
+    return app.extensions['db_routing']
+
+
+class TestRouting:
+
+    def test_read_only_view_reads_from_replica(self, routed_client):
+        response = routed_client.get('/_routing/clinics')
+
+        assert response.get_data(as_text=True) == 'Réplica'
+        assert response.headers[READ_TARGET_HEADER] == REPLICA_BIND_KEY
+
+    def test_other_views_read_from_primary(self, routed_client):
+        response = routed_client.get('/_routing/clinics/primary')
+
+        assert response.get_data(as_text=True) == 'Primaria'
+        assert READ_TARGET_HEADER not in response.headers
+
+    def test_read_your_writes(self, routed_app, routed_client):
+        assert routed_client.post('/_routing/clinics').status_code == 200
+
+        # La escritura fue a la primaria y el usuario la ve aunque la réplica no la tenga aún
+        response = routed_client.get('/_routing/clinics')
+        assert response.get_data(as_text=True) == 'Primaria,Nueva'
+        assert response.headers[READ_TARGET_HEADER] == 'primary'
+
+        # Otro usuario (sin la marca en su sesión) sigue leyendo de la réplica
+        other = routed_app.test_client()
+        with other.session_transaction() as session:
+            session['_user_id'] = '1'
+        assert other.get('/_routing/clinics').get_data(as_text=True) == 'Réplica'
+
+    def test_read_your_writes_window_expires(self, routed_app, routed_client):
+        routed_app.config['READ_YOUR_WRITES_SECONDS'] = 0
+        routed_client.post('/_routing/clinics')
+
+        assert routed_client.get('/_routing/clinics').get_data(as_text=True) == 'Réplica'
+
+    def test_lagging_replica_falls_back_to_primary(self, routed_app, routed_client):
+        health = _health(routed_app)
+        health.probe = lambda connection: 120.0
+        health.reset()
+        before = READ_ROUTING.value(target='primary', reason='replica_lag')
+
+        response = routed_client.get('/_routing/clinics')
+
+        assert response.get_data(as_text=True) == 'Primaria'
+        assert READ_ROUTING.value(target='primary', reason='replica_lag') == before + 1
+        assert health.lag == 120.0
+
+    def test_unreachable_replica_falls_back_to_primary(self, routed_app, routed_client):
+        def broken(connection):
+            raise ConnectionError('réplica caída')
+        health = _health(routed_app)
+        health.probe = broken
+        health.reset()
+
+        assert routed_client.get('/_routing/clinics').get_data(as_text=True) == 'Primaria'
+
+    def test_lag_is_checked_once_per_interval(self, routed_app, routed_client):
+        calls = []
+        health = _health(routed_app)
+        health.probe = lambda connection: calls.append(1) or 0.0
+        health.reset()
+
+        for _ in range(3):
+            routed_client.get('/_routing/clinics')
+
+        assert len(calls) == 1
+
+    def test_real_read_only_views(self, routed_client):
+        for path in ('/dashboard/', '/admin/audit/actions', '/admin/audit/logins'):
+            response = routed_client.get(path)
+            assert response.status_code == 200, path
+            assert response.headers[READ_TARGET_HEADER] == REPLICA_BIND_KEY, path
+
+
+    def test_user_is_loaded_from_the_primary(self, routed_app, routed_client):
+        # Desactivado en la primaria; la réplica atrasada aún lo tiene activo
+        with routed_app.app_context():
+            with db.engines[None].begin() as connection:
+                connection.execute(User.__table__.update().where(User.id == 1).values(is_active=False))
+
+        response = routed_client.get('/dashboard/')
+
+        # La vista lee de la réplica, pero el usuario (y su snapshot cacheado) viene de la primaria
+        assert response.status_code == 302 and '/login' in response.headers['Location']
+        with routed_app.app_context():
+            assert UserCache.load(1).is_active is False
+
+    def test_cached_ticket_views_are_built_from_the_primary(self, routed_app, routed_client):
+        # Un ticket recién confirmado por otro usuario que la réplica aún no tiene
+        with routed_app.app_context():
+            specialty = Specialty(name='Cirugía General', clinic_id=1, is_active=True)
+            db.session.add(specialty)
+            db.session.flush()
+            surgery = Surgery(name='Colecistectomía', base_stay_hours=24, specialty_id=specialty.id, clinic_id=1,
+                              is_active=True, applies_ticket_home=True, is_ambulatory=False)
+            patient = Patient(rut='11111111-1', primer_nombre='Juan', apellido_paterno='Pérez', age=45, sex='M',
+                              clinic_id=1)
+            db.session.add_all([surgery, patient])
+            db.session.flush()
+            make_ticket(1, surgery, db.session.get(Clinic, 1), patient, utcnow() - timedelta(hours=3),
+                        current_fpa=utcnow() + timedelta(hours=5))
+            db.session.commit()
+        app_cache.clear()
+        OccupancyService.reset()
+
+        occupancy = routed_client.get('/tickets/api/occupancy')
+        forecast = routed_client.get('/tickets/api/discharge-forecast')
+
+        # Las vistas siguen enrutadas a la réplica, pero el índice y el pronóstico (cacheados con la
+        # versión de la primaria) se leen de la primaria
+        assert occupancy.headers[READ_TARGET_HEADER] == forecast.headers[READ_TARGET_HEADER] == REPLICA_BIND_KEY
+        assert occupancy.get_json()['total'] == 1
+        assert forecast.get_json()['total'] == 1
+
+
+class TestSession:
+
+    def test_for_update_and_writes_stay_on_primary(self, routed_app):
+        with routed_app.test_request_context():
+            g._db_read_target = REPLICA_BIND_KEY
+            primary, replica = db.engines[None], db.engines[REPLICA_BIND_KEY]
+
+            assert db.session.get_bind(clause=select(Clinic)) is replica
+            assert db.session.get_bind(clause=select(Clinic).with_for_update()) is primary
+            assert db.session.get_bind(clause=Clinic.__table__.update()) is primary
+            assert db.session.get_bind(clause=text('SELECT 1')) is primary
+
+    def test_without_replica_nothing_is_registered(self, app):
+        assert app.extensions['db_routing'] is None
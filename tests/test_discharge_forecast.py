@@ -0,0 +1,143 @@
+"""
+Tests del pronóstico de altas por bloque de 2 horas (services/discharge_forecast.py
+y /tickets/api/discharge-forecast).
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Clinic, TICKET_STATUS_ANULADO
+from services import DischargeForecastService, FpaRecalcService
+from services.discharge_forecast import NO_LOCATION
+from tests.conftest import make_ticket
+from utils.time_blocks import TimeBlockHelper
+
+NOW = datetime(2025, 1, 15, 10, 20)
+START = datetime(2025, 1, 15, 10, 0)
+
+
+@pytest.fixture
+def add_ticket(db_session, sample_clinic, sample_patient, sample_surgery_normal):
+    """Agrega un ticket vigente con la FPA vigente y la ubicación dadas."""
+    numbers = iter(range(1, 1000))
+
+    def add(current_fpa, location=None, clinic=sample_clinic, **kwargs):
+        ticket = make_ticket(next(numbers), sample_surgery_normal, clinic, sample_patient,
+                             current_fpa - timedelta(hours=30), current_fpa=current_fpa, **kwargs)
+        ticket.location = location
+        db.session.commit()
+        return ticket
+    return add
+
+
+def _column(forecast, location, block):
+    return forecast['counts'][forecast['locations'].index(location)][block]
+
+
+class TestForecast:
+
+    def test_blocks_follow_time_block_helper(self, add_ticket, sample_clinic):
+        fpas = [START, START + timedelta(minutes=29), START + timedelta(minutes=30),
+                START + timedelta(hours=5, minutes=45), START + timedelta(hours=71, minutes=29)]
+        for fpa in fpas:
+            add_ticket(fpa, location='Piso 3')
+
+        forecast = DischargeForecastService.forecast(sample_clinic.id, now=NOW)
+
+        assert forecast['start'] == START.isoformat() and len(forecast['blocks']) == 72
+        counts = forecast['counts'][0]
+        assert [i for i, count in enumerate(counts) for _ in range(count)] == [0, 0, 1, 6, 71]
+        for fpa in fpas:
+            block = TimeBlockHelper.get_block_for_time(fpa)
+            index = int((fpa + timedelta(minutes=30) - START).total_seconds()) // 3600
+            assert forecast['blocks'][index] == block['value']
+            assert forecast['labels'][index] == block['label']
+
+    def test_window_overdue_and_exclusions(self, add_ticket, sample_clinic):
+        add_ticket(START - timedelta(minutes=31), location='Piso 3')
+        add_ticket(START - timedelta(days=3), location='Piso 3')
+        add_ticket(START + timedelta(hours=71, minutes=30), location='Piso 3')
+        add_ticket(START + timedelta(hours=2), location='Piso 3', status=TICKET_STATUS_ANULADO)
+        other = Clinic(name='Otra', is_active=True)
+        db.session.add(other)
+        db.session.commit()
+        add_ticket(START + timedelta(hours=2), location='Piso 3', clinic=other)
+
+        forecast = DischargeForecastService.forecast(sample_clinic.id, now=NOW)
+
+        assert forecast['overdue'] == [2]
+        assert forecast['total'] == 0
+        # El superusuario ve todas las clínicas
+        assert DischargeForecastService.forecast(None, now=NOW)['total'] == 1
+
+    def test_locations(self, add_ticket, sample_clinic):
+        add_ticket(START + timedelta(hours=1), location='UCI')
+        add_ticket(START + timedelta(hours=1), location=None)
+        add_ticket(START + timedelta(hours=1), location='')
+        add_ticket(START + timedelta(hours=1), location='Piso 3')
+        add_ticket(START + timedelta(hours=2), location='Piso 3')
+
+        forecast = DischargeForecastService.forecast(sample_clinic.id, now=NOW)
+
+        assert forecast['locations'] == ['Piso 3', 'UCI', NO_LOCATION]
+        assert _column(forecast, NO_LOCATION, 1) == 2
+        assert forecast['totals'][1:3] == [4, 1]
+
+    def test_empty(self, db_session, sample_clinic):
+        forecast = DischargeForecastService.forecast(sample_clinic.id, now=NOW)
+
+        assert (forecast['locations'], forecast['counts'], forecast['total']) == ([], [], 0)
+        assert forecast['totals'] == [0] * 72
+
+
+class TestForecastCache:
+
+    def test_cached_until_a_ticket_changes(self, add_ticket, sample_clinic, query_counter):
+        ticket = add_ticket(START + timedelta(hours=1), location='Piso 3')
+        DischargeForecastService.forecast(sample_clinic.id, now=NOW)
+
+        with query_counter() as counter:
+            cached = DischargeForecastService.forecast(sample_clinic.id, now=NOW + timedelta(minutes=30))
+        assert counter.count == 0 and cached['total'] == 1
+
+        ticket.current_fpa = START + timedelta(hours=3)
+        db.session.commit()
+
+        forecast = DischargeForecastService.forecast(sample_clinic.id, now=NOW)
+        assert _column(forecast, 'Piso 3', 3) == 1 and forecast['total'] == 1
+
+    def test_bulk_recalculation_invalidates(self, db_session, sample_clinic, sample_patient, sample_surgery_normal,
+                                            sample_user_super):
+        # Ingreso 08:00 del 14/01: con 24h base la FPA es 08:00 del 15/01 (vencida); con 30h, 14:00
+        make_ticket(1, sample_surgery_normal, sample_clinic, sample_patient, datetime(2025, 1, 14, 10, 0))
+        db.session.commit()
+        assert DischargeForecastService.forecast(sample_clinic.id, now=NOW)['overdue'] == [1]
+
+        sample_surgery_normal.base_stay_hours = 30
+        db.session.commit()
+        FpaRecalcService.recalculate(sample_surgery_normal, user=sample_user_super)
+        db.session.commit()
+
+        forecast = DischargeForecastService.forecast(sample_clinic.id, now=NOW)
+        assert forecast['overdue'] == [0] and forecast['counts'] == [[0] * 4 + [1] + [0] * 67]
+
+
+class TestForecastEndpoint:
+
+    def test_clinic_user_gets_own_clinic(self, app, authenticated_client, add_ticket, sample_clinic):
+        add_ticket(datetime.utcnow() + timedelta(hours=5), location='Piso 3')
+        other = Clinic(name='Otra', is_active=True)
+        db.session.add(other)
+        db.session.commit()
+
+        response = authenticated_client.get(f'/tickets/api/discharge-forecast?clinic_id={other.id}&hours=24')
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['clinic_id'] == sample_clinic.id
+        assert (data['hours'], data['locations'], data['total']) == (24, ['Piso 3'], 1)
+
+    def test_nursing_board_includes_heatmap(self, authenticated_client):
+        html = authenticated_client.get('/tickets/nursing').get_data(as_text=True)
+
+        assert 'id="discharge-forecast"' in html and '/tickets/api/discharge-forecast' in html
@@ -0,0 +1,122 @@
+"""
+Tests del motor de FPA del navegador (static/js/fpa_engine.js).
+
+tests/data/fpa_golden_vectors.json es el contrato entre FPACalculator y el
+motor JS: estos tests verifican que el archivo coincide con Python y
+tests/js/fpa_engine.test.js (node) que coincide con JavaScript. Si cambia una
+regla, regenerar el archivo con:
+
+    python -m tests.test_fpa_engine
+"""
+import json
+import logging
+import shutil
+import subprocess
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from models import Ticket
+from services import FPACalculator, MasterDataService
+from utils.time_blocks import TimeBlockHelper
+
+ROOT = Path(__file__).resolve().parent.parent
+GOLDEN_VECTORS = ROOT / 'tests' / 'data' / 'fpa_golden_vectors.json'
+NODE_TEST = ROOT / 'tests' / 'js' / 'fpa_engine.test.js'
+
+SURGERY_TIMES = [
+    # Excepción de las 08:00 (se conservan los segundos) y sus vecinos
+    '2025-01-15T08:00', '2025-01-15T08:00:59', '2025-01-15T08:00:59.500', '2025-01-15T07:59', '2025-01-15T08:01',
+    # Horas cerradas, un minuto y un segundo después
+    '2025-01-15T10:00', '2025-01-15T10:01', '2025-01-15T10:00:01', '2025-01-15T14:30', '2025-01-15T23:59',
+    # Ingreso el día anterior, fin de mes y de año, 29 de febrero
+    '2025-01-15T00:30', '2025-01-15T01:59', '2025-01-31T22:15', '2025-12-31T23:30', '2024-02-29T08:00',
+    # Cambios de hora de Chile: la aritmética es sin zona horaria
+    '2025-04-06T00:30', '2025-09-07T00:30',
+]
+BASE_STAY_HOURS = [0, 1, 6, 22, 24, 25, 48, 72, 720]
+BLOCK_TIMES = ['2025-01-15T00:00', '2025-01-15T00:29', '2025-01-15T00:30', '2025-01-15T01:00',
+               '2025-01-15T13:59', '2025-01-15T22:30', '2025-01-15T23:29', '2025-01-15T23:30', '2025-01-15T23:59:59']
+
+
+def golden_vectors():
+    """Vectores calculados con la implementación de Python."""
+    return {
+        'rules': FPACalculator.rules(),
+        'previews': [
+            {'surgery_time': surgery_time, 'base_stay_hours': hours,
+             'expected': FPACalculator.preview(datetime.fromisoformat(surgery_time), hours)}
+            for surgery_time in SURGERY_TIMES for hours in BASE_STAY_HOURS
+        ],
+        'blocks': [
+            {'time': time, 'expected': TimeBlockHelper.get_block_for_time(datetime.fromisoformat(time))}
+            for time in BLOCK_TIMES
+        ],
+    }
+
+
+@pytest.fixture(scope='module')
+def vectors():
+    return json.loads(GOLDEN_VECTORS.read_text(encoding='utf-8'))
+
+
+@pytest.mark.fpa
+@pytest.mark.unit
+class TestGoldenVectors:
+
+    def test_python_matches_golden_vectors(self, vectors):
+        assert vectors == golden_vectors()
+
+    def test_js_engine_matches_golden_vectors(self):
+        node = shutil.which('node')
+        if node is None:
+            pytest.skip('node no está instalado')
+
+        result = subprocess.run([node, '--test', str(NODE_TEST)], capture_output=True, text=True, timeout=60)
+
+        assert result.returncode == 0, result.stdout + result.stderr
+
+
+class TestServerSide:
+
+    def test_rules_ship_with_master_data(self, app, db_session, sample_clinic, sample_surgery_normal):
+        form_data = MasterDataService.create_form_data(sample_clinic.id)
+
+        assert form_data['fpa_rules'] == FPACalculator.rules()
+        assert form_data['surgeries_data'][0]['base_stay_hours'] == 24
+
+    def test_create_form_uses_the_engine(self, authenticated_client):
+        html = authenticated_client.get('/tickets/create').get_data(as_text=True)
+
+        assert 'js/fpa_engine.js' in html and 'FpaEngine.preview' in html
+        assert 'api/calculate-fpa' not in html
+
+    def test_endpoint_matches_golden_vectors(self, authenticated_client, sample_clinic, sample_surgery_normal, vectors):
+        vector = next(v for v in vectors['previews'] if v['base_stay_hours'] == 24)
+
+        response = authenticated_client.post('/tickets/api/calculate-fpa', json={
+            'surgery_id': sample_surgery_normal.id, 'pavilion_end_time': vector['surgery_time'],
+            'clinic_id': sample_clinic.id})
+
+        assert response.get_json() == vector['expected']
+
+    @pytest.mark.parametrize('preview_fpa, drift', [('2026-03-02T08:00:00', False), ('2026-03-02T09:00:00', True)])
+    def test_submit_recalculates_and_logs_drift(self, authenticated_client, sample_surgery_normal, caplog,
+                                                preview_fpa, drift):
+        form = {
+            'rut': '99999999-9', 'primer_nombre': 'Nuevo', 'apellido_paterno': 'Paciente', 'age': '40',
+            'sex': 'F', 'surgery_id': str(sample_surgery_normal.id), 'pavilion_end_time': '2026-03-01T10:00',
+            'preview_fpa': preview_fpa,
+        }
+
+        with caplog.at_level(logging.WARNING, logger='routes.tickets'):
+            authenticated_client.post('/tickets/create', data=form)
+
+        assert Ticket.query.one().current_fpa == datetime(2026, 3, 2, 8, 0)
+        assert ('FPA de previsualización' in caplog.text) is drift
+
+
+if __name__ == '__main__':
+    GOLDEN_VECTORS.write_text(json.dumps(golden_vectors(), indent=2, ensure_ascii=False) + '\n', encoding='utf-8')
+    print(f'{GOLDEN_VECTORS.relative_to(ROOT)} regenerado')
@@ -0,0 +1,209 @@
+"""
+Tests del recálculo masivo de FPA del sistema (services/fpa_recalc.py,
+`flask recalc-fpa` y la acción de administración).
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from commands import recalc_fpa_command
+from models import (
+    db, Ticket, FpaModification, ActionAudit, TICKET_STATUS_ANULADO, AUDIT_EVENT_FPA_RECALCULATED,
+)
+from services import FPACalculator, FpaRecalcService
+from tests.conftest import make_ticket
+
+
+@pytest.fixture
+def tickets(db_session, sample_clinic, sample_patient, sample_surgery_normal):
+    """Cinco tickets vigentes con la FPA del sistema de una cirugía de 24h, que pasa a 48h."""
+    start = datetime(2025, 1, 15, 10, 15)
+    created = [make_ticket(i, sample_surgery_normal, sample_clinic, sample_patient, start + timedelta(hours=i))
+               for i in range(1, 6)]
+    db.session.commit()
+    sample_surgery_normal.base_stay_hours = 48
+    db.session.commit()
+    return created
+
+
+def _ticket(ticket_id):
+    return db.session.get(Ticket, ticket_id)
+
+
+class TestCalculateMany:
+
+    def test_matches_calculate(self, sample_surgery_normal):
+        times = [datetime(2025, 3, 1, 8, 0), datetime(2025, 3, 1, 8, 0, 30), datetime(2025, 3, 1, 23, 45),
+                 datetime(2025, 3, 1, 14, 0, 0, 500), datetime(2025, 12, 31, 22, 1), datetime(2025, 3, 1, 0, 0)]
+
+        for hours in (0, 6, 24, 30, 72):
+            sample_surgery_normal.base_stay_hours = hours
+            expected = [FPACalculator.calculate(t, sample_surgery_normal) for t in times]
+            fpas, nights = FPACalculator.calculate_many(times, hours)
+            assert list(zip(fpas.tolist(), nights.tolist())) == expected
+
+
+class TestRecalculate:
+
+    def test_tickets_following_the_system_are_updated(self, tickets, sample_surgery_normal, sample_user_super):
+        result = FpaRecalcService.recalculate(sample_surgery_normal, user=sample_user_super)
+        db.session.commit()
+
+        assert (result.scanned, len(result.changes), len(result.current_fpa_changes)) == (5, 5, 5)
+        ticket = _ticket(tickets[0].id)
+        fpa, overnight = FPACalculator.calculate(ticket.pavilion_end_time, sample_surgery_normal)
+        assert (ticket.system_calculated_fpa, ticket.current_fpa, ticket.overnight_stays) == (fpa, fpa, overnight)
+        assert ticket.surgery_base_hours_snapshot == 48
+        # La FPA inicial es histórica
+        assert ticket.initial_fpa == fpa - timedelta(hours=24)
+
+    def test_medical_decisions_are_kept(self, db_session, tickets, sample_surgery_normal, sample_user_super):
+        overridden, modified = _ticket(tickets[0].id), _ticket(tickets[1].id)
+        overridden.current_fpa = overridden.current_fpa + timedelta(hours=5)
+        db.session.add(FpaModification(ticket_id=modified.id, clinic_id=modified.clinic_id,
+                                       previous_fpa=modified.current_fpa, new_fpa=modified.current_fpa,
+                                       reason='Sin cambio', modified_by='test'))
+        db.session.commit()
+        before = {t.id: (t.current_fpa, t.overnight_stays) for t in (overridden, modified)}
+
+        result = FpaRecalcService.recalculate(sample_surgery_normal, user=sample_user_super)
+        db.session.commit()
+
+        assert len(result.current_fpa_changes) == 3
+        for ticket_id, (current_fpa, overnight) in before.items():
+            ticket = _ticket(ticket_id)
+            assert (ticket.current_fpa, ticket.overnight_stays) == (current_fpa, overnight)
+            assert ticket.system_calculated_fpa == FPACalculator.calculate(
+                ticket.pavilion_end_time, sample_surgery_normal)[0]
+
+    def test_annulled_tickets_are_not_touched(self, db_session, tickets, sample_surgery_normal, sample_user_super):
+        annulled = _ticket(tickets[0].id)
+        annulled.status = TICKET_STATUS_ANULADO
+        db.session.commit()
+        stale = annulled.system_calculated_fpa
+
+        result = FpaRecalcService.recalculate(sample_surgery_normal, user=sample_user_super)
+        db.session.commit()
+
+        assert result.scanned == 4
+        assert _ticket(tickets[0].id).system_calculated_fpa == stale
+
+    def test_dry_run_writes_nothing(self, tickets, sample_surgery_normal):
+        stale = _ticket(tickets[0].id).system_calculated_fpa
+
+        result = FpaRecalcService.recalculate(sample_surgery_normal, dry_run=True)
+        db.session.commit()
+
+        assert len(result.changes) == 5 and not result.applied
+        assert _ticket(tickets[0].id).system_calculated_fpa == stale
+        assert ActionAudit.query.count() == 0
+
+    def test_one_audit_entry_per_run(self, tickets, sample_surgery_normal, sample_user_super):
+        FpaRecalcService.recalculate(sample_surgery_normal, user=sample_user_super, batch_size=2)
+        db.session.commit()
+
+        audit = ActionAudit.query.filter_by(event_type=AUDIT_EVENT_FPA_RECALCULATED).one()
+        assert (audit.target_type, audit.target_id) == ('Surgery', str(sample_surgery_normal.id))
+        assert audit.payload['updated'] == 5
+        assert sorted(row[0] for row in audit.payload['changes']) == [t.id for t in tickets]
+
+    def test_second_run_has_nothing_to_do(self, tickets, sample_surgery_normal, sample_user_super):
+        FpaRecalcService.recalculate(sample_surgery_normal, user=sample_user_super)
+        db.session.commit()
+
+        result = FpaRecalcService.recalculate(sample_surgery_normal, user=sample_user_super)
+        db.session.commit()
+
+        assert result.changes == [] and not result.applied
+        assert ActionAudit.query.count() == 1
+
+    def test_concurrent_fpa_change_wins(self, tickets, sample_surgery_normal, sample_user_super, monkeypatch):
+        moved = datetime(2025, 2, 1, 12, 0)
+        write = FpaRecalcService._write
+
+        def modified_meanwhile(changes, base_stay_hours):
+            db.session.execute(db.update(Ticket).where(Ticket.id == tickets[0].id).values(current_fpa=moved))
+            return write(changes, base_stay_hours)
+        monkeypatch.setattr(FpaRecalcService, '_write', staticmethod(modified_meanwhile))
+
+        result = FpaRecalcService.recalculate(sample_surgery_normal, user=sample_user_super)
+        db.session.commit()
+
+        assert _ticket(tickets[0].id).current_fpa == moved
+        # El ticket que perdió la carrera no se cuenta ni se audita
+        audit = ActionAudit.query.filter_by(event_type=AUDIT_EVENT_FPA_RECALCULATED).one()
+        assert len(result.changes) == audit.payload['updated'] == 4
+        assert tickets[0].id not in {row[0] for row in audit.payload['changes']}
+
+    def test_ticket_annulled_meanwhile_is_not_counted(self, tickets, sample_surgery_normal, sample_user_super,
+                                                      monkeypatch):
+        db.session.add(FpaModification(
+            ticket_id=tickets[1].id, clinic_id=tickets[1].clinic_id, previous_fpa=tickets[1].current_fpa,
+            new_fpa=tickets[1].current_fpa + timedelta(days=1), reason='Complicación', modified_by='test'))
+        tickets[1].current_fpa += timedelta(days=1)
+        db.session.commit()
+        write = FpaRecalcService._write
+
+        def annulled_meanwhile(changes, base_stay_hours):
+            db.session.execute(db.update(Ticket).where(Ticket.id == tickets[1].id)
+                               .values(status=TICKET_STATUS_ANULADO))
+            return write(changes, base_stay_hours)
+        monkeypatch.setattr(FpaRecalcService, '_write', staticmethod(annulled_meanwhile))
+
+        result = FpaRecalcService.recalculate(sample_surgery_normal, user=sample_user_super)
+        db.session.commit()
+
+        assert [c.ticket_id for c in result.changes] == [t.id for t in tickets if t.id != tickets[1].id]
+        assert _ticket(tickets[1].id).surgery_base_hours_snapshot == 24
+
+    def test_applying_requires_a_user(self, tickets, sample_surgery_normal):
+        with pytest.raises(ValueError):
+            FpaRecalcService.recalculate(sample_surgery_normal)
+
+
+class TestCommand:
+
+    def test_dry_run_reports_differences(self, app, tickets, sample_surgery_normal):
+        result = app.test_cli_runner().invoke(
+            recalc_fpa_command, ['--surgery', str(sample_surgery_normal.id), '--dry-run', '--show', '2'])
+
+        assert result.exit_code == 0, result.output
+        assert '5 tickets vigentes, 5 con diferencias' in result.output
+        assert '... y 3 más' in result.output
+        assert 'no se escribió nada' in result.output
+
+    def test_apply_requires_user(self, app, tickets, sample_surgery_normal):
+        result = app.test_cli_runner().invoke(recalc_fpa_command, ['--surgery', str(sample_surgery_normal.id)])
+
+        assert result.exit_code != 0
+        assert '--user' in result.output
+
+    def test_apply(self, app, tickets, sample_surgery_normal, sample_user_super):
+        result = app.test_cli_runner().invoke(
+            recalc_fpa_command, ['--surgery', str(sample_surgery_normal.id), '--user', sample_user_super.email])
+
+        assert result.exit_code == 0, result.output
+        assert '✓ 5 tickets actualizados' in result.output
+        assert _ticket(tickets[0].id).surgery_base_hours_snapshot == 48
+
+
+class TestAdminAction:
+
+    def _login(self, app, user):
+        from flask_login import login_user
+        with app.test_request_context():
+            login_user(user)
+
+    def test_preview_and_apply(self, app, client, tickets, sample_surgery_normal, sample_user_super):
+        url = f'/admin/master-data/surgery/{sample_surgery_normal.id}/recalc-fpa'
+        with client:
+            self._login(app, sample_user_super)
+            preview = client.get(url)
+            assert preview.status_code == 200
+            assert 'Aplicar recálculo a 5 tickets' in preview.get_data(as_text=True)
+            assert _ticket(tickets[0].id).surgery_base_hours_snapshot == 24
+
+            response = client.post(url)
+
+        assert response.status_code == 302
+        assert _ticket(tickets[0].id).surgery_base_hours_snapshot == 48
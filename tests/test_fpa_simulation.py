@@ -0,0 +1,133 @@
+"""
+Tests del FPACalculator vectorizado (calculate_many) y del reporte what-if de
+días-cama (services/fpa_simulation.py, `flask fpa-whatif`).
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from hypothesis import given, settings, strategies as st
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from commands import fpa_whatif_command
+from models import db, Surgery, Ticket, TICKET_STATUS_ANULADO
+from services import FPACalculator, FpaSimulationService
+from utils.sql_time import epoch_seconds
+from tests.conftest import make_ticket
+
+
+surgery_times = st.one_of(
+    st.datetimes(min_value=datetime(2000, 1, 1), max_value=datetime(2099, 12, 31)),
+    # La excepción de las 08:00 y las horas cerradas merecen más casos que los que da el azar
+    st.builds(lambda day, second, microsecond: day.replace(hour=8, minute=0, second=second, microsecond=microsecond),
+              st.datetimes(min_value=datetime(2000, 1, 1), max_value=datetime(2099, 12, 31)),
+              st.integers(0, 59), st.sampled_from([0, 1, 999_999])),
+    st.builds(lambda day, hour: day.replace(hour=hour, minute=0, second=0, microsecond=0),
+              st.datetimes(min_value=datetime(2000, 1, 1), max_value=datetime(2099, 12, 31)),
+              st.integers(0, 23)),
+)
+base_hours = st.integers(min_value=0, max_value=24 * 30)
+
+
+def scalar(surgery_time, hours):
+    return FPACalculator.calculate(surgery_time, Surgery(base_stay_hours=hours))
+
+
+@pytest.mark.fpa
+@pytest.mark.unit
+class TestCalculateManyEquivalence:
+
+    @settings(max_examples=500, deadline=None)
+    @given(st.lists(surgery_times, max_size=50), base_hours)
+    def test_same_base_hours(self, times, hours):
+        fpas, nights = FPACalculator.calculate_many(times, hours)
+
+        assert list(zip(fpas.tolist(), nights.tolist())) == [scalar(t, hours) for t in times]
+
+    @settings(max_examples=200, deadline=None)
+    @given(st.lists(st.tuples(surgery_times, base_hours), max_size=50))
+    def test_hours_per_time(self, pairs):
+        times = [t for t, _ in pairs]
+        fpas, nights = FPACalculator.calculate_many(times, [h for _, h in pairs])
+
+        assert list(zip(fpas.tolist(), nights.tolist())) == [scalar(t, h) for t, h in pairs]
+
+    def test_accepts_datetime64_arrays(self):
+        times = np.array(['2025-01-15T08:00', '2025-01-15T14:30'], dtype='datetime64[m]')
+
+        fpas, nights = FPACalculator.calculate_many(times, 24)
+
+        assert fpas.tolist() == [datetime(2025, 1, 16, 6, 30) + timedelta(minutes=30),
+                                 datetime(2025, 1, 16, 13, 0)]
+        assert nights.tolist() == [1, 1]
+
+    def test_empty(self):
+        fpas, nights = FPACalculator.calculate_many([], 24)
+
+        assert len(fpas) == len(nights) == 0
+
+
+class TestBedNightsWhatIf:
+
+    @pytest.fixture
+    def history(self, db_session, sample_clinic, sample_patient, sample_surgery_normal):
+        """Tickets de la cirugía de 24h: tres del último año, uno antiguo y uno anulado."""
+        now = datetime(2025, 6, 1, 12, 0)
+        times = [now - timedelta(days=d, hours=3) for d in (10, 100, 200)]
+        for i, t in enumerate(times, start=1):
+            make_ticket(i, sample_surgery_normal, sample_clinic, sample_patient, t)
+        make_ticket(4, sample_surgery_normal, sample_clinic, sample_patient, now - timedelta(days=500))
+        make_ticket(5, sample_surgery_normal, sample_clinic, sample_patient, now - timedelta(days=20),
+                    status=TICKET_STATUS_ANULADO)
+        db.session.commit()
+        return now, times
+
+    def test_last_year(self, history, sample_surgery_normal):
+        now, times = history
+        start, end = FpaSimulationService.period(365, now=now)
+
+        report = FpaSimulationService.bed_nights_whatif(sample_surgery_normal, 72, start=start, end=end)
+
+        assert report.tickets == 3
+        assert report.current_bed_nights == sum(scalar(t, 24)[1] for t in times)
+        assert report.whatif_bed_nights == sum(scalar(t, 72)[1] for t in times)
+        assert report.delta == report.whatif_bed_nights - report.current_bed_nights > 0
+        assert report.recorded_bed_nights == report.current_bed_nights
+
+    def test_whole_history_and_nothing_written(self, history, sample_surgery_normal):
+        report = FpaSimulationService.bed_nights_whatif(sample_surgery_normal, 0)
+
+        assert report.tickets == 4
+        assert report.whatif_bed_nights < report.current_bed_nights
+        assert not db.session.dirty and sample_surgery_normal.base_stay_hours == 24
+
+    def test_surgery_without_tickets(self, db_session, sample_surgery_normal):
+        report = FpaSimulationService.bed_nights_whatif(sample_surgery_normal, 36)
+
+        assert (report.tickets, report.current_bed_nights, report.whatif_bed_nights) == (0, 0, 0)
+
+    def test_command(self, app, history, sample_surgery_normal):
+        result = app.test_cli_runner().invoke(
+            fpa_whatif_command, ['--surgery', str(sample_surgery_normal.id), '--base-hours', '72', '--days', '0'])
+
+        assert result.exit_code == 0, result.output
+        assert '4 tickets (toda la historia)' in result.output
+        assert 'sistema con 72h base' in result.output
+
+
+class TestEpochSeconds:
+
+    def test_truncates_to_the_second(self, db_session, sample_clinic, sample_patient, sample_surgery_normal):
+        pavilion_end = datetime(2025, 3, 1, 9, 59, 59, 900_000)
+        make_ticket(1, sample_surgery_normal, sample_clinic, sample_patient, pavilion_end)
+        db.session.commit()
+
+        seconds = db.session.execute(select(epoch_seconds(Ticket.pavilion_end_time))).scalar()
+
+        assert seconds == int(pavilion_end.replace(microsecond=0).timestamp() - datetime(1970, 1, 1).timestamp())
+
+    def test_postgresql(self):
+        sql = str(select(epoch_seconds(Ticket.pavilion_end_time)).compile(dialect=postgresql.dialect()))
+
+        assert 'CAST(FLOOR(EXTRACT(EPOCH FROM ticket.pavilion_end_time)) AS BIGINT)' in sql
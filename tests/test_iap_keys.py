@@ -0,0 +1,276 @@
+"""
+Tests del almacén de claves públicas de IAP y del cache de JWT verificados.
+
+Usa un servidor HTTP local que imita https://www.gstatic.com/iap/verify/public_key
+(JSON {kid: PEM}) y claves EC generadas en el momento, firmando con ES256.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from auth_iap import IAPAuthenticator, IAPKeyStore, VerifiedTokenCache
+
+
+AUDIENCE = '/projects/123/global/backendServices/456'
+
+
+def _new_key():
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    return private_key, pem
+
+
+class StubKeyServer:
+    """Servidor de claves en un hilo; `keys` se puede cambiar para simular rotación."""
+
+    def __init__(self):
+        self.keys = {}
+        self.hits = 0
+        self.fail = False
+        self.delay = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.hits += 1
+                time.sleep(stub.delay)
+                if stub.fail:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                body = json.dumps(stub.keys).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/public_key'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def key_server():
+    server = StubKeyServer()
+    yield server
+    server.stop()
+
+
+def _token(private_key, kid, exp_in=600, audience=AUDIENCE, email='user@example.com'):
+    now = int(time.time())
+    return jwt.encode(
+        {'email': email, 'aud': audience, 'iat': now, 'exp': now + exp_in},
+        private_key, algorithm='ES256', headers={'kid': kid}
+    )
+
+
+class TestIAPKeyStore:
+
+    def test_keys_are_fetched_once_and_preparsed(self, key_server):
+        _, pem = _new_key()
+        key_server.keys = {'k1': pem}
+        store = IAPKeyStore(url=key_server.url)
+
+        for _ in range(5):
+            keys = store.get_keys()
+
+        assert key_server.hits == 1
+        assert isinstance(keys['k1'], ec.EllipticCurvePublicKey)
+
+    def test_unknown_kid_triggers_refetch(self, key_server):
+        _, pem1 = _new_key()
+        _, pem2 = _new_key()
+        key_server.keys = {'k1': pem1}
+        store = IAPKeyStore(url=key_server.url, kid_miss_interval=0)
+        store.get_keys()
+
+        key_server.keys = {'k1': pem1, 'k2': pem2}  # rotación
+        assert store.get_key('k2') is not None
+        assert key_server.hits == 2
+
+    def test_unknown_kid_refetch_is_rate_limited(self, key_server):
+        _, pem = _new_key()
+        key_server.keys = {'k1': pem}
+        store = IAPKeyStore(url=key_server.url, kid_miss_interval=60)
+        store.get_keys()
+
+        for _ in range(10):
+            assert store.get_key('no-existe') is None
+        # La carga inicial no cuenta: solo el primer kid desconocido re-descarga
+        assert key_server.hits == 2
+
+    def test_kid_miss_does_not_delay_expired_refetch(self, key_server):
+        _, pem = _new_key()
+        key_server.keys = {'k1': pem}
+        store = IAPKeyStore(url=key_server.url, ttl=0.05, kid_miss_interval=60)
+        store.get_keys()
+        assert store.get_key('no-existe') is None
+        assert key_server.hits == 2
+
+        time.sleep(0.1)
+        store.get_keys()
+        assert key_server.hits == 3
+
+    def test_expired_keys_are_refetched(self, key_server):
+        _, pem = _new_key()
+        key_server.keys = {'k1': pem}
+        store = IAPKeyStore(url=key_server.url, ttl=0.05, kid_miss_interval=0)
+        store.get_keys()
+        time.sleep(0.1)
+        store.get_keys()
+        assert key_server.hits == 2
+
+    def test_refresh_ahead_runs_in_background(self, key_server):
+        _, pem1 = _new_key()
+        _, pem2 = _new_key()
+        key_server.keys = {'k1': pem1}
+        store = IAPKeyStore(url=key_server.url, ttl=0.5, refresh_ahead=0.1)
+        store.get_keys()
+
+        key_server.keys = {'k2': pem2}
+        time.sleep(0.1)
+        # Entra en la ventana de refresco: responde con lo que tiene y refresca en otro hilo
+        assert store.get_keys()
+
+        deadline = time.time() + 2
+        while 'k2' not in store.get_keys() and time.time() < deadline:
+            time.sleep(0.01)
+        assert 'k2' in store.get_keys()
+
+    def test_refresh_ahead_starts_a_single_thread(self, key_server):
+        _, pem = _new_key()
+        key_server.keys = {'k1': pem}
+        store = IAPKeyStore(url=key_server.url, ttl=5, refresh_ahead=0.01)
+        store.get_keys()
+
+        key_server.delay = 0.2
+        time.sleep(0.1)
+        barrier = threading.Barrier(8)
+
+        def worker():
+            barrier.wait()
+            for _ in range(20):
+                assert store.get_keys()
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        deadline = time.time() + 2
+        while store._refreshing and time.time() < deadline:
+            time.sleep(0.01)
+        assert key_server.hits == 2
+
+    def test_failed_refresh_ahead_backs_off(self, key_server):
+        _, pem = _new_key()
+        key_server.keys = {'k1': pem}
+        store = IAPKeyStore(url=key_server.url, ttl=5, refresh_ahead=0.01, kid_miss_interval=60)
+        store.get_keys()
+
+        key_server.fail = True
+        time.sleep(0.1)
+        store.get_keys()
+        deadline = time.time() + 2
+        while (store._refreshing or key_server.hits < 2) and time.time() < deadline:
+            time.sleep(0.01)
+
+        for _ in range(10):
+            assert 'k1' in store.get_keys()
+            time.sleep(0.01)
+        assert key_server.hits == 2
+
+    def test_stale_keys_served_when_server_fails(self, key_server):
+        _, pem = _new_key()
+        key_server.keys = {'k1': pem}
+        store = IAPKeyStore(url=key_server.url, ttl=0.05, kid_miss_interval=0)
+        store.get_keys()
+
+        key_server.fail = True
+        time.sleep(0.1)
+        assert 'k1' in store.get_keys()
+
+
+class TestVerifiedTokenCache:
+
+    def test_entry_expires_at_exp(self):
+        cache = VerifiedTokenCache()
+        cache.put('token', {'email': 'a@b.c', 'exp': time.time() + 0.05})
+        assert cache.get('token')['email'] == 'a@b.c'
+        time.sleep(0.1)
+        assert cache.get('token') is None
+
+    def test_lru_is_bounded(self):
+        cache = VerifiedTokenCache(maxsize=2)
+        exp = time.time() + 60
+        cache.put('a', {'exp': exp})
+        cache.put('b', {'exp': exp})
+        cache.get('a')  # 'a' pasa a ser el más reciente
+        cache.put('c', {'exp': exp})
+
+        assert len(cache) == 2
+        assert cache.get('b') is None
+        assert cache.get('a') is not None
+
+
+class TestIAPAuthenticatorValidation:
+
+    def test_valid_jwt_is_verified_once(self, app, key_server, monkeypatch):
+        private_key, pem = _new_key()
+        key_server.keys = {'k1': pem}
+        auth = IAPAuthenticator('123', '456', key_store=IAPKeyStore(url=key_server.url))
+        token = _token(private_key, 'k1')
+
+        calls = []
+        real_decode = jwt.decode
+        monkeypatch.setattr(jwt, 'decode', lambda *a, **kw: calls.append(1) or real_decode(*a, **kw))
+
+        with app.app_context():
+            first, _ = auth._validate_jwt(token)
+            second, _ = auth._validate_jwt(token)
+
+        assert first['email'] == second['email'] == 'user@example.com'
+        assert len(calls) == 1
+        assert key_server.hits == 1
+
+    def test_invalid_audience_is_rejected_and_not_cached(self, app, key_server):
+        private_key, pem = _new_key()
+        key_server.keys = {'k1': pem}
+        auth = IAPAuthenticator('123', '456', key_store=IAPKeyStore(url=key_server.url))
+        token = _token(private_key, 'k1', audience='/projects/999/global/backendServices/1')
+
+        with app.app_context():
+            decoded, message = auth._validate_jwt(token)
+
+        assert decoded is None
+        assert 'Audiencia' in message
+        assert len(auth.verified_tokens) == 0
+
+    def test_token_signed_with_unknown_key_is_rejected(self, app, key_server):
+        _, pem = _new_key()
+        other_private_key, _ = _new_key()
+        key_server.keys = {'k1': pem}
+        auth = IAPAuthenticator('123', '456', key_store=IAPKeyStore(url=key_server.url))
+
+        with app.app_context():
+            decoded, _ = auth._validate_jwt(_token(other_private_key, 'k1'))
+
+        assert decoded is None
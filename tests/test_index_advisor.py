@@ -0,0 +1,92 @@
+"""
+Tests del index advisor (db_indexes.py) y de `flask index-advisor`.
+"""
+import pytest
+from sqlalchemy import text
+
+import db_indexes
+from commands import index_advisor_command
+from models import db
+
+
+@pytest.fixture
+def connection(app, db_session, sample_ticket):
+    return db.session.connection()
+
+
+class TestAdvisor:
+
+    def test_every_canonical_query_explains(self, connection):
+        results = db_indexes.run_advisor(connection)
+
+        assert [r.name for r in results] == list(db_indexes.CANONICAL_QUERIES)
+        assert not [(r.name, r.error) for r in results if r.error]
+        assert all(r.plan for r in results)
+
+    @pytest.mark.parametrize('name, index', [
+        ('nursing_board', 'ix_ticket_clinic_status_fpa'),
+        ('ticket_modifications', 'ix_fpa_modification_ticket_modified'),
+        ('tickets_by_creator', 'ix_ticket_created_by'),
+    ])
+    def test_hot_queries_use_their_index(self, connection, name, index):
+        result, = db_indexes.run_advisor(connection, queries=[name])
+
+        assert not result.flagged_scans
+        assert any(index in line for line in result.plan)
+
+    def test_missing_index_is_reported_and_query_flagged(self, connection):
+        assert db_indexes.missing_indexes(connection) == []
+        connection.execute(text('DROP INDEX ix_fpa_modification_ticket_modified'))
+        try:
+            assert db_indexes.missing_indexes(connection) == [
+                ('fpa_modification', 'ix_fpa_modification_ticket_modified')]
+            result, = db_indexes.run_advisor(connection, queries=['ticket_modifications'])
+            assert result.flagged_scans == ['fpa_modification']
+        finally:
+            connection.execute(text(
+                'CREATE INDEX ix_fpa_modification_ticket_modified ON fpa_modification (ticket_id, modified_at)'))
+
+
+class TestPlanParsing:
+
+    def test_sqlite_plan(self):
+        plan = ['SCAN ticket', 'SEARCH patient_1 USING INTEGER PRIMARY KEY (rowid=?)',
+                'SCAN surgery_1 USING INDEX ix_surgery', 'SCAN clinic', 'USE TEMP B-TREE FOR ORDER BY']
+
+        scans, sorts = db_indexes.analyze_plan(plan, 'sqlite')
+
+        assert scans == ['ticket', 'clinic']
+        assert sorts
+
+    def test_postgres_plan(self):
+        plan = [
+            'Sort  (cost=120.1..121.3 rows=480 width=300)',
+            '  ->  Hash Join  (cost=10.2..98.7 rows=480 width=300)',
+            '        ->  Seq Scan on ticket  (cost=0.00..80.0 rows=480 width=200)',
+            '        ->  Seq Scan on surgery surgery_1  (cost=0.00..1.2 rows=24 width=100)',
+            '        ->  Index Scan using patient_pkey on patient patient_1  (cost=0.29..0.31 rows=1)',
+        ]
+
+        scans, sorts = db_indexes.analyze_plan(plan, 'postgresql')
+        result = db_indexes.AdvisorResult('q', '', plan=plan, seq_scans=scans, sorts=sorts)
+
+        assert scans == ['ticket', 'surgery']
+        assert sorts
+        # Tablas maestras chicas no se marcan
+        assert result.flagged_scans == ['ticket']
+
+
+class TestCommand:
+
+    def test_report(self, app, db_session, sample_ticket):
+        result = app.test_cli_runner().invoke(index_advisor_command, ['--strict'])
+
+        assert result.exit_code == 0, result.output
+        assert 'Todos los índices de models.py existen' in result.output
+        assert 'nursing_board' in result.output
+
+    def test_unknown_query_is_rejected(self, app, db_session):
+        result = app.test_cli_runner().invoke(index_advisor_command, ['--query', 'nope'])
+
+        assert result.exit_code == 2
+        assert 'nursing_board' in result.output
@@ -0,0 +1,164 @@
+"""
+Tests de la prueba de carga en proceso (benchmarks/load_test.py) y del comando
+`flask load-test`.
+"""
+import random
+
+import pytest
+
+from models import Ticket, FpaModification
+from services.synthetic_data import SyntheticDataGenerator, LoadDataSpec
+from benchmarks.load_test import (
+    SCENARIOS, Scenario, Sample, ClinicData, LoadTestConfig, LoadTestError, VirtualUser,
+    parse_mix, summarize, find_saturation, run_stage, load_clinics,
+)
+from commands import load_test_command
+
+SPEC = LoadDataSpec(clinics=2, tickets=60, days=20, surgeries_per_clinic=4, doctors_per_clinic=3,
+                    with_login_audit=False)
+
+
+@pytest.fixture
+def load_data(db_session):
+    return SyntheticDataGenerator(SPEC, batch_size=50).generate()
+
+
+class TestHelpers:
+
+    def test_parse_mix(self):
+        assert parse_mix('nurse_board=3, export_burst=1') == {'nurse_board': 3.0, 'export_burst': 1.0}
+        assert parse_mix('admin_dashboard') == {'admin_dashboard': 1.0}
+
+    @pytest.mark.parametrize('value', ['unknown=1', 'nurse_board=x', 'nurse_board=-1', 'nurse_board=0'])
+    def test_parse_mix_rejects_invalid(self, value):
+        with pytest.raises(ValueError):
+            parse_mix(value)
+
+    def test_summarize_per_scenario_and_step(self):
+        samples = [Sample('nurse_board', 'nursing_board', 0, ms, 200, True) for ms in range(1, 101)]
+        samples += [
+            Sample('clinician_create_modify', 'create_submit', 0, 50, 302, True),
+            Sample('clinician_create_modify', 'modify_fpa', 0, 70, 302, False),
+        ]
+
+        summary = summarize(samples, duration=10)
+
+        board = summary['nurse_board']
+        assert board['requests'] == 100
+        assert board['rps'] == 10.0
+        assert (board['p50_ms'], board['p95_ms'], board['p99_ms'], board['max_ms']) == (51, 95, 99, 100)
+        clinician = summary['clinician_create_modify']
+        assert clinician['errors'] == 1 and clinician['error_rate'] == 0.5
+        assert set(clinician['steps']) == {'create_submit', 'modify_fpa'}
+
+    def test_find_saturation(self):
+        def stages(*rps):
+            return [{'concurrency': 2 ** i, 'rps': value} for i, value in enumerate(rps)]
+
+        assert find_saturation(stages(10, 19, 20.5, 20)) == 4
+        assert find_saturation(stages(10, 19, 35)) is None
+
+
+class TestScenarios:
+
+    @pytest.mark.parametrize('name', list(SCENARIOS))
+    def test_scenario_succeeds(self, app, load_data, name):
+        with app.app_context():
+            clinic = load_clinics()[0]
+        definition = SCENARIOS[name]
+        user_id = clinic.admin_ids[0] if definition.role == 'admin' else clinic.clinical_ids[0]
+        user = VirtualUser(app, clinic, user_id, random.Random(1), name, origin=0)
+
+        definition.run(user)
+
+        assert user.samples
+        assert all(sample.ok for sample in user.samples), user.samples
+
+    def test_clinician_creates_and_modifies(self, app, load_data):
+        with app.app_context():
+            clinic = load_clinics()[0]
+            before = Ticket.query.count(), FpaModification.query.count()
+        user = VirtualUser(app, clinic, clinic.clinical_ids[0], random.Random(2),
+                           'clinician_create_modify', origin=0)
+
+        SCENARIOS['clinician_create_modify'].run(user)
+
+        assert [s.step for s in user.samples] == ['create_form', 'create_submit', 'modify_fpa']
+        with app.app_context():
+            assert (Ticket.query.count(), FpaModification.query.count()) == (before[0] + 1, before[1] + 1)
+
+    def test_streamed_body_is_read_inside_the_sample(self, app, load_data):
+        with app.app_context():
+            clinic = load_clinics()[0]
+        user = VirtualUser(app, clinic, clinic.clinical_ids[0], random.Random(4), 'nurse_board', origin=0)
+
+        response = user.request('nursing_board', 'GET', '/tickets/nursing')
+
+        # El tablero va en streaming: el cuerpo ya se leyó (y el generador se cerró) al cronometrar
+        assert not response.is_streamed and b'</html>' in response.data
+
+    def test_failed_post_counts_as_error(self, app, load_data):
+        with app.app_context():
+            clinic = load_clinics()[0]
+        user = VirtualUser(app, clinic, clinic.clinical_ids[0], random.Random(3), 'x', origin=0)
+
+        # Sin datos: la ruta redirige (302) pero deja un flash de error
+        user.request('create_submit', 'POST', '/tickets/create', expect=302, data={})
+
+        assert user.samples[0].status == 302
+        assert not user.samples[0].ok
+
+    def test_load_clinics_requires_load_users(self, app, sample_user_admin):
+        with app.app_context(), pytest.raises(LoadTestError):
+            load_clinics()
+
+
+class TestRunStage:
+
+    def test_threads_record_samples(self, app, db_session, monkeypatch):
+        def fetch_static(user):
+            user.request('css', 'GET', '/static/css/enhanced-tickets.css')
+
+        monkeypatch.setitem(SCENARIOS, 'static', Scenario('static', fetch_static, role='clinical'))
+        clinic = ClinicData(clinic_id=1, admin_ids=[1], clinical_ids=[1], surgery_ids=[1], doctor_ids=[])
+        config = LoadTestConfig(duration=0.3, warmup=0.1, mix={'static': 1}, burst_every=0)
+
+        stage = run_stage(app, [clinic], config, concurrency=4)
+
+        assert stage['concurrency'] == 4
+        assert stage['requests'] > 0 and stage['errors'] == 0
+        assert stage['scenarios']['static']['steps']['css']['requests'] == stage['requests']
+
+
+class TestLoadTestCommand:
+
+    def test_runs_and_reports(self, app, load_data, tmp_path):
+        output = tmp_path / 'load.json'
+        result = app.test_cli_runner().invoke(load_test_command, [
+            '--concurrency', '1', '--duration', '0.5', '--warmup', '0',
+            '--mix', 'nurse_board=1,admin_dashboard=1', '--output', str(output),
+        ])
+
+        assert result.exit_code == 0, result.output
+        assert '== 1 hilos' in result.output
+        assert output.exists()
+
+    def test_requires_load_data(self, app, db_session):
+        result = app.test_cli_runner().invoke(load_test_command, ['--duration', '0.1', '--yes'])
+
+        assert result.exit_code == 1
+        assert 'gen-load-data' in result.output
+
+    def test_rejects_invalid_mix(self, app, db_session):
+        result = app.test_cli_runner().invoke(load_test_command, ['--mix', 'nope=1', '--yes'])
+
+        assert result.exit_code == 2
+
+    def test_refuses_in_production(self, app, load_data):
+        app.config['ENVIRONMENT'] = 'production'
+        try:
+            result = app.test_cli_runner().invoke(load_test_command, ['--yes'])
+        finally:
+            app.config['ENVIRONMENT'] = 'local'
+
+        assert result.exit_code == 1
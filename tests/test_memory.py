@@ -0,0 +1,136 @@
+"""
+Tests de la medición de memoria por request (monitoring/memory.py) y del techo
+de memoria de los exports.
+"""
+import io
+import json
+import logging
+import time
+import tracemalloc
+
+import openpyxl
+import pytest
+
+from monitoring.memory import (
+    MB, trace_memory, current_rss, rss_peaks, REQUEST_MEMORY_PEAK, MEMORY_TRACE_SKIPPED,
+)
+from services.synthetic_data import SyntheticDataGenerator, LoadDataSpec
+
+# Presupuesto del export Excel: base + costo por fila (hoy ~18 KB/fila en openpyxl + ORM)
+EXPORT_BASE_MB = 4
+EXPORT_KB_PER_ROW = 25
+
+
+def _login(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+
+def _traced_count(endpoint):
+    entry = REQUEST_MEMORY_PEAK.snapshot().get((endpoint,))
+    return entry[2] if entry else 0
+
+
+class TestMemoryTrace:
+
+    def test_peak_and_sites_near_the_peak(self):
+        with trace_memory(interval=0.01) as trace:
+            blob = [bytes(1024) for _ in range(5000)]  # ~5 MB
+            time.sleep(0.1)
+            del blob
+
+        assert trace.peak_bytes >= 5 * MB
+        top = trace.top_allocations()
+        # El snapshot es del pico, no del final (cuando blob ya no existe)
+        assert top[0]['site'].startswith('tests/test_memory.py:')
+        assert top[0]['size_kb'] >= 5000
+        assert not tracemalloc.is_tracing()
+
+    def test_keeps_external_tracing_running(self):
+        tracemalloc.start()
+        try:
+            with trace_memory() as trace:
+                data = bytearray(2 * MB)
+            assert tracemalloc.is_tracing()
+            assert trace.peak_bytes >= 2 * MB
+            del data
+        finally:
+            tracemalloc.stop()
+
+    def test_current_rss(self):
+        assert current_rss() > 0
+
+
+@pytest.fixture
+def trace_every_request(app):
+    app.config['MEMORY_TRACE_SAMPLE_RATE'] = 1.0
+    yield
+    app.config['MEMORY_TRACE_SAMPLE_RATE'] = 0.1
+
+
+@pytest.mark.usefixtures('trace_every_request')
+class TestRequestTracking:
+
+    def test_tracked_endpoint_is_logged_and_measured(self, client, sample_user_admin, sample_ticket, caplog):
+        _login(client, sample_user_admin.id)
+        before = _traced_count('tickets.nursing_board')
+
+        with caplog.at_level(logging.INFO, logger='monitoring.memory'):
+            assert client.get('/tickets/nursing').status_code == 200
+
+        records = [json.loads(r.getMessage()) for r in caplog.records if r.name == 'monitoring.memory']
+        assert len(records) == 1
+        record = records[0]
+        assert record['endpoint'] == 'tickets.nursing_board'
+        assert record['peak_mb'] > 0
+        assert record['top_allocations'] and {'site', 'size_kb', 'count'} <= set(record['top_allocations'][0])
+        assert _traced_count('tickets.nursing_board') == before + 1
+        assert rss_peaks.values()[('tickets.nursing_board',)] > 0
+
+    def test_untracked_endpoint_is_ignored(self, client, sample_user_admin, caplog):
+        _login(client, sample_user_admin.id)
+
+        with caplog.at_level(logging.INFO, logger='monitoring.memory'):
+            client.get('/tickets/')
+
+        assert not [r for r in caplog.records if r.name == 'monitoring.memory']
+
+    def test_concurrent_trace_is_skipped(self, client, sample_user_admin, caplog):
+        _login(client, sample_user_admin.id)
+        skipped = MEMORY_TRACE_SKIPPED.value(endpoint='tickets.nursing_board')
+
+        # Otro trazado en curso: el request no espera, solo se cuenta
+        with trace_memory(), caplog.at_level(logging.INFO, logger='monitoring.memory'):
+            assert client.get('/tickets/nursing').status_code == 200
+
+        assert MEMORY_TRACE_SKIPPED.value(endpoint='tickets.nursing_board') == skipped + 1
+        assert not [r for r in caplog.records if r.name == 'monitoring.memory']
+
+    def test_unsampled_request_only_records_rss(self, app, client, sample_user_admin, caplog):
+        _login(client, sample_user_admin.id)
+        app.config['MEMORY_TRACE_SAMPLE_RATE'] = 0.0
+        rss_peaks.reset()
+
+        with caplog.at_level(logging.INFO, logger='monitoring.memory'):
+            client.get('/tickets/nursing')
+
+        assert not [r for r in caplog.records if r.name == 'monitoring.memory']
+        assert rss_peaks.values()[('tickets.nursing_board',)] > 0
+
+
+class TestExportMemoryCeiling:
+
+    ROWS = 500
+
+    def test_excel_export_stays_under_ceiling(self, client, db_session, memory_ceiling):
+        summary = SyntheticDataGenerator(
+            LoadDataSpec(clinics=1, tickets=self.ROWS, days=60, with_login_audit=False), batch_size=1000
+        ).generate()
+        _login(client, summary.admin_user_ids[0])
+
+        with memory_ceiling(EXPORT_BASE_MB + self.ROWS * EXPORT_KB_PER_ROW / 1024):
+            response = client.get('/export/tickets/reports/excel')
+
+        assert response.status_code == 200
+        assert openpyxl.load_workbook(io.BytesIO(response.data)).active.max_row == self.ROWS + 1
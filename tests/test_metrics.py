@@ -0,0 +1,151 @@
+"""
+Tests del registro de métricas y del endpoint /metrics.
+"""
+import threading
+from datetime import timedelta
+
+from flask_login import login_user
+
+from monitoring.metrics import MetricsRegistry
+from services.user_cache import UserCache
+from utils.datetime_utils import utcnow
+
+
+class TestMetricsRegistry:
+
+    def test_counter_sums_all_threads(self):
+        reg = MetricsRegistry()
+        counter = reg.counter('jobs_total', 'Jobs.', ('kind',))
+
+        def work():
+            for _ in range(1000):
+                counter.inc(kind='a')
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert counter.value(kind='a') == 8000
+        assert 'jobs_total{kind="a"} 8000' in reg.expose()
+
+    def test_shards_of_finished_threads_are_merged(self):
+        reg = MetricsRegistry()
+        counter = reg.counter('jobs_total', 'Jobs.', ('kind',))
+        hist = reg.histogram('latency_seconds', 'Latencia.', buckets=(0.1, 1.0))
+
+        def work():
+            counter.inc(kind='a')
+            hist.observe(0.5)
+
+        for _ in range(20):
+            t = threading.Thread(target=work)
+            t.start()
+            t.join()
+
+        assert counter._shards.all() == [{('a',): 20.0}]
+        assert len(hist._shards.all()) == 1
+        assert counter.value(kind='a') == 20
+        assert hist.snapshot()[()] == ([0, 20, 20], 10.0, 20)
+
+    def test_histogram_buckets_are_cumulative(self):
+        reg = MetricsRegistry()
+        hist = reg.histogram('latency_seconds', 'Latencia.', ('endpoint',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 3.0):
+            hist.observe(value, endpoint='x')
+
+        text = reg.expose()
+        assert '# TYPE latency_seconds histogram' in text
+        assert 'latency_seconds_bucket{endpoint="x",le="0.1"} 1' in text
+        assert 'latency_seconds_bucket{endpoint="x",le="1"} 3' in text
+        assert 'latency_seconds_bucket{endpoint="x",le="+Inf"} 4' in text
+        assert 'latency_seconds_count{endpoint="x"} 4' in text
+        assert 'latency_seconds_sum{endpoint="x"} 4.05' in text
+
+    def test_gauge_track_decorator(self):
+        reg = MetricsRegistry()
+        gauge = reg.gauge('running', 'En curso.', ('kind',))
+        seen = []
+
+        @gauge.track(kind='excel')
+        def job():
+            seen.append(gauge.value(kind='excel'))
+
+        job()
+        assert seen == [1]
+        assert gauge.value(kind='excel') == 0
+
+    def test_label_values_are_escaped(self):
+        reg = MetricsRegistry()
+        reg.counter('c_total', 'C.', ('name',)).inc(name='a"b')
+        assert 'c_total{name="a\\"b"} 1' in reg.expose()
+
+
+class TestMetricsEndpoint:
+
+    def test_requires_superuser(self, app, client, db_session, sample_user_admin):
+        with client:
+            with app.test_request_context():
+                login_user(sample_user_admin)
+            response = client.get('/metrics')
+        assert response.status_code == 403
+
+    def test_unauthenticated_without_token_is_forbidden(self, client, db_session):
+        assert client.get('/metrics').status_code == 403
+
+    def test_bearer_token(self, app, client, db_session):
+        app.config['METRICS_TOKEN'] = 'secreto'
+        try:
+            assert client.get('/metrics', headers={'Authorization': 'Bearer otro'}).status_code == 403
+            response = client.get('/metrics', headers={'Authorization': 'Bearer secreto'})
+        finally:
+            app.config['METRICS_TOKEN'] = None
+        assert response.status_code == 200
+        assert response.mimetype == 'text/plain'
+
+    def test_ticket_counts_match_python_classification(self, db_session, sample_clinic, sample_patient,
+                                                        sample_surgery_normal):
+        from collections import Counter
+        from models import Ticket, TICKET_STATUS_ANULADO, TICKET_STATUS_VIGENTE
+        from monitoring.metrics import _ticket_counts
+        from tests.conftest import make_ticket
+
+        now = utcnow()
+        for i, hours_left in enumerate((-5, 1, 3, 3, 12, 40), start=1):
+            make_ticket(i, sample_surgery_normal, sample_clinic, sample_patient, now - timedelta(hours=20),
+                        current_fpa=now + timedelta(hours=hours_left))
+        make_ticket(7, sample_surgery_normal, sample_clinic, sample_patient, now + timedelta(hours=5))
+        make_ticket(8, sample_surgery_normal, sample_clinic, sample_patient, now - timedelta(hours=20),
+                    status=TICKET_STATUS_ANULADO)
+        db_session.session.commit()
+
+        expected = Counter(
+            (sample_clinic.name, Ticket.urgency_level_for(t.pavilion_end_time, t.current_fpa, now))
+            for t in Ticket.query.filter_by(status=TICKET_STATUS_VIGENTE)
+        )
+        assert _ticket_counts() == dict(expected)
+        assert sum(expected.values()) == 7
+
+    def test_exposes_request_and_ticket_metrics(self, app, client, db_session, sample_user_super,
+                                                 sample_ticket, sample_clinic):
+        # Ticket vigente con FPA en 3 horas -> urgencia 'warning'
+        sample_ticket.pavilion_end_time = utcnow() - timedelta(hours=20)
+        sample_ticket.current_fpa = utcnow() + timedelta(hours=3, minutes=30)
+        db_session.session.commit()
+        UserCache.load(sample_user_super.id)
+
+        with client:
+            with app.test_request_context():
+                login_user(sample_user_super)
+            client.get('/tickets/nursing')
+            response = client.get('/metrics')
+
+        assert response.status_code == 200
+        text = response.get_data(as_text=True)
+        assert 'http_request_duration_seconds_bucket{endpoint="tickets.nursing_board",method="GET"' in text
+        assert 'http_requests_total{endpoint="tickets.nursing_board",method="GET",status="200"}' in text
+        assert f'tickets_active{{clinic="{sample_clinic.name}",urgency="warning"}} 1' in text
+        assert '# TYPE http_requests_in_flight gauge' in text
+        assert '# TYPE db_pool_checkout_wait_seconds histogram' in text
+        assert 'cache_requests_total{cache="user"' in text
@@ -0,0 +1,135 @@
+"""
+Tests de la instrumentación por request (monitoring/).
+"""
+import json
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from models import Ticket, TICKET_STATUS_VIGENTE
+from monitoring import fingerprint_statement, RequestQueryStats
+
+
+def _create_tickets(db_session, count, clinic, patient, surgery):
+    base = datetime(2026, 3, 1, 10, 0)
+    for i in range(count):
+        fpa = base + timedelta(hours=24 + i)
+        db_session.session.add(Ticket(
+            id=f'TH-TEST-2026-{i + 100:03d}',
+            patient_id=patient.id,
+            surgery_id=surgery.id,
+            clinic_id=clinic.id,
+            pavilion_end_time=base,
+            medical_discharge_date=fpa.date(),
+            system_calculated_fpa=fpa,
+            initial_fpa=fpa,
+            current_fpa=fpa,
+            overnight_stays=1,
+            status=TICKET_STATUS_VIGENTE,
+            created_by='test_user',
+            surgery_name_snapshot=surgery.name,
+            surgery_base_hours_snapshot=surgery.base_stay_hours,
+        ))
+    db_session.session.commit()
+
+
+class TestFingerprint:
+
+    def test_literals_and_params_are_normalized(self):
+        a = fingerprint_statement("SELECT * FROM ticket WHERE id = 'TH-1' AND clinic_id = 3")
+        b = fingerprint_statement("SELECT *  FROM ticket\nWHERE id = 'TH-2' AND clinic_id = 7")
+        assert a == b == 'SELECT * FROM ticket WHERE id = ? AND clinic_id = ?'
+
+    def test_in_lists_collapse(self):
+        a = fingerprint_statement('SELECT 1 FROM t WHERE id IN (?, ?, ?)')
+        b = fingerprint_statement('SELECT 1 FROM t WHERE id IN (%(id_1)s, %(id_2)s)')
+        assert a == b
+
+    def test_repeated_threshold(self):
+        stats = RequestQueryStats()
+        for _ in range(5):
+            stats.record('SELECT * FROM fpa_modification WHERE ticket_id = ?', 0.001)
+        stats.record('SELECT * FROM ticket', 0.001)
+
+        assert stats.count == 6
+        assert stats.repeated(5) == [('SELECT * FROM fpa_modification WHERE ticket_id = ?', 5)]
+        assert stats.repeated(6) == []
+
+
+class TestRequestInstrumentation:
+
+    def test_server_timing_header(self, authenticated_client):
+        response = authenticated_client.get('/tickets/nursing')
+        header = response.headers.get('Server-Timing', '')
+        assert 'db;dur=' in header
+        assert 'queries' in header
+        assert 'app;dur=' in header
+
+    def test_n_plus_one_is_logged(self, app, db_session, sample_clinic, sample_patient,
+                                  sample_surgery_normal, caplog):
+        _create_tickets(db_session, 6, sample_clinic, sample_patient, sample_surgery_normal)
+        ticket_ids = [t.id for t in Ticket.query.all()]
+        with caplog.at_level(logging.WARNING, logger='monitoring.sql'):
+            with app.test_request_context('/tickets/nursing'):
+                app.preprocess_request()
+                # Lazy load dentro de un loop: una query por ticket
+                for ticket_id in ticket_ids:
+                    db_session.session.execute(
+                        text('SELECT id FROM fpa_modification WHERE ticket_id = :ticket_id'),
+                        {'ticket_id': ticket_id}
+                    ).all()
+                app.process_response(app.response_class())
+
+        records = [json.loads(r.message) for r in caplog.records if r.name == 'monitoring.sql']
+        assert records, 'el request debería haberse reportado'
+        record = records[-1]
+        assert record['endpoint'] == 'tickets.nursing_board'
+        assert record['n_plus_one']
+        assert all(item['count'] >= 5 for item in record['n_plus_one'])
+
+    def test_streamed_response_is_reported_after_the_body(self, client, sample_user_admin, db_session, sample_clinic,
+                                                            sample_patient, sample_surgery_normal, query_counter,
+                                                            caplog):
+        _create_tickets(db_session, 3, sample_clinic, sample_patient, sample_surgery_normal)
+        # Sin `with client`: el contexto no se preserva y el teardown corre al cerrar el stream
+        with client.session_transaction() as session:
+            session['_user_id'] = str(sample_user_admin.id)
+        with caplog.at_level(logging.INFO, logger='monitoring.sql'):
+            with query_counter() as counter:
+                response = client.get('/tickets/nursing?status=Todos')
+                before_body = counter.count
+                assert response.is_streamed
+                html = response.get_data(as_text=True)
+                response.close()
+
+        assert 'data-ticket-id="TH-TEST-2026-100"' in html
+        # El header solo puede declarar lo ejecutado antes del cuerpo, y lo dice
+        assert f'desc="{before_body} queries before body"' in response.headers['Server-Timing']
+        # El log se escribe al cerrar el stream: incluye la query de las tarjetas
+        log = [r for r in caplog.records if r.name == 'monitoring.sql'][-1]
+        record = json.loads(log.message)
+        assert log.levelno == logging.INFO
+        assert record['endpoint'] == 'tickets.nursing_board' and record['status'] == 200
+        assert record['queries'] == counter.count > before_body
+        assert any('FROM ticket' in statement for statement in counter.statements[before_body:])
+
+    def test_failed_statement_does_not_leak_its_start_time(self, app, db_session):
+        with db_session.engine.connect() as conn:
+            for _ in range(3):
+                try:
+                    conn.execute(text('SELECT * FROM tabla_inexistente'))
+                except OperationalError:
+                    conn.rollback()
+            assert not conn.info.get('_query_start_time')
+
+    def test_stats_reset_between_requests(self, authenticated_client):
+        first = authenticated_client.get('/tickets/nursing').headers['Server-Timing']
+        second = authenticated_client.get('/tickets/nursing').headers['Server-Timing']
+
+        def queries(header):
+            return int(header.split('desc="')[1].split(' ')[0])
+
+        # El segundo request no acumula las queries del primero
+        assert queries(second) <= queries(first)
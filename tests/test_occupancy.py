@@ -0,0 +1,203 @@
+"""
+Tests del índice de ocupación de camas (services/occupancy.py), su
+actualización incremental, /tickets/api/occupancy y `flask occupancy-report`.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from commands import occupancy_report_command
+from models import db, TICKET_STATUS_ANULADO
+from services import OccupancyService, OccupancyIndex, FPACalculator
+from services.discharge_forecast import NO_LOCATION
+from cache import app_cache
+from tests.conftest import make_ticket
+
+T0 = datetime(2025, 1, 1)
+
+
+def hours(n):
+    return T0 + timedelta(hours=n)
+
+
+intervals = st.lists(
+    st.tuples(st.sampled_from(['A', 'B', None]), st.integers(0, 48), st.integers(1, 24)),
+    max_size=30,
+)
+
+
+def brute_at(spans, when, location):
+    return sum(1 for loc, start, end in spans if start <= when < end and location in (None, loc))
+
+
+class TestOccupancyIndex:
+
+    def _index(self, raw):
+        spans = [(loc or NO_LOCATION, hours(start), hours(start + length)) for loc, start, length in raw]
+        index = OccupancyIndex.from_intervals((f'T{i}', *span) for i, span in enumerate(spans))
+        return index, spans
+
+    @settings(max_examples=200, deadline=None)
+    @given(intervals, st.integers(-2, 75), st.integers(1, 30), st.sampled_from([None, 'A', NO_LOCATION]))
+    def test_matches_brute_force(self, raw, start, length, location):
+        index, spans = self._index(raw)
+        a, b = hours(start), hours(start + length)
+        in_range = [s for s in spans if location in (None, s[0])]
+
+        assert index.at(a, location) == brute_at(spans, a, location)
+        assert index.during(a, b, location) == sum(1 for _, s, e in in_range if s < b and e > a)
+        assert index.admitted(a, b, location) == sum(1 for _, s, _ in in_range if a <= s < b)
+        assert index.discharged(a, b, location) == sum(1 for _, _, e in in_range if a <= e < b)
+
+        candidates = sorted({a, *(s for _, s, _ in in_range if a < s < b)})
+        counts = [brute_at(spans, t, location) for t in candidates]
+        peak = index.peak(a, b, location)
+        assert peak.count == max(counts)
+        assert peak.at == candidates[counts.index(max(counts))]
+
+    @settings(max_examples=100, deadline=None)
+    @given(intervals, intervals)
+    def test_incremental_equals_rebuild(self, first, second):
+        index, _ = self._index(first)
+        expected, _ = self._index(second)
+
+        for i in range(len(first)):
+            index.remove(f'T{i}')
+        for i, (loc, start, length) in enumerate(second):
+            index.add(f'T{i}', loc, hours(start), hours(start + length))
+
+        assert index.intervals == expected.intervals
+        assert index.locations == expected.locations
+        for location in (None, 'A', 'B', NO_LOCATION):
+            assert index._starts[location] == expected._starts[location]
+            assert index._ends[location] == expected._ends[location]
+
+    def test_discharge_frees_the_bed_before_an_admission_at_the_same_time(self):
+        index = OccupancyIndex.from_intervals([('T1', 'A', hours(0), hours(10)), ('T2', 'A', hours(10), hours(20))])
+
+        assert index.peak(hours(0), hours(20)).count == 1
+        assert index.at(hours(10)) == 1
+
+
+@pytest.fixture
+def add_ticket(db_session, sample_clinic, sample_patient, sample_surgery_normal):
+    """Ticket cuya estadía es [pabellón - 2h, current_fpa)."""
+    numbers = iter(range(1, 1000))
+
+    def add(pavilion_end, current_fpa, location=None, clinic=sample_clinic, **kwargs):
+        ticket = make_ticket(next(numbers), sample_surgery_normal, clinic, sample_patient, pavilion_end,
+                             current_fpa=current_fpa, **kwargs)
+        ticket.location = location
+        db.session.commit()
+        return ticket
+    return add
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    """Cuenta las reconstrucciones de índices."""
+    calls = []
+    build = OccupancyService.build
+
+    def counting(clinic_id=None):
+        calls.append(clinic_id)
+        return build(clinic_id)
+    monkeypatch.setattr(OccupancyService, 'build', staticmethod(counting))
+    return calls
+
+
+class TestOccupancyService:
+
+    def test_point_and_range_queries(self, add_ticket, sample_clinic):
+        add_ticket(hours(12), hours(40), location='Piso 3')   # en la clínica de 10:00 a 16:00 del día 2
+        add_ticket(hours(20), hours(30), location='Piso 3')
+        add_ticket(hours(14), hours(36), location=None)
+        add_ticket(hours(14), hours(100), location='UCI', status=TICKET_STATUS_ANULADO)
+
+        at = OccupancyService.at(sample_clinic.id, hours(25))
+        report = OccupancyService.report(sample_clinic.id, hours(0), hours(48))
+
+        assert at['total'] == 3 and at['by_location'] == {'Piso 3': 2, NO_LOCATION: 1}
+        assert [row['location'] for row in report['locations']] == ['Piso 3', NO_LOCATION]
+        total = report['total']
+        assert (total['patients'], total['admitted'], total['discharged'], total['peak']) == (3, 3, 3, 3)
+        assert total['peak_at'] == hours(18).isoformat()
+
+    def test_admission_follows_fpa_calculator(self, add_ticket, sample_clinic):
+        pavilion_end = datetime(2025, 1, 2, 8, 0)
+        add_ticket(pavilion_end, hours(60))
+        admission = FPACalculator.calculate_admission_time(pavilion_end)
+
+        assert OccupancyService.at(sample_clinic.id, admission - timedelta(seconds=1))['total'] == 0
+        assert OccupancyService.at(sample_clinic.id, admission)['total'] == 1
+
+    def test_writes_are_applied_incrementally(self, add_ticket, sample_clinic, builds):
+        ticket = add_ticket(hours(12), hours(40), location='Piso 3')
+        assert OccupancyService.at(sample_clinic.id, hours(20))['by_location'] == {'Piso 3': 1}
+        assert OccupancyService.at(None, hours(20))['total'] == 1
+
+        ticket.location = 'UCI'
+        db.session.commit()
+        add_ticket(hours(15), hours(30), location='UCI')
+        other = add_ticket(hours(16), hours(30), location='UCI')
+        other.status = TICKET_STATUS_ANULADO
+        db.session.commit()
+
+        assert OccupancyService.at(sample_clinic.id, hours(20))['by_location'] == {'UCI': 2}
+        assert OccupancyService.at(None, hours(20))['total'] == 2
+        assert builds == [sample_clinic.id, None]
+
+    def test_rollback_is_not_applied(self, add_ticket, sample_clinic, builds):
+        ticket = add_ticket(hours(12), hours(40))
+        OccupancyService.at(sample_clinic.id, hours(20))
+
+        ticket.current_fpa = hours(18)
+        db.session.flush()
+        db.session.rollback()
+
+        assert OccupancyService.at(sample_clinic.id, hours(20))['total'] == 1
+        assert builds == [sample_clinic.id]
+
+    def test_write_from_another_process_rebuilds(self, add_ticket, sample_clinic, builds):
+        add_ticket(hours(12), hours(40))
+        OccupancyService.at(sample_clinic.id, hours(20))
+
+        # Otra instancia escribió: su bump llega por el bus sin cambios locales que aplicar
+        app_cache.bump(f'tickets:{sample_clinic.id}', publish=False)
+        OccupancyService.at(sample_clinic.id, hours(20))
+
+        assert builds == [sample_clinic.id, sample_clinic.id]
+
+
+class TestOccupancyEndpointAndCommand:
+
+    def test_endpoint(self, authenticated_client, add_ticket):
+        add_ticket(hours(12), hours(40), location='Piso 3')
+
+        at = authenticated_client.get(f'/tickets/api/occupancy?at={hours(20).isoformat()}').get_json()
+        report = authenticated_client.get(
+            f'/tickets/api/occupancy?start={hours(0).isoformat()}&end={hours(48).isoformat()}').get_json()
+
+        assert at['total'] == 1
+        assert report['locations'][0]['location'] == 'Piso 3' and report['total']['peak'] == 1
+
+    @pytest.mark.parametrize('query', ['at=ayer', f'start={hours(0).isoformat()}',
+                                       f'start={hours(5).isoformat()}&end={hours(1).isoformat()}'])
+    def test_endpoint_rejects_bad_dates(self, authenticated_client, query):
+        response = authenticated_client.get(f'/tickets/api/occupancy?{query}')
+
+        assert response.status_code == 400
+
+    def test_command(self, app, add_ticket, sample_clinic):
+        add_ticket(hours(12), hours(40), location='Piso 3')
+        runner = app.test_cli_runner()
+
+        report = runner.invoke(occupancy_report_command, ['--clinic-id', str(sample_clinic.id),
+                                                          '--from', '2025-01-01', '--to', '2025-01-03'])
+        at = runner.invoke(occupancy_report_command, ['--at', '2025-01-01 20:00'])
+
+        assert report.exit_code == 0, report.output
+        assert 'Piso 3' in report.output and 'Total' in report.output
+        assert at.exit_code == 0, at.output
+        assert 'Pacientes el 2025-01-01 20:00: 1' in at.output
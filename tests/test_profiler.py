@@ -0,0 +1,154 @@
+"""
+Tests del profiler bajo demanda (monitoring/profiler.py).
+"""
+import marshal
+import re
+import time
+
+import pytest
+from flask import Flask
+
+from monitoring.profiler import RateLimiter, SamplingCollector, frame_label, init_profiler
+
+
+def _login(client, user):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+
+
+@pytest.fixture
+def profiler(app):
+    limiter = app.extensions['profiler']
+    limiter.reset()
+    yield limiter
+    limiter.reset()
+    app.config['PROFILER_RATE_LIMIT'] = 6
+
+
+@pytest.fixture
+def super_client(client, profiler, sample_user_super, sample_ticket):
+    _login(client, sample_user_super)
+    return client
+
+
+class TestProfiledRequests:
+
+    def test_cprofile_html_report_with_sql(self, super_client):
+        response = super_client.get('/tickets/nursing?__profile=1')
+
+        assert response.status_code == 200
+        assert response.headers['X-Profile-Mode'] == 'cprofile'
+        assert response.headers['X-Profile-Original-Status'] == '200'
+        html = response.get_data(as_text=True)
+        assert 'Perfil (cprofile)' in html
+        assert 'Por tiempo acumulado' in html
+        assert 'nursing_board' in html
+        assert 'FROM ticket' in html
+
+    def test_cprofile_pstats_download(self, super_client):
+        response = super_client.get('/tickets/nursing?__profile=cprofile&__profile_format=pstats')
+
+        assert response.mimetype == 'application/octet-stream'
+        assert 'attachment; filename="profile-tickets_nursing_board-' in response.headers['Content-Disposition']
+        stats = marshal.loads(response.data)
+        assert any(func == 'nursing_board' for (_, _, func) in stats)
+
+    def test_sample_collapsed_via_headers(self, app, super_client):
+        app.config['PROFILER_SAMPLE_INTERVAL_MS'] = 0.5
+        try:
+            response = super_client.get('/tickets/nursing',
+                                        headers={'X-Profile': 'sample', 'X-Profile-Format': 'collapsed'})
+        finally:
+            app.config['PROFILER_SAMPLE_INTERVAL_MS'] = 5.0
+
+        assert response.status_code == 200
+        assert response.mimetype == 'text/plain'
+        for line in response.get_data(as_text=True).splitlines():
+            assert re.fullmatch(r'[^ ].*? \d+', line), line
+
+    def test_sample_html_report(self, super_client):
+        response = super_client.get('/tickets/nursing?__profile=sample')
+
+        assert response.headers['X-Profile-Mode'] == 'sample'
+        assert 'Stacks colapsados' in response.get_data(as_text=True)
+
+    def test_invalid_format_is_rejected(self, super_client):
+        response = super_client.get('/tickets/nursing?__profile=1&__profile_format=collapsed')
+        assert response.status_code == 400
+
+    def test_rate_limit(self, app, super_client):
+        app.config['PROFILER_RATE_LIMIT'] = 1
+
+        assert super_client.get('/tickets/nursing?__profile=1').status_code == 200
+        assert super_client.get('/tickets/nursing?__profile=1').status_code == 429
+        # Sin pedir perfil el request sigue normal
+        assert super_client.get('/tickets/nursing').status_code == 200
+
+    def test_lock_is_released_after_each_profile(self, super_client):
+        for _ in range(3):
+            assert super_client.get('/tickets/nursing?__profile=1').status_code == 200
+
+
+class TestAuthorization:
+
+    def test_non_superuser_gets_normal_page(self, client, profiler, sample_user_admin):
+        _login(client, sample_user_admin)
+
+        response = client.get('/tickets/nursing?__profile=1')
+
+        assert response.status_code == 200
+        assert 'X-Profile-Mode' not in response.headers
+        assert 'Perfil (cprofile)' not in response.get_data(as_text=True)
+
+    def test_anonymous_is_not_profiled(self, client, profiler, db_session):
+        response = client.get('/tickets/nursing?__profile=1')
+
+        assert 'X-Profile-Mode' not in response.headers
+
+    def test_disabled_registers_no_hooks(self):
+        app = Flask(__name__)
+        app.config['PROFILER_ENABLED'] = False
+
+        init_profiler(app)
+
+        assert not app.before_request_funcs
+        assert 'profiler' not in app.extensions
+
+    def test_never_registered_in_production(self):
+        app = Flask(__name__)
+        app.config.update(ENVIRONMENT='production', PROFILER_ENABLED=True)
+
+        init_profiler(app)
+
+        assert not app.before_request_funcs
+        assert 'profiler' not in app.extensions
+
+
+class TestHelpers:
+
+    def test_rate_limiter_window(self):
+        limiter = RateLimiter(window=0)
+        assert limiter.allow(1)
+        # Ventana de 0 s: el evento anterior ya expiró
+        assert limiter.allow(1)
+
+        limiter = RateLimiter(window=60)
+        assert limiter.allow(2) and limiter.allow(2)
+        assert not limiter.allow(2)
+
+    def test_frame_label_is_relative_and_has_no_semicolons(self):
+        label = frame_label(frame_label.__code__)
+        assert label.startswith('frame_label (monitoring/profiler.py:')
+        assert ';' not in label
+
+    def test_sampler_collects_stacks(self):
+        collector = SamplingCollector(interval=0.001)
+        collector.start()
+        deadline = time.monotonic() + 2
+        while not collector.samples and time.monotonic() < deadline:
+            sum(range(10_000))
+        collector.stop()
+
+        assert collector.samples > 0
+        assert 'test_sampler_collects_stacks' in collector.collapsed()
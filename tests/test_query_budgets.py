@@ -0,0 +1,185 @@
+"""
+Presupuesto de queries SQL por endpoint.
+
+Cada endpoint tiene un máximo declarado de sentencias por request y se mide
+con 10 y con 1.000 tickets: la cantidad de queries no debe depender del
+número de filas (un N+1 hace que crezca con los tickets y el test falla).
+El resumen por endpoint se imprime al final de la corrida de pytest.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from flask_login import login_user
+from sqlalchemy import insert
+
+from models import (
+    db, Patient, Ticket, FpaModification, TICKET_STATUS_VIGENTE,
+)
+from services.user_cache import UserCache
+from tests.conftest import QUERY_BUDGET_REPORT
+
+DATASET_SIZES = (10, 1000)
+
+# Máximo de sentencias SQL por request
+QUERY_BUDGETS = {
+    'tickets.nursing_board': 4,
+    'tickets.list': 5,
+    'tickets.detail': 5,
+    'dashboard.dashboard': 15,
+    'exports.export_excel': 3,
+    'tickets.create[GET]': 6,
+    'tickets.create[POST]': 10,
+}
+
+TICKET_ID_PREFIX = 'TH-CLIN-2026-'
+
+
+def _populate(clinic, surgery, doctor, user, count):
+    """Inserta `count` tickets vigentes (con paciente y 2 modificaciones c/u) vía Core."""
+    base = datetime.utcnow() - timedelta(hours=12)
+
+    db.session.execute(insert(Patient), [{
+        'rut': f'{10000000 + i}-{i % 10}',
+        'primer_nombre': f'Paciente{i}',
+        'apellido_paterno': 'Prueba',
+        'age': 30 + i % 50,
+        'sex': 'M' if i % 2 else 'F',
+        'clinic_id': clinic.id,
+    } for i in range(count)])
+    patient_ids = [pid for (pid,) in db.session.execute(
+        db.select(Patient.id).where(Patient.clinic_id == clinic.id).order_by(Patient.id)
+    ).all()][-count:]
+
+    tickets, modifications = [], []
+    for i, patient_id in enumerate(patient_ids):
+        ticket_id = f'{TICKET_ID_PREFIX}{i + 1:04d}'
+        fpa = base + timedelta(hours=24 + i % 72)
+        tickets.append({
+            'id': ticket_id,
+            'patient_id': patient_id,
+            'surgery_id': surgery.id,
+            'doctor_id': doctor.id,
+            'clinic_id': clinic.id,
+            'pavilion_end_time': base,
+            'medical_discharge_date': fpa.date(),
+            'system_calculated_fpa': fpa,
+            'initial_fpa': fpa,
+            'current_fpa': fpa,
+            'overnight_stays': 1,
+            'bed_number': str(100 + i % 300),
+            'status': TICKET_STATUS_VIGENTE,
+            'created_by': user.username,
+            'created_at': base + timedelta(seconds=i),
+            'surgery_name_snapshot': surgery.name,
+            'surgery_base_hours_snapshot': surgery.base_stay_hours,
+        })
+        for n in range(2):
+            modifications.append({
+                'ticket_id': ticket_id,
+                'clinic_id': clinic.id,
+                'previous_fpa': fpa,
+                'new_fpa': fpa + timedelta(hours=n + 1),
+                'reason': 'Paciente requiere observación adicional',
+                'modified_by': user.username,
+                'modified_at': base + timedelta(minutes=n),
+            })
+    db.session.execute(insert(Ticket), tickets)
+    db.session.execute(insert(FpaModification), modifications)
+    db.session.commit()
+
+
+@pytest.fixture(params=DATASET_SIZES, ids=lambda n: f'{n}_tickets')
+def dataset(request, db_session, sample_clinic, sample_surgery_normal, sample_doctor,
+            sample_user_admin, sample_reasons):
+    _populate(sample_clinic, sample_surgery_normal, sample_doctor, sample_user_admin, request.param)
+    return request.param
+
+
+@pytest.fixture
+def logged_client(app, client, sample_user_admin):
+    # Snapshot desacoplado de la sesión: sobrevive al expunge_all() de cada medición
+    user = UserCache.load(sample_user_admin.id)
+    with client:
+        with app.test_request_context():
+            login_user(user)
+        yield client
+
+
+def _measure(query_counter, name, tickets, call):
+    # Como en un request real: nada precargado en el identity map
+    db.session.expunge_all()
+    with query_counter() as counter:
+        response = call()
+        # Las vistas en streaming consultan mientras se envía el cuerpo
+        response.get_data()
+    assert response.status_code in (200, 302), f'{name}: status {response.status_code}'
+    QUERY_BUDGET_REPORT.append((name, tickets, counter.count, QUERY_BUDGETS[name]))
+    assert counter.count <= QUERY_BUDGETS[name], (
+        f'{name} ejecutó {counter.count} queries con {tickets} tickets '
+        f'(presupuesto {QUERY_BUDGETS[name]}):\n' + '\n'.join(counter.statements)
+    )
+    return counter.count
+
+
+@pytest.mark.slow
+class TestQueryBudgets:
+
+    def test_nursing_board(self, logged_client, dataset, query_counter):
+        _measure(query_counter, 'tickets.nursing_board', dataset,
+                 lambda: logged_client.get('/tickets/nursing'))
+
+    def test_list(self, logged_client, dataset, query_counter):
+        _measure(query_counter, 'tickets.list', dataset,
+                 lambda: logged_client.get('/tickets/'))
+
+    def test_detail(self, logged_client, dataset, query_counter):
+        _measure(query_counter, 'tickets.detail', dataset,
+                 lambda: logged_client.get(f'/tickets/{TICKET_ID_PREFIX}0001'))
+
+    def test_dashboard(self, logged_client, dataset, query_counter):
+        _measure(query_counter, 'dashboard.dashboard', dataset,
+                 lambda: logged_client.get('/dashboard/'))
+
+    def test_export_excel(self, logged_client, dataset, query_counter):
+        _measure(query_counter, 'exports.export_excel', dataset,
+                 lambda: logged_client.get('/export/tickets/reports/excel'))
+
+    def test_create_form(self, logged_client, dataset, query_counter):
+        _measure(query_counter, 'tickets.create[GET]', dataset,
+                 lambda: logged_client.get('/tickets/create'))
+
+    def test_create_ticket(self, logged_client, dataset, query_counter, sample_surgery_normal,
+                           sample_doctor):
+        form = {
+            'rut': '99999999-9',
+            'primer_nombre': 'Nuevo',
+            'segundo_nombre': '',
+            'apellido_paterno': 'Paciente',
+            'apellido_materno': '',
+            'age': '40',
+            'sex': 'F',
+            'episode_id': 'EP-1',
+            'surgery_id': str(sample_surgery_normal.id),
+            'doctor_id': str(sample_doctor.id),
+            'pavilion_end_time': '2026-03-01T10:00',
+            'room': '101',
+        }
+        _measure(query_counter, 'tickets.create[POST]', dataset,
+                 lambda: logged_client.post('/tickets/create', data=form))
+        assert Ticket.query.filter_by(patient_id=Patient.query.filter_by(rut='99999999-9').one().id).count() == 1
+
+
+class TestQueriesDoNotScaleWithRows:
+    """Las mismas mediciones con ambos tamaños deben coincidir (O(1) en filas)."""
+
+    def test_counts_match_across_sizes(self):
+        by_endpoint = {}
+        for name, tickets, queries, _ in QUERY_BUDGET_REPORT:
+            by_endpoint.setdefault(name, {})[tickets] = queries
+
+        complete = {name: sizes for name, sizes in by_endpoint.items() if len(sizes) == len(DATASET_SIZES)}
+        if not complete:
+            pytest.skip('Requiere correr TestQueryBudgets en la misma sesión')
+
+        scaling = {name: sizes for name, sizes in complete.items() if len(set(sizes.values())) > 1}
+        assert not scaling, f'Queries dependen de la cantidad de tickets: {scaling}'
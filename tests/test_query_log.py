@@ -0,0 +1,162 @@
+"""
+Tests del agregado de queries por fingerprint (monitoring/query_log.py) y de
+`flask query-report`.
+"""
+import json
+import logging
+import os
+from datetime import datetime
+
+import pytest
+
+from commands import query_report_command
+from models import db, Ticket
+from monitoring.query_log import (
+    QueryLog, OTHER_FINGERPRINT, query_log, load_dumps, top_fingerprints, explain, placeholder_parameters,
+)
+
+
+def _login(client, user):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+
+
+class TestQueryLog:
+
+    def test_literals_are_aggregated_by_fingerprint(self):
+        log = QueryLog(capture_parameters=True)
+        log.record('SELECT * FROM ticket WHERE id = ?', (1,), 2.0, rowcount=1, endpoint='tickets.detail')
+        log.record('SELECT * FROM ticket WHERE id = ?', (2,), 8.0, rowcount=1, endpoint='tickets.detail')
+        log.record("SELECT * FROM ticket WHERE id = 3", (), 5.0, rowcount=-1)
+
+        snapshot = log.snapshot()
+        assert len(snapshot) == 1
+        entry = snapshot['SELECT * FROM ticket WHERE id = ?']
+        assert entry['count'] == 3
+        assert entry['total_ms'] == 15.0
+        assert entry['mean_ms'] == 5.0
+        assert entry['max_ms'] == 8.0
+        # rowcount -1 (no informado por el driver) no cuenta como medición
+        assert (entry['rows'], entry['rows_measured']) == (2, 2)
+        # Sentencia y parámetros de la ejecución más lenta, listos para EXPLAIN
+        assert entry['parameters'] == [2]
+        assert entry['endpoints'] == {'tickets.detail': 2, '-': 1}
+
+    def test_fingerprint_cap_overflows_into_other(self):
+        log = QueryLog(max_fingerprints=2)
+        for table in ('a', 'b', 'c', 'd'):
+            log.record(f'SELECT * FROM {table}', (), 1.0)
+
+        snapshot = log.snapshot()
+        assert set(snapshot) == {'SELECT * FROM a', 'SELECT * FROM b', OTHER_FINGERPRINT}
+        assert snapshot[OTHER_FINGERPRINT]['count'] == 2
+
+    def test_slow_query_is_logged(self, caplog):
+        log = QueryLog(slow_ms=50)
+        with caplog.at_level(logging.WARNING, logger='monitoring.query_log'):
+            log.record('SELECT 1', (), 10.0)
+            log.record('SELECT 1', (), 75.0, endpoint='admin.dashboard')
+
+        records = [json.loads(r.getMessage()) for r in caplog.records if r.name == 'monitoring.query_log']
+        assert len(records) == 1
+        assert records[0]['event'] == 'slow_query'
+        assert records[0]['endpoint'] == 'admin.dashboard'
+        assert log.snapshot()['SELECT ?']['slow'] == 1
+
+    def test_parameter_values_are_not_kept_by_default(self):
+        log = QueryLog()
+        log.record('SELECT * FROM patient WHERE rut = ? AND age = ? AND created_at > ?',
+                   ('12345678-5', 54, datetime(2026, 1, 1)), 1.0)
+        log.record('SELECT * FROM patient WHERE rut = %(rut)s', {'rut': '12345678-5'}, 1.0)
+
+        snapshot = json.dumps(log.snapshot())
+        assert '12345678-5' not in snapshot and '54' not in snapshot
+        entries = log.snapshot()
+        assert entries['SELECT * FROM patient WHERE rut = ? AND age = ? AND created_at > ?']['parameter_types'] == \
+            ['str', 'int', 'datetime']
+        assert entries['SELECT * FROM patient WHERE rut = ?']['parameter_types'] == {'rut': 'str'}
+        assert placeholder_parameters(['str', 'int', 'datetime', 'NoneType']) == ['', 0, datetime(2000, 1, 1), None]
+
+    def test_executemany_parameters_are_not_kept(self):
+        log = QueryLog()
+        log.record('INSERT INTO t (a) VALUES (?)', [(1,), (2,)], 1.0, executemany=True)
+        assert log.snapshot()['INSERT INTO t (a) VALUES (?)']['parameters'] is None
+
+
+class TestDumps:
+
+    def test_dumps_of_several_processes_are_merged(self, tmp_path):
+        first, second = QueryLog(capture_parameters=True), QueryLog(capture_parameters=True)
+        first.record('SELECT * FROM ticket WHERE id = ?', (1,), 4.0, endpoint='a')
+        second.record('SELECT * FROM ticket WHERE id = ?', (9,), 12.0, endpoint='b')
+        second.record('SELECT * FROM patient', (), 1.0)
+        first.dump(str(tmp_path / 'query-log-1.json'))
+        second.dump(str(tmp_path / 'query-log-2.json'))
+        (tmp_path / 'query-log-3.json').write_text('{truncado')
+
+        merged = load_dumps(str(tmp_path))
+
+        entry = merged['SELECT * FROM ticket WHERE id = ?']
+        assert entry.count == 2
+        assert entry.total_ms == 16.0
+        assert entry.max_ms == 12.0
+        assert entry.parameters == [9]
+        assert dict(entry.endpoints) == {'a': 1, 'b': 1}
+        assert not [p for p in os.listdir(tmp_path) if p.endswith('.tmp')]
+
+    def test_top_fingerprints_sorting(self):
+        log = QueryLog()
+        for _ in range(10):
+            log.record('SELECT * FROM frequent', (), 1.0)
+        log.record('SELECT * FROM slow', (), 50.0)
+        stats = dict(log._stats)
+
+        assert top_fingerprints(stats, 'total_ms', 1)[0][0] == 'SELECT * FROM slow'
+        assert top_fingerprints(stats, 'count', 1)[0][0] == 'SELECT * FROM frequent'
+        with pytest.raises(ValueError):
+            top_fingerprints(stats, 'nombre')
+
+
+class TestAppIntegration:
+
+    def test_request_queries_are_recorded_with_endpoint(self, app, client, sample_user_admin, sample_ticket):
+        _login(client, sample_user_admin)
+        query_log.reset()
+
+        assert client.get('/tickets/nursing').status_code == 200
+
+        entries = query_log.snapshot().values()
+        assert any('tickets.nursing_board' in entry['endpoints'] for entry in entries)
+
+    def test_explain_only_for_selects(self, app, db_session, sample_ticket):
+        query_log.reset()
+        Ticket.query.filter_by(id=sample_ticket.id).all()
+        entry = next(entry for fp, entry in query_log._stats.items() if 'FROM ticket WHERE ticket.id = ?' in fp)
+
+        # Sin valores capturados: EXPLAIN con valores de relleno
+        assert entry.parameters is None and entry.parameter_types == ['str']
+        plan = explain(db.session.connection(), entry, analyze=True)
+        assert plan and any('ticket' in line for line in plan)
+
+        log = QueryLog()
+        log.record('UPDATE ticket SET notes = ? WHERE id = ?', ('x', 1), 1.0)
+        assert explain(db.session.connection(), log._stats['UPDATE ticket SET notes = ? WHERE id = ?']) is None
+
+    def test_query_report_cli(self, app, db_session, sample_ticket, tmp_path):
+        query_log.reset()
+        Ticket.query.filter_by(id=sample_ticket.id).all()
+        query_log.dump(str(tmp_path / 'query-log-1.json'))
+
+        result = app.test_cli_runner().invoke(query_report_command, ['--dir', str(tmp_path), '--top', '5'])
+
+        assert result.exit_code == 0, result.output
+        assert 'fingerprints' in result.output
+        assert 'FROM ticket' in result.output
+        assert 'SEARCH ticket' in result.output or 'SCAN ticket' in result.output
+
+    def test_query_report_without_dumps(self, app, tmp_path):
+        result = app.test_cli_runner().invoke(query_report_command, ['--dir', str(tmp_path)])
+
+        assert result.exit_code == 0
+        assert 'Sin volcados' in result.output
@@ -0,0 +1,183 @@
+"""
+Tests de las vistas en streaming (utils/streaming.py): tablero de enfermería y
+listado. La urgencia, el filtro de UI, el orden y los contadores del tablero se
+calculan en SQL (Ticket.urgency_level_expression, TicketRepository.board_*)
+y deben coincidir con el cálculo en Python que reemplazan.
+"""
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from models import db, Patient, Ticket, FpaModification, TICKET_STATUS_ANULADO
+from repositories import TicketRepository
+from repositories.ticket_repository import BOARD_URGENCY_ORDER
+from tests.conftest import make_ticket
+from utils import utcnow
+
+DAY = datetime(2025, 1, 15)
+
+BOARD_FILTERS = {'status': '', 'search': '', 'room': '', 'urgency': '', 'clinic_id': '',
+                 'date_from': '', 'date_to': '', 'surgery': ''}
+
+
+class TestUrgencyExpression:
+
+    @pytest.fixture
+    def grid(self, db_session, sample_clinic, sample_patient, sample_surgery_normal):
+        """Pabellones alrededor de las 08:00 (y su minuto exacto) por FPAs alrededor de los umbrales."""
+        pavilions = [DAY + timedelta(hours=6, minutes=k) for k in range(0, 240, 7)]
+        pavilions += [DAY.replace(hour=7, minute=59, second=59), DAY.replace(hour=8),
+                      DAY.replace(hour=8, second=30), DAY.replace(hour=8, second=59, microsecond=999_999),
+                      DAY.replace(hour=8, minute=1), DAY.replace(hour=9, minute=59, second=59)]
+        fpas = [DAY + timedelta(hours=h, seconds=s) for h in (5, 6, 7, 8, 13, 14, 20) for s in (-1, 0, 1)]
+        number = 0
+        for pavilion in pavilions:
+            for fpa in fpas:
+                number += 1
+                make_ticket(number, sample_surgery_normal, sample_clinic, sample_patient, pavilion, current_fpa=fpa)
+        db.session.commit()
+
+    @pytest.mark.parametrize('now', [
+        DAY.replace(hour=6), DAY.replace(hour=6, minute=15, second=30), DAY.replace(hour=6, minute=29, second=59),
+        DAY.replace(hour=6, minute=30), DAY.replace(hour=6, minute=30, second=1), DAY.replace(hour=7),
+        DAY.replace(hour=8, second=30), DAY - timedelta(minutes=15),
+    ])
+    def test_matches_urgency_level_for(self, grid, now):
+        rows = db.session.execute(select(Ticket.pavilion_end_time, Ticket.current_fpa,
+                                         Ticket.urgency_level_expression(now))).all()
+
+        mismatches = [(pavilion, fpa, level) for pavilion, fpa, level in rows
+                      if level != Ticket.urgency_level_for(pavilion, fpa, now)]
+        assert not mismatches
+
+
+@pytest.fixture
+def board(db_session, sample_clinic, sample_patient, sample_surgery_normal):
+    """Tickets en todos los niveles de urgencia, anulados y sin episodio."""
+    now = utcnow()
+    no_episode = Patient(rut='22222222-2', primer_nombre='Ana', apellido_paterno='Soto', age=30, sex='F',
+                         episode_id='  ', clinic_id=sample_clinic.id)
+    db.session.add(no_episode)
+    db.session.flush()
+
+    specs = [
+        # (paciente, pabellón, FPA, estado)
+        (sample_patient, now + timedelta(hours=5), now + timedelta(hours=40), None),       # programado
+        (sample_patient, now - timedelta(hours=3), now + timedelta(minutes=50), None),     # crítico
+        (no_episode, now - timedelta(hours=3), now + timedelta(hours=4), None),            # advertencia
+        (sample_patient, now - timedelta(hours=3), now + timedelta(hours=30), None),       # normal
+        (sample_patient, now - timedelta(hours=4), now + timedelta(hours=30), None),       # normal, misma FPA
+        (no_episode, now - timedelta(hours=30), now - timedelta(hours=1), None),           # vencido
+        (sample_patient, now - timedelta(hours=3), now + timedelta(hours=20), TICKET_STATUS_ANULADO),
+    ]
+    tickets = []
+    for number, (patient, pavilion, fpa, status) in enumerate(specs, start=1):
+        ticket = make_ticket(number, sample_surgery_normal, sample_clinic, patient, pavilion,
+                             status=status or 'Vigente', current_fpa=fpa.replace(microsecond=0))
+        ticket.created_at = now - timedelta(days=number)
+        tickets.append(ticket)
+    db.session.add(FpaModification(ticket_id=tickets[3].id, clinic_id=sample_clinic.id,
+                                   previous_fpa=tickets[3].current_fpa, new_fpa=tickets[3].current_fpa,
+                                   reason='Observación', modified_by='test'))
+    db.session.commit()
+    return tickets
+
+
+def reference_board(status_filter, sort_by, sort_dir):
+    """El cálculo en Python que hacía la vista antes de moverlo a SQL."""
+    column = 'created_at' if sort_by == 'created_at' else 'current_fpa'
+    tickets = sorted(Ticket.query.order_by(Ticket.id).all(), key=lambda t: getattr(t, column),
+                     reverse=sort_dir != 'asc')
+    for ticket in tickets:
+        ticket.compute_state()
+    tickets.sort(key=lambda t: (BOARD_URGENCY_ORDER.get(t.urgency_level, 99), t.current_fpa or datetime.max))
+
+    def without_episode(t):
+        return (not t.patient.episode_id or not t.patient.episode_id.strip()) and t.status != TICKET_STATUS_ANULADO \
+            and t.urgency_level != 'unknown'
+
+    stats = {level: len([t for t in tickets if t.urgency_level == level])
+             for level in ('critical', 'warning', 'normal', 'expired', 'scheduled')}
+    stats.update(total=len(tickets), annulled=len([t for t in tickets if t.status == TICKET_STATUS_ANULADO]),
+                 without_episode=len([t for t in tickets if without_episode(t)]))
+
+    shown = {
+        'Vigente': lambda t: t.urgency_level in ('normal', 'warning', 'critical', 'scheduled')
+                             and t.status != TICKET_STATUS_ANULADO,
+        'Vencido': lambda t: t.urgency_level == 'expired' and t.status != TICKET_STATUS_ANULADO,
+        'Anulado': lambda t: t.status == TICKET_STATUS_ANULADO,
+        'SinEpisodio': without_episode,
+    }.get(status_filter, lambda t: True)
+    return [t.id for t in tickets if shown(t)], stats
+
+
+class TestBoardQueries:
+
+    @pytest.mark.parametrize('status_filter', ['Vigente', 'Vencido', 'Anulado', 'SinEpisodio', 'Todos'])
+    @pytest.mark.parametrize('sort_by, sort_dir', [('discharge_date', 'desc'), ('created_at', 'asc')])
+    def test_matches_python_board(self, board, sample_user_admin, status_filter, sort_by, sort_dir):
+        now = utcnow()
+        expected_ids, expected_stats = reference_board(status_filter, sort_by, sort_dir)
+
+        ids = [t.id for t in TicketRepository.board_query(BOARD_FILTERS, sample_user_admin, status_filter,
+                                                          sort_by, sort_dir, now)]
+        stats = TicketRepository.board_stats(BOARD_FILTERS, sample_user_admin, status_filter, now)
+
+        assert ids == expected_ids
+        assert stats.pop('shown') == len(expected_ids)
+        assert stats == expected_stats
+
+    def test_modification_count_without_loading_the_collection(self, board, sample_user_admin):
+        modified, unmodified = board[3].id, board[0].id
+        for ticket in board:
+            db.session.expunge(ticket)
+        tickets = {t.id: t for t in TicketRepository.board_query(BOARD_FILTERS, sample_user_admin, 'Todos',
+                                                                 'discharge_date', 'desc', utcnow())}
+
+        assert tickets[modified].get_modification_count() == 1
+        assert tickets[unmodified].get_modification_count() == 0
+        assert 'modifications' not in tickets[modified].__dict__
+
+
+class TestStreamedViews:
+
+    def test_board_streams_header_before_fetching_tickets(self, authenticated_client, board, query_counter):
+        response = authenticated_client.get('/tickets/nursing?status=Todos')
+        assert response.is_streamed
+
+        # Lo enviado antes del trozo cuya generación ejecutó la query de las tarjetas
+        html, sent_before_query = '', None
+        with query_counter() as counter:
+            for chunk in response.response:
+                if sent_before_query is None and any('FROM ticket' in s for s in counter.statements):
+                    sent_before_query = html
+                html += chunk.decode()
+        response.close()
+
+        assert len([s for s in counter.statements if 'FROM ticket' in s]) == 1
+        assert '(7 pacientes)' in sent_before_query and 'class="patient-card ' not in sent_before_query
+        ids, _ = reference_board('Todos', 'discharge_date', 'desc')
+        positions = [html.index(f'data-ticket-id="{ticket_id}"') for ticket_id in ids]
+        assert positions == sorted(positions)
+        assert len(re.findall(r'class="patient-card ', html)) == 7
+        assert '1 modificación(es)' in html
+
+    def test_board_empty_state(self, authenticated_client, board):
+        html = authenticated_client.get('/tickets/nursing?status=SinEpisodio&search=nadie').get_data(as_text=True)
+
+        assert 'No hay tickets vigentes' in html and 'class="patient-card ' not in html
+
+    def test_list(self, authenticated_client, board):
+        response = authenticated_client.get('/tickets/')
+        assert response.is_streamed
+        html = response.get_data(as_text=True)
+
+        assert 'Tickets (7 resultados)' in html
+        assert all(f'TH-TEST-2025-{number:03d}' in html for number in range(1, 8))
+
+    def test_list_page_past_the_end(self, authenticated_client, board):
+        html = authenticated_client.get('/tickets/?page=3').get_data(as_text=True)
+
+        assert 'Tickets (7 resultados)' in html and 'No hay tickets' in html
@@ -0,0 +1,128 @@
+"""
+Tests del generador de datos de carga (services/synthetic_data.py) y del
+comando `flask gen-load-data`.
+"""
+from datetime import datetime
+
+from models import (
+    db, Clinic, User, Patient, Ticket, FpaModification, ActionAudit, LoginAudit,
+    TICKET_STATUS_ANULADO, AUDIT_EVENT_TICKET_CREATED, AUDIT_EVENT_FPA_MODIFIED,
+    AUDIT_EVENT_TICKET_ANNULLED,
+)
+from services.synthetic_data import (
+    SyntheticDataGenerator, LoadDataSpec, rut_with_check_digit, _copy_value,
+)
+from services.ticket_service import TicketService
+from commands import gen_load_data_command
+
+NOW = datetime(2026, 3, 1, 12, 0)
+SPEC = LoadDataSpec(clinics=3, tickets=300, days=60, surgeries_per_clinic=6, doctors_per_clinic=4,
+                    annulled_ratio=0.1)
+
+
+def _generate(spec=SPEC):
+    return SyntheticDataGenerator(spec, batch_size=50, now=NOW).generate()
+
+
+class TestHelpers:
+
+    def test_rut_check_digit(self):
+        assert rut_with_check_digit(11111111) == '11111111-1'
+        assert rut_with_check_digit(12345678) == '12345678-5'
+        assert rut_with_check_digit(10000013) == '10000013-K'
+
+    def test_copy_value_escaping(self):
+        assert _copy_value(None) == '\\N'
+        assert _copy_value(True) == 't'
+        assert _copy_value(datetime(2026, 3, 1, 8, 30)) == '2026-03-01 08:30:00'
+        assert _copy_value('a\tb\nc\\d') == 'a\\tb\\nc\\\\d'
+        assert _copy_value({'reason': 'x'}) == '{"reason": "x"}'
+
+
+class TestSyntheticDataGenerator:
+
+    def test_row_counts(self, db_session):
+        summary = _generate()
+
+        assert Clinic.query.count() == 3
+        assert Ticket.query.count() == 300
+        assert summary.rows['ticket'] == 300
+        assert summary.rows['fpa_modification'] == FpaModification.query.count()
+        assert summary.rows['patient'] == Patient.query.count() <= 300
+        assert LoginAudit.query.count() == summary.rows['login_audit'] > 0
+        # Reparto parejo entre clínicas
+        assert sorted(Ticket.query.filter_by(clinic_id=cid).count() for cid in summary.clinic_ids) == [100] * 3
+
+    def test_audit_rows_match_events(self, db_session):
+        _generate()
+
+        def events(event_type):
+            return ActionAudit.query.filter_by(event_type=event_type).count()
+
+        assert events(AUDIT_EVENT_TICKET_CREATED) == Ticket.query.count()
+        assert events(AUDIT_EVENT_FPA_MODIFIED) == FpaModification.query.count()
+        assert events(AUDIT_EVENT_TICKET_ANNULLED) == Ticket.query.filter_by(status=TICKET_STATUS_ANULADO).count() > 0
+
+    def test_tickets_are_consistent(self, db_session):
+        _generate()
+
+        for ticket in Ticket.query.limit(50):
+            assert ticket.patient.clinic_id == ticket.clinic_id
+            assert ticket.surgery.clinic_id == ticket.clinic_id
+            assert ticket.medical_discharge_date == ticket.initial_fpa.date()
+            modifications = sorted(ticket.modifications, key=lambda m: m.modified_at)
+            if modifications:
+                assert modifications[0].previous_fpa == ticket.initial_fpa
+                assert modifications[-1].new_fpa == ticket.current_fpa
+            else:
+                assert ticket.current_fpa == ticket.initial_fpa
+
+    def test_same_seed_same_data(self, db_session):
+        _generate()
+        first = [(t.id, t.current_fpa, t.bed_number, t.status) for t in Ticket.query.order_by(Ticket.id)]
+
+        db.drop_all()
+        db.create_all()
+        _generate()
+        second = [(t.id, t.current_fpa, t.bed_number, t.status) for t in Ticket.query.order_by(Ticket.id)]
+
+        assert first == second
+
+    def test_coexists_with_existing_data(self, db_session, sample_clinic, sample_user_admin):
+        summary = _generate()
+
+        assert sample_clinic.id not in summary.clinic_ids
+        assert User.query.filter(User.username.like('load_admin_%')).count() == 3
+        # Prefijos únicos y numeración compatible: el próximo id del app no choca
+        for clinic_id in summary.clinic_ids:
+            next_id = TicketService.generate_ticket_id(db.session.get(Clinic, clinic_id))
+            assert db.session.get(Ticket, next_id) is None
+
+    def test_second_run_appends(self, db_session):
+        _generate(LoadDataSpec(clinics=1, tickets=20, days=10, with_login_audit=False))
+        _generate(LoadDataSpec(clinics=1, tickets=20, days=10, with_login_audit=False))
+
+        assert Clinic.query.count() == 2
+        assert Ticket.query.count() == 40
+
+
+class TestGenLoadDataCommand:
+
+    def test_generates_data(self, app, db_session):
+        result = app.test_cli_runner().invoke(gen_load_data_command, [
+            '--clinics', '2', '--tickets', '30', '--days', '20', '--yes',
+        ])
+
+        assert result.exit_code == 0, result.output
+        assert 'ticket: 30' in result.output
+        assert Ticket.query.count() == 30
+
+    def test_refuses_in_production(self, app, db_session):
+        app.config['ENVIRONMENT'] = 'production'
+        try:
+            result = app.test_cli_runner().invoke(gen_load_data_command, ['--tickets', '10', '--yes'])
+        finally:
+            app.config['ENVIRONMENT'] = 'local'
+
+        assert result.exit_code == 1
+        assert Ticket.query.count() == 0
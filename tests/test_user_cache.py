@@ -0,0 +1,135 @@
+"""
+Tests del cache de usuarios del user_loader de Flask-Login.
+"""
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from cache import app_cache
+from models import db, User
+from services.user_cache import UserCache, CachedUser
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+class TestUserCache:
+
+    def test_snapshot_has_request_fields(self, db_session, sample_user_admin, sample_clinic):
+        snapshot = UserCache.load(sample_user_admin.id)
+
+        assert isinstance(snapshot, CachedUser)
+        assert snapshot.get_id() == str(sample_user_admin.id)
+        assert snapshot.clinic_id == sample_clinic.id
+        assert snapshot.clinic.name == sample_clinic.name
+        assert snapshot.is_admin()
+        assert not snapshot.is_superuser
+        assert snapshot.is_authenticated and snapshot.is_active
+
+    def test_second_load_does_not_query(self, db_session, sample_user_admin):
+        user_id = sample_user_admin.id
+        UserCache.load(user_id)
+
+        with count_queries() as statements:
+            snapshot = UserCache.load(user_id)
+            snapshot.is_superuser
+            snapshot.clinic.name
+
+        assert statements == []
+
+    def test_superuser_snapshot(self, db_session, sample_user_super):
+        snapshot = UserCache.load(sample_user_super.id)
+        assert snapshot.is_superuser
+        assert snapshot.clinic is None
+
+    def test_missing_user_returns_none(self, db_session):
+        assert UserCache.load(999) is None
+
+    def test_invalidate_reloads_changes(self, db_session, sample_user_clinical):
+        assert UserCache.load(sample_user_clinical.id).is_active
+
+        # Un cambio que no pasa por el ORM: sin invalidar se sigue viendo el snapshot anterior
+        db_session.session.execute(User.__table__.update().where(User.id == sample_user_clinical.id)
+                                   .values(is_active=False))
+        db_session.session.commit()
+        assert UserCache.load(sample_user_clinical.id).is_active
+
+        UserCache.invalidate(sample_user_clinical.id)
+        assert not UserCache.load(sample_user_clinical.id).is_active
+
+    def test_deactivation_invalidates_on_commit(self, db_session, sample_user_admin, sample_user_clinical):
+        from services import UserService
+
+        active = UserCache.load(sample_user_clinical.id)
+        UserService.deactivate_user(sample_user_clinical, sample_user_admin)
+        # Antes del commit otro request aún lee la fila activa y la cachea
+        app_cache.set(UserCache.name, sample_user_clinical.id, active, namespace=UserCache.namespace,
+                      ttl=UserCache.ttl)
+
+        db_session.session.commit()
+
+        # El commit invalida: el siguiente request ve al usuario desactivado
+        assert not UserCache.load(sample_user_clinical.id).is_active
+
+    def test_rolled_back_change_keeps_the_snapshot(self, db_session, sample_user_admin, sample_user_clinical):
+        from services import UserService
+
+        user_id = sample_user_clinical.id
+        UserCache.load(user_id)
+        UserService.deactivate_user(sample_user_clinical, sample_user_admin)
+        db_session.session.rollback()
+
+        with count_queries() as statements:
+            assert UserCache.load(user_id).is_active
+        assert not statements
+
+    def test_zero_ttl_disables_cache(self, db_session, sample_user_admin):
+        UserCache.configure(ttl=0)
+        try:
+            user_id = sample_user_admin.id
+            UserCache.load(user_id)
+            db_session.session.expunge_all()  # como en un request nuevo
+            with count_queries() as statements:
+                UserCache.load(user_id)
+            assert statements
+        finally:
+            UserCache.configure(ttl=60)
+
+    def test_toggle_route_invalidates(self, app, client, db_session, sample_user_super,
+                                      sample_user_clinical):
+        from flask_login import login_user
+
+        assert UserCache.load(sample_user_clinical.id).is_active
+
+        with client:
+            with app.test_request_context():
+                login_user(sample_user_super)
+            response = client.post(f'/admin/users/{sample_user_clinical.id}/toggle')
+
+        assert response.status_code == 302
+        assert not UserCache.load(sample_user_clinical.id).is_active
+
+    def test_sync_superusers_invalidates(self, app, db_session, sample_user_super, monkeypatch):
+        from commands import _sync_superusers
+
+        assert UserCache.load(sample_user_super.id).is_superuser
+
+        # El email deja de estar en SUPERUSER_EMAILS: el sync lo elimina e invalida
+        monkeypatch.setenv('SUPERUSER_EMAILS', 'otro@example.com')
+        user_id = sample_user_super.id
+        _sync_superusers()
+        db_session.session.expunge_all()
+
+        assert not UserCache.load(user_id).is_superuser
@@ -0,0 +1,113 @@
+"""
+Tests del warmup de instancias nuevas (utils/warmup.py) y de los datos
+maestros que precarga (services/master_data.py).
+"""
+import pytest
+
+from models import db, Clinic
+from services import MasterDataService
+from utils import warmup
+from utils.warmup import WarmupState, WARMUP_STEPS, run_warmup
+
+
+@pytest.fixture
+def fresh_warmup(app, monkeypatch):
+    """Estado de warmup sin correr para este test."""
+    monkeypatch.setitem(app.extensions, 'warmup', WarmupState())
+    return app.extensions['warmup']
+
+
+class TestSteps:
+
+    def test_every_step_runs(self, app, db_session, sample_clinic):
+        report = run_warmup(app)
+
+        assert [step.name for step in report.steps] == list(WARMUP_STEPS)
+        assert all(step.ok for step in report.steps), report.summary()
+        assert report.step('master_data').detail == '1 clínicas'
+        assert report.step('iap_keys').detail == 'sin validación de JWT de IAP'
+
+    def test_templates_are_compiled(self, app, db_session):
+        app.jinja_env.cache.clear()
+
+        run_warmup(app, ['templates'])
+
+        compiled = {name for _, name in app.jinja_env.cache.keys()}
+        assert {'tickets/nursing_board.html', 'tickets/create.html', 'dashboard.html'} <= compiled
+
+    def test_failing_step_does_not_stop_the_rest(self, app, db_session, monkeypatch):
+        def broken(app):
+            raise RuntimeError('base no disponible')
+        monkeypatch.setitem(WARMUP_STEPS, 'master_data', broken)
+
+        report = run_warmup(app)
+
+        assert not report.step('master_data').ok
+        assert report.step('master_data').detail == 'base no disponible'
+        assert report.step('urgency_thresholds').ok
+        assert 'FALLÓ' in report.summary('Warmup')
+
+    def test_iap_keys_are_fetched_when_jwt_is_validated(self, app, monkeypatch):
+        from auth_iap import hybrid_auth, IAPAuthenticator, IAPKeyStore
+
+        class FakeKeyStore(IAPKeyStore):
+            def _fetch(self):
+                self._keys = {'kid-1': object(), 'kid-2': object()}
+                return True
+
+        authenticator = IAPAuthenticator('123', 'backend', key_store=FakeKeyStore())
+        monkeypatch.setattr(hybrid_auth, 'iap_auth', authenticator)
+
+        assert warmup.warm_iap_keys(app) == '2 claves'
+
+
+class TestEndpoint:
+
+    def test_warmup_is_public_and_reports_steps(self, client, db_session, fresh_warmup):
+        response = client.get('/_ah/warmup')
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['status'] == 'ok'
+        assert [step['name'] for step in data['steps']] == list(WARMUP_STEPS)
+        assert data['total_ms'] >= 0
+
+    def test_warmup_runs_once_per_process(self, client, db_session, fresh_warmup, monkeypatch):
+        calls = []
+        monkeypatch.setitem(WARMUP_STEPS, 'templates', lambda app: calls.append(1))
+
+        client.get('/_ah/warmup')
+        client.get('/_ah/warmup')
+
+        assert len(calls) == 1
+
+    def test_degraded_status_when_a_step_fails(self, client, db_session, fresh_warmup, monkeypatch):
+        def broken(app):
+            raise RuntimeError('sin red')
+        monkeypatch.setitem(WARMUP_STEPS, 'iap_keys', broken)
+
+        data = client.get('/_ah/warmup').get_json()
+
+        step = next(step for step in data['steps'] if step['name'] == 'iap_keys')
+        assert data['status'] == 'degraded'
+        assert (step['ok'], step['detail']) == (False, 'sin red')
+
+
+class TestMasterData:
+
+    def test_form_data_is_filtered_by_clinic(self, app, db_session, sample_clinic, sample_surgery_normal,
+                                             sample_doctor, sample_reasons):
+        other = Clinic(name='Otra clínica', is_active=True)
+        db.session.add(other)
+        db.session.commit()
+
+        own = MasterDataService.create_form_data(sample_clinic.id)
+        foreign = MasterDataService.create_form_data(other.id)
+        every = MasterDataService.create_form_data(None)
+
+        assert [s['id'] for s in own['surgeries_data']] == [sample_surgery_normal.id]
+        assert [r['reason'] for r in own['initial_reasons_data']] == ['Criterio médico inicial']
+        assert own['doctors_data'][0]['name'] == sample_doctor.name
+        # Las reglas de FPA son globales; los catálogos, de cada clínica
+        assert all(not rows for key, rows in foreign.items() if key != 'fpa_rules')
+        assert every == own
@@ -7,6 +7,8 @@ This package contains utility functions and decorators used across the applicati
 from .datetime_utils import calculate_time_remaining, utcnow
 from .string_utils import generate_prefix
 from .decorators import admin_required, superuser_required
+from .db_routing import read_only, primary_bind
+from .streaming import stream_page
 
 __all__ = [
     'calculate_time_remaining',
@@ -14,4 +16,7 @@ __all__ = [
     'generate_prefix',
     'admin_required',
     'superuser_required',
+    'read_only',
+    'primary_bind',
+    'stream_page',
 ]
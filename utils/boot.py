@@ -0,0 +1,259 @@
+"""
+Boot - Pasos de arranque dentro del proceso de gunicorn
+
+En Cloud Run cada cold start corría `flask db upgrade` y `flask sync-superusers`
+como procesos separados, cada uno importando la app completa, antes de que
+gunicorn la importara por tercera vez. Con BOOT_STEPS_IN_PROCESS (startup.sh lo
+activa en STARTUP_MODE=fast) app.py, al crear la app:
+
+- compara la revisión de Alembic de la base con el head de migrations/ y solo
+  corre `upgrade` si hay migraciones pendientes (en PostgreSQL bajo un advisory
+  lock, para que dos instancias que arrancan juntas no migren a la vez);
+- sincroniza los superusuarios de SUPERUSER_EMAILS (un error no aborta el boot);
+- con WARMUP_ON_BOOT, corre el warmup (utils/warmup.py);
+- registra en el log cuánto tomó el import de la app y cada paso.
+
+`flask import-report` mide qué paquetes pesan en el import de la app y verifica
+que las librerías de exports (LAZY_MODULES) no se carguen al arrancar.
+"""
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from alembic import command
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+
+# Clave del pg_advisory_lock que serializa las migraciones entre instancias
+MIGRATION_LOCK_KEY = 20261019
+
+# Solo se usan en exports: se importan en la primera llamada
+LAZY_MODULES = ('openpyxl', 'reportlab')
+
+# "import time:   self [us] | cumulative | <sangría>módulo"
+_IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)\s*$')
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass
+class BootStep:
+    name: str
+    seconds: float
+    detail: str = ''
+    ok: bool = True
+
+
+@dataclass
+class BootReport:
+    steps: list = field(default_factory=list)
+
+    @property
+    def total_seconds(self):
+        return sum(step.seconds for step in self.steps)
+
+    def step(self, name):
+        return next((step for step in self.steps if step.name == name), None)
+
+    def summary(self, title='Boot'):
+        parts = []
+        for step in self.steps:
+            part = f'{step.name} {step.seconds:.2f}s'
+            if step.detail:
+                part += f' ({step.detail})'
+            parts.append(part if step.ok else f'{part} FALLÓ')
+        return f"{title} en {self.total_seconds:.2f}s: {', '.join(parts)}"
+
+    def to_dict(self):
+        return {
+            'total_ms': round(self.total_seconds * 1000, 1),
+            'steps': [{'name': step.name, 'ms': round(step.seconds * 1000, 1), 'ok': step.ok,
+                       'detail': step.detail} for step in self.steps],
+        }
+
+
+def loaded_lazy_modules():
+    """LAZY_MODULES que ya están importados en este proceso."""
+    return [name for name in LAZY_MODULES if name in sys.modules]
+
+
+# --- Migraciones ---
+
+def alembic_config(app):
+    config = app.extensions['migrate'].migrate.get_config()
+    # Dentro de gunicorn env.py no debe reconfigurar el logging del proceso
+    config.attributes['configure_logger'] = False
+    return config
+
+
+def migration_revisions(app, connection):
+    """(revisiones actuales de la base, heads de migrations/) como sets."""
+    script = ScriptDirectory.from_config(alembic_config(app))
+    current = MigrationContext.configure(connection).get_current_heads()
+    return set(current), set(script.get_heads())
+
+
+def _describe(revisions):
+    return ', '.join(sorted(revisions)) or 'base vacía'
+
+
+def upgrade_if_needed(app, db):
+    """
+    Aplica las migraciones pendientes; si la base ya está en el head no hace nada.
+
+    Requiere app context. Los errores se propagan: con la base a medio migrar la
+    app no debe arrancar.
+
+    Returns:
+        str: Detalle para el reporte de boot
+    """
+    # AUTOCOMMIT: una transacción abierta en la conexión del lock haría esperar
+    # para siempre a los CREATE INDEX CONCURRENTLY de la migración
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        current, heads = migration_revisions(app, connection)
+        if current == heads:
+            return f'al día en {_describe(heads)}'
+
+        locked = connection.dialect.name == 'postgresql'
+        if locked:
+            connection.execute(text('SELECT pg_advisory_lock(:key)'), {'key': MIGRATION_LOCK_KEY})
+        try:
+            # Otra instancia pudo haber migrado mientras se esperaba el lock
+            current, heads = migration_revisions(app, connection)
+            if current == heads:
+                return f'migrada por otra instancia a {_describe(heads)}'
+            app.logger.info(f'Aplicando migraciones: {_describe(current)} -> {_describe(heads)}')
+            command.upgrade(alembic_config(app), 'head')
+        finally:
+            if locked:
+                connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': MIGRATION_LOCK_KEY})
+    return f'{_describe(current)} -> {_describe(heads)}'
+
+
+def sync_superusers():
+    """Sincroniza SUPERUSER_EMAILS (el mismo código de `flask sync-superusers`)."""
+    from commands import _sync_superusers
+    _sync_superusers()
+
+
+# --- Boot ---
+
+def run_boot_steps(app, db, import_seconds=None):
+    """
+    Migraciones y sync de superusuarios dentro del proceso que sirve la app.
+
+    Args:
+        app: Aplicación Flask ya creada
+        db: Instancia de Flask-SQLAlchemy
+        import_seconds (float, optional): Tiempo de import de la app, para el reporte
+
+    Returns:
+        BootReport (también queda en app.extensions['boot'])
+    """
+    report = BootReport()
+    if import_seconds is not None:
+        report.steps.append(BootStep('import', import_seconds))
+
+    with app.app_context():
+        started = time.perf_counter()
+        try:
+            detail = upgrade_if_needed(app, db)
+        except Exception as e:
+            app.logger.error(f'Las migraciones de base de datos fallaron, la app no arranca: {e}', exc_info=True)
+            raise
+        report.steps.append(BootStep('migraciones', time.perf_counter() - started, detail))
+
+        started = time.perf_counter()
+        step = BootStep('superusers', 0.0)
+        try:
+            sync_superusers()
+        except Exception as e:
+            db.session.rollback()
+            step.ok, step.detail = False, str(e).splitlines()[0]
+            app.logger.warning(f'No se pudieron sincronizar superusers: {e}')
+        finally:
+            db.session.remove()
+        step.seconds = time.perf_counter() - started
+        report.steps.append(step)
+
+        # Con gunicorn --preload el worker se forkea después: no debe heredar
+        # las conexiones abiertas por estos pasos
+        for engine in db.engines.values():
+            engine.dispose()
+
+    if app.config.get('WARMUP_ON_BOOT') and 'warmup' in app.extensions:
+        from utils.warmup import warm_pool_after_fork
+
+        started = time.perf_counter()
+        warmup = app.extensions['warmup'].run_once(app)
+        failed = [step.name for step in warmup.steps if not step.ok]
+        report.steps.append(BootStep('warmup', time.perf_counter() - started,
+                                     f"falló {', '.join(failed)}" if failed else f'{len(warmup.steps)} pasos'))
+        warm_pool_after_fork(app)
+
+    eager = loaded_lazy_modules()
+    if eager:
+        app.logger.warning(f"Librerías de export cargadas en el arranque: {', '.join(eager)} "
+                           f"(revisar con `flask import-report`)")
+    app.logger.info(report.summary())
+    app.extensions['boot'] = report
+    return report
+
+
+# --- Reporte de import ---
+
+@dataclass
+class ImportReport:
+    module: str
+    total_us: int
+    packages: list  # [(paquete, self_us, módulos)] de mayor a menor
+    eager_lazy: list
+
+    def top(self, limit):
+        return self.packages[:limit]
+
+
+def parse_importtime(output, module='app'):
+    """
+    Agrega por paquete la salida de `python -X importtime`.
+
+    Args:
+        output (str): stderr del intérprete (las líneas que no son de importtime se ignoran)
+        module (str): Módulo importado; su tiempo acumulado es el total
+
+    Returns:
+        ImportReport
+    """
+    by_package = defaultdict(lambda: [0, 0])
+    total_us = 0
+    for line in output.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        package = by_package[name.split('.')[0]]
+        package[0] += int(self_us)
+        package[1] += 1
+        if name == module and not indent:
+            total_us = int(cumulative_us)
+    packages = sorted(((name, self_us, count) for name, (self_us, count) in by_package.items()),
+                      key=lambda p: p[1], reverse=True)
+    eager = [name for name in LAZY_MODULES if name in by_package]
+    return ImportReport(module, total_us, packages, eager)
+
+
+def import_time_report(module='app'):
+    """Importa `module` en un intérprete nuevo con -X importtime y agrega el resultado."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=PROJECT_DIR, env=os.environ.copy(), capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        last_line = (result.stderr.strip().splitlines() or [''])[-1]
+        raise RuntimeError(f'No se pudo importar {module}: {last_line}')
+    return parse_importtime(result.stderr, module)
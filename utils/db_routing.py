@@ -0,0 +1,212 @@
+"""
+DB Routing - Lecturas de vistas read-only a una réplica
+
+Dashboard, visualizador, exports y auditoría solo leen, pero comparten la
+primaria con el flujo de escritura de TicketService. Con READ_REPLICA_URL
+configurada, las vistas marcadas con @read_only envían sus SELECT al bind
+'replica'; todo lo demás sigue en la primaria:
+
+- escrituras (flush), SELECT ... FOR UPDATE y SQL textual;
+- requests que no son GET/HEAD;
+- read-your-writes: después de escribir, el usuario lee de la primaria durante
+  READ_YOUR_WRITES_SECONDS (marca en la sesión de Flask), y el resto del
+  request que escribió también;
+- réplica caída o con más de READ_REPLICA_MAX_LAG_SECONDS de retraso (el lag
+  se consulta como máximo cada READ_REPLICA_CHECK_SECONDS).
+
+Localmente se prueba con dos archivos SQLite (o dos PostgreSQL):
+
+    DATABASE_URL=sqlite:////tmp/primary.db READ_REPLICA_URL=sqlite:////tmp/replica.db
+
+El header X-DB-Read-Target de las vistas read-only indica dónde se leyó.
+"""
+import logging
+import threading
+import time
+from flask import g, request, session, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql import Select
+
+from monitoring.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND_KEY = 'replica'
+
+# Clave en la sesión de Flask: timestamp hasta el cual el usuario lee de la primaria
+PRIMARY_UNTIL_KEY = '_db_primary_until'
+
+READ_TARGET_HEADER = 'X-DB-Read-Target'
+
+# Lag en PostgreSQL: 0 si no es standby o ya aplicó todo lo recibido (una
+# primaria sin escrituras no debe verse como réplica atrasada)
+PG_LAG_SQL = (
+    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+READ_ROUTING = registry.counter(
+    'db_read_routing_total', 'Requests de vistas read-only por destino de lectura y motivo.',
+    ('target', 'reason'))
+
+_last_lag = {}
+REPLICA_LAG = registry.gauge(
+    'db_replica_lag_seconds', 'Último lag medido de la réplica de lectura.',
+    callback=lambda: dict(_last_lag))
+
+
+def read_only(view):
+    """
+    Marca una vista como de solo lectura: sus SELECT pueden ir a la réplica.
+
+    Solo agrega metadata a la función (functools.wraps la propaga a los
+    decoradores de afuera); la decisión se toma en before_request.
+    """
+    view.read_only = True
+    return view
+
+
+def primary_bind(db):
+    """
+    bind_arguments de Session.execute que leen de la primaria aunque el request
+    haya sido enrutado a la réplica.
+
+    Para resultados que se cachean con la versión de un namespace de la
+    primaria: leídos de una réplica atrasada quedarían marcados como vigentes
+    sin incluir los últimos commits de otros usuarios.
+    """
+    return {'bind': db.engine}
+
+
+def replica_lag_seconds(connection):
+    """Segundos de retraso de la réplica (0 en motores sin replicación, p.ej. SQLite)."""
+    if connection.dialect.name == 'postgresql':
+        return float(connection.exec_driver_sql(PG_LAG_SQL).scalar() or 0)
+    connection.exec_driver_sql('SELECT 1')
+    return 0.0
+
+
+class ReplicaHealth:
+    """Estado de la réplica, consultado como máximo cada `interval` segundos."""
+
+    def __init__(self, engine, max_lag, interval, probe=replica_lag_seconds):
+        self.engine = engine
+        self.max_lag = max_lag
+        self.interval = interval
+        self.probe = probe
+        self.lag = None
+        self._reason = 'not_checked'
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _check(self):
+        try:
+            with self.engine.connect() as connection:
+                self.lag = self.probe(connection)
+        except Exception as e:
+            self.lag = None
+            logger.warning(f'Réplica de lectura no disponible, se lee de la primaria: {e}')
+            return 'replica_error'
+        _last_lag[()] = self.lag
+        if self.lag > self.max_lag:
+            logger.warning(f'Réplica con {self.lag:.1f}s de lag (máximo {self.max_lag}s), se lee de la primaria')
+            return 'replica_lag'
+        return 'replica'
+
+    def status(self):
+        """(usable, motivo) con el último chequeo vigente."""
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is None or now - self._checked_at >= self.interval:
+                self._reason = self._check()
+                self._checked_at = now
+            return self._reason == 'replica', self._reason
+
+    def reset(self):
+        with self._lock:
+            self._checked_at = None
+
+
+class RoutingSession(Session):
+    """
+    Session de Flask-SQLAlchemy que envía los SELECT a la réplica cuando el
+    request actual fue enrutado a ella (g._db_read_target).
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and isinstance(clause, Select)
+                and clause._for_update_arg is None and has_app_context()
+                and g.get('_db_read_target') == REPLICA_BIND_KEY):
+            engine = self._db.engines.get(REPLICA_BIND_KEY)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(db_session, flush_context):
+    if not has_app_context():
+        return
+    g._db_wrote = True
+    # El resto del request lee lo que acaba de escribir
+    g.pop('_db_read_target', None)
+
+
+def _is_read_only_view(app):
+    view = app.view_functions.get(request.endpoint)
+    return view is not None and getattr(view, 'read_only', False)
+
+
+def init_db_routing(app, db):
+    """
+    Registra el enrutamiento de lecturas a la réplica.
+
+    Requiere `db = SQLAlchemy(session_options={'class_': RoutingSession})` y
+    SQLALCHEMY_BINDS['replica'] (Config lo arma desde READ_REPLICA_URL). Sin
+    réplica no registra nada y todo se lee de la primaria.
+
+    Config:
+        READ_REPLICA_MAX_LAG_SECONDS (float): Lag desde el cual se lee de la primaria (default 10)
+        READ_REPLICA_CHECK_SECONDS (float): Intervalo entre chequeos de lag (default 5)
+        READ_YOUR_WRITES_SECONDS (float): Lecturas en la primaria tras una escritura (default 15)
+    """
+    app.config.setdefault('READ_REPLICA_MAX_LAG_SECONDS', 10.0)
+    app.config.setdefault('READ_REPLICA_CHECK_SECONDS', 5.0)
+    app.config.setdefault('READ_YOUR_WRITES_SECONDS', 15.0)
+
+    with app.app_context():
+        replica = db.engines.get(REPLICA_BIND_KEY)
+    app.extensions['db_routing'] = None
+    if replica is None:
+        return
+
+    health = ReplicaHealth(replica, app.config['READ_REPLICA_MAX_LAG_SECONDS'],
+                           app.config['READ_REPLICA_CHECK_SECONDS'])
+    app.extensions['db_routing'] = health
+    logger.info(f'Réplica de lectura: {replica.url.render_as_string(hide_password=True)}')
+
+    @app.before_request
+    def choose_read_target():
+        if request.method not in ('GET', 'HEAD') or not _is_read_only_view(app):
+            return
+        if session.get(PRIMARY_UNTIL_KEY, 0) > time.time():
+            usable, reason = False, 'read_your_writes'
+        else:
+            usable, reason = health.status()
+        g._db_read_target = REPLICA_BIND_KEY if usable else 'primary'
+        READ_ROUTING.inc(target=g._db_read_target, reason=reason)
+
+    @app.after_request
+    def track_writes(response):
+        if g.pop('_db_wrote', False):
+            session[PRIMARY_UNTIL_KEY] = time.time() + app.config['READ_YOUR_WRITES_SECONDS']
+        if _is_read_only_view(app):
+            response.headers[READ_TARGET_HEADER] = g.get('_db_read_target') or 'primary'
+        return response
+
+    @app.teardown_request
+    def clear_read_target(exc):
+        g.pop('_db_read_target', None)
+        g.pop('_db_wrote', None)
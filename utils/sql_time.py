@@ -0,0 +1,32 @@
+"""
+SQL Time - Expresiones de fecha portables entre PostgreSQL y SQLite
+
+Funciones SQL compiladas por dialecto (sqlalchemy.ext.compiler) para los
+cálculos que conviene hacer en la base en vez de traer un datetime por fila
+a Python.
+"""
+from sqlalchemy import BigInteger
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+
+class epoch_seconds(FunctionElement):
+    """
+    Segundos enteros desde 1970-01-01 de una columna DateTime naive (truncados).
+
+    Traer la columna como entero evita crear un datetime por fila; NumPy la
+    convierte luego con `.astype('datetime64[s]')`.
+    """
+    type = BigInteger()
+    inherit_cache = True
+    name = 'epoch_seconds'
+
+
+@compiles(epoch_seconds)
+def _epoch_seconds_default(element, compiler, **kw):
+    return f'CAST(FLOOR(EXTRACT(EPOCH FROM {compiler.process(element.clauses, **kw)})) AS BIGINT)'
+
+
+@compiles(epoch_seconds, 'sqlite')
+def _epoch_seconds_sqlite(element, compiler, **kw):
+    return f"CAST(strftime('%s', {compiler.process(element.clauses, **kw)}) AS INTEGER)"
@@ -0,0 +1,46 @@
+"""
+Streaming - HTML pages sent while they render
+
+stream_page() renders a template with Flask's stream_template: the part of the
+page before the first loop over a lazy iterable (header, filters, counters)
+goes out right away and the rest follows as the rows are fetched, so the
+time to first byte does not grow with the number of rows. The request
+context stays alive until the last chunk (teardown handlers run after it).
+
+Jinja yields small fragments; they are joined into chunks of about
+STREAM_CHUNK_SIZE bytes so each socket write carries a useful amount of HTML.
+"""
+from flask import Response, stream_template
+
+STREAM_CHUNK_SIZE = 8 * 1024
+
+
+def stream_page(template_name, chunk_size=STREAM_CHUNK_SIZE, **context):
+    """
+    Streamed HTML response of a template.
+
+    Args:
+        template_name (str): Template to render
+        chunk_size (int): Approximate size of each chunk sent
+        **context: Template context
+
+    Returns:
+        Response: text/html response whose body is generated while sent
+    """
+    return Response(_chunks(stream_template(template_name, **context), chunk_size), mimetype='text/html')
+
+
+def _chunks(fragments, size):
+    buffer, length = [], 0
+    try:
+        for fragment in fragments:
+            buffer.append(fragment)
+            length += len(fragment)
+            if length >= size:
+                yield ''.join(buffer)
+                buffer, length = [], 0
+        if buffer:
+            yield ''.join(buffer)
+    finally:
+        # Cliente desconectado: cerrar el render libera el contexto y el cursor de la BD
+        fragments.close()
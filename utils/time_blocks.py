@@ -10,6 +10,10 @@ from datetime import datetime, time
 class TimeBlockHelper:
     """Helper estático para generar y manipular bloques horarios de 2 horas."""
 
+    BLOCK_HOURS = 2
+    # Desde este minuto la hora se redondea hacia arriba (Issue #53)
+    ROUND_UP_MINUTE = 30
+
     @staticmethod
     def get_all_blocks():
         """
@@ -37,7 +41,7 @@ class TimeBlockHelper:
         """
         blocks = []
         for end_hour in range(24):  # 0, 1, 2, ..., 23
-            start_hour = (end_hour - 2) % 24
+            start_hour = (end_hour - TimeBlockHelper.BLOCK_HOURS) % 24
 
             blocks.append({
                 'value': end_hour,
@@ -75,7 +79,7 @@ class TimeBlockHelper:
         minute = dt.minute
 
         # Redondeo a hora más cercana (Issue #53)
-        if minute >= 30:
+        if minute >= TimeBlockHelper.ROUND_UP_MINUTE:
             hour += 1  # Redondear ARRIBA
         # Si < 30, mantener hora actual (redondear ABAJO)
 
@@ -85,7 +89,7 @@ class TimeBlockHelper:
 
         # La hora redondeada es el extremo DERECHO del bloque
         block_end = hour
-        block_start = (block_end - 2) % 24
+        block_start = (block_end - TimeBlockHelper.BLOCK_HOURS) % 24
 
         return {
             'value': block_end,
@@ -109,7 +113,7 @@ class TimeBlockHelper:
             >>> TimeBlockHelper.get_block_label(14)
             '12:00 - 14:00'
         """
-        start_hour = (end_hour - 2) % 24
+        start_hour = (end_hour - TimeBlockHelper.BLOCK_HOURS) % 24
         return f'{start_hour:02d}:00 - {end_hour:02d}:00'
 
     @staticmethod
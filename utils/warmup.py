@@ -0,0 +1,215 @@
+"""
+Warmup - Instancias nuevas en régimen antes de su primer request
+
+Tras un scale-out, los primeros requests de una instancia pagan: compilar los
+templates Jinja y el url_map, configurar los mappers de SQLAlchemy, abrir las
+conexiones del pool y la primera ejecución de cada consulta (compilación del
+SQL en el cache del engine, páginas frías en la base). Los pasos de
+WARMUP_STEPS lo hacen por adelantado:
+
+- al arrancar, con BOOT_STEPS_IN_PROCESS y WARMUP_ON_BOOT (utils/boot.py);
+- con GET /_ah/warmup (público: corre una sola vez por proceso y después
+  devuelve el mismo reporte, así que no sirve para cargar la base).
+
+Con gunicorn --preload el warmup de arranque corre en el master: templates,
+mappers y datos quedan en la memoria que hereda el worker, pero una conexión
+no se comparte entre procesos, así que el pool se cierra antes del fork y el
+worker lo vuelve a abrir en segundo plano.
+"""
+import os
+import threading
+import time
+
+from flask import jsonify
+from sqlalchemy.orm import configure_mappers
+from sqlalchemy.pool import QueuePool
+from werkzeug.exceptions import HTTPException
+
+from models import db, Clinic
+from monitoring.metrics import registry
+from utils.boot import BootReport, BootStep
+
+WARMUP_STEPS = {}
+
+_last_steps = {}
+WARMUP_STEP_SECONDS = registry.gauge(
+    'app_warmup_step_seconds', 'Duración de cada paso del último warmup del proceso.',
+    ('step',), callback=lambda: dict(_last_steps))
+
+
+def warmup_step(name):
+    """Registra un paso de warmup: func(app) -> detalle para el reporte."""
+    def decorator(func):
+        WARMUP_STEPS[name] = func
+        return func
+    return decorator
+
+
+def _active_clinic_ids():
+    return [clinic_id for clinic_id, in db.session.query(Clinic.id).filter_by(is_active=True).order_by(Clinic.id)]
+
+
+# --- Pasos ---
+
+@warmup_step('templates')
+def warm_templates(app):
+    names = [name for name in app.jinja_env.list_templates() if name.endswith('.html')]
+    for name in names:
+        app.jinja_env.get_template(name)
+    return f'{len(names)} templates'
+
+
+@warmup_step('url_map')
+def warm_url_map(app):
+    # bind() compila el matcher de werkzeug; si no, lo compila el primer request
+    try:
+        app.url_map.bind('localhost').match('/')
+    except HTTPException:
+        pass
+    return f'{len(list(app.url_map.iter_rules()))} rutas'
+
+
+@warmup_step('mappers')
+def warm_mappers(app):
+    configure_mappers()
+    return f'{len(db.Model.registry.mappers)} mappers'
+
+
+@warmup_step('pool')
+def warm_pool(app):
+    wanted = app.config['WARMUP_POOL_CONNECTIONS']
+    opened = []
+    for key, engine in db.engines.items():
+        count = 1
+        if isinstance(engine.pool, QueuePool):
+            count = min(wanted, engine.pool.size()) if wanted else engine.pool.size()
+        connections = []
+        try:
+            for _ in range(count):
+                connections.append(engine.connect())
+        finally:
+            for connection in connections:
+                connection.close()
+        opened.append(f'{key or "primaria"} {count}')
+    return ', '.join(opened)
+
+
+@warmup_step('master_data')
+def warm_master_data(app):
+    from services.master_data import MasterDataService
+
+    clinic_ids = _active_clinic_ids()
+    for clinic_id in clinic_ids:
+        MasterDataService.create_form_data(clinic_id)
+    # Formulario de superusuario (todas las clínicas)
+    MasterDataService.create_form_data(None)
+    return f'{len(clinic_ids)} clínicas'
+
+
+@warmup_step('urgency_thresholds')
+def warm_urgency_thresholds(app):
+    from services.master_data import MasterDataService
+
+    clinic_ids = _active_clinic_ids()
+    for clinic_id in [None, *clinic_ids]:
+        MasterDataService.urgency_thresholds(clinic_id)
+    return f'global + {len(clinic_ids)} clínicas'
+
+
+@warmup_step('iap_keys')
+def warm_iap_keys(app):
+    from auth_iap import hybrid_auth
+
+    authenticator = hybrid_auth.iap_auth
+    if authenticator is None or not authenticator.expected_audience:
+        return 'sin validación de JWT de IAP'
+    keys = authenticator.key_store.get_keys()
+    if not keys:
+        raise RuntimeError('no se pudieron descargar las claves públicas de IAP')
+    return f'{len(keys)} claves'
+
+
+# --- Ejecución ---
+
+def run_warmup(app, steps=None):
+    """
+    Corre los pasos de warmup y registra cuánto tomó cada uno.
+
+    Un paso que falla se reporta y no detiene a los siguientes: el warmup
+    nunca impide que la instancia arranque.
+
+    Args:
+        app: Aplicación Flask
+        steps (list, optional): Nombres de WARMUP_STEPS (default todos, en orden)
+
+    Returns:
+        BootReport
+    """
+    report = BootReport()
+    with app.app_context():
+        for name in steps or WARMUP_STEPS:
+            step = BootStep(name, 0.0)
+            started = time.perf_counter()
+            try:
+                step.detail = WARMUP_STEPS[name](app) or ''
+            except Exception as e:
+                db.session.rollback()
+                step.ok, step.detail = False, str(e).splitlines()[0] if str(e) else type(e).__name__
+                app.logger.warning(f'Warmup: el paso {name} falló: {e}')
+            step.seconds = time.perf_counter() - started
+            _last_steps[(name,)] = step.seconds
+            report.steps.append(step)
+        db.session.remove()
+    app.logger.info(report.summary('Warmup'))
+    return report
+
+
+class WarmupState:
+    """Resultado del warmup del proceso; llamadas concurrentes esperan al que está corriendo."""
+
+    def __init__(self):
+        self.report = None
+        self._lock = threading.Lock()
+
+    def run_once(self, app):
+        with self._lock:
+            if self.report is None:
+                self.report = run_warmup(app)
+            return self.report
+
+
+def warm_pool_after_fork(app):
+    """
+    Con gunicorn --preload: cierra el pool del master antes de forkear y lo
+    vuelve a abrir en el worker, en segundo plano.
+    """
+    with app.app_context():
+        engines = list(db.engines.values())
+
+    def close_pools():
+        for engine in engines:
+            engine.dispose()
+
+    def reopen_pool():
+        threading.Thread(target=run_warmup, args=(app, ['pool']), name='warmup-pool', daemon=True).start()
+
+    os.register_at_fork(before=close_pools, after_in_child=reopen_pool)
+
+
+def init_warmup(app):
+    """
+    Registra GET /_ah/warmup.
+
+    Config:
+        WARMUP_ON_BOOT (bool): Correr el warmup en el arranque con BOOT_STEPS_IN_PROCESS (default True)
+        WARMUP_POOL_CONNECTIONS (int): Conexiones a abrir por engine (0 = pool_size del engine)
+    """
+    app.config.setdefault('WARMUP_ON_BOOT', True)
+    app.config.setdefault('WARMUP_POOL_CONNECTIONS', 0)
+    app.extensions['warmup'] = WarmupState()
+
+    def warmup():
+        report = app.extensions['warmup'].run_once(app)
+        return jsonify(status='ok' if all(step.ok for step in report.steps) else 'degraded', **report.to_dict())
+
+    app.add_url_rule('/_ah/warmup', 'warmup', warmup)